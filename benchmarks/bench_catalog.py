@@ -0,0 +1,102 @@
+"""
+Size of the tools/list payload with one tool per agent vs catalog mode.
+
+Generates a fleet of synthetic agents, starts the server in-process for each
+tool mode (in a subprocess, since the server registers its tools at import)
+and measures what a client receives from tools/list, plus the first catalog
+page a client would read to discover agents. Token counts are estimated at
+four bytes per token.
+
+    python benchmarks/bench_catalog.py [--agents 300] [--pinned 5]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+AGENT_TEMPLATE = """---
+agent-name: {name}
+description: {description}
+tools: Read, Grep, Glob, Bash
+model: sonnet
+cwd: .
+optional:
+  resume-session: {resume}
+---
+
+You are the {name} agent. {description}
+"""
+
+TOPICS = ["billing", "search", "payments", "auth", "notifications", "reporting", "ingest", "exports",
+          "scheduling", "inventory", "pricing", "onboarding", "audit", "analytics", "mobile", "frontend"]
+ROLES = ["reviewer", "debugger", "migrator", "tester", "documenter", "optimizer", "auditor", "planner"]
+
+MEASURE = textwrap.dedent("""
+    import asyncio, json
+    from fastmcp import Client
+    from task_agents_mcp.server import mcp
+
+    async def measure():
+        async with Client(mcp) as client:
+            tools = await client.list_tools()
+            resources = await client.list_resources()
+            tools_bytes = len(json.dumps([t.model_dump(mode="json", exclude_none=True) for t in tools]))
+            catalog_bytes = 0
+            if any(r.uri.__str__() == "task-agent://catalog" for r in resources):
+                page = await client.read_resource("task-agent://catalog")
+                catalog_bytes = len(page[0].text)
+            print(json.dumps({"tools": len(tools), "tools_bytes": tools_bytes,
+                              "resources": len(resources), "catalog_page_bytes": catalog_bytes}))
+
+    asyncio.run(measure())
+""")
+
+
+def write_agents(directory: str, count: int, pinned: int):
+    for i in range(count):
+        topic, role = TOPICS[i % len(TOPICS)], ROLES[(i // len(TOPICS)) % len(ROLES)]
+        name = f"{topic.title()} {role.title()} {i}"
+        description = (f"Specialist {role} for the {topic} service. Knows the {topic} data model, its "
+                       f"APIs and deployment, and follows the team's conventions for {role} work.")
+        content = AGENT_TEMPLATE.format(name=name, description=description, resume="true" if i % 4 == 0 else "false")
+        if i < pinned:
+            content = content.replace("optional:\n", "optional:\n  pinned: true\n")
+        with open(os.path.join(directory, f"agent-{i}.md"), "w") as f:
+            f.write(content)
+
+
+def measure(agents_dir: str, mode: str) -> dict:
+    env = dict(os.environ, TASK_AGENTS_PATH=agents_dir, TASK_AGENTS_TOOL_MODE=mode,
+               PLUGIN_REGISTRY_PATH=os.path.join(agents_dir, "no-registry.json"),
+               PYTHONPATH=os.pathsep.join(filter(None, [SRC, os.environ.get("PYTHONPATH")])))
+    output = subprocess.run([sys.executable, "-c", MEASURE], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--agents", type=int, default=300)
+    parser.add_argument("--pinned", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as agents_dir:
+        write_agents(agents_dir, args.agents, args.pinned)
+        results = {mode: measure(agents_dir, mode) for mode in ("individual", "catalog")}
+
+    print(f"{args.agents} agents, {args.pinned} pinned")
+    for mode, r in results.items():
+        print(f"  {mode:<11} tools {r['tools']:>4}   tools/list {r['tools_bytes']:>8,} bytes "
+              f"(~{r['tools_bytes'] // 4:,} tokens)   resources {r['resources']:>4}"
+              + (f"   catalog page {r['catalog_page_bytes']:,} bytes" if mode == "catalog" else ""))
+    saved = 1 - results["catalog"]["tools_bytes"] / results["individual"]["tools_bytes"]
+    print(f"  tools/list reduced by {saved:.0%}")
+
+
+if __name__ == "__main__":
+    main()
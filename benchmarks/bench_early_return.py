@@ -0,0 +1,122 @@
+"""
+Response latency of agent runs whose CLI lingers after its result: waiting for the exit vs early return.
+
+A stand-in CLI streams a short run (init, a tool call, the answer, the
+result event) and then keeps running for a while, as the real CLI does while
+it shuts down the MCP servers from --mcp-config. Each request goes through
+AgentManager.execute_task end to end, once waiting for the CLI to exit and
+once returning at the result event (TASK_AGENTS_EARLY_RETURN).
+
+    python benchmarks/bench_early_return.py [--requests 10] [--work 0.2] [--linger 0.5 1 2]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from task_agents_mcp.run_ledger import percentile  # noqa: E402
+
+FAKE_CLI = """\
+#!{python}
+import json, os, sys, time, uuid
+session_id = str(uuid.uuid4())
+def emit(event):
+    sys.stdout.write(json.dumps(event) + "\\n")
+    sys.stdout.flush()
+emit({{"type": "system", "subtype": "init", "session_id": session_id}})
+time.sleep(float(os.environ["BENCH_WORK"]))
+emit({{"type": "assistant", "message": {{"content": [{{"type": "tool_use", "name": "Read"}}]}}}})
+emit({{"type": "assistant", "message": {{"content": [{{"type": "text", "text": "done"}}]}}}})
+emit({{"type": "result", "subtype": "success", "is_error": False, "result": "done", "session_id": session_id,
+      "usage": {{"input_tokens": 100, "output_tokens": 20}}}})
+time.sleep(float(os.environ["BENCH_LINGER"]))  # Shutting down MCP servers, flushing state
+"""
+
+AGENT = """\
+---
+agent-name: Bench
+description: Benchmark agent
+tools: Read
+model: sonnet
+cwd: {cwd}
+---
+
+System-prompt:
+You answer benchmark requests.
+"""
+
+
+def setup(workdir: str):
+    """Write the stand-in CLI and agent, and point the server's state at the work directory."""
+    cli = os.path.join(workdir, "claude")
+    with open(cli, "w") as f:
+        f.write(FAKE_CLI.format(python=sys.executable))
+    os.chmod(cli, 0o755)
+    agents = os.path.join(workdir, "agents")
+    os.makedirs(agents)
+    with open(os.path.join(agents, "bench.md"), "w") as f:
+        f.write(AGENT.format(cwd=workdir))
+    os.environ.update(
+        CLAUDE_EXECUTABLE_PATH=cli,
+        TASK_AGENTS_LEDGER_PATH=os.path.join(workdir, "ledger.jsonl"),
+        TASK_AGENTS_ARCHIVE_DIR=os.path.join(workdir, "archive"),
+        TASK_AGENTS_RESULT_DIR=os.path.join(workdir, "results"),
+        TASK_AGENTS_TOOL_STATS_PATH=os.path.join(workdir, "tool_stats.json"),
+        TASK_AGENTS_BROKER="off",
+        TASK_AGENTS_SAMPLE_INTERVAL="0",
+    )
+    return agents
+
+
+async def scenario(manager, early_return: bool, requests: int):
+    """Latencies of sequential requests (each CLI has exited before the next scenario)."""
+    manager.early_return = early_return
+    agent = next(iter(manager.agents.values()))
+    selected = {'name': agent.name, 'config': agent}
+    latencies = []
+    for i in range(requests):
+        t = time.monotonic()
+        response = await manager.execute_task(selected, f"benchmark request {i}")
+        latencies.append(time.monotonic() - t)
+        if "done" not in response:
+            raise RuntimeError(f"Unexpected response: {response}")
+    await asyncio.gather(*manager.teardown_tasks)
+    return latencies
+
+
+async def run(args, manager):
+    print(f"{args.requests} sequential requests, {args.work:.2f}s of work before the result")
+    print(f"{'linger':>8}  {'wait for exit p50':>18}  {'early return p50':>17}  {'reduction':>10}")
+    for linger in args.linger:
+        os.environ["BENCH_LINGER"] = str(linger)
+        waited = await scenario(manager, False, args.requests)
+        early = await scenario(manager, True, args.requests)
+        before, after = percentile(waited, 0.5), percentile(early, 0.5)
+        print(f"{linger:>7.1f}s  {before * 1000:>15.0f} ms  {after * 1000:>14.0f} ms  "
+              f"{(before - after) / before:>9.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10, help="Sequential requests per scenario")
+    parser.add_argument("--work", type=float, default=0.2, help="Seconds the CLI works before its result")
+    parser.add_argument("--linger", type=float, nargs="+", default=[0.5, 1.0, 2.0],
+                        help="Seconds the CLI keeps running after its result")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_early_return-") as workdir:
+        agents = setup(workdir)
+        from task_agents_mcp.agent_manager import AgentManager
+        manager = AgentManager(agents)
+        manager.load_agents()
+        os.environ["BENCH_WORK"] = str(args.work)
+        asyncio.run(run(args, manager))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Repository index: tool calls and wall time of code lookups against plain Grep/Glob.
+
+Each lookup is done the way an agent does it with the built-in tools and
+with the index server's tools, counting the calls each workflow needs:
+
+- definition of a symbol: Grep for files with a definition pattern, then Grep
+  those files in content mode for the line (2 calls), vs. find_symbol (1 call)
+- usages of an identifier: Grep in content mode, plus one narrowing call when
+  over 100 lines come back, vs. search_code with the same rule
+- files by name fragment: Glob ``**/*fragment*`` vs. find_files (1 call each)
+
+Grep runs ripgrep when installed (like the Grep tool) and GNU grep otherwise;
+Glob walks the tree. Index queries run in-process, without the MCP round
+trip that the built-in tools don't have either. Also measured: building the
+index, a new run's sync of an unchanged tree, and the update after edits.
+
+    python benchmarks/bench_repo_index.py [--files 5000] [--lookups 60] [--repo PATH]
+"""
+
+import argparse
+import fnmatch
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from task_agents_mcp.repo_index import RepoIndex, SKIPPED_DIRS  # noqa: E402
+from task_agents_mcp.run_ledger import percentile  # noqa: E402
+
+WORDS = ["account", "billing", "cache", "config", "event", "export", "invoice", "ledger", "order", "payment",
+         "queue", "report", "session", "shipment", "token", "user", "webhook", "worker", "audit", "catalog"]
+DEFINITION = r"(def|class|function|func|fn|type|interface)[[:space:]]+{name}\b"
+GREP_LIMIT = 100  # Lines after which the agent narrows the search
+
+
+def make_repo(root: str, files: int, rng: random.Random):
+    """A synthetic Python/TypeScript/Go tree whose modules call each other's functions."""
+    names = []
+    for i in range(files):
+        a, b = rng.sample(WORDS, 2)
+        ext = rng.choice(["py", "ts", "go"])
+        package = f"{rng.choice(WORDS)}/{rng.choice(WORDS)}"
+        names.append((f"src/{package}/{a}_{b}_{i}.{ext}", f"{a}_{b}_{i}", ext))
+    for path, stem, ext in names:
+        calls = [other[1] for other in rng.sample(names, 5)]
+        body = []
+        for j in range(8):
+            fn = f"{stem}_step{j}"
+            callee = f"{rng.choice(calls)}_step{rng.randrange(8)}"
+            if ext == "py":
+                body.append(f"def {fn}(value, options=None):\n    result = {callee}(value)\n"
+                            f"    # {' '.join(rng.choices(WORDS, k=12))}\n    return result\n")
+            elif ext == "ts":
+                body.append(f"export function {fn}(value: number): number {{\n  const result = {callee}(value);\n"
+                            f"  // {' '.join(rng.choices(WORDS, k=12))}\n  return result;\n}}\n")
+            else:
+                body.append(f"func {fn}(value int) int {{\n\tresult := {callee}(value)\n"
+                            f"\t// {' '.join(rng.choices(WORDS, k=12))}\n\treturn result\n}}\n")
+        head = f"class {stem.title().replace('_', '')}Service:\n    pass\n" if ext == "py" else ""
+        os.makedirs(os.path.join(root, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(root, path), "w") as f:
+            f.write(head + "\n".join(body))
+
+
+def grep(root: str, pattern: str, files_only: bool = False, paths=None):
+    """Lines (or files) matching an extended regex, like the Grep tool."""
+    if shutil.which("rg"):
+        cmd = ["rg", "--no-heading", "-n"] + (["-l"] if files_only else []) + ["-e", pattern.replace(
+            "[[:space:]]", r"\s")] + (paths or [root])
+    else:
+        cmd = ["grep", "-rInE"] + (["-l"] if files_only else []) + [
+            f"--exclude-dir={d}" for d in SKIPPED_DIRS] + ["-e", pattern] + (paths or [root])
+    output = subprocess.run(cmd, capture_output=True, text=True).stdout
+    return output.splitlines()
+
+
+def glob(root: str, pattern: str):
+    """Paths matching a glob, walking the tree like the Glob tool."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIPPED_DIRS]
+        for filename in filenames:
+            path = os.path.relpath(os.path.join(dirpath, filename), root)
+            if fnmatch.fnmatch(path, pattern):
+                found.append(path)
+    return found
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=5000, help="Files of the synthetic tree")
+    parser.add_argument("--lookups", type=int, default=60, help="Lookups per kind")
+    parser.add_argument("--repo", help="Benchmark an existing directory instead of a synthetic tree")
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    workdir = tempfile.mkdtemp(prefix="bench_repo_index-")
+    root = os.path.abspath(args.repo) if args.repo else os.path.join(workdir, "repo")
+    try:
+        if not args.repo:
+            make_repo(root, args.files, rng)
+        index_dir = os.path.join(workdir, "index")
+
+        index = RepoIndex(root, index_dir=index_dir, sync_ttl=0, watch=False)
+        counts, build = timed(index.sync, force=True)
+        index.close()
+        # A new agent run opens the shared index, finds the tree unchanged and watches it
+        rerun = RepoIndex(root, index_dir=index_dir, sync_ttl=0)
+        _, warm = timed(rerun.sync, force=True)
+        status = rerun.status()
+
+        symbols = [row[0] for row in rerun._conn.execute(
+            "SELECT DISTINCT name FROM symbols WHERE kind IN ('function', 'class') ORDER BY name")]
+        targets = rng.sample(symbols, min(args.lookups, len(symbols)))
+        fragments = [target.split("_")[0] if "_" in target else target[:5] for target in targets]
+
+        results = {kind: {"grep": [0, []], "index": [0, []]} for kind in ("definition", "usages", "files")}
+        for target, fragment in zip(targets, fragments):
+            # Definition
+            pattern = DEFINITION.format(name=target)
+            started = time.perf_counter()
+            files = grep(root, pattern, files_only=True)
+            if files:
+                grep(root, pattern, paths=files[:50])
+            results["definition"]["grep"][0] += 2
+            results["definition"]["grep"][1].append(time.perf_counter() - started)
+            _, elapsed = timed(rerun.find_symbol, target)
+            results["definition"]["index"][0] += 1
+            results["definition"]["index"][1].append(elapsed)
+
+            # Usages
+            started = time.perf_counter()
+            lines = grep(root, target)
+            calls = 1 + (len(lines) > GREP_LIMIT)
+            results["usages"]["grep"][0] += calls
+            results["usages"]["grep"][1].append(time.perf_counter() - started)
+            (hits, _, more), elapsed = timed(rerun.search, target, max_results=GREP_LIMIT)
+            results["usages"]["index"][0] += 1 + more
+            results["usages"]["index"][1].append(elapsed)
+
+            # Files
+            _, elapsed = timed(glob, root, f"*{fragment}*")
+            results["files"]["grep"][0] += 1
+            results["files"]["grep"][1].append(elapsed)
+            _, elapsed = timed(rerun.find_files, fragment)
+            results["files"]["index"][0] += 1
+            results["files"]["index"][1].append(elapsed)
+
+        # Incremental: an agent edits 10 files
+        edited = rng.sample([row[0] for row in rerun._conn.execute("SELECT path FROM files")], 10)
+        for path in edited:
+            with open(os.path.join(root, path), "a") as f:
+                f.write("\n# edited\n")
+        time.sleep(0.1)  # Let the change events arrive
+        _, incremental = timed(rerun.update)
+        mode = rerun.mode
+        rerun.close()
+        if args.repo:
+            for path in edited:  # Leave the benchmarked checkout as it was
+                with open(os.path.join(root, path), "rb+") as f:
+                    f.truncate(os.path.getsize(os.path.join(root, path)) - len("\n# edited\n"))
+
+        tool = "ripgrep" if shutil.which("rg") else "grep"
+        print(f"{status['files']} files, {status['bytes'] / 1e6:.1f} MB, {status['symbols']} symbols "
+              f"(index {status['database_bytes'] / 1e6:.1f} MB)")
+        print(f"  build                 {build:8.2f} s   ({counts['read']} files read)")
+        print(f"  new run, unchanged    {warm * 1000:8.1f} ms")
+        print(f"  update after 10 edits {incremental * 1000:8.1f} ms   ({mode})")
+        print(f"  {len(targets)} lookups per kind: tool calls and p50/p95 per lookup, {tool}/Glob vs index")
+        for kind, by_tool in results.items():
+            (grep_calls, grep_times), (index_calls, index_times) = by_tool["grep"], by_tool["index"]
+            print(f"  {kind:<11} calls {grep_calls:4d} vs {index_calls:4d}   "
+                  f"p50 {percentile(grep_times, 0.5) * 1000:7.1f} vs {percentile(index_times, 0.5) * 1000:6.2f} ms   "
+                  f"p95 {percentile(grep_times, 0.95) * 1000:7.1f} vs {percentile(index_times, 0.95) * 1000:6.2f} ms")
+        total_grep = sum(sum(by_tool["grep"][1]) for by_tool in results.values())
+        total_index = sum(sum(by_tool["index"][1]) for by_tool in results.values())
+        print(f"  total wall time       {total_grep:8.2f} s vs {total_index:.2f} s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Agent routing index: build time, query latency and incremental updates with thousands of agents.
+
+Synthetic agents combine a domain, a role and a stack; each query names the
+domain, role and stack of one agent in different words than its description,
+and counts as a hit when that agent ranks first.
+
+    python benchmarks/bench_router.py [--agents 5000] [--queries 2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from task_agents_mcp.agent_index import AgentIndex  # noqa: E402
+from task_agents_mcp.run_ledger import percentile  # noqa: E402
+
+DOMAINS = ["billing", "search", "payments", "auth", "notifications", "reporting", "ingest", "exports",
+           "scheduling", "inventory", "pricing", "onboarding", "audit", "analytics", "mobile", "checkout",
+           "shipping", "catalog", "messaging", "identity", "ledger", "fraud", "recommendations", "media"]
+ROLES = {
+    "reviewer": "Reviews pull requests for correctness, style and security issues",
+    "debugger": "Investigates failing behaviour, reads logs and finds root causes of bugs",
+    "migrator": "Plans and performs schema and data migrations safely",
+    "tester": "Writes and runs unit and integration tests, improves coverage",
+    "documenter": "Writes API documentation, guides and changelogs",
+    "optimizer": "Profiles slow code paths and optimizes latency and memory",
+    "auditor": "Audits dependencies, permissions and compliance requirements",
+    "planner": "Breaks features into tasks and writes implementation plans",
+}
+QUERY_VERBS = {
+    "reviewer": "review my pull request", "debugger": "debug a crash", "migrator": "migrate the schema",
+    "tester": "add tests", "documenter": "document the api", "optimizer": "optimize slow queries",
+    "auditor": "audit dependencies", "planner": "plan the feature",
+}
+STACKS = ["python", "go", "typescript", "java", "rust", "kotlin", "swift", "ruby", "postgres", "kafka",
+          "react", "terraform", "kubernetes", "graphql", "redis", "spark"]
+
+
+def make_agents(count: int, rng: random.Random):
+    agents = {}
+    for i in range(count):
+        domain = DOMAINS[i % len(DOMAINS)]
+        role = list(ROLES)[(i // len(DOMAINS)) % len(ROLES)]
+        stack = STACKS[(i // (len(DOMAINS) * len(ROLES))) % len(STACKS)]
+        name = f"{domain}-{role}-{stack}-{i}"
+        agents[name] = SimpleNamespace(
+            name=name,
+            agent_name=f"{domain.title()} {role.title()} {stack.title()} {i}",
+            description=f"{ROLES[role]} in the {domain} service, written in {stack}.",
+            tools=rng.sample(["Read", "Write", "Edit", "Grep", "Glob", "Bash", "WebFetch"], 4),
+            system_prompt=(f"You are the {role} for the {domain} team. The {domain} service is built with "
+                           f"{stack}. " + " ".join(rng.choices(list(ROLES.values()), k=6))),
+            meta=(domain, role, stack),
+        )
+    return agents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--agents", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    agents = make_agents(args.agents, rng)
+
+    started = time.perf_counter()
+    index = AgentIndex()
+    index.sync(agents, generation=1)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index.sync(agents, generation=1)
+    noop = time.perf_counter() - started
+
+    # One agent edited: the generation changes and only that agent is re-indexed
+    edited = next(iter(agents))
+    agents[edited] = SimpleNamespace(**{**vars(agents[edited]), "description": "Edited description."})
+    started = time.perf_counter()
+    counts = index.sync(agents, generation=2)
+    incremental = time.perf_counter() - started
+
+    # Queries for agents whose (domain, role, stack) combination is unique
+    unique = {}
+    for name, agent in agents.items():
+        unique.setdefault(agent.meta, []).append(name)
+    targets = [names[0] for names in unique.values() if len(names) == 1 and names[0] != edited]
+    latencies, hits = [], 0
+    for _ in range(args.queries):
+        target = rng.choice(targets)
+        domain, role, stack = agents[target].meta
+        query = f"Please {QUERY_VERBS[role]} for {domain}, it's a {stack} codebase"
+        started = time.perf_counter()
+        results = index.search(query, top_k=3)
+        latencies.append(time.perf_counter() - started)
+        hits += bool(results) and results[0][0] == target
+
+    print(f"{args.agents} agents, {len(index.postings)} terms")
+    print(f"  full build          {build * 1000:8.1f} ms")
+    print(f"  sync, no changes    {noop * 1e6:8.1f} us")
+    print(f"  sync, 1 edited      {incremental * 1000:8.1f} ms   (added/updated/removed {counts})")
+    print(f"  query p50           {percentile(latencies, 0.5) * 1e6:8.1f} us")
+    print(f"  query p95           {percentile(latencies, 0.95) * 1e6:8.1f} us")
+    print(f"  top-1 accuracy      {hits / args.queries:8.1%}   ({len(targets)} distinct targets)")
+
+
+if __name__ == "__main__":
+    main()
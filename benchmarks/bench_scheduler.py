@@ -0,0 +1,88 @@
+"""
+Queue wait of interactive requests during a batch flood: arrival order vs the fair scheduler.
+
+An automation client submits a burst of long batch requests; meanwhile a
+developer makes short interactive calls at a steady rate. Runs are simulated
+with sleeps (no Claude CLI involved), scaled down so the whole benchmark
+takes a few seconds.
+
+    python benchmarks/bench_scheduler.py [--capacity 4] [--batch 80] [--interactive 30]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from task_agents_mcp.run_ledger import percentile  # noqa: E402
+from task_agents_mcp.scheduler import FairScheduler  # noqa: E402
+
+
+class ArrivalOrder:
+    """Baseline: a semaphore, i.e. requests run in arrival order."""
+
+    def __init__(self, capacity: int):
+        self.semaphore = asyncio.Semaphore(capacity)
+
+    async def run(self, priority, client, duration):
+        started = time.monotonic()
+        async with self.semaphore:
+            waited = time.monotonic() - started
+            await asyncio.sleep(duration)
+        return waited
+
+
+class Fair:
+    def __init__(self, capacity: int):
+        self.scheduler = FairScheduler(capacity=capacity, max_wait=30)
+
+    async def run(self, priority, client, duration):
+        async with self.scheduler.slot(priority, client, cost=duration) as admission:
+            await asyncio.sleep(duration)
+        return admission.queue_wait
+
+
+async def scenario(runner, args):
+    waits = {"interactive": [], "batch": []}
+
+    async def request(priority, client, duration, delay):
+        await asyncio.sleep(delay)
+        waits[priority].append(await runner.run(priority, client, duration))
+
+    tasks = [request("batch", "automation", args.batch_seconds, i * 0.001) for i in range(args.batch)]
+    tasks += [request("interactive", "developer", args.interactive_seconds, 0.05 + i * args.spacing)
+              for i in range(args.interactive)]
+    started = time.monotonic()
+    await asyncio.gather(*tasks)
+    return waits, time.monotonic() - started
+
+
+def report(name, waits, elapsed):
+    def fmt(values):
+        return (f"p50 {percentile(values, 0.5) * 1000:7.0f} ms   p95 {percentile(values, 0.95) * 1000:7.0f} ms   "
+                f"max {max(values) * 1000:7.0f} ms")
+    print(f"{name} (total {elapsed:.1f}s)")
+    for priority, values in waits.items():
+        print(f"  {priority:<12} {fmt(values)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--capacity", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=80, help="Batch requests in the flood")
+    parser.add_argument("--batch-seconds", type=float, default=0.2, help="Duration of a batch run")
+    parser.add_argument("--interactive", type=int, default=30, help="Interactive requests")
+    parser.add_argument("--interactive-seconds", type=float, default=0.05, help="Duration of an interactive run")
+    parser.add_argument("--spacing", type=float, default=0.1, help="Seconds between interactive requests")
+    args = parser.parse_args()
+
+    for name, runner_cls in (("arrival order", ArrivalOrder), ("fair scheduler", Fair)):
+        waits, elapsed = asyncio.run(scenario(runner_cls(args.capacity), args))
+        report(name, waits, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,13 @@
 
 __version__ = "4.1.0"
 
-from .server import mcp
+__all__ = ["mcp"]
 
-__all__ = ["mcp"]
\ No newline at end of file
+
+def __getattr__(name):
+    # Import the server lazily so helper modules (e.g. the routing simulator)
+    # can be run with ``python -m`` without starting up the MCP server
+    if name == "mcp":
+        from .server import mcp
+        return mcp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
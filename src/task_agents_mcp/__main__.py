@@ -2,7 +2,7 @@
 """
 Entry point for running task-agents-mcp as a module.
 """
-from .server import mcp
+from .cli import main
 
 if __name__ == "__main__":
-    mcp.run()
\ No newline at end of file
+    main()
@@ -0,0 +1,185 @@
+"""
+Agent Index for Task-Agents MCP Server
+
+In-memory inverted index over the agents' names, descriptions, tools and
+system prompts, ranked with BM25. It backs the ``route`` tool, which picks
+the agent for a task description without a model turn spent reading agent
+listings.
+
+Fields are weighted by repeating their terms (a name match counts three
+times as much as a system-prompt match). The index is updated per agent:
+``sync`` compares a fingerprint of every agent with the indexed one and only
+re-tokenizes agents that were added or changed, so reloading one agent in a
+fleet of thousands costs one document.
+"""
+
+import heapq
+import logging
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FIELD_WEIGHTS = {"name": 3, "description": 2, "tools": 1, "prompt": 1}
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+    a an and are as at be but by can do does for from has have how i if in into is it its me my no not
+    of on or our so than that the their them then there these they this to too us was we were what
+    when where which who will with would you your
+""".split())
+_SUFFIXES = ("ing", "ers", "ies", "ed", "er", "s")
+
+
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if len(word) > len(suffix) + 2 and word.endswith(suffix) and not word.endswith("ss"):
+            return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words without stopwords, lightly stemmed ("reviews", "reviewing" -> "review")."""
+    return [_stem(word) for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+
+
+def _fields(agent_config) -> Dict[str, str]:
+    return {
+        "name": f"{agent_config.name} {agent_config.agent_name}",
+        "description": agent_config.description,
+        "tools": " ".join(agent_config.tools),
+        "prompt": agent_config.system_prompt or "",
+    }
+
+
+def _fingerprint(agent_config) -> int:
+    # Strings cache their hash, so this is cheap even for long system prompts
+    return hash((agent_config.agent_name, agent_config.description, tuple(agent_config.tools),
+                 agent_config.system_prompt))
+
+
+class AgentIndex:
+    """BM25 inverted index of agents, updated incrementally."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        Initialize an empty index.
+
+        Args:
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> {agent: weighted term frequency}
+        self.doc_terms: Dict[str, Counter] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.fingerprints: Dict[str, int] = {}
+        self.total_length = 0
+        self._norms: Optional[Dict[str, float]] = None  # BM25 length norm per agent, rebuilt after changes
+        self.generation: Optional[int] = None  # AgentManager generation the index reflects
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def add(self, name: str, agent_config):
+        """Index an agent (replacing its previous version)."""
+        if name in self.doc_terms:
+            self.remove(name)
+        terms: Counter = Counter()
+        for field_name, text in _fields(agent_config).items():
+            weight = FIELD_WEIGHTS[field_name]
+            for term in tokenize(text):
+                terms[term] += weight
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[name] = tf
+        length = sum(terms.values())
+        self.doc_terms[name] = terms
+        self.doc_lengths[name] = length
+        self.fingerprints[name] = _fingerprint(agent_config)
+        self.total_length += length
+        self._norms = None
+
+    def remove(self, name: str):
+        """Drop an agent from the index."""
+        terms = self.doc_terms.pop(name, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(name, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(name)
+        self.fingerprints.pop(name, None)
+        self._norms = None
+
+    def sync(self, agents: Dict[str, object], generation: Optional[int] = None) -> Tuple[int, int, int]:
+        """Bring the index in line with ``agents``, re-indexing only what changed.
+
+        Args:
+            agents: Agent configs by internal name
+            generation: Version of ``agents``; if it matches the last sync, nothing is checked
+
+        Returns:
+            Numbers of agents added, updated and removed
+        """
+        if generation is not None and generation == self.generation:
+            return (0, 0, 0)
+        added = updated = 0
+        for name, config in agents.items():
+            indexed = self.fingerprints.get(name)
+            if indexed is None:
+                added += 1
+            elif indexed != _fingerprint(config):
+                updated += 1
+            else:
+                continue
+            self.add(name, config)
+        removed = [name for name in self.doc_terms if name not in agents]
+        for name in removed:
+            self.remove(name)
+        self.generation = generation
+        if added or updated or removed:
+            logger.info(f"Agent index: {added} added, {updated} updated, {len(removed)} removed "
+                        f"({len(self)} agents, {len(self.postings)} terms)")
+        return (added, updated, len(removed))
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[str, float]]:
+        """The ``top_k`` agents for a query as ``(internal name, BM25 score)``, best first."""
+        doc_count = len(self.doc_terms)
+        if not doc_count:
+            return []
+        if self._norms is None:
+            avg_length = self.total_length / doc_count
+            self._norms = {name: self.k1 * (1 - self.b + self.b * length / avg_length)
+                           for name, length in self.doc_lengths.items()}
+        norms = self._norms
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            boost = idf * (self.k1 + 1)
+            for name, tf in posting.items():
+                scores[name] = scores.get(name, 0.0) + boost * tf / (tf + norms[name])
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def explain(self, name: str, query: str) -> List[str]:
+        """Words of the query that matched an agent (for showing why it was picked)."""
+        terms = self.doc_terms.get(name, {})
+        words = _WORD.findall(query.lower())
+        return sorted({word for word in words if word not in _STOPWORDS and _stem(word) in terms})
+
+    @staticmethod
+    def build(agents: Iterable[Tuple[str, object]]) -> "AgentIndex":
+        """Index a batch of ``(name, config)`` pairs from scratch."""
+        index = AgentIndex()
+        for name, config in agents:
+            index.add(name, config)
+        return index
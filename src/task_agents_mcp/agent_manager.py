@@ -6,19 +6,52 @@ Handles agent discovery, selection, and task execution via Claude Code CLI.
 
 import os
 import re
+import hashlib
 import yaml
 import logging
-import subprocess
 import asyncio
 import json
+import time
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Callable, Awaitable, Union
-from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, AsyncIterator, Callable, Awaitable, Union
+from dataclasses import dataclass, field
 
-from .session_store import SessionChainStore
+from .session_store import SessionChainStore, COMPACTION_PROMPT
+from .reliability import ReliabilityTracker, classify_error, TRANSIENT_ERRORS
+from .run_ledger import RunLedger, RunRecord, default_ledger_path
+from .model_router import ModelRouter, POLICIES
+from .progress_model import RuntimeModel, RunProgress
+from .session_primer import SessionPrimer, PRIMING_PROMPT
+from .workspace_pool import WorkspacePool
+from .resource_governor import ResourceProfile, CgroupManager
+from .host_broker import HostBroker
+from .executors import Execution, LocalExecution, SpooledExecution, find_claude_executable
+from .run_supervisor import RunSupervisor, RunCheckpoint
+from . import live_status
+from .live_status import LiveStatus
+from .worker import WorkerPool, WorkerEndpoint, RemoteExecution, WorkerError, LOCAL
+from .scheduler import FairScheduler, Admission, DEFAULT_PRIORITY
+from .agent_index import AgentIndex
+from .log_pipeline import redact_command
+from .result_store import ResultStore, result_uri
+from .transcript_archive import TranscriptArchive, ArchivedRun
+from .resource_manifest import ManifestCache
+from .repo_index import index_available
+from .index_server import write_mcp_config, TOOL_PREFIX as INDEX_TOOL_PREFIX
+from .tool_profiler import ToolProfiler, load_override, apply_override, override_path
 
 logger = logging.getLogger(__name__)
 
+# Appended to the system prompt of agents with the repository index server
+REPO_INDEX_CONTEXT = (
+    f"REPOSITORY INDEX: {INDEX_TOOL_PREFIX}__search_code, {INDEX_TOOL_PREFIX}__find_files and "
+    f"{INDEX_TOOL_PREFIX}__find_symbol answer from a prebuilt, continuously updated index of the working "
+    f"directory. Prefer them over Grep and Glob for searching it.")
+
+# Tools that change files or run commands - agents using them must not be run twice in parallel
+WRITE_TOOLS = {"Write", "Edit", "MultiEdit", "NotebookEdit", "Bash", "KillBash"}
+
 
 @dataclass
 class AgentConfig:
@@ -38,6 +71,74 @@ class AgentConfig:
     prompt_type: str = "override"  # "override" or "append" (how PROMPT.md is applied)
     is_plugin_agent: bool = False  # True if loaded from plugin registry
     prompt_file: Optional[str] = None  # Path to PROMPT.md file
+    fallback_model: Optional[str] = None  # Model to use while the primary model's circuit is open
+    hedge_after: Optional[float] = None  # Seconds before a hedge run starts (0 = historical p90, None = off)
+    hedge_model: Optional[str] = None  # Optional faster model for the hedge run
+    models: Optional[List[str]] = None  # Allowed models for adaptive routing, cheapest first
+    routing_policy: Optional[str] = None  # Routing policy name (see model_router.POLICIES)
+    prime_session: bool = False  # Fork fresh requests from a primed base session
+    session_compaction: bool = False  # Summarize long resume-session chains instead of resetting them
+    compact_after_tokens: int = 50000  # Context size (input tokens) that triggers compaction
+    compaction_model: str = "haiku"  # Model that writes the compacted summary
+    isolation: Optional[str] = None  # "worktree" or "overlay": run each invocation in its own checkout
+    resources: Optional[ResourceProfile] = None  # nice, rlimits and cgroup limits for CLI runs
+    pinned: bool = False  # Keep as an individual MCP tool in catalog mode
+    manifest_tokens: Optional[int] = None  # Token budget of the resource_dirs manifest (None = default, 0 = off)
+    repo_index: Optional[bool] = None  # Attach the bundled repository index server (None = TASK_AGENTS_REPO_INDEX)
+
+    @property
+    def config_version(self) -> str:
+        """Short hash of the settings that shape the agent's prompt prefix."""
+        parts = [
+            self.system_prompt,
+            ','.join(self.tools),
+            ','.join(self.disallowed_tools or []),
+            ','.join(self.resource_dirs or []),
+            self.mcp_config or '',
+            self.prompt_type,
+            self.cwd,
+        ]
+        if self.prompt_file and os.path.exists(self.prompt_file):
+            parts.append(str(os.path.getmtime(self.prompt_file)))
+        if self.repo_index:
+            parts.append('repo-index')
+        return hashlib.sha1('\0'.join(parts).encode('utf-8')).hexdigest()[:12]
+
+
+@dataclass
+class CliRunResult:
+    """Parsed outcome of a single Claude CLI run."""
+    returncode: Optional[int] = None
+    session_id: Optional[str] = None
+    messages: List[str] = field(default_factory=list)  # Assistant text segments (or the final result)
+    tools_used: List[str] = field(default_factory=list)
+    usage: Dict[str, Any] = field(default_factory=dict)
+    total_cost: Optional[float] = None
+    result_event: Optional[Dict[str, Any]] = None
+    stderr: str = ""
+    output_line_count: int = 0
+    model: Optional[str] = None
+    duration: float = 0.0  # Seconds from spawn to process exit (to the result until a teardown finishes)
+    time_to_result: Optional[float] = None  # Seconds from spawn to the result event
+    time_to_first_token: Optional[float] = None  # Seconds from spawn to the first text delta
+    message_usage: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # Per-message usage seen so far
+    hedge_role: Optional[str] = None  # "primary" or "hedge" when the request was hedged
+    hedge_threshold: Optional[float] = None
+    hedge_extra_tokens: int = 0  # Tokens spent by the losing run of a hedged request
+    primed_from: Optional[str] = None  # Base session this run was forked from
+    peak_rss_bytes: Optional[int] = None  # Peak memory of the CLI and its children
+    cpu_seconds: Optional[float] = None  # CPU time of the CLI and its children
+    slot_wait: float = 0.0  # Seconds spent waiting for a host concurrency slot
+    worker: str = LOCAL  # "local" or the address of the worker that ran the CLI
+    events: List[Dict[str, Any]] = field(default_factory=list)  # Events kept for the transcript archive
+    events_truncated: bool = False  # The run had more events than the archive keeps
+    spool_id: Optional[str] = None  # Run id of a detached run's spool files and checkpoint
+    teardown: Optional[asyncio.Task] = None  # Reaping of a run returned at its result event
+
+    def tokens_so_far(self) -> int:
+        """Input and output tokens consumed so far (final usage if the run completed)."""
+        usage_list = [self.usage] if self.usage else list(self.message_usage.values())
+        return sum(u.get('input_tokens', 0) + u.get('output_tokens', 0) for u in usage_list)
     
 
 class AgentManager:
@@ -46,10 +147,93 @@ class AgentManager:
     def __init__(self, configs_dir: str = "configs"):
         self.configs_dir = Path(configs_dir)
         self.agents: Dict[str, AgentConfig] = {}
+        self.generation = 0  # Bumped whenever the set of agents or their configs change
+        self.config_mtimes: Dict[str, float] = {}  # Agent name -> mtime of its .md file (or override)
+        self.reload_listeners: List[Callable[[Dict[str, List[str]]], None]] = []  # Called with reload changes
+
+        # Inverted index for routing task descriptions to agents
+        self.index = AgentIndex()
         
-        # Initialize session store with persistent storage
-        session_store_path = Path("/tmp/task_agents_sessions.json")
+        # Initialize session store with persistent storage (one file per agents
+        # directory, since every project runs its own server instance)
+        configs_digest = hashlib.sha1(str(self.configs_dir.resolve()).encode('utf-8')).hexdigest()[:10]
+        session_store_path = Path(f"/tmp/task_agents_sessions-{configs_digest}.json")
         self.session_store = SessionChainStore(session_store_path)
+
+        # Large results are stored on disk and read back through task-agent://results/... resources
+        self.results = ResultStore(Path(os.environ.get('TASK_AGENTS_RESULT_DIR')
+                                        or f"/tmp/task_agents_results-{configs_digest}"))
+
+        # Compressed, indexed archive of every run's events (task-agent://transcripts/... resources)
+        self.archive = TranscriptArchive(Path(os.environ.get('TASK_AGENTS_ARCHIVE_DIR')
+                                              or f"/tmp/task_agents_archive-{configs_digest}"))
+        self.archive_tasks: set = set()
+
+        # Listings of agents' resource_dirs added to their system prompts
+        self.manifests = ManifestCache()
+        # Attach the bundled repository index server to agents that don't set repo-index
+        self.repo_index_default = os.environ.get('TASK_AGENTS_REPO_INDEX', '').strip().lower() in (
+            '1', 'true', 'yes', 'on')
+
+        # Per-model circuit breakers and retry statistics
+        self.reliability = ReliabilityTracker()
+
+        # History of finished runs (latency percentiles, token usage, hedging cost)
+        self.ledger = RunLedger(default_ledger_path(configs_digest))
+
+        # Per-request model selection for agents that declare several models
+        self.router = ModelRouter(self.ledger)
+
+        # Expected run time, tool calls and output per agent (progress, ETAs and scheduler costs)
+        self.runtimes = RuntimeModel(self.ledger)
+
+        # Tool usage per agent across runs, and suggestions for tighter tool sets
+        self.tool_profiler = ToolProfiler(Path(os.environ.get('TASK_AGENTS_TOOL_STATS_PATH')
+                                               or f"/tmp/task_agents_tool_stats-{configs_digest}.json"))
+        if not self.tool_profiler.loaded:
+            self.tool_profiler.bootstrap(run for runs in self.ledger.records.values() for run in runs)
+        self.override_tasks: Dict[str, asyncio.Task] = {}  # Auto-applied tool suggestions being written
+        self.in_flight = 0  # Agent runs currently executing
+        # Requests and CLI runs in progress, kept current as they advance (task-agent://status)
+        self.live = LiveStatus()
+
+        # Primed base sessions that fresh requests fork from
+        self.primer = SessionPrimer()
+
+        # Background summary runs of resume-session chains, by agent name
+        self.compactions: Dict[str, asyncio.Task] = {}
+
+        # One lock per session chain: exchanges on a chain run one at a time, in arrival order
+        self.chain_locks: Dict[str, asyncio.Lock] = {}
+
+        # Pooled git worktrees and overlay copies for isolated agents
+        self.workspaces = WorkspacePool()
+
+        # Per-run cgroups for agents with resource profiles, and /proc sampling for the rest
+        self.cgroups = CgroupManager()
+        self.sample_interval = float(os.environ.get('TASK_AGENTS_SAMPLE_INTERVAL', '0'))
+
+        # Runs return at their result event; the CLI's exit is waited for in the background
+        self.early_return = os.environ.get('TASK_AGENTS_EARLY_RETURN', 'on').strip().lower() not in (
+            'off', '0', 'false', 'no')
+        self.teardown_timeout = float(os.environ.get('TASK_AGENTS_TEARDOWN_TIMEOUT', '30'))
+        self.teardown_tasks: set = set()
+        self.chain_teardowns: Dict[str, asyncio.Task] = {}  # Agent name -> teardown of its chain's last exchange
+
+        # Concurrency budget for CLI processes shared with other instances on this host
+        self.broker = HostBroker()
+
+        # Where CLI runs execute: locally and on the workers in TASK_AGENTS_WORKERS
+        self.workers = WorkerPool(
+            local_capacity=self.broker.host_slots if self.broker.enabled else self.broker.local_limit)
+
+        # Order of requests when more arrive than the healthy endpoints can run
+        self.scheduler = FairScheduler(
+            capacity=lambda: sum(e.capacity for e in self.workers.endpoints.values() if e.healthy) or 1)
+
+        # Detached runs that survive a restart, adoption of runs left by exited servers, and drain mode
+        self.supervisor = RunSupervisor(Path(os.environ.get('TASK_AGENTS_SPOOL_DIR')
+                                             or f"/tmp/task_agents_spool-{configs_digest}"))
         
     def load_agents(self) -> None:
         """Load all agent configurations from the configs directory."""
@@ -62,9 +246,89 @@ class AgentManager:
                 agent = self._parse_agent_config(config_file)
                 if agent:
                     self.agents[agent.name] = agent
+                    self.config_mtimes[agent.name] = self._config_mtime(config_file)
                     logger.info(f"Loaded agent: {agent.name}")
             except Exception as e:
                 logger.error(f"Error loading agent config {config_file}: {e}")
+        self.generation += 1
+
+    def reload_agents(self) -> Dict[str, List[str]]:
+        """Re-read the configs directory, parsing only new and modified files.
+
+        Registry agents are left as they are.
+
+        Returns:
+            Internal names of the agents that were added, changed and removed
+        """
+        changes: Dict[str, List[str]] = {"added": [], "changed": [], "removed": []}
+        seen = set()
+        config_files = self.configs_dir.glob("*.md") if self.configs_dir.exists() else []
+        for config_file in config_files:
+            name = config_file.stem
+            seen.add(name)
+            try:
+                mtime = self._config_mtime(config_file)
+                if self.config_mtimes.get(name) == mtime:
+                    continue
+                agent = self._parse_agent_config(config_file)
+            except Exception as e:
+                logger.error(f"Error loading agent config {config_file}: {e}")
+                continue
+            if agent is None:
+                continue
+            changes["changed" if name in self.agents else "added"].append(name)
+            self.agents[name] = agent
+            self.config_mtimes[name] = mtime
+
+        for name in list(self.config_mtimes):
+            if name not in seen:
+                del self.config_mtimes[name]
+                if self.agents.pop(name, None) is not None:
+                    changes["removed"].append(name)
+
+        if any(changes.values()):
+            self.generation += 1
+            logger.info(f"Reloaded agents: {', '.join(f'{len(v)} {k}' for k, v in changes.items())}")
+            for listener in self.reload_listeners:
+                listener(changes)
+        return changes
+
+    def _config_mtime(self, config_file: Path) -> float:
+        """Modification time of an agent file, or of its override when that is newer."""
+        mtime = config_file.stat().st_mtime
+        override = override_path(self.configs_dir, config_file.stem)
+        return max(mtime, override.stat().st_mtime) if override.exists() else mtime
+
+    def tool_report(self, internal_name: str) -> Dict[str, Any]:
+        """Tool usage of an agent and the suggested tool set (see tool_profiler)."""
+        agent_config = self.agents[internal_name]
+        report = self.tool_profiler.report(agent_config)
+        override = override_path(self.configs_dir, internal_name)
+        report["override"] = str(override) if override.exists() else None
+        return report
+
+    def apply_tool_suggestion(self, internal_name: str) -> Optional[Path]:
+        """Write an agent's suggested tool set as its override and reload it.
+
+        Returns:
+            The override file, or None if there is no suggestion for the agent
+        """
+        agent_config = self.agents[internal_name]
+        suggestion = self.tool_profiler.report(agent_config)["suggestion"]
+        if not suggestion or agent_config.is_plugin_agent:
+            return None
+        path = self.tool_profiler.write_override(self.configs_dir, agent_config, suggestion)
+        self.reload_agents()
+        return path
+
+    def route(self, task_description: str, top_k: int = 3) -> List[tuple]:
+        """Rank agents for a task description.
+
+        Returns:
+            Up to ``top_k`` ``(internal name, score)`` pairs, best first
+        """
+        self.index.sync(self.agents, self.generation)
+        return self.index.search(task_description, top_k)
                 
     def _parse_agent_config(self, config_path: Path) -> Optional[AgentConfig]:
         """Parse a single agent configuration file."""
@@ -106,6 +370,12 @@ class AgentManager:
                     logger.error(f"Missing required field '{field}' in {config_path}")
                     return None
             
+            # Merge the agent's override (e.g. a tool set written by the tool-usage profiler)
+            override = load_override(self.configs_dir, config_path.stem)
+            if override:
+                frontmatter = apply_override(frontmatter, override)
+                logger.info(f"Applied override to {config_path.name}: {', '.join(override)}")
+
             # Parse tools list
             tools = frontmatter['tools']
             if isinstance(tools, str):
@@ -122,6 +392,20 @@ class AgentManager:
             resource_dirs = None
             disallowed_tools = None
             mcp_config = None
+            fallback_model = None
+            hedge_after = None
+            hedge_model = None
+            models = None
+            routing_policy = None
+            prime_session = False
+            session_compaction = False
+            compact_after_tokens = 50000
+            compaction_model = "haiku"
+            isolation = None
+            resources = None
+            pinned = False
+            manifest_tokens = None
+            repo_index = None
             
             if 'optional' in frontmatter and isinstance(frontmatter['optional'], dict):
                 optional = frontmatter['optional']
@@ -167,6 +451,108 @@ class AgentManager:
                 if mcp_config_val and isinstance(mcp_config_val, str):
                     mcp_config = mcp_config_val.strip()
 
+                # Parse fallback-model (used while the primary model's circuit breaker is open)
+                fallback_model_val = optional.get('fallback-model') or optional.get('fallback_model')
+                if fallback_model_val and isinstance(fallback_model_val, str):
+                    fallback_model = fallback_model_val.strip()
+
+                # Parse hedge: true (use historical p90) or a number of seconds
+                hedge_val = optional.get('hedge', False)
+                if hedge_val is True or (isinstance(hedge_val, str) and hedge_val.strip().lower() == 'true'):
+                    hedge_after = 0.0
+                elif isinstance(hedge_val, (int, float)) and not isinstance(hedge_val, bool) and hedge_val > 0:
+                    hedge_after = float(hedge_val)
+                elif isinstance(hedge_val, str) and hedge_val.strip().replace('.', '', 1).isdigit():
+                    hedge_after = float(hedge_val.strip())
+
+                hedge_model_val = optional.get('hedge-model') or optional.get('hedge_model')
+                if hedge_model_val and isinstance(hedge_model_val, str):
+                    hedge_model = hedge_model_val.strip()
+
+                # Parse models (allowed models for adaptive routing) and routing-policy
+                models_val = optional.get('models')
+                if models_val:
+                    if isinstance(models_val, str):
+                        models = [m.strip() for m in models_val.split(',') if m.strip()]
+                    elif isinstance(models_val, list):
+                        models = [str(m).strip() for m in models_val]
+                routing_policy_val = optional.get('routing-policy') or optional.get('routing_policy')
+                if routing_policy_val:
+                    if routing_policy_val in POLICIES:
+                        routing_policy = routing_policy_val
+                    else:
+                        logger.warning(f"Unknown routing-policy '{routing_policy_val}' in {config_path.name}, "
+                                       f"using default (available: {', '.join(sorted(POLICIES))})")
+
+                # Parse prime-session
+                prime_val = optional.get('prime-session', optional.get('prime_session', False))
+                prime_session = prime_val is True or (isinstance(prime_val, str) and prime_val.strip().lower() == 'true')
+
+                # Parse session-compaction, compact-after-tokens and compaction-model
+                compaction_val = optional.get('session-compaction', optional.get('session_compaction', False))
+                session_compaction = compaction_val is True or (
+                    isinstance(compaction_val, str) and compaction_val.strip().lower() == 'true')
+                compact_tokens_val = optional.get('compact-after-tokens', optional.get('compact_after_tokens'))
+                if isinstance(compact_tokens_val, int) and not isinstance(compact_tokens_val, bool) and compact_tokens_val > 0:
+                    compact_after_tokens = compact_tokens_val
+                elif isinstance(compact_tokens_val, str) and compact_tokens_val.strip().isdigit():
+                    compact_after_tokens = int(compact_tokens_val.strip())
+                compaction_model_val = optional.get('compaction-model') or optional.get('compaction_model')
+                if compaction_model_val and isinstance(compaction_model_val, str):
+                    compaction_model = compaction_model_val.strip()
+                if session_compaction and not resume_session:
+                    logger.warning(f"session-compaction ignored for {config_path.name}: resume-session is not enabled")
+                    session_compaction = False
+
+                # Parse isolation (worktree, or overlay to always copy the directory)
+                isolation_val = optional.get('isolation')
+                if isinstance(isolation_val, str) and isolation_val.strip().lower() in ('worktree', 'overlay'):
+                    isolation = isolation_val.strip().lower()
+                elif isolation_val:
+                    logger.warning(f"Unknown isolation '{isolation_val}' in {config_path.name} "
+                                   f"(expected worktree or overlay), running without isolation")
+                if isolation and (resume_session or prime_session):
+                    # The CLI stores sessions per directory, and every isolated run gets a new one
+                    logger.warning(f"resume-session and prime-session are ignored for {config_path.name}: "
+                                   f"isolated runs cannot resume sessions")
+                    resume_session = False
+                    prime_session = False
+                    session_compaction = False
+
+                # Parse resources (priority class, nice, rlimits, cgroup limits)
+                resources_val = optional.get('resources')
+                if isinstance(resources_val, dict):
+                    try:
+                        resources = ResourceProfile.from_frontmatter(resources_val)
+                    except (TypeError, ValueError) as e:
+                        logger.warning(f"Invalid resources in {config_path.name}: {e}, running without limits")
+                elif resources_val:
+                    logger.warning(f"resources in {config_path.name} must be a mapping, running without limits")
+
+                # Hedging runs the task twice in parallel - only safe for read-only agents
+                if hedge_after is not None and WRITE_TOOLS.intersection(tools):
+                    logger.warning(f"Hedging disabled for {config_path.name}: agent has write-capable tools "
+                                   f"({', '.join(sorted(WRITE_TOOLS.intersection(tools)))})")
+                    hedge_after = None
+
+                # Parse pinned (stays an individual tool in catalog mode)
+                pinned_val = optional.get('pinned', False)
+                pinned = pinned_val is True or (isinstance(pinned_val, str) and pinned_val.strip().lower() == 'true')
+
+                # Parse manifest-tokens (budget of the resource_dirs listing, 0 = no listing)
+                manifest_val = optional.get('manifest-tokens', optional.get('manifest_tokens'))
+                if isinstance(manifest_val, int) and not isinstance(manifest_val, bool) and manifest_val >= 0:
+                    manifest_tokens = manifest_val
+                elif isinstance(manifest_val, str) and manifest_val.strip().isdigit():
+                    manifest_tokens = int(manifest_val.strip())
+
+                # Parse repo-index (attach the bundled repository index server)
+                repo_index_val = optional.get('repo-index', optional.get('repo_index'))
+                if isinstance(repo_index_val, bool):
+                    repo_index = repo_index_val
+                elif isinstance(repo_index_val, str) and repo_index_val.strip().lower() in ('true', 'false'):
+                    repo_index = repo_index_val.strip().lower() == 'true'
+
                 # Parse prompt-type (for plugin agents)
                 prompt_type_val = optional.get('prompt-type', optional.get('prompt_type'))
                 if prompt_type_val:
@@ -194,7 +580,21 @@ class AgentManager:
                 plugin_dir=plugin_dir,
                 prompt_type=prompt_type,
                 is_plugin_agent=is_plugin,
-                prompt_file=prompt_file
+                prompt_file=prompt_file,
+                fallback_model=fallback_model,
+                hedge_after=hedge_after,
+                hedge_model=hedge_model,
+                models=models,
+                routing_policy=routing_policy,
+                prime_session=prime_session,
+                session_compaction=session_compaction,
+                compact_after_tokens=compact_after_tokens,
+                compaction_model=compaction_model,
+                isolation=isolation,
+                resources=resources,
+                pinned=pinned,
+                manifest_tokens=manifest_tokens,
+                repo_index=repo_index
             )
             
         except yaml.YAMLError as e:
@@ -266,6 +666,7 @@ class AgentManager:
                 logger.error(f"Error loading registry agent {agent_name}: {e}")
 
         if loaded_count > 0:
+            self.generation += 1
             logger.info(f"Loaded {loaded_count} agents from plugin registry")
 
     def _parse_registry_agent(self, name: str, entry: dict) -> Optional[AgentConfig]:
@@ -340,21 +741,814 @@ class AgentManager:
             prompt_file=prompt_file if os.path.exists(prompt_file) else None
         )
 
+    def _find_claude_executable(self) -> Optional[str]:
+        """Locate the Claude Code CLI from the environment, PATH or common install locations."""
+        return find_claude_executable()
+
+    def _resolve_working_dir(self, agent_config: AgentConfig) -> str:
+        """Resolve the agent's configured cwd to an absolute working directory."""
+        cwd = agent_config.cwd
+
+        # If cwd is '.', resolve based on agent type
+        if cwd == '.':
+            if agent_config.is_plugin_agent:
+                # Plugin agent: use current working directory
+                cwd = os.getcwd()
+                logger.info(f"Plugin agent cwd was '.', resolved to cwd: {cwd}")
+            else:
+                # .md agent: use the parent directory of the task-agents folder
+                task_agents_dir = Path(self.configs_dir).resolve()
+                cwd = str(task_agents_dir.parent)
+                logger.info(f"Agent cwd was '.', resolved to: {cwd}")
+
+        # Expand environment variables and make absolute
+        return os.path.abspath(os.path.expandvars(cwd))
+
+    def _build_command(self, agent_config: AgentConfig, task_description: str, claude_path: str,
+                       working_dir: str, model: str,
+                       resume_session_id: Optional[str] = None,
+                       fork_session: bool = False,
+                       extra_context: Optional[List[str]] = None) -> List[str]:
+        """Build the Claude CLI argv for one run of an agent.
+
+        With ``fork_session`` the resumed session is forked into a new session
+        instead of being continued (used to start from a primed base session).
+        ``extra_context`` blocks are added to the appended system prompt (e.g.
+        the compacted summary of a session chain).
+        """
+        cmd = [
+            claude_path,
+            '-p', task_description,
+            '--output-format', 'stream-json',
+            '--verbose',  # Required for stream-json output
+            '--include-partial-messages',
+            '--tools', ','.join(agent_config.tools),
+            '--model', model
+        ]
+        
+        # Add session display name
+        session_name = agent_config.agent_name.lower().replace(' ', '_').replace('-', '_')
+        cmd.extend(['--name', session_name])
+
+        # Add disallowed tools if configured
+        if agent_config.disallowed_tools:
+            cmd.extend(['--disallowed-tools', ','.join(agent_config.disallowed_tools)])
+
+        # Add resume flag if we have a session to resume
+        if resume_session_id:
+            cmd.extend(['-r', resume_session_id])
+            if fork_session:
+                cmd.append('--fork-session')
+                logger.info(f"Forking session {resume_session_id} for {agent_config.agent_name}")
+            else:
+                logger.info(f"Resuming session {resume_session_id} for {agent_config.agent_name}")
+
+        # Add any resource directories specified in agent config
+        resolved_resource_dirs = []
+        accessible_resource_dirs = []
+        missing_resource_dirs = []
+        
+        if agent_config.resource_dirs:
+            for resource_dir in agent_config.resource_dirs:
+                resolved_dir = self._resolve_resource_dir(resource_dir, working_dir)
+                resolved_resource_dirs.append((resource_dir, resolved_dir))
+                
+                # Check if directory exists before adding
+                if os.path.exists(resolved_dir) and os.path.isdir(resolved_dir):
+                    cmd.extend(['--add-dir', resolved_dir])
+                    logger.info(f"Added resource directory: {resolved_dir}")
+                    accessible_resource_dirs.append(resolved_dir)
+                else:
+                    logger.warning(f"Resource directory not found or not a directory: {resolved_dir}")
+                    missing_resource_dirs.append((resource_dir, resolved_dir))
+        
+        # Add MCP config if specified
+        mcp_config_path = None
+        if agent_config.mcp_config:
+            mcp_config_path = agent_config.mcp_config
+            if not os.path.isabs(mcp_config_path):
+                mcp_config_path = os.path.abspath(os.path.join(working_dir, mcp_config_path))
+            if not os.path.exists(mcp_config_path):
+                logger.warning(f"MCP config file not found: {mcp_config_path}")
+                mcp_config_path = None
+
+        # Attach the repository index server, merged into the agent's own MCP config
+        index_config_path = None
+        if self._uses_repo_index(agent_config):
+            try:
+                index_config_path = write_mcp_config(working_dir, mcp_config_path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Repository index not attached for {agent_config.agent_name}: {e}")
+        if index_config_path:
+            cmd.extend(['--mcp-config', index_config_path])
+            if mcp_config_path:
+                cmd.append('--strict-mcp-config')
+            cmd.extend(['--allowedTools', INDEX_TOOL_PREFIX])
+            logger.info(f"Added repository index MCP config: {index_config_path}")
+        elif mcp_config_path:
+            cmd.extend(['--mcp-config', mcp_config_path, '--strict-mcp-config'])
+            logger.info(f"Added MCP config: {mcp_config_path}")
+
+        # Branch: plugin-based agents vs .md-based agents
+        if agent_config.is_plugin_agent and agent_config.plugin_dir:
+            # Plugin agent: use --plugin-dir + --system-prompt-file
+            cmd.extend(['--plugin-dir', agent_config.plugin_dir])
+
+            append_prompt_parts = []
+            if agent_config.prompt_file:
+                if agent_config.prompt_type == "append":
+                    cmd.extend(['--append-system-prompt-file', agent_config.prompt_file])
+                else:
+                    cmd.extend(['--system-prompt-file', agent_config.prompt_file])
+                    # Only add working dir context for override agents
+                    # (append agents retain default prompt which handles cwd)
+                    append_prompt_parts.append(
+                        f"WORKING DIRECTORY CONTEXT: You are currently operating from the directory: {working_dir}")
+            append_prompt_parts.extend(extra_context or [])
+            if append_prompt_parts:
+                cmd.extend(['--append-system-prompt', '\n'.join(append_prompt_parts)])
+        else:
+            # .md-based agent: inline system prompt (existing behavior)
+            # Build dynamic resource directory instruction
+            resource_info = []
+            if accessible_resource_dirs:
+                resource_info.append(f"ACCESSIBLE RESOURCES: {', '.join(accessible_resource_dirs)}")
+            if missing_resource_dirs:
+                missing_list = [f"{orig} (looked at: {resolved})" for orig, resolved in missing_resource_dirs]
+                resource_info.append(f"MISSING RESOURCES: {', '.join(missing_list)}")
+
+            # Replace [resource_dir] placeholders in system prompt with actual paths
+            system_prompt_with_replacements = agent_config.system_prompt
+            if accessible_resource_dirs:
+                if len(accessible_resource_dirs) == 1:
+                    system_prompt_with_replacements = system_prompt_with_replacements.replace('[resource_dir]', accessible_resource_dirs[0])
+                else:
+                    resource_dirs_str = ', '.join(accessible_resource_dirs)
+                    system_prompt_with_replacements = system_prompt_with_replacements.replace('[resource_dir]', resource_dirs_str)
+
+            # Add the system prompt with replacements
+            cmd.extend(['--system-prompt', system_prompt_with_replacements])
+
+            # Build append-system-prompt instruction for working directory and resources
+            append_prompt_parts = []
+            append_prompt_parts.append(f"WORKING DIRECTORY CONTEXT: You are currently operating from the directory: {working_dir}")
+            if resource_info:
+                append_prompt_parts.extend(resource_info)
+            append_prompt_parts.extend(extra_context or [])
+
+            # Add append-system-prompt flag
+            append_prompt = '\n'.join(append_prompt_parts)
+            cmd.extend(['--append-system-prompt', append_prompt])
+
+        return cmd
+
+    @staticmethod
+    def _resolve_resource_dir(resource_dir: str, working_dir: str) -> str:
+        """Absolute path of a resource_dirs entry (relative entries are resolved from the working directory)."""
+        if not os.path.isabs(resource_dir):
+            return os.path.abspath(os.path.join(working_dir, resource_dir))
+        return os.path.abspath(os.path.expandvars(resource_dir))
+
+    def _uses_repo_index(self, agent_config: AgentConfig) -> bool:
+        """Whether runs of an agent get the repository index server.
+
+        Not for isolated agents: every run's fresh checkout would need an index built from scratch.
+        """
+        enabled = self.repo_index_default if agent_config.repo_index is None else agent_config.repo_index
+        return enabled and not agent_config.isolation and index_available()
+
+    async def _manifest_context(self, agent_config: AgentConfig, working_dir: str) -> Optional[str]:
+        """Appended-system-prompt block listing the agent's resource directories."""
+        if not agent_config.resource_dirs or agent_config.manifest_tokens == 0:
+            return None
+        roots = [self._resolve_resource_dir(d, working_dir) for d in agent_config.resource_dirs]
+        roots = [root for root in roots if os.path.isdir(root)]
+        if not roots:
+            return None
+        try:
+            return await asyncio.to_thread(self.manifests.context, roots, agent_config.manifest_tokens)
+        except Exception as e:
+            logger.warning(f"Could not build the resource manifest of {agent_config.agent_name}: {e}")
+            return None
+
+    async def _run_cli(self, cmd: List[str], working_dir: str, agent_config: AgentConfig,
+                       progress_callback: Optional[Callable[[str], Awaitable[None]]] = None,
+                       model: Optional[str] = None,
+                       result_seen: Optional[asyncio.Event] = None,
+                       run: Optional[CliRunResult] = None,
+                       checkpoint: Optional[RunCheckpoint] = None) -> CliRunResult:
+        """Run the Claude CLI once and parse its stream-json output as it arrives.
+
+        Args:
+            cmd: Full CLI argv
+            working_dir: Directory to run the CLI in
+            agent_config: The agent being run (for logging and progress messages)
+            progress_callback: Optional async callback for progress updates
+            model: Model the command was built for (recorded on the result)
+            result_seen: Optional event set as soon as the ``result`` event is parsed
+            run: Optional result object to fill in, so callers can inspect partial
+                 progress of a run that gets cancelled
+            checkpoint: Run the CLI detached with this checkpoint when it runs locally,
+                        so it survives a server restart (the caller releases ``run.spool_id``)
+        """
+        if run is None:
+            run = CliRunResult(model=model or agent_config.model)
+
+        endpoint = await self._select_endpoint(run)
+        while endpoint is not None and endpoint.address != LOCAL:
+            try:
+                execution = await self._start_remote(endpoint, cmd, working_dir, agent_config)
+            except BaseException:
+                self.workers.finished(endpoint)
+                raise
+            if execution is None:
+                # The worker is now marked unhealthy, so this picks another endpoint
+                self.workers.finished(endpoint)
+                endpoint = await self._select_endpoint(run)
+                continue
+            run.worker = endpoint.address
+            try:
+                run = await self._consume(execution, agent_config, run, progress_callback, result_seen)
+            finally:
+                self._after_teardown(run, self.workers.finished, endpoint)
+            if execution.lost:
+                # Classified as a network error, so the retry goes to another endpoint
+                self.workers.mark_failed(endpoint, ConnectionError(execution.stderr))
+            return run
+        if endpoint is None:
+            return run
+
+        async def on_wait():
+            logger.info(f"No free agent slot for {agent_config.agent_name}, queueing")
+            self.live.set_state(live_status.WAITING_FOR_SLOT)
+            if progress_callback:
+                await progress_callback("⏳ Waiting for a free agent slot...")
+
+        try:
+            lease = await self.broker.acquire(agent_config.agent_name, on_wait)
+        except BaseException:
+            self.workers.finished(endpoint)
+            raise
+        run.slot_wait = lease.waited
+        try:
+            if checkpoint is None:
+                execution = await LocalExecution.start(cmd, working_dir, agent_config.resources, self.cgroups,
+                                                       agent_config.agent_name, self.sample_interval)
+                return await self._consume(execution, agent_config, run, progress_callback, result_seen)
+            execution = await self._start_detached(cmd, working_dir, agent_config, checkpoint)
+            run.spool_id = checkpoint.run_id
+            try:
+                return await self._consume(execution, agent_config, run, progress_callback, result_seen)
+            except BaseException:
+                # Cancelled (and killed) or broken - nothing to hand over
+                self.supervisor.release(run.spool_id)
+                raise
+        finally:
+            # A run returned at its result keeps its slot until the CLI has exited
+            self._after_teardown(run, self.workers.finished, endpoint)
+            self._after_teardown(run, self.broker.release, lease)
+
+    async def _select_endpoint(self, run: CliRunResult) -> Optional[WorkerEndpoint]:
+        """Reserve an endpoint, or fail the run as a network error (retried) if none is healthy."""
+        try:
+            return await self.workers.select()
+        except WorkerError as e:
+            logger.warning(f"Cannot dispatch run: {e}")
+            run.returncode = -1
+            run.stderr = f"Worker connection error: {e}"
+            return None
+
+    async def _start_detached(self, cmd: List[str], working_dir: str, agent_config: AgentConfig,
+                              checkpoint: RunCheckpoint) -> SpooledExecution:
+        """Start the CLI detached, writing to spool files, and checkpoint the run."""
+        checkpoint.run_id = self.supervisor.new_run_id()
+        execution = await SpooledExecution.start(cmd, working_dir, self.supervisor.prefix(checkpoint.run_id),
+                                                 agent_config.resources, self.cgroups, agent_config.agent_name,
+                                                 self.sample_interval)
+        checkpoint.pid = execution.pid
+        checkpoint.started_at = time.time()
+        checkpoint.cgroup_path = str(execution.cgroup_path) if execution.cgroup_path else None
+        try:
+            self.supervisor.register(checkpoint)
+        except OSError as e:
+            # The run still works, it just cannot be handed over
+            logger.warning(f"Could not checkpoint the run of {agent_config.agent_name}: {e}")
+        return execution
+
+    async def _start_remote(self, endpoint, cmd: List[str], working_dir: str,
+                            agent_config: AgentConfig) -> Optional[RemoteExecution]:
+        """Start a run on a remote worker, or return None (and mark it failed) if it cannot take it."""
+        try:
+            return await RemoteExecution.start(endpoint.address, cmd, working_dir, agent_config.resources,
+                                               agent_config.agent_name, self.workers.token)
+        except (OSError, asyncio.TimeoutError, ValueError, WorkerError) as e:
+            self.workers.mark_failed(endpoint, e)
+            logger.info(f"Could not start {agent_config.agent_name} on {endpoint.address}, trying another endpoint")
+            return None
+
+    async def _consume(self, execution: Execution, agent_config: AgentConfig, run: CliRunResult,
+                       progress_callback: Optional[Callable[[str], Awaitable[None]]],
+                       result_seen: Optional[asyncio.Event]) -> CliRunResult:
+        """Parse a started CLI run's events until it exits (body of _run_cli).
+
+        With early return on, a run whose ``result`` event reports success is
+        returned right away, and the CLI's exit is left to ``_teardown``.
+        """
+        started = time.monotonic()
+        live_run = self.live.run_started(agent_config.agent_name, run, execution)
+        # Runs without a progress callback (hedges, background work) don't move the request's progress
+        tracker = self.live.progress() if progress_callback else None
+        if tracker:
+            tracker.run_started()
+        
+        # Send initial progress update
+        if progress_callback:
+            where = "" if execution.where == LOCAL else f" on {execution.where}"
+            await progress_callback(f"🚀 Starting {agent_config.agent_name} agent{where}...")
+        
+        # Read events as they arrive for real-time streaming
+        async def read_stream(stream) -> bool:
+            """Parse events until the stream ends, or until a successful result with early return on."""
+            async for event in stream:
+                self.live.event(live_run, event.get('type'))
+                run.output_line_count += 1
+                if self.archive.keep(event):
+                    if len(run.events) < self.archive.max_events:
+                        run.events.append(event)
+                    else:
+                        run.events_truncated = True
+                try:
+                    await process_event(event)
+                except Exception as e:
+                    logger.debug(f"Error processing line: {e}", extra={"sample": "stream_event"})
+                if self.early_return and run.result_event is event and not event.get('is_error'):
+                    return True
+            return False
+        
+        # Process events as they arrive
+        async def process_event(event):
+            event_type = event.get('type')
+            
+            # Capture session ID from system init
+            if event_type == 'system' and event.get('subtype') == 'init':
+                run.session_id = event.get('session_id')
+                logger.info(f"Session ID: {run.session_id}")
+
+            # Handle partial message streaming events
+            elif event_type == 'stream_event':
+                stream_data = event.get('event', {})
+                if stream_data.get('type') == 'content_block_delta':
+                    delta = stream_data.get('delta', {})
+                    if delta.get('type') == 'text_delta' and delta.get('text'):
+                        if run.time_to_first_token is None:
+                            run.time_to_first_token = time.monotonic() - started
+                        if tracker:
+                            tracker.output_received(len(delta['text']))
+                        if progress_callback:
+                            await progress_callback(f"partial:{delta['text']}")
+
+            # Look for tool use events for progress
+            elif event_type == 'assistant' and 'message' in event:
+                message = event['message']
+                if message.get('usage'):
+                    run.message_usage[message.get('id', str(len(run.message_usage)))] = message['usage']
+                if message.get('content'):
+                    for content_item in message['content']:
+                        if content_item.get('type') == 'tool_use':
+                            tool_name = content_item.get('name', 'unknown')
+                            run.tools_used.append(tool_name)
+                            if tracker:
+                                tracker.tool_used(len(run.tools_used))
+                            if progress_callback:
+                                await progress_callback(f"🔧 Using tool: {tool_name} (#{len(run.tools_used)})")
+                        elif content_item.get('type') == 'text' and content_item.get('text'):
+                            run.messages.append(content_item['text'])
+            
+            # Check for completion
+            elif event_type == 'result':
+                run.result_event = event
+                run.time_to_result = time.monotonic() - started
+                if result_seen:
+                    result_seen.set()
+                if event.get('result'):
+                    result_text = event['result']
+                    if result_text and isinstance(result_text, str):
+                        run.messages.clear()
+                        run.messages.append(result_text)
+                
+                # Extract token usage
+                if 'usage' in event:
+                    run.usage = event['usage']
+                if 'total_cost_usd' in event:
+                    run.total_cost = event['total_cost_usd']
+                
+                if tracker and not event.get('is_error'):
+                    tracker.finish()
+                if progress_callback and not event.get('is_error'):
+                    await progress_callback("✅ Task completed!")
+        
+        stream = execution.events()
+        try:
+            # Start reading the stream
+            if await read_stream(stream):
+                # The answer is complete - don't make the caller wait while the CLI shuts down
+                run.returncode = 0  # The result reported success; the teardown logs a failing exit
+                run.duration = time.monotonic() - started
+                run.teardown = asyncio.create_task(
+                    self._teardown(execution, agent_config, run, stream, live_run, started))
+                self.teardown_tasks.add(run.teardown)
+                run.teardown.add_done_callback(self.teardown_tasks.discard)
+                return run
+            
+            # Wait for process to complete
+            await execution.wait()
+        except asyncio.CancelledError:
+            # Caller cancelled (e.g. an async job was cancelled) - kill the CLI
+            logger.info(f"Task for {agent_config.agent_name} cancelled, terminating run on {execution.where}")
+            await execution.terminate()
+            raise
+        finally:
+            if run.teardown is None:
+                self.live.run_finished(live_run)
+                await self._finish_execution(execution, run)
+
+        run.stderr = execution.stderr
+        run.returncode = execution.returncode
+        run.duration = time.monotonic() - started
+        return run
+
+    async def _finish_execution(self, execution: Execution, run: CliRunResult):
+        """Collect a run's stderr and resource usage and release its resources."""
+        await execution.finish()
+        if execution.usage:
+            run.peak_rss_bytes = execution.usage.peak_rss_bytes
+            run.cpu_seconds = execution.usage.cpu_seconds
+
+    async def _teardown(self, execution: Execution, agent_config: AgentConfig, run: CliRunResult,
+                        stream: AsyncIterator[Dict[str, Any]], live_run, started: float):
+        """Wait for the CLI of a run that was returned at its result event to exit.
+
+        Reads what is left of its output, reaps it (killing it if it has not exited
+        within TASK_AGENTS_TEARDOWN_TIMEOUT seconds) and collects its stderr and
+        resource usage. Failures are logged; the response has already been sent.
+        """
+        async def drain():
+            async for event in stream:
+                self.live.event(live_run, event.get('type'))
+            await execution.wait()
+
+        try:
+            try:
+                await asyncio.wait_for(drain(), timeout=self.teardown_timeout)
+                killed = False
+            except asyncio.TimeoutError:
+                logger.warning(f"{agent_config.agent_name} CLI still running {self.teardown_timeout:.0f}s "
+                               f"after its result, terminating it")
+                await execution.terminate()
+                killed = True
+            await self._finish_execution(execution, run)
+            run.duration = time.monotonic() - started
+            if execution.returncode and not killed:
+                logger.warning(f"{agent_config.agent_name} CLI exited with code {execution.returncode} after "
+                               f"its result: {execution.stderr.strip()[-500:] or 'no stderr'}")
+        except asyncio.CancelledError:
+            await execution.terminate()
+            raise
+        except Exception as e:
+            logger.warning(f"Teardown of the {agent_config.agent_name} run failed: {e}")
+        finally:
+            self.live.run_finished(live_run)
+            # A detached run's spool files outlive its checkpoint until the CLI is gone
+            self.supervisor.release(run.spool_id)
+
+    @staticmethod
+    def _after_teardown(run: CliRunResult, callback: Callable, *args):
+        """Call ``callback(*args)`` now, or once the run's background teardown has finished."""
+        if run.teardown is None or run.teardown.done():
+            callback(*args)
+        else:
+            run.teardown.add_done_callback(lambda _: callback(*args))
+
+    def _release_spool(self, run: CliRunResult):
+        """Drop a recorded run's checkpoint (its spool files go with the CLI's teardown, if any)."""
+        if run.teardown is not None and not run.teardown.done():
+            self.supervisor.disown(run.spool_id)
+        else:
+            self.supervisor.release(run.spool_id)
+
+    def _hedge_threshold(self, agent_config: AgentConfig, model: str) -> Optional[float]:
+        """Seconds to wait for a result before hedging, or None if hedging is off."""
+        if agent_config.hedge_after is None:
+            return None
+        if agent_config.hedge_after > 0:
+            return agent_config.hedge_after
+        # Derive the threshold from the agent's recent latency distribution
+        p90 = self.ledger.latency_percentile(agent_config.agent_name, 0.9, model=model,
+                                             min_samples=int(os.environ.get('TASK_AGENTS_HEDGE_MIN_SAMPLES', '20')))
+        if p90 is None:
+            logger.debug(f"Not enough history to hedge {agent_config.agent_name} yet")
+        return p90
+
+    async def _run_hedged(self, agent_config: AgentConfig, primary_cmd: List[str], primary_model: str,
+                          hedge_cmd: List[str], hedge_model: str, working_dir: str, threshold: float,
+                          progress_callback: Optional[Callable[[str], Awaitable[None]]] = None) -> CliRunResult:
+        """Run the CLI, starting an identical hedge run if no result arrives within ``threshold``.
+
+        The first run to emit a ``result`` event wins; the other run's process group is killed.
+        """
+        primary_seen = asyncio.Event()
+        primary_run = CliRunResult(model=primary_model)
+        primary = asyncio.create_task(self._run_cli(
+            primary_cmd, working_dir, agent_config, progress_callback,
+            result_seen=primary_seen, run=primary_run))
+        primary_wait = asyncio.create_task(primary_seen.wait())
+        try:
+            await asyncio.wait({primary, primary_wait}, timeout=threshold,
+                               return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            primary.cancel()
+            primary_wait.cancel()
+            raise
+        if primary_seen.is_set() or primary.done():
+            primary_wait.cancel()
+            return await primary
+
+        logger.info(f"No result from {agent_config.agent_name} after {threshold:.1f}s, starting hedge run on {hedge_model}")
+        if progress_callback:
+            await progress_callback(f"⚡ Slow response - starting a parallel hedge run on {hedge_model}")
+        hedge_seen = asyncio.Event()
+        hedge_run = CliRunResult(model=hedge_model)
+        hedge = asyncio.create_task(self._run_cli(
+            hedge_cmd, working_dir, agent_config, None, result_seen=hedge_seen, run=hedge_run))
+        hedge_wait = asyncio.create_task(hedge_seen.wait())
+
+        contenders = {primary: (primary_wait, primary_seen, "primary"), hedge: (hedge_wait, hedge_seen, "hedge")}
+        winner = None
+        try:
+            while contenders and winner is None:
+                waitables = set(contenders) | {w for w, _, _ in contenders.values()}
+                await asyncio.wait(waitables, return_when=asyncio.FIRST_COMPLETED)
+                for task, (_, seen, role) in contenders.items():
+                    if seen.is_set():
+                        winner = (task, role)
+                        break
+                if winner is None:
+                    # Drop runs that exited without a result; keep waiting on the other
+                    for task in [t for t in contenders if t.done()]:
+                        waiter = contenders.pop(task)[0]
+                        waiter.cancel()
+                        if not contenders:
+                            winner = (task, "primary" if task is primary else "hedge")
+        except asyncio.CancelledError:
+            for task in (primary, hedge, primary_wait, hedge_wait):
+                task.cancel()
+            raise
+
+        winner_task, winner_role = winner
+        loser_task = hedge if winner_task is primary else primary
+        for waiter in (primary_wait, hedge_wait):
+            waiter.cancel()
+
+        # Kill the losing run; its partial token usage is the cost of hedging
+        loser_run = hedge_run if winner_task is primary else primary_run
+        if not loser_task.done():
+            loser_task.cancel()
+        try:
+            await loser_task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.debug(f"Losing hedge run failed: {e}")
+
+        run = await winner_task
+        run.hedge_role = winner_role
+        run.hedge_threshold = threshold
+        run.hedge_extra_tokens = loser_run.tokens_so_far()
+        logger.info(f"Hedged request for {agent_config.agent_name} won by {winner_role} run "
+                    f"({run.hedge_extra_tokens} extra tokens)")
+        if winner_role == "hedge":
+            tracker = self.live.progress()
+            if tracker:
+                tracker.finish()
+            if progress_callback:
+                await progress_callback("✅ Task completed!")
+        return run
+
     async def execute_task(self, selected_agent: Dict[str, Any], task_description: str, 
                           session_reset: bool = False,
-                          progress_callback: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+                          progress_callback: Optional[Callable[[str], Awaitable[None]]] = None,
+                          allow_fork: bool = False, priority: Optional[str] = None,
+                          client: Optional[str] = None, job_id: Optional[str] = None,
+                          progress: Optional[RunProgress] = None) -> str:
         """Execute a task using the selected agent via Claude Code CLI.
         
+        Transient failures (rate limits, overload, network) are retried with
+        jittered exponential backoff, and a per-model circuit breaker fails fast
+        or switches to the agent's fallback model while a model is unhealthy.
+        Agents that declare several ``models`` get one picked per request by
+        their routing policy.
+
+        Calls to a ``resume-session`` agent are serialized on its session chain
+        so every exchange resumes the one before it. With ``allow_fork`` a call
+        that would have to wait instead runs immediately in a fork of the
+        chain's current session, which is not recorded on the chain.
+
+        When more requests arrive than can run at once, they wait in the
+        fair scheduler, ordered by priority class and client (see scheduler.py).
+
+        With detached runs enabled the CLI outlives a server restart, and the
+        next server finishes the run (see run_supervisor.py). While the server
+        drains, new tasks are refused.
+        
         Args:
             selected_agent: The agent configuration to use
             task_description: The task to execute
             session_reset: Whether to reset the session before executing (default: False)
             progress_callback: Optional async callback for progress updates
+            allow_fork: Fork instead of queueing when the session chain is busy (default: False)
+            priority: Priority class (interactive, normal, batch); defaults to the
+                      priority of the agent's resource profile, else normal
+            client: Identity of the calling client, for fair queuing (default: "default")
+            job_id: Async job the task runs for, recorded with detached runs
+            progress: Optional tracker of the task's progress and ETA, fed as the run's events arrive
         
         Returns:
             The final response from the agent
         """
         agent_config = selected_agent['config']
+        if self.supervisor.draining:
+            return "Error: The server is draining for a restart and does not accept new tasks. Try again shortly."
+        if priority is None:
+            priority = agent_config.resources.priority if agent_config.resources else DEFAULT_PRIORITY
+        client = client or "default"
+        chain = self.session_store.get_chain_info(agent_config.agent_name) if agent_config.resume_session else None
+        request = self.live.request_started(agent_config.agent_name, client, priority, job_id,
+                                            chain['chain_id'] if chain else None, progress)
+        self.in_flight += 1
+        try:
+            if agent_config.isolation:
+                async with self._admit(agent_config, priority, client, progress_callback,
+                                       len(task_description)) as admission:
+                    return await self._execute_isolated(selected_agent, task_description, progress_callback,
+                                                        admission)
+            if not agent_config.resume_session:
+                async with self._admit(agent_config, priority, client, progress_callback,
+                                       len(task_description)) as admission:
+                    return await self._execute_task(selected_agent, task_description, session_reset,
+                                                    progress_callback, admission=admission, job_id=job_id)
+
+            lock = self.chain_locks.setdefault(agent_config.agent_name, asyncio.Lock())
+            if lock.locked():
+                if allow_fork and not session_reset:
+                    logger.info(f"Session chain of {agent_config.agent_name} busy, forking")
+                    async with self._admit(agent_config, priority, client, progress_callback,
+                                           len(task_description)) as admission:
+                        return await self._execute_task(selected_agent, task_description, False,
+                                                        progress_callback, fork_chain=True, admission=admission,
+                                                        job_id=job_id)
+                logger.info(f"Session chain of {agent_config.agent_name} busy, queueing")
+                self.live.set_state(live_status.WAITING_FOR_CHAIN)
+                if progress_callback:
+                    await progress_callback(f"⏳ Queued behind a running exchange on the "
+                                            f"{agent_config.agent_name} session")
+            async with lock:
+                async with self._admit(agent_config, priority, client, progress_callback,
+                                       len(task_description)) as admission:
+                    return await self._execute_task(selected_agent, task_description, session_reset,
+                                                    progress_callback, admission=admission, job_id=job_id)
+        finally:
+            self.in_flight -= 1
+            self.live.request_finished(request)
+
+    async def finish_adopted_run(self, checkpoint: RunCheckpoint,
+                                 progress_callback: Optional[Callable[[str], Awaitable[None]]] = None,
+                                 progress: Optional[RunProgress] = None) -> str:
+        """Finish a detached run started by a server that has since exited.
+
+        Re-reads the run's spool from the start, follows it until the CLI
+        exits, and records the result as the original server would have:
+        session chain, run ledger and transcript archive.
+
+        Args:
+            checkpoint: The adopted run's checkpoint (see RunSupervisor.adopt_orphans)
+            progress_callback: Optional async callback for progress updates
+            progress: Optional tracker of the run's progress and ETA
+
+        Returns:
+            The agent's response, or an error message
+        """
+        agent_config = next((config for config in self.agents.values()
+                             if config.agent_name == checkpoint.agent), None)
+        execution = SpooledExecution.attach(self.supervisor.prefix(checkpoint.run_id), checkpoint.pid,
+                                            Path(checkpoint.cgroup_path) if checkpoint.cgroup_path else None)
+        request = self.live.request_started(checkpoint.agent, "adopted", DEFAULT_PRIORITY, checkpoint.job_id,
+                                            progress=progress)
+        run = None
+        self.in_flight += 1
+        try:
+            if agent_config is None:
+                # Removed since the run started: let it finish, but nothing can be recorded for it
+                logger.warning(f"Adopted run {checkpoint.run_id} belongs to unknown agent {checkpoint.agent}")
+                await execution.wait()
+                await execution.finish()
+                return f"Error: Agent '{checkpoint.agent}' no longer exists; its run finished unrecorded"
+
+            run = CliRunResult(model=checkpoint.model or agent_config.model, spool_id=checkpoint.run_id)
+            run = await self._consume(execution, agent_config, run, progress_callback, None)
+            # Timings measured from the adoption would be wrong
+            run.duration = time.time() - checkpoint.started_at
+            run.time_to_result = run.time_to_first_token = None
+
+            failed = run.returncode != 0 or bool(run.result_event and run.result_event.get('is_error'))
+            outcome = classify_error(run.stderr, run.result_event) if failed else "success"
+            if failed:
+                self.reliability.record_error(run.model, outcome)
+            self._record_run(agent_config, checkpoint.prompt, run, outcome)
+            if not failed and run.session_id and checkpoint.on_chain:
+                self._update_chain(agent_config, run, checkpoint.was_resume, checkpoint.seeded_from_summary,
+                                   self._find_claude_executable() or "claude", checkpoint.working_dir)
+            self._archive_run(agent_config, run, outcome, checkpoint.resumed_from, on_chain=checkpoint.on_chain)
+        finally:
+            self.in_flight -= 1
+            self.live.request_finished(request)
+            if run is not None:
+                self._release_spool(run)
+            else:
+                self.supervisor.release(checkpoint.run_id)
+
+        logger.info(f"Finished adopted run {checkpoint.run_id} of {agent_config.agent_name}: {outcome}")
+        if run.returncode != 0:
+            return (f"Error executing Claude CLI (return code {run.returncode}, {outcome}): "
+                    f"{run.stderr.strip() or 'Unknown error'}")
+        final_message = '\n'.join(run.messages)
+        if self.results.should_spill(final_message):
+            final_message = await self._spill_result(agent_config, final_message)
+        response = f"Session: {run.session_id}\n" if run.session_id else ""
+        started = datetime.fromtimestamp(checkpoint.started_at).strftime('%Y-%m-%d %H:%M:%S')
+        response += f"Recovered: started {started} by a server that has since exited\n"
+        if run.tools_used:
+            response += f"Tools used: {', '.join(run.tools_used)}\n\n"
+        response += final_message or "Task completed but no response message was generated."
+        if run.usage:
+            input_tokens = run.usage.get('input_tokens', 0)
+            output_tokens = run.usage.get('output_tokens', 0)
+            response += f"\n\nTokens: {input_tokens + output_tokens:,} ({input_tokens:,} in, {output_tokens:,} out)"
+        return response
+
+    def _admit(self, agent_config: AgentConfig, priority: str, client: str,
+               progress_callback: Optional[Callable[[str], Awaitable[None]]], prompt_chars: int = 0):
+        """Scheduler slot for one request, charged its expected run time."""
+        estimate = self.runtimes.estimate(agent_config.agent_name, prompt_chars)
+        cost = estimate.expected_seconds if estimate else (
+            self.ledger.latency_percentile(agent_config.agent_name, 0.5, min_samples=5) or 30.0)
+
+        async def on_wait(admission: Admission, position: int):
+            logger.info(f"{agent_config.agent_name} request from {client} queued ({priority}, position {position})")
+            self.live.set_state(live_status.QUEUED, f"position {position}")
+            if progress_callback:
+                await progress_callback(f"⏳ Queued at position {position} ({priority} priority)")
+
+        return self.scheduler.slot(priority, client, agent_config.agent_name, cost, on_wait)
+
+    async def _execute_isolated(self, selected_agent: Dict[str, Any], task_description: str,
+                                progress_callback: Optional[Callable[[str], Awaitable[None]]],
+                                admission: Optional[Admission] = None) -> str:
+        """Run an isolated agent in its own worktree or overlay copy and report what it changed."""
+        agent_config = selected_agent['config']
+        working_dir = self._resolve_working_dir(agent_config)
+        if not os.path.exists(working_dir):
+            logger.error(f"Working directory does not exist: {working_dir}")
+            return f"Error: Working directory does not exist: {working_dir}"
+
+        try:
+            workspace = await self.workspaces.acquire(agent_config.agent_name, working_dir, agent_config.isolation)
+        except Exception as e:
+            logger.error(f"Could not create an isolated workspace for {agent_config.agent_name}: {e}")
+            return f"Error: Could not create an isolated workspace: {e}"
+
+        try:
+            result = await self._execute_task(selected_agent, task_description, False, progress_callback,
+                                              working_dir=workspace.path, admission=admission)
+        finally:
+            outcome = await asyncio.shield(self.workspaces.release(workspace, task_description))
+        return f"{result}\n\n{outcome.format()}"
+
+    async def _execute_task(self, selected_agent: Dict[str, Any], task_description: str,
+                            session_reset: bool,
+                            progress_callback: Optional[Callable[[str], Awaitable[None]]],
+                            fork_chain: bool = False, working_dir: Optional[str] = None,
+                            admission: Optional[Admission] = None, job_id: Optional[str] = None) -> str:
+        """Body of execute_task (see there).
+
+        With ``fork_chain`` the run forks the chain's current session and leaves
+        the chain unchanged. ``working_dir`` overrides the agent's resolved
+        working directory (used for isolated workspaces, whose runs are not
+        detached). ``admission`` is the request's scheduler slot, recorded with
+        each run.
+        """
+        detach = self.supervisor.enabled and working_dir is None
+        agent_config = selected_agent['config']
+        self.live.set_state(live_status.STARTING)
         
         # Handle session reset if requested
         if session_reset and agent_config.resume_session:
@@ -363,336 +1557,216 @@ class AgentManager:
             if progress_callback:
                 await progress_callback(f"🔄 Session reset for {agent_config.agent_name}")
         
+        # Calculate max exchanges
+        if agent_config.resume_session is True:
+            max_exchanges = 5  # Default when just "true"
+        else:
+            max_exchanges = agent_config.resume_session
+
         # Determine if we should resume a session
         resume_session_id = None
         was_resume = False
-        if agent_config.resume_session and not session_reset:
-            # Calculate max exchanges
-            if agent_config.resume_session is True:
-                max_exchanges = 5  # Default when just "true"
-            else:
-                max_exchanges = agent_config.resume_session
-            
+        seed_summary = None
+        fork_info = self.session_store.get_chain_info(agent_config.agent_name) if fork_chain else None
+        if fork_info:
+            # Branch off the chain without touching it
+            resume_session_id = fork_info['current_session']
+        elif agent_config.resume_session and not session_reset:
+            # A compacted chain continues in a fresh session seeded with its summary
+            if agent_config.session_compaction:
+                seed_summary = self.session_store.get_summary(agent_config.agent_name)
+
             # Get session to resume
-            resume_session_id = self.session_store.get_resume_session(
-                agent_config.agent_name,
-                max_exchanges
-            )
+            if seed_summary is None:
+                resume_session_id = self.session_store.get_resume_session(
+                    agent_config.agent_name,
+                    max_exchanges,
+                    compaction=agent_config.session_compaction
+                )
             was_resume = resume_session_id is not None
+        context_summary = seed_summary
+        # The session's last exchange may still be shutting down; let its CLI exit before resuming it
+        teardown = self.chain_teardowns.get(agent_config.agent_name)
+        if resume_session_id and teardown is not None and not teardown.done():
+            await asyncio.wait({teardown})
+        if (resume_session_id or fork_info) and agent_config.session_compaction:
+            context_summary = self.session_store.get_segment_seed(agent_config.agent_name)
+        extra_context = self._summary_context(context_summary)
         
         # Get claude executable path from environment or try to find it
-        claude_path = os.environ.get('CLAUDE_EXECUTABLE_PATH')
-        
+        claude_path = self._find_claude_executable()
+        if not claude_path and LOCAL not in self.workers.endpoints:
+            claude_path = "claude"  # Only remote workers, which use their own CLI
         if not claude_path:
-            # Try to find claude in PATH
-            import shutil
-            claude_path = shutil.which('claude')
-            
-            if not claude_path:
-                # Check common installation locations
-                common_paths = [
-                    os.path.expanduser('~/.claude/local/claude'),
-                    '/usr/local/bin/claude',
-                    '/opt/homebrew/bin/claude'
-                ]
-                for path in common_paths:
-                    if os.path.exists(path) and os.access(path, os.X_OK):
-                        claude_path = path
-                        break
-                        
-            if not claude_path:
-                return "Error: Claude Code CLI not found. Please install Claude Code CLI from https://claude.ai/download or set CLAUDE_EXECUTABLE_PATH environment variable."
-        
-        # Start building the command
-        cmd = [
-            claude_path,
-            '-p', task_description,
-            '--output-format', 'stream-json',
-            '--verbose',  # Required for stream-json output
-            '--include-partial-messages',
-            '--tools', ','.join(agent_config.tools),
-            '--model', agent_config.model
-        ]
-        
-        # Add session display name
-        session_name = agent_config.agent_name.lower().replace(' ', '_').replace('-', '_')
-        cmd.extend(['--name', session_name])
-
-        # Add disallowed tools if configured
-        if agent_config.disallowed_tools:
-            cmd.extend(['--disallowed-tools', ','.join(agent_config.disallowed_tools)])
-
-        # Add resume flag if we have a session to resume
-        if resume_session_id:
-            cmd.extend(['-r', resume_session_id])
-            logger.info(f"Resuming session {resume_session_id} for {agent_config.agent_name}")
+            return "Error: Claude Code CLI not found. Please install Claude Code CLI from https://claude.ai/download or set CLAUDE_EXECUTABLE_PATH environment variable."
         
+        run = None
         try:
             # Resolve the working directory from agent config
-            cwd = agent_config.cwd
-            
-            
-            # If cwd is '.', resolve based on agent type
-            if cwd == '.':
-                if agent_config.is_plugin_agent:
-                    # Plugin agent: use current working directory
-                    cwd = os.getcwd()
-                    logger.info(f"Plugin agent cwd was '.', resolved to cwd: {cwd}")
-                else:
-                    # .md agent: use the parent directory of the task-agents folder
-                    task_agents_dir = Path(self.configs_dir).resolve()
-                    cwd = str(task_agents_dir.parent)
-                    logger.info(f"Agent cwd was '.', resolved to: {cwd}")
-            
-            # Expand environment variables and make absolute
-            working_dir = os.path.abspath(os.path.expandvars(cwd))
-            
-            # Add any resource directories specified in agent config
-            resolved_resource_dirs = []
-            accessible_resource_dirs = []
-            missing_resource_dirs = []
-            
-            if agent_config.resource_dirs:
-                for resource_dir in agent_config.resource_dirs:
-                    # Resolve resource_dir relative to the working directory
-                    if not os.path.isabs(resource_dir):
-                        # Relative path - resolve from working directory
-                        resolved_dir = os.path.abspath(os.path.join(working_dir, resource_dir))
-                    else:
-                        # Absolute path - use as-is  
-                        resolved_dir = os.path.abspath(os.path.expandvars(resource_dir))
-                    
-                    resolved_resource_dirs.append((resource_dir, resolved_dir))
-                    
-                    # Check if directory exists before adding
-                    if os.path.exists(resolved_dir) and os.path.isdir(resolved_dir):
-                        cmd.extend(['--add-dir', resolved_dir])
-                        logger.info(f"Added resource directory: {resolved_dir}")
-                        accessible_resource_dirs.append(resolved_dir)
-                    else:
-                        logger.warning(f"Resource directory not found or not a directory: {resolved_dir}")
-                        missing_resource_dirs.append((resource_dir, resolved_dir))
-            
-            # Add MCP config if specified
-            if agent_config.mcp_config:
-                mcp_config_path = agent_config.mcp_config
-                if not os.path.isabs(mcp_config_path):
-                    mcp_config_path = os.path.abspath(os.path.join(working_dir, mcp_config_path))
-                if os.path.exists(mcp_config_path):
-                    cmd.extend(['--mcp-config', mcp_config_path, '--strict-mcp-config'])
-                    logger.info(f"Added MCP config: {mcp_config_path}")
-                else:
-                    logger.warning(f"MCP config file not found: {mcp_config_path}")
-
-            # Branch: plugin-based agents vs .md-based agents
-            if agent_config.is_plugin_agent and agent_config.plugin_dir:
-                # Plugin agent: use --plugin-dir + --system-prompt-file
-                cmd.extend(['--plugin-dir', agent_config.plugin_dir])
-
-                if agent_config.prompt_file:
-                    if agent_config.prompt_type == "append":
-                        cmd.extend(['--append-system-prompt-file', agent_config.prompt_file])
-                    else:
-                        cmd.extend(['--system-prompt-file', agent_config.prompt_file])
-                        # Only add working dir context for override agents
-                        # (append agents retain default prompt which handles cwd)
-                        cmd.extend(['--append-system-prompt',
-                                    f"WORKING DIRECTORY CONTEXT: You are currently operating from the directory: {working_dir}"])
-            else:
-                # .md-based agent: inline system prompt (existing behavior)
-                # Build dynamic resource directory instruction
-                resource_info = []
-                if accessible_resource_dirs:
-                    resource_info.append(f"ACCESSIBLE RESOURCES: {', '.join(accessible_resource_dirs)}")
-                if missing_resource_dirs:
-                    missing_list = [f"{orig} (looked at: {resolved})" for orig, resolved in missing_resource_dirs]
-                    resource_info.append(f"MISSING RESOURCES: {', '.join(missing_list)}")
-
-                # Replace [resource_dir] placeholders in system prompt with actual paths
-                system_prompt_with_replacements = agent_config.system_prompt
-                if accessible_resource_dirs:
-                    if len(accessible_resource_dirs) == 1:
-                        system_prompt_with_replacements = system_prompt_with_replacements.replace('[resource_dir]', accessible_resource_dirs[0])
-                    else:
-                        resource_dirs_str = ', '.join(accessible_resource_dirs)
-                        system_prompt_with_replacements = system_prompt_with_replacements.replace('[resource_dir]', resource_dirs_str)
-
-                # Add the system prompt with replacements
-                cmd.extend(['--system-prompt', system_prompt_with_replacements])
-
-                # Build append-system-prompt instruction for working directory and resources
-                append_prompt_parts = []
-                append_prompt_parts.append(f"WORKING DIRECTORY CONTEXT: You are currently operating from the directory: {working_dir}")
-                if resource_info:
-                    append_prompt_parts.extend(resource_info)
-
-                # Add append-system-prompt flag
-                append_prompt = '\n'.join(append_prompt_parts)
-                cmd.extend(['--append-system-prompt', append_prompt])
+            working_dir = working_dir or self._resolve_working_dir(agent_config)
             
-            # Log the full command for debugging
+            # Log the resolved configuration for debugging
             logger.info(f"Agent config cwd: {agent_config.cwd}")
-            logger.info(f"Resolved cwd: {cwd}")
             logger.info(f"Final working directory: {working_dir}")
-            logger.info(f"Appending working directory instruction to system prompt")
-            logger.info(f"Executing command: {' '.join(cmd)}")
-            logger.info(f"Using model: {agent_config.model}")
             
             # Verify the working directory exists
             if not os.path.exists(working_dir):
                 logger.error(f"Working directory does not exist: {working_dir}")
                 return f"Error: Working directory does not exist: {working_dir}"
-            
-            # Run the command asynchronously with a timeout
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                cwd=working_dir,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                stdin=asyncio.subprocess.DEVNULL  # Ensure no interactive input is expected
-            )
-            
-            # Send initial progress update
-            if progress_callback:
-                await progress_callback(f"🚀 Starting {agent_config.agent_name} agent...")
-            
-            # Stream output line by line for real-time progress
-            output_lines = []
-            stderr_lines = []
-            
-            # Extract the final assistant message from the stream
-            assistant_messages = []  # Collect all text segments
-            
-            # Track progress events and usage
-            tool_count = 0
-            tools_used = []
-            token_usage = {}
-            total_cost = None
-            session_id = None
-            
-            # Read stdout line by line for real-time streaming
-            async def read_stream():
-                while True:
-                    line = await process.stdout.readline()
-                    if not line:
-                        break
-                    
-                    line_str = line.decode('utf-8').strip()
-                    if line_str:
-                        output_lines.append(line_str)
-                        
-                        # Process each line as it arrives for real-time progress
-                        try:
-                            event = json.loads(line_str)
-                            await process_event(event)
-                        except json.JSONDecodeError:
-                            logger.debug(f"Non-JSON line: {line_str[:100]}")
-                        except Exception as e:
-                            logger.debug(f"Error processing line: {e}")
-            
-            # Process events as they arrive
-            async def process_event(event):
-                nonlocal tool_count, session_id
-                event_type = event.get('type')
-                
-                # Capture session ID from system init
-                if event_type == 'system' and event.get('subtype') == 'init':
-                    session_id = event.get('session_id')
-                    logger.info(f"Session ID: {session_id}")
-
-                # Handle partial message streaming events
-                elif event_type == 'stream_event':
-                    stream_data = event.get('event', {})
-                    if stream_data.get('type') == 'content_block_delta':
-                        delta = stream_data.get('delta', {})
-                        if delta.get('type') == 'text_delta' and delta.get('text'):
-                            if progress_callback:
-                                await progress_callback(f"partial:{delta['text']}")
-
-                # Look for tool use events for progress
-                elif event_type == 'assistant' and 'message' in event:
-                    message = event['message']
-                    if message.get('content'):
-                        for content_item in message['content']:
-                            if content_item.get('type') == 'tool_use':
-                                tool_name = content_item.get('name', 'unknown')
-                                tool_count += 1
-                                tools_used.append(tool_name)
-                                if progress_callback:
-                                    await progress_callback(f"🔧 Using tool: {tool_name} (#{tool_count})")
-                            elif content_item.get('type') == 'text' and content_item.get('text'):
-                                assistant_messages.append(content_item['text'])
-                
-                # Check for completion
-                elif event_type == 'result':
-                    if event.get('result'):
-                        result_text = event['result']
-                        if result_text and isinstance(result_text, str):
-                            assistant_messages.clear()
-                            assistant_messages.append(result_text)
-                    
-                    # Extract token usage
-                    if 'usage' in event:
-                        nonlocal token_usage, total_cost
-                        token_usage = event['usage']
-                    if 'total_cost_usd' in event:
-                        total_cost = event['total_cost_usd']
-                    
+
+            # List the resource directories up front instead of letting the agent explore them
+            manifest_context = await self._manifest_context(agent_config, working_dir)
+            if manifest_context:
+                # Before the chain summary: the listing rarely changes, which keeps the prompt prefix cacheable
+                extra_context = [manifest_context] + (extra_context or [])
+            if self._uses_repo_index(agent_config):
+                extra_context = [REPO_INDEX_CONTEXT] + (extra_context or [])
+
+            # Adaptive routing: pick the model for this request from the agent's allowed set
+            requested_model = agent_config.model
+            routing = None
+            if agent_config.models:
+                routing = self.router.route(agent_config, task_description, queue_depth=self.in_flight - 1)
+                requested_model = routing.model
+
+            # Prompt-cache priming: fresh requests fork from a primed base session
+            base_session_id = None
+            if agent_config.prime_session and not resume_session_id and not seed_summary:
+                base_session_id = self.primer.get_base_session(
+                    agent_config.agent_name, requested_model, agent_config.config_version,
+                    lambda: self._prime_session(agent_config, claude_path, working_dir, requested_model)
+                )
+
+            retry_policy = self.reliability.retry_policy
+            attempt = 0
+            while True:
+                # Pick a model whose circuit breaker allows the request
+                model = self._select_healthy_model(agent_config, requested_model)
+                if model is None:
+                    self.reliability.fast_failures += 1
+                    breaker = self.reliability.breaker(requested_model)
+                    return (f"Error: Model '{requested_model}' is temporarily unavailable after repeated "
+                            f"transient failures (circuit open, retry in {breaker.retry_after():.0f}s)")
+
+                try:
+                    # Primed sessions are per model - only fork when running on the requested one
+                    fork_from = base_session_id if model == requested_model else None
+                    cmd = self._build_command(agent_config, task_description, claude_path,
+                                              working_dir, model, resume_session_id or fork_from,
+                                              fork_session=bool(fork_from or fork_info),
+                                              extra_context=extra_context)
+                    logger.info(f"Executing command: {' '.join(redact_command(cmd))}",
+                                extra={"agent": agent_config.name, "model": model})
+                    logger.info(f"Using model: {model}")
+
+                    # Hedge slow requests on the primary model (read-only agents only)
+                    hedge_threshold = self._hedge_threshold(agent_config, model) if model == requested_model else None
+
+                    if hedge_threshold:
+                        hedge_model = agent_config.hedge_model or model
+                        hedge_fork = fork_from if hedge_model == model else None
+                        hedge_cmd = self._build_command(agent_config, task_description, claude_path,
+                                                        working_dir, hedge_model, resume_session_id or hedge_fork,
+                                                        fork_session=bool(hedge_fork or fork_info),
+                                                        extra_context=extra_context)
+                        run = await self._run_hedged(agent_config, cmd, model, hedge_cmd, hedge_model,
+                                                     working_dir, hedge_threshold, progress_callback)
+                    else:
+                        checkpoint = RunCheckpoint(
+                            agent=agent_config.agent_name, prompt=task_description, working_dir=working_dir,
+                            model=model, job_id=job_id, on_chain=bool(agent_config.resume_session) and not fork_chain,
+                            was_resume=was_resume, seeded_from_summary=seed_summary is not None,
+                            resumed_from=resume_session_id or fork_from) if detach else None
+                        run = await self._run_cli(cmd, working_dir, agent_config, progress_callback, model=model,
+                                                  checkpoint=checkpoint)
+                except BaseException:
+                    # Cancelled, or the CLI could not be started: give back a half-open probe slot,
+                    # or the model would stay unavailable
+                    self.reliability.breaker(model).release_probe()
+                    raise
+                if fork_from and run.hedge_role != "hedge":
+                    run.primed_from = fork_from
+
+                failed = run.returncode != 0 or bool(run.result_event and run.result_event.get('is_error'))
+                if not failed:
+                    self.reliability.breaker(run.model).record_success()
+                    # Recorded once the CLI has exited, with its full run time and resource usage
+                    self._after_teardown(run, self._record_run, agent_config, task_description, run, "success",
+                                         routing, admission)
+                    break
+
+                error_kind = classify_error(run.stderr, run.result_event)
+                self.reliability.record_error(run.model, error_kind)
+                self._record_run(agent_config, task_description, run, error_kind, routing, admission)
+                self._archive_run(agent_config, run, error_kind, resume_session_id or fork_from,
+                                  on_chain=bool(agent_config.resume_session) and not fork_chain)
+                self.supervisor.release(run.spool_id)
+
+                # A broken base session (e.g. pruned by the CLI) - drop it and start cold
+                if fork_from and error_kind not in TRANSIENT_ERRORS and not run.tools_used:
+                    logger.warning(f"Forking primed session {fork_from} failed for {agent_config.agent_name}, "
+                                   f"retrying without priming")
+                    self.primer.invalidate(agent_config.agent_name, model)
+                    base_session_id = None
+                    continue
+                logger.warning(f"Claude CLI run failed for {agent_config.agent_name} on {model}: {error_kind}")
+
+                # Only retry transient failures, and only if the run had no side effects yet
+                if (error_kind in TRANSIENT_ERRORS and not run.tools_used
+                        and attempt < retry_policy.max_retries):
+                    delay = retry_policy.delay(attempt)
+                    attempt += 1
+                    self.reliability.retries += 1
+                    logger.info(f"Retrying {agent_config.agent_name} in {delay:.1f}s "
+                                f"(attempt {attempt + 1}/{retry_policy.max_retries + 1})")
+                    self.live.set_state(live_status.RETRYING, f"{error_kind}, attempt {attempt + 1}")
                     if progress_callback:
-                        await progress_callback("✅ Task completed!")
-            
-            # Start reading the stream
-            await read_stream()
-            
-            # Also collect any stderr
-            stderr_task = asyncio.create_task(process.stderr.read())
-            
-            # Wait for process to complete
-            await process.wait()
-            
-            # Get stderr if any
-            try:
-                stderr_data = await asyncio.wait_for(stderr_task, timeout=1.0)
-                if stderr_data:
-                    stderr_lines = stderr_data.decode('utf-8').split('\n')
-            except asyncio.TimeoutError:
-                pass
-            
-            # Check return code
-            if process.returncode != 0:
-                error_msg = '\n'.join(stderr_lines) if stderr_lines else "Unknown error"
-                logger.error(f"Claude CLI error (return code {process.returncode}): {error_msg}")
-                return f"Error executing Claude CLI (return code {process.returncode}): {error_msg}"
-            
+                        await progress_callback(f"🔁 {error_kind} - retrying in {delay:.0f}s "
+                                                f"(attempt {attempt + 1}/{retry_policy.max_retries + 1})")
+                    await asyncio.sleep(delay)
+                    continue
+
+                if run.returncode != 0:
+                    error_msg = run.stderr.strip() or "Unknown error"
+                    logger.error(f"Claude CLI error (return code {run.returncode}, {error_kind}): {error_msg}")
+                    return f"Error executing Claude CLI (return code {run.returncode}, {error_kind}): {error_msg}"
+                # A non-transient error result with a zero exit code is returned as the response
+                break
+
             # Check if we got any output
-            if not output_lines:
+            if not run.output_line_count:
                 logger.warning("Claude CLI returned empty output")
                 return "Claude CLI returned empty output. The command may have completed without generating a response."
             
-            logger.debug(f"Total output lines: {len(output_lines)}")
-            
-            # Note: All processing already happened in real-time during streaming
-            # No need to re-process the lines here
+            logger.debug(f"Total output lines: {run.output_line_count}")
             
             # Log parsing summary
-            logger.info(f"Parsing complete - Messages: {len(assistant_messages)}, Tools: {len(tools_used)}, Session: {session_id}")
+            logger.info(f"Parsing complete - Messages: {len(run.messages)}, Tools: {len(run.tools_used)}, Session: {run.session_id}")
             
             # Combine all assistant messages
-            final_message = '\n'.join(assistant_messages) if assistant_messages else ""
+            final_message = '\n'.join(run.messages) if run.messages else ""
             
             if not final_message:
+                self._archive_run(agent_config, run, "success", run.primed_from or resume_session_id,
+                                  on_chain=bool(agent_config.resume_session) and not fork_chain)
+                self._release_spool(run)
                 logger.warning("No assistant message found in stream-json output")
+                tracker = self.live.progress()
+                if tracker:
+                    tracker.finish()
                 if progress_callback:
                     await progress_callback("⚠️ Task completed but no response was generated")
                 return "Task completed but no response message was generated."
             
             # Update session store with the NEW session ID
-            if session_id and agent_config.resume_session:
-                self.session_store.update_chain(
-                    agent_config.agent_name,
-                    session_id,
-                    was_resume=was_resume
-                )
+            session_id = run.session_id
+            if session_id and agent_config.resume_session and not fork_chain:
+                self._update_chain(agent_config, run, was_resume, seed_summary is not None, claude_path,
+                                   working_dir)
+            self._archive_run(agent_config, run, "success", run.primed_from or resume_session_id,
+                              on_chain=bool(agent_config.resume_session) and not fork_chain)
+            # The run is fully recorded - a later server must not finish it again
+            self._release_spool(run)
             
             # Format the response with tool usage first
             formatted_response = ""
@@ -702,7 +1776,13 @@ class AgentManager:
                 formatted_response += f"Session: {session_id}\n"
                 
                 # Add session chain info if resume is enabled
-                if agent_config.resume_session:
+                if fork_chain:
+                    if fork_info:
+                        formatted_response += (f"Chain: forked from chain {fork_info['chain_id']} at exchange "
+                                               f"{fork_info['exchange_count']} (not recorded on the chain)\n")
+                    else:
+                        formatted_response += "Chain: new session (not recorded on the chain)\n"
+                elif agent_config.resume_session:
                     chain_info = self.session_store.get_chain_info(agent_config.agent_name)
                     if chain_info:
                         formatted_response += f"Exchange: {chain_info['exchange_count']}"
@@ -710,19 +1790,31 @@ class AgentManager:
                             formatted_response += "/5"
                         else:
                             formatted_response += f"/{agent_config.resume_session}"
+                        if chain_info['compacted_segments']:
+                            formatted_response += (f" (segment {chain_info['compacted_segments'] + 1} "
+                                                   f"of chain {chain_info['chain_id']})")
                         formatted_response += "\n"
+
+            # Report the model when it was routed, or when a fallback or hedge model answered
+            if run.model != requested_model:
+                reason = "hedge" if run.hedge_role == "hedge" else "fallback"
+                formatted_response += f"Model: {run.model} ({reason} for {requested_model})\n"
+            elif routing:
+                formatted_response += f"Model: {run.model} (routed by {routing.policy} policy: {routing.reason})\n"
             
             # Add tool usage summary if any tools were used
-            if tools_used:
-                formatted_response += f"Tools used: {', '.join(tools_used)}\n\n"
+            if run.tools_used:
+                formatted_response += f"Tools used: {', '.join(run.tools_used)}\n\n"
             
-            # Add the actual message
+            # Add the actual message (only its beginning if it is large enough to be stored)
+            if self.results.should_spill(final_message):
+                final_message = await self._spill_result(agent_config, final_message)
             formatted_response += final_message
             
             # Add token usage if available
-            if token_usage:
-                input_tokens = token_usage.get('input_tokens', 0)
-                output_tokens = token_usage.get('output_tokens', 0)
+            if run.usage:
+                input_tokens = run.usage.get('input_tokens', 0)
+                output_tokens = run.usage.get('output_tokens', 0)
                 total_tokens = input_tokens + output_tokens
                 
                 formatted_response += f"\n\nTokens: {total_tokens:,} ({input_tokens:,} in, {output_tokens:,} out)"
@@ -733,4 +1825,227 @@ class AgentManager:
             return "Error: Claude CLI not found. Please ensure 'claude' is installed and in PATH."
         except Exception as e:
             logger.error(f"Error executing task: {str(e)}")
-            return f"Error executing task: {str(e)}"
\ No newline at end of file
+            return f"Error executing task: {str(e)}"
+        finally:
+            if run is not None:
+                self._release_spool(run)
+
+    def _update_chain(self, agent_config: AgentConfig, run: CliRunResult, was_resume: bool,
+                      seeded_from_summary: bool, claude_path: str, working_dir: str):
+        """Record a successful exchange on the agent's session chain, compacting it when due."""
+        usage = run.usage or {}
+        self.session_store.update_chain(
+            agent_config.agent_name,
+            run.session_id,
+            was_resume=was_resume,
+            context_tokens=(usage.get('input_tokens', 0) + usage.get('cache_read_input_tokens', 0)
+                            + usage.get('cache_creation_input_tokens', 0)),
+            seeded_from_summary=seeded_from_summary,
+            save=False
+        )
+        # Written once the CLI has exited, off the response path
+        self._after_teardown(run, self.session_store.flush)
+        if run.teardown is not None and not run.teardown.done():
+            self.chain_teardowns[agent_config.agent_name] = run.teardown
+        # Summarize the chain in the background once it has grown past its thresholds
+        max_exchanges = 5 if agent_config.resume_session is True else agent_config.resume_session
+        if agent_config.session_compaction and self.session_store.needs_compaction(
+                agent_config.agent_name, max_exchanges, agent_config.compact_after_tokens):
+            self._start_compaction(agent_config, claude_path, working_dir, run.session_id)
+
+    def live_pools(self) -> Dict[str, Any]:
+        """Pool states for the live status, from counters kept by each pool (no scanning)."""
+        pools = {
+            "scheduler": {"running": len(self.scheduler.running), "queued": len(self.scheduler.queue),
+                          "capacity": self.scheduler.capacity()},
+            "host_slots": {"held": self.broker.held, "waiting": self.broker.waiting},
+            "workers": {e.address: f"{e.active}/{e.capacity}{'' if e.healthy else ' unhealthy'}"
+                        for e in self.workers.endpoints.values()},
+            "workspaces": {"busy": len(self.workspaces.busy),
+                           "idle": sum(len(paths) for paths in self.workspaces.idle.values())},
+        }
+        if self.supervisor.enabled or self.supervisor.owned:
+            pools["detached"] = {"owned": len(self.supervisor.owned), "draining": self.supervisor.draining}
+        return pools
+
+    async def _spill_result(self, agent_config: AgentConfig, text: str) -> str:
+        """Store a large result and return its beginning with the URIs to read the rest."""
+        try:
+            stored = await asyncio.to_thread(self.results.put, text, agent_config.agent_name)
+        except OSError as e:
+            logger.warning(f"Could not store the result of {agent_config.agent_name}, returning it whole: {e}")
+            return text
+        pages = len(stored.pages)
+        expires = datetime.fromtimestamp(stored.expires_at).strftime('%Y-%m-%d %H:%M')
+        return (f"{self.results.head(text)}\n\n"
+                f"[Result truncated: {stored.size:,} bytes (~{stored.tokens:,} tokens) in {pages} pages. "
+                f"Read pages with {result_uri(stored.result_id, 'page/{n}')} (1-{pages}) or bytes with "
+                f"{result_uri(stored.result_id, 'range/{start}/{end}')}; "
+                f"details at {result_uri(stored.result_id)}. Kept until {expires}.]")
+
+    def _archive_run(self, agent_config: AgentConfig, run: CliRunResult, outcome: str,
+                     resumed_from: Optional[str] = None, on_chain: bool = False):
+        """Write a finished run's events to the transcript archive in the background.
+
+        Args:
+            agent_config: The agent that ran
+            run: The finished run
+            outcome: "success" or the error kind
+            resumed_from: Session the run resumed or forked
+            on_chain: The run is an exchange of the agent's session chain
+        """
+        if not self.archive.enabled or not run.events:
+            return
+        chain = self.session_store.get_chain_info(agent_config.agent_name) if on_chain else None
+        entry = ArchivedRun(
+            agent=agent_config.agent_name,
+            session_id=run.session_id,
+            started_at=time.time() - run.duration,
+            duration=round(run.duration, 3),
+            model=run.model or agent_config.model,
+            outcome=outcome,
+            chain_id=chain['chain_id'] if chain else None,
+            resumed_from=resumed_from,
+        )
+
+        async def archive():
+            try:
+                await asyncio.to_thread(self.archive.append, entry, run.events, run.events_truncated)
+            except Exception as e:
+                logger.warning(f"Could not archive the run of {agent_config.agent_name}: {e}")
+
+        task = asyncio.create_task(archive())
+        self.archive_tasks.add(task)
+        task.add_done_callback(self.archive_tasks.discard)
+
+    def _record_run(self, agent_config: AgentConfig, task_description: str,
+                    run: CliRunResult, outcome: str, routing=None,
+                    admission: Optional[Admission] = None):
+        """Add a finished CLI run to the run ledger."""
+        usage = run.usage or {}
+        self.ledger.record(RunRecord(
+            agent=agent_config.agent_name,
+            model=run.model or agent_config.model,
+            outcome=outcome,
+            started_at=time.time() - run.duration,
+            duration=round(run.duration, 3),
+            time_to_result=round(run.time_to_result, 3) if run.time_to_result is not None else None,
+            time_to_first_token=(round(run.time_to_first_token, 3)
+                                 if run.time_to_first_token is not None else None),
+            prompt_chars=len(task_description),
+            output_chars=sum(len(m) for m in run.messages),
+            tool_count=len(run.tools_used),
+            tools_used=list(run.tools_used),
+            input_tokens=usage.get('input_tokens', 0),
+            output_tokens=usage.get('output_tokens', 0),
+            cache_read_tokens=usage.get('cache_read_input_tokens', 0),
+            cache_creation_tokens=usage.get('cache_creation_input_tokens', 0),
+            cost_usd=run.total_cost,
+            session_id=run.session_id,
+            hedged=run.hedge_role is not None,
+            hedge_winner=run.hedge_role,
+            hedge_threshold=run.hedge_threshold,
+            hedge_extra_tokens=run.hedge_extra_tokens,
+            routing_policy=routing.policy if routing else None,
+            primed=run.primed_from is not None,
+            peak_rss_bytes=run.peak_rss_bytes,
+            cpu_seconds=round(run.cpu_seconds, 3) if run.cpu_seconds is not None else None,
+            slot_wait=round(run.slot_wait, 3),
+            worker=run.worker,
+            priority=admission.priority if admission else None,
+            client=admission.client if admission else None,
+            queue_wait=round(admission.queue_wait, 3) if admission else 0.0
+        ))
+        self.tool_profiler.record(agent_config.agent_name, run.tools_used)
+        if self.tool_profiler.auto_apply:
+            internal_name = next((name for name, config in self.agents.items() if config is agent_config), None)
+            if internal_name and internal_name not in self.override_tasks:
+                task = asyncio.create_task(self._auto_apply_tool_suggestion(internal_name))
+                self.override_tasks[internal_name] = task
+                task.add_done_callback(lambda _: self.override_tasks.pop(internal_name, None))
+
+    async def _auto_apply_tool_suggestion(self, internal_name: str):
+        """Apply an agent's tool suggestion after the response has gone out (TASK_AGENTS_TOOL_AUTO_APPLY).
+
+        The override is written in a worker thread; the reload runs on the event loop, since it
+        re-registers the agent's MCP tool.
+        """
+        agent_config = self.agents.get(internal_name)
+        if agent_config is None or agent_config.is_plugin_agent:
+            return
+        suggestion = self.tool_profiler.report(agent_config)["suggestion"]
+        if not suggestion:
+            return
+        try:
+            await asyncio.to_thread(self.tool_profiler.write_override, self.configs_dir, agent_config, suggestion)
+            self.reload_agents()
+        except Exception as e:
+            logger.warning(f"Could not apply the tool suggestion for {agent_config.agent_name}: {e}")
+
+    async def _prime_session(self, agent_config: AgentConfig, claude_path: str,
+                             working_dir: str, model: str) -> Optional[str]:
+        """Run a priming exchange for an agent and return the new base session ID."""
+        cmd = self._build_command(agent_config, PRIMING_PROMPT, claude_path, working_dir, model)
+        cmd.extend(['--max-turns', '1'])
+        logger.info(f"Priming base session for {agent_config.agent_name} on {model}")
+        run = await self._run_cli(cmd, working_dir, agent_config, model=model)
+        if run.returncode != 0 or (run.result_event and run.result_event.get('is_error')):
+            logger.warning(f"Priming {agent_config.agent_name} failed: "
+                           f"{classify_error(run.stderr, run.result_event)}")
+            return None
+        return run.session_id
+
+    @staticmethod
+    def _summary_context(summary: Optional[str]) -> Optional[List[str]]:
+        """Appended-system-prompt block carrying a compacted chain summary."""
+        if not summary:
+            return None
+        return [f"CONVERSATION SUMMARY (earlier exchanges of this conversation, compacted):\n{summary}"]
+
+    def _start_compaction(self, agent_config: AgentConfig, claude_path: str,
+                          working_dir: str, session_id: str):
+        """Start summarizing an agent's session chain in the background (once per agent)."""
+        name = agent_config.agent_name
+        if name in self.compactions and not self.compactions[name].done():
+            return
+        self.compactions[name] = asyncio.create_task(
+            self._compact_chain(agent_config, claude_path, working_dir, session_id))
+
+    async def _compact_chain(self, agent_config: AgentConfig, claude_path: str,
+                             working_dir: str, session_id: str):
+        """Summarize a session chain with the compaction model and store the summary on the chain.
+
+        The summary is written in a fork of the chain's current session, so the
+        chain itself is left untouched.
+        """
+        self.live.detach_background()  # Outlives the request that started it
+        model = agent_config.compaction_model
+        # Include the current segment's own seed so summaries roll up the whole chain
+        cmd = self._build_command(agent_config, COMPACTION_PROMPT, claude_path, working_dir, model,
+                                  session_id, fork_session=True,
+                                  extra_context=self._summary_context(
+                                      self.session_store.get_segment_seed(agent_config.agent_name)))
+        cmd.extend(['--max-turns', '1'])
+        logger.info(f"Compacting session chain of {agent_config.agent_name} ({session_id}) with {model}")
+        try:
+            run = await self._run_cli(cmd, working_dir, agent_config, model=model)
+        except Exception as e:
+            logger.warning(f"Compaction run for {agent_config.agent_name} failed: {e}")
+            return
+        summary = '\n'.join(run.messages).strip()
+        if run.returncode != 0 or (run.result_event and run.result_event.get('is_error')) or not summary:
+            logger.warning(f"Compaction of {agent_config.agent_name} failed: "
+                           f"{classify_error(run.stderr, run.result_event)}")
+            return
+        self.session_store.set_summary(agent_config.agent_name, session_id, summary)
+
+    def _select_healthy_model(self, agent_config: AgentConfig, model: str) -> Optional[str]:
+        """Return ``model``, or the agent's fallback while that model's breaker is open."""
+        if self.reliability.breaker(model).allow_request():
+            return model
+        if agent_config.fallback_model and self.reliability.breaker(agent_config.fallback_model).allow_request():
+            self.reliability.fallbacks += 1
+            logger.warning(f"Circuit open for {model}, falling back to {agent_config.fallback_model} "
+                           f"for {agent_config.agent_name}")
+            return agent_config.fallback_model
+        return None
@@ -0,0 +1,172 @@
+"""
+Agent Catalog for Task-Agents MCP Server
+
+With many agents, registering each as its own MCP tool makes ``tools/list``
+(and the client model's context) grow with every agent. In catalog mode only
+pinned agents are registered as tools; the rest are called through a single
+``run_agent`` dispatcher tool and discovered through catalog resources:
+
+    task-agent://catalog                  First page of compact entries
+    task-agent://catalog/page/{page}      Further pages
+    task-agent://catalog/search/{query}   Entries matching a query
+    task-agent://catalog/agents/{name}    Full detail of one agent (built on request)
+
+Settings:
+    TASK_AGENTS_TOOL_MODE       individual (default), catalog, or auto: catalog mode
+                                once there are more than TASK_AGENTS_CATALOG_THRESHOLD agents
+    TASK_AGENTS_CATALOG_THRESHOLD   Agent count above which auto switches (default 30)
+    TASK_AGENTS_PINNED          Comma-separated agents that stay individual tools
+                                (in addition to agents with ``pinned: true``)
+    TASK_AGENTS_CATALOG_PAGE_SIZE   Entries per catalog page (default 50)
+"""
+
+import difflib
+import logging
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOOL_MODES = ("individual", "catalog", "auto")
+CATALOG_URI = "task-agent://catalog"
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tool_name_for(agent_name: str) -> str:
+    """Tool name of an agent (same rule as the individual agent tools)."""
+    return agent_name.lower().replace(' ', '_').replace('-', '_')
+
+
+def resolve_tool_mode(agent_count: int) -> str:
+    """Tool mode for this server: ``individual`` or ``catalog``.
+
+    Catalog mode is opt-in: it removes the agents' own tools, which prompts
+    calling them by name rely on.
+    """
+    mode = os.environ.get('TASK_AGENTS_TOOL_MODE', 'individual').strip().lower()
+    if mode not in TOOL_MODES:
+        logger.warning(f"Unknown TASK_AGENTS_TOOL_MODE '{mode}', using individual")
+        mode = "individual"
+    threshold = int(os.environ.get('TASK_AGENTS_CATALOG_THRESHOLD', '30'))
+    if mode == "auto":
+        mode = "catalog" if agent_count > threshold else "individual"
+    elif mode == "individual" and agent_count > threshold and 'TASK_AGENTS_TOOL_MODE' not in os.environ:
+        logger.info(f"{agent_count} agents registered as individual tools; TASK_AGENTS_TOOL_MODE=auto or "
+                    f"catalog lists them through run_agent and task-agent://catalog instead")
+    return mode
+
+
+def _summary(description: str, limit: int = 160) -> str:
+    """First sentence of a description, capped at ``limit`` characters."""
+    text = " ".join(description.split())
+    match = re.search(r"(?<=[.!?])\s", text)
+    if match:
+        text = text[:match.start()]
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+class AgentCatalog:
+    """Compact, paginated and searchable listing of the agents behind the dispatcher tool."""
+
+    def __init__(self, agent_manager, page_size: Optional[int] = None):
+        """
+        Initialize the catalog.
+
+        Args:
+            agent_manager: The AgentManager whose agents are listed
+            page_size: Entries per page (default from TASK_AGENTS_CATALOG_PAGE_SIZE, 50)
+        """
+        self.agent_manager = agent_manager
+        self.page_size = page_size or int(os.environ.get('TASK_AGENTS_CATALOG_PAGE_SIZE', '50'))
+        self.pinned_names = {
+            tool_name_for(name.strip()) for name in os.environ.get('TASK_AGENTS_PINNED', '').split(',')
+            if name.strip()
+        }
+        self._entries: Optional[List[Dict[str, Any]]] = None
+        self._lookup: Optional[Dict[str, Tuple[str, Any]]] = None
+
+    def is_pinned(self, agent_config) -> bool:
+        """Whether an agent stays an individual tool in catalog mode."""
+        return agent_config.pinned or tool_name_for(agent_config.agent_name) in self.pinned_names or \
+            agent_config.name in self.pinned_names
+
+    def refresh(self):
+        """Drop the cached entries (call after agents change)."""
+        self._entries = None
+        self._lookup = None
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """One compact entry per agent, sorted by tool name."""
+        if self._entries is None:
+            entries = []
+            for internal_name, config in self.agent_manager.agents.items():
+                tool_name = tool_name_for(config.agent_name)
+                entries.append({
+                    "agent": tool_name,
+                    "name": config.agent_name,
+                    "summary": _summary(config.description),
+                    "session": bool(config.resume_session),
+                    "pinned": self.is_pinned(config),
+                    "detail": f"{CATALOG_URI}/agents/{tool_name}",
+                })
+            entries.sort(key=lambda e: e["agent"])
+            self._entries = entries
+        return self._entries
+
+    def page(self, page: int = 1) -> Dict[str, Any]:
+        """One page of entries (1-based), with links to the neighbouring pages."""
+        entries = self.entries()
+        pages = max(1, math.ceil(len(entries) / self.page_size))
+        page = min(max(1, page), pages)
+        start = (page - 1) * self.page_size
+        return {
+            "page": page,
+            "pages": pages,
+            "total": len(entries),
+            "agents": entries[start:start + self.page_size],
+            "next": f"{CATALOG_URI}/page/{page + 1}" if page < pages else None,
+            "prev": f"{CATALOG_URI}/page/{page - 1}" if page > 1 else None,
+            "search": f"{CATALOG_URI}/search/{{query}}",
+            "call_with": "run_agent(agent=<agent>, prompt=...)",
+        }
+
+    def search(self, query: str, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Entries whose name or description match the query words, best matches first."""
+        words = set(_WORD.findall(query.lower()))
+        scored = []
+        for entry, config in zip(self.entries(), self._configs()):
+            name_words = set(_WORD.findall(f"{entry['agent']} {entry['name']}".lower()))
+            text_words = set(_WORD.findall(config.description.lower()))
+            score = 3 * len(words & name_words) + len(words & text_words)
+            if score:
+                scored.append((score, entry))
+        scored.sort(key=lambda item: (-item[0], item[1]["agent"]))
+        matches = [entry for _, entry in scored[:limit or self.page_size]]
+        return {"query": query, "total": len(scored), "agents": matches}
+
+    def suggest(self, name: str, limit: int = 5) -> List[str]:
+        """Agent names close to a misspelled or partial name."""
+        names = [e["agent"] for e in self.entries()]
+        close = difflib.get_close_matches(tool_name_for(name), names, n=limit, cutoff=0.6)
+        for entry in self.search(name, limit=limit)["agents"]:
+            if entry["agent"] not in close:
+                close.append(entry["agent"])
+        return close[:limit]
+
+    def find(self, name: str):
+        """Agent config by tool name, display name or internal name."""
+        if self._lookup is None:
+            lookup = {}
+            # Reversed so that, as before, the first agent wins when names collide
+            for internal_name, config in reversed(list(self.agent_manager.agents.items())):
+                for key in (tool_name_for(config.agent_name), config.agent_name, internal_name):
+                    lookup[key] = (internal_name, config)
+            self._lookup = lookup
+        return self._lookup.get(name, (None, None))
+
+    def _configs(self) -> List[Any]:
+        """Agent configs in the same order as ``entries``."""
+        return [self.find(e["agent"])[1] for e in self.entries()]
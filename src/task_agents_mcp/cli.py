@@ -0,0 +1,23 @@
+"""
+Command-line entry point for task-agent.
+
+    task-agent                  Run the MCP server (stdio)
+    task-agent worker [...]     Run a remote worker (see worker.py)
+"""
+import sys
+
+
+def main():
+    """Dispatch to the worker or the MCP server."""
+    if len(sys.argv) > 1 and sys.argv[1] == "worker":
+        from .worker import main as worker_main
+        worker_main(sys.argv[2:])
+        return
+
+    # Importing the server loads the agents, so only do it when serving
+    from .server import main as server_main
+    server_main()
+
+
+if __name__ == "__main__":
+    main()
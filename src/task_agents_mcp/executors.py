@@ -0,0 +1,374 @@
+"""
+CLI Executions for Task-Agents MCP Server
+
+An execution is one running Claude CLI process as seen by the code that
+parses its stream-json output: an async stream of events, an exit code,
+stderr, resource usage, and a way to kill it. ``LocalExecution`` runs the CLI
+as a child process of this server; ``SpooledExecution`` runs it detached,
+writing to spool files, so it outlives a server restart (see
+run_supervisor.py); ``worker.RemoteExecution`` runs it on a task-agent worker
+and relays the same events over a socket.
+"""
+
+import abc
+import asyncio
+import json
+import logging
+import os
+import shutil
+import signal
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .resource_governor import (
+    ResourceProfile, ResourceUsage, CgroupManager, ProcessSampler, limit_command
+)
+
+logger = logging.getLogger(__name__)
+
+
+def find_claude_executable() -> Optional[str]:
+    """Locate the Claude Code CLI from the environment, PATH or common install locations."""
+    claude_path = os.environ.get('CLAUDE_EXECUTABLE_PATH')
+    if claude_path:
+        return claude_path
+
+    # Try to find claude in PATH
+    claude_path = shutil.which('claude')
+    if claude_path:
+        return claude_path
+
+    # Check common installation locations
+    common_paths = [
+        os.path.expanduser('~/.claude/local/claude'),
+        '/usr/local/bin/claude',
+        '/opt/homebrew/bin/claude'
+    ]
+    for path in common_paths:
+        if os.path.exists(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+async def terminate_process(process: asyncio.subprocess.Process, grace: float = 5.0):
+    """Terminate a CLI process and its process group, escalating to SIGKILL."""
+    if process.returncode is not None:
+        return
+    try:
+        pgid = os.getpgid(process.pid)
+        os.killpg(pgid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    except OSError:
+        pgid = None
+        process.terminate()
+    try:
+        await asyncio.wait_for(process.wait(), timeout=grace)
+    except asyncio.TimeoutError:
+        logger.warning(f"Process {process.pid} ignored SIGTERM, sending SIGKILL")
+        try:
+            if pgid is not None:
+                os.killpg(pgid, signal.SIGKILL)
+            else:
+                process.kill()
+        except ProcessLookupError:
+            pass
+        await process.wait()
+
+
+class Execution(abc.ABC):
+    """A running CLI process."""
+    where = "local"  # "local" or the worker address
+
+    def __init__(self):
+        self.returncode: Optional[int] = None
+        self.stderr: str = ""
+        self.usage: Optional[ResourceUsage] = None
+
+    @abc.abstractmethod
+    def events(self) -> AsyncIterator[Dict[str, Any]]:
+        """Parsed stream-json events, in order, until the CLI closes its output."""
+
+    @abc.abstractmethod
+    async def wait(self) -> int:
+        """Wait for the CLI to exit and return its exit code."""
+
+    @abc.abstractmethod
+    async def terminate(self):
+        """Kill the CLI and everything it started."""
+
+    @abc.abstractmethod
+    async def finish(self):
+        """Collect stderr and resource usage and release resources (always called)."""
+
+
+class LocalExecution(Execution):
+    """The CLI as a child process of this server."""
+
+    def __init__(self, process: asyncio.subprocess.Process, cgroup_path: Optional[Path],
+                 sampler: Optional[ProcessSampler]):
+        super().__init__()
+        self.process = process
+        self.pid = process.pid
+        self.cgroup_path = cgroup_path
+        self.sampler = sampler
+        self.stderr_task = asyncio.create_task(process.stderr.read())
+
+    @classmethod
+    async def start(cls, cmd: List[str], working_dir: str, profile: Optional[ResourceProfile] = None,
+                    cgroups: Optional[CgroupManager] = None, label: str = "",
+                    sample_interval: float = 0.0) -> "LocalExecution":
+        """Spawn the CLI with the resource profile applied.
+
+        Args:
+            cmd: Full CLI argv
+            working_dir: Directory to run the CLI in
+            profile: Optional resource profile (nice, rlimits, cgroup limits)
+            cgroups: Cgroup manager used when the profile asks for cgroup limits
+            label: Name used for the run's cgroup (the agent name)
+            sample_interval: Seconds between /proc samples when there is no cgroup (0 = off)
+        """
+        # A run cgroup also gives exact usage figures
+        cgroup_path = None
+        if profile and profile.wants_cgroup and cgroups:
+            cgroup_path = cgroups.create(label, profile)
+
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *limit_command(cmd, profile, cgroup_path),
+                cwd=working_dir,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                stdin=asyncio.subprocess.DEVNULL,  # Ensure no interactive input is expected
+                start_new_session=True,  # Own process group so cancellation can kill the whole tree
+                limit=16 * 1024 * 1024,  # stream-json lines carry whole tool results
+            )
+        except BaseException:
+            if cgroup_path:
+                await asyncio.to_thread(CgroupManager.remove, cgroup_path)
+            raise
+
+        sampler = None
+        if cgroup_path is None and sample_interval > 0 and ProcessSampler.supported():
+            sampler = ProcessSampler(process.pid, sample_interval)
+            sampler.start()
+        return cls(process, cgroup_path, sampler)
+
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                break
+            line_str = line.decode('utf-8').strip()
+            if not line_str:
+                continue
+            try:
+                yield json.loads(line_str)
+            except json.JSONDecodeError:
+                logger.debug(f"Non-JSON line: {line_str[:100]}", extra={"sample": "non_json"})
+
+    async def wait(self) -> int:
+        self.returncode = await self.process.wait()
+        return self.returncode
+
+    async def terminate(self):
+        self.stderr_task.cancel()
+        await terminate_process(self.process)
+        self.returncode = self.process.returncode
+
+    async def finish(self):
+        if self.cgroup_path:
+            self.usage = CgroupManager.usage(self.cgroup_path)
+        elif self.sampler:
+            self.usage = await self.sampler.stop()
+        if self.cgroup_path:
+            await asyncio.to_thread(CgroupManager.remove, self.cgroup_path)
+
+        if not self.stderr_task.cancelled():
+            try:
+                stderr_data = await asyncio.wait_for(self.stderr_task, timeout=1.0)
+                if stderr_data:
+                    self.stderr = stderr_data.decode('utf-8', errors='replace')
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+        self.returncode = self.process.returncode
+
+
+# Runs the CLI and records its exit code in the file named by $0 (the CLI's parent
+# may be gone by the time it exits, so nobody else could wait for it)
+_EXIT_WRAPPER = '"$@"; code=$?; echo $code > "$0.tmp"; mv "$0.tmp" "$0"'
+SPOOL_POLL_MIN = 0.01  # Seconds between reads of a spool file that is being written
+SPOOL_POLL_MAX = 0.1  # ... backing off to this while the CLI is quiet
+STDERR_TAIL = 64 * 1024  # Bytes of stderr kept
+
+
+def _alive(pid: int) -> bool:
+    """Whether a process exists and is not a zombie."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            return f.read().rsplit(b")", 1)[-1].split()[0] != b"Z"
+    except (OSError, IndexError):
+        return True
+
+
+class SpooledExecution(Execution):
+    """The CLI detached from this server: its output goes to spool files.
+
+    The CLI runs in its own session under a small shell wrapper that writes
+    its exit code to ``<prefix>.exit``; stream-json output goes to
+    ``<prefix>.out`` and stderr to ``<prefix>.err``. The server tails the
+    output file instead of a pipe, so the run keeps going if the server
+    exits, and a later server can ``attach`` to it and re-read the spool
+    from the start.
+    """
+
+    def __init__(self, prefix: Path, pid: int, process: Optional[asyncio.subprocess.Process] = None,
+                 cgroup_path: Optional[Path] = None, sampler: Optional[ProcessSampler] = None):
+        super().__init__()
+        self.prefix = prefix
+        self.pid = pid
+        self.process = process  # None when attached to a run started by an earlier server
+        self.cgroup_path = cgroup_path
+        self.sampler = sampler
+
+    @property
+    def out_path(self) -> Path:
+        return Path(f"{self.prefix}.out")
+
+    @property
+    def err_path(self) -> Path:
+        return Path(f"{self.prefix}.err")
+
+    @property
+    def exit_path(self) -> Path:
+        return Path(f"{self.prefix}.exit")
+
+    @classmethod
+    async def start(cls, cmd: List[str], working_dir: str, prefix: Path,
+                    profile: Optional[ResourceProfile] = None, cgroups: Optional[CgroupManager] = None,
+                    label: str = "", sample_interval: float = 0.0) -> "SpooledExecution":
+        """Spawn the CLI detached, with the resource profile applied (see LocalExecution.start).
+
+        Args:
+            prefix: Path prefix of the run's spool files
+        """
+        cgroup_path = None
+        if profile and profile.wants_cgroup and cgroups:
+            cgroup_path = cgroups.create(label, profile)
+
+        try:
+            with open(f"{prefix}.out", "wb") as stdout, open(f"{prefix}.err", "wb") as stderr:
+                process = await asyncio.create_subprocess_exec(
+                    "/bin/sh", "-c", _EXIT_WRAPPER, f"{prefix}.exit", *limit_command(cmd, profile, cgroup_path),
+                    cwd=working_dir,
+                    stdout=stdout,
+                    stderr=stderr,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    start_new_session=True,  # Survives the server, and cancellation can kill the whole tree
+                )
+        except BaseException:
+            if cgroup_path:
+                await asyncio.to_thread(CgroupManager.remove, cgroup_path)
+            raise
+
+        sampler = None
+        if cgroup_path is None and sample_interval > 0 and ProcessSampler.supported():
+            sampler = ProcessSampler(process.pid, sample_interval)
+            sampler.start()
+        return cls(prefix, process.pid, process, cgroup_path, sampler)
+
+    @classmethod
+    def attach(cls, prefix: Path, pid: int, cgroup_path: Optional[Path] = None) -> "SpooledExecution":
+        """Follow a run started by an earlier server."""
+        return cls(prefix, pid, cgroup_path=cgroup_path)
+
+    def _exited(self) -> bool:
+        if self.exit_path.exists():
+            return True
+        if self.process is not None:
+            return self.process.returncode is not None
+        return not _alive(self.pid)
+
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        delay = SPOOL_POLL_MIN
+        pending = b""
+        with open(self.out_path, "rb") as f:
+            while True:
+                # Check before reading, so output written just before the exit is not missed
+                exited = self._exited()
+                chunk = f.read()
+                if chunk:
+                    delay = SPOOL_POLL_MIN
+                    lines = (pending + chunk).split(b"\n")
+                    pending = lines.pop()
+                    for line in lines:
+                        line_str = line.decode('utf-8', errors='replace').strip()
+                        if not line_str:
+                            continue
+                        try:
+                            yield json.loads(line_str)
+                        except json.JSONDecodeError:
+                            logger.debug(f"Non-JSON line: {line_str[:100]}", extra={"sample": "non_json"})
+                    continue
+                if exited:
+                    if pending.strip():
+                        try:
+                            yield json.loads(pending.decode('utf-8', errors='replace'))
+                        except json.JSONDecodeError:
+                            pass
+                    break
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, SPOOL_POLL_MAX)
+
+    async def wait(self) -> int:
+        if self.process is not None:
+            wrapper_code = await self.process.wait()
+        else:
+            delay = SPOOL_POLL_MIN
+            while not self._exited():
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, SPOOL_POLL_MAX)
+            wrapper_code = -1  # Killed before it could record the CLI's exit code
+        try:
+            self.returncode = int(self.exit_path.read_text().strip())
+        except (OSError, ValueError):
+            self.returncode = wrapper_code
+        return self.returncode
+
+    async def terminate(self):
+        if self.process is not None:
+            await terminate_process(self.process)
+            self.returncode = self.process.returncode
+            return
+        for sig, grace in ((signal.SIGTERM, 5.0), (signal.SIGKILL, 5.0)):
+            try:
+                os.killpg(self.pid, sig)
+            except ProcessLookupError:
+                break
+            deadline = time.monotonic() + grace
+            while _alive(self.pid) and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+            if not _alive(self.pid):
+                break
+        self.returncode = -signal.SIGTERM
+
+    async def finish(self):
+        if self.cgroup_path:
+            self.usage = CgroupManager.usage(self.cgroup_path)
+        elif self.sampler:
+            self.usage = await self.sampler.stop()
+        if self.cgroup_path:
+            await asyncio.to_thread(CgroupManager.remove, self.cgroup_path)
+        try:
+            with open(self.err_path, "rb") as f:
+                f.seek(max(0, os.fstat(f.fileno()).st_size - STDERR_TAIL))
+                self.stderr = f.read().decode('utf-8', errors='replace')
+        except OSError:
+            pass
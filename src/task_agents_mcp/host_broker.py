@@ -0,0 +1,342 @@
+"""
+Host Broker for Task-Agents MCP Server
+
+Shares one concurrency budget for Claude CLI processes between all task-agent
+server instances of a user on the same host (one per open project), using
+lock files instead of a daemon:
+
+- ``slot-<n>.lock``: one file per slot. A run holds an exclusive ``flock`` on
+  a slot file while its CLI process is alive. The kernel drops the lock when
+  the holder exits, so crashed instances never leak slots.
+- ``queue/<time>-<pid>-<id>``: a ticket per waiting run, also held with
+  ``flock`` so tickets of dead instances can be recognised and removed.
+  Waiters are served round-robin across instances, in arrival order within
+  an instance, so one instance with a long backlog cannot starve the others.
+- ``served/<pid>``: when each instance was last granted a slot. The instance
+  served longest ago (or never) goes first in the round-robin.
+
+The queue and slot files are checked in a worker thread, never on the event
+loop. Tickets near the head of the queue are checked every ``poll_interval``;
+tickets further back, which need several slots to be released first, are
+checked less often (up to ``max_poll_interval``).
+
+When the broker directory cannot be used (no ``fcntl``, unwritable /tmp,
+``TASK_AGENTS_BROKER=off``) the instance falls back to a local limit.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Lease:
+    """A held concurrency slot."""
+    kind: str  # "host" or "local"
+    slot: Optional[int] = None
+    fd: Optional[int] = None
+    waited: float = 0.0  # Seconds spent waiting for the slot
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except (BlockingIOError, PermissionError):
+        return False
+
+
+class HostBroker:
+    """Grants concurrency slots shared by all server instances on the host."""
+
+    def __init__(self, broker_dir: Optional[Path] = None, host_slots: Optional[int] = None,
+                 local_limit: Optional[int] = None, poll_interval: float = 0.1,
+                 max_poll_interval: float = 1.0):
+        """
+        Initialize the broker.
+
+        Args:
+            broker_dir: Directory for slot and ticket files
+                        (TASK_AGENTS_BROKER_DIR, default /tmp/task_agents_broker-<uid>)
+            host_slots: CLI processes allowed at once across the host
+                        (TASK_AGENTS_HOST_CONCURRENCY, default: number of CPUs, at least 4)
+            local_limit: CLI processes allowed at once in this instance when the
+                         broker is unavailable (TASK_AGENTS_MAX_CONCURRENCY, default 4)
+            poll_interval: Seconds between checks while at the head of the queue
+            max_poll_interval: Longest interval between checks far back in the queue
+        """
+        uid = os.getuid() if hasattr(os, 'getuid') else 0
+        self.broker_dir = broker_dir or Path(
+            os.environ.get('TASK_AGENTS_BROKER_DIR', f'/tmp/task_agents_broker-{uid}'))
+        self.host_slots = host_slots if host_slots is not None else int(
+            os.environ.get('TASK_AGENTS_HOST_CONCURRENCY', str(max(4, os.cpu_count() or 4))))
+        self.local_limit = local_limit if local_limit is not None else int(
+            os.environ.get('TASK_AGENTS_MAX_CONCURRENCY', '4'))
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max(max_poll_interval, poll_interval)
+        self.enabled = self._init_broker_dir()
+        self.local = asyncio.Semaphore(self.local_limit)
+        self.tickets: set = set()  # Names of this instance's queued tickets
+        self.held = 0
+        self.waiting = 0
+        self.granted = 0
+        self.total_wait = 0.0
+
+    def _init_broker_dir(self) -> bool:
+        if os.environ.get('TASK_AGENTS_BROKER', 'on').lower() in ('off', '0', 'false'):
+            logger.info(f"Host broker disabled, using local limit of {self.local_limit}")
+            return False
+        if fcntl is None:
+            logger.info(f"flock not available, using local limit of {self.local_limit}")
+            return False
+        try:
+            (self.broker_dir / "queue").mkdir(parents=True, exist_ok=True)
+            (self.broker_dir / "served").mkdir(exist_ok=True)
+            probe = self.broker_dir / f".probe-{os.getpid()}"
+            probe.touch()
+            probe.unlink()
+        except OSError as e:
+            logger.warning(f"Host broker directory {self.broker_dir} unusable ({e}), "
+                           f"using local limit of {self.local_limit}")
+            return False
+        logger.info(f"Host broker at {self.broker_dir} with {self.host_slots} slots")
+        return True
+
+    async def acquire(self, label: str = "", on_wait=None) -> Lease:
+        """Wait for a concurrency slot.
+
+        Args:
+            label: Written into the slot file for visibility (e.g. the agent name)
+            on_wait: Optional async callback invoked once if the caller has to queue
+        """
+        started = time.monotonic()
+        if not self.enabled:
+            if self.local.locked() and on_wait:
+                await on_wait()
+            self.waiting += 1
+            try:
+                await self.local.acquire()
+            finally:
+                self.waiting -= 1
+            return self._granted(Lease(kind="local", waited=time.monotonic() - started))
+
+        # Fast path: nobody is queued and a slot is free
+        lease = await self._poll_in_thread(None, label)
+        if lease:
+            return self._granted(lease)
+
+        ticket_name = f"{time.time_ns()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        ticket_path = self.broker_dir / "queue" / ticket_name
+        ticket_fd = os.open(ticket_path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(ticket_fd, fcntl.LOCK_EX)
+        self.tickets.add(ticket_name)
+        self.waiting += 1
+        try:
+            if on_wait:
+                await on_wait()
+            while True:
+                lease = await self._poll_in_thread(ticket_name, label)
+                if isinstance(lease, Lease):
+                    lease.waited = time.monotonic() - started
+                    return self._granted(lease)
+                # lease is the number of tickets ahead: a slot must come free for each in turn
+                await asyncio.sleep(min(self.poll_interval * max(1, lease // self.host_slots),
+                                        self.max_poll_interval))
+        finally:
+            self.waiting -= 1
+            self.tickets.discard(ticket_name)
+            try:
+                ticket_path.unlink()
+            except OSError:
+                pass
+            os.close(ticket_fd)
+
+    def release(self, lease: Lease):
+        """Give a slot back."""
+        self.held -= 1
+        if lease.kind == "local":
+            self.local.release()
+            return
+        try:
+            os.ftruncate(lease.fd, 0)
+        except OSError:
+            pass
+        os.close(lease.fd)  # Closing the descriptor drops the flock
+
+    def _granted(self, lease: Lease) -> Lease:
+        self.held += 1
+        self.granted += 1
+        self.total_wait += lease.waited
+        return lease
+
+    async def _poll_in_thread(self, ticket_name: Optional[str], label: str):
+        """Run one _poll in a worker thread, giving back a slot it takes after the caller was cancelled."""
+        poll = asyncio.ensure_future(asyncio.to_thread(self._poll, ticket_name, label))
+        try:
+            return await asyncio.shield(poll)
+        except asyncio.CancelledError:
+            poll.add_done_callback(self._discard_late_lease)
+            raise
+
+    @staticmethod
+    def _discard_late_lease(poll: asyncio.Future):
+        if not poll.cancelled() and poll.exception() is None and isinstance(poll.result(), Lease):
+            os.close(poll.result().fd)
+
+    def _poll(self, ticket_name: Optional[str], label: str):
+        """One check of the queue and slots (blocking file IO, runs in a worker thread).
+
+        Args:
+            ticket_name: This run's ticket, or None for the fast path (only when nobody is queued)
+            label: Written into the slot file
+
+        Returns:
+            A Lease if a slot was taken. Otherwise, for a ticket, the number of tickets ahead
+            of it (0 when it is its turn but all slots are busy), and None on the fast path.
+        """
+        order = self._queue_order()
+        if ticket_name is None:
+            lease = self._try_slots(label) if not order else None
+        else:
+            ahead = order.index(ticket_name) if ticket_name in order else 0
+            if ahead:
+                return ahead
+            lease = self._try_slots(label) or 0
+        if lease:
+            self._mark_served()
+        return lease
+
+    def _try_slots(self, label: str) -> Optional[Lease]:
+        for slot in range(self.host_slots):
+            fd = os.open(self.broker_dir / f"slot-{slot}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+            if _try_lock(fd):
+                os.ftruncate(fd, 0)
+                os.write(fd, f"{os.getpid()} {label}\n".encode('utf-8'))
+                return Lease(kind="host", slot=slot, fd=fd)
+            os.close(fd)
+        return None
+
+    def _queue_order(self) -> List[str]:
+        """Live tickets in service order: round-robin over instances, oldest first within one.
+
+        Instances take turns starting with the one served longest ago (see ``served/``).
+        """
+        by_pid: Dict[str, List[str]] = {}
+        queue_dir = self.broker_dir / "queue"
+        for entry in os.scandir(queue_dir):
+            parts = entry.name.split("-")
+            if len(parts) != 3 or not parts[0].isdigit():
+                continue
+            if entry.name not in self.tickets and self._is_stale(entry.path):
+                continue
+            by_pid.setdefault(parts[1], []).append(entry.name)
+
+        for tickets in by_pid.values():
+            tickets.sort(key=lambda name: int(name.split("-")[0]))
+        served = self._last_served(by_pid)
+        instances = sorted(by_pid, key=lambda pid: (served.get(pid, 0), int(by_pid[pid][0].split("-")[0])))
+        ranked = []
+        for position, pid in enumerate(instances):
+            ranked.extend((rank, position, name) for rank, name in enumerate(by_pid[pid]))
+        return [name for _, _, name in sorted(ranked)]
+
+    def _last_served(self, pids: Iterable[str]) -> Dict[str, int]:
+        """When each instance was last granted a slot (time_ns), for those that have been."""
+        served = {}
+        for pid in pids:
+            try:
+                served[pid] = int((self.broker_dir / "served" / pid).read_text())
+            except (OSError, ValueError):
+                pass
+        return served
+
+    def _mark_served(self):
+        """Record that this instance was just granted a slot, and forget dead instances."""
+        served_dir = self.broker_dir / "served"
+        try:
+            path = served_dir / str(os.getpid())
+            tmp_path = served_dir / f".{os.getpid()}.tmp"
+            tmp_path.write_text(str(time.time_ns()))
+            os.replace(tmp_path, path)
+            for name in os.listdir(served_dir):
+                if name.isdigit() and not _pid_alive(int(name)):
+                    os.unlink(served_dir / name)
+        except OSError as e:
+            logger.debug(f"Could not record the grant: {e}")
+
+    @staticmethod
+    def _is_stale(path: str) -> bool:
+        """Remove a ticket whose owner died (nobody holds its lock any more)."""
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except OSError:
+            return True
+        try:
+            if _try_lock(fd):
+                os.unlink(path)
+                return True
+            return False
+        except OSError:
+            return True
+        finally:
+            os.close(fd)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Broker state for the status resource (blocking file reads, call it in a thread)."""
+        status: Dict[str, Any] = {
+            "mode": "host" if self.enabled else "local",
+            "held_here": self.held,
+            "waiting_here": self.waiting,
+            "granted": self.granted,
+            "mean_wait_seconds": round(self.total_wait / self.granted, 3) if self.granted else None,
+        }
+        if not self.enabled:
+            status["local_limit"] = self.local_limit
+            return status
+
+        # Read-only: taking a free slot's lock here, even briefly, would make another
+        # instance's acquire of it fail. Holder lines are written under the lock and
+        # truncated on release; a crashed holder's line stays until _try_slots reuses the slot.
+        holders = []
+        for slot in range(self.host_slots):
+            try:
+                content = (self.broker_dir / f"slot-{slot}.lock").read_text(encoding='utf-8', errors='replace')
+            except OSError:
+                continue
+            pid = content.split(" ", 1)[0]
+            if pid.isdigit() and _pid_alive(int(pid)):
+                holders.append({"slot": slot, "holder": content.strip()})
+        queued = 0
+        for name in os.listdir(self.broker_dir / "queue"):
+            parts = name.split("-")
+            if len(parts) == 3 and parts[0].isdigit() and parts[1].isdigit() and _pid_alive(int(parts[1])):
+                queued += 1
+        status.update({
+            "broker_dir": str(self.broker_dir),
+            "host_slots": self.host_slots,
+            "busy_slots": holders,
+            "queued_on_host": queued,
+        })
+        return status
@@ -0,0 +1,159 @@
+"""
+Bundled Repository Index MCP Server
+
+Serves search tools over one directory's index (see repo_index.py) on stdio.
+The Claude CLI starts it for agents with ``repo-index`` enabled, from the
+``--mcp-config`` that ``write_mcp_config`` generates:
+
+    python -m task_agents_mcp.index_server --root /path/to/project
+
+Tools (as seen by the agent: ``mcp__repo_index__<tool>``):
+    search_code   Lines matching a string or regex, like Grep in content mode
+    find_files    Paths matching a glob or containing a substring, like Glob
+    find_symbol   Where classes, functions, types and headings are defined
+    index_status  Size and freshness of the index
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from typing import Optional
+
+from .repo_index import RepoIndex, default_index_dir
+
+logger = logging.getLogger(__name__)
+
+SERVER_NAME = "repo_index"
+TOOL_PREFIX = f"mcp__{SERVER_NAME}"  # Permission rule allowing all of the server's tools
+
+
+def write_mcp_config(root: str, base_config: Optional[str] = None) -> str:
+    """Write an MCP config that starts the index server for ``root``, merged with an agent's own config.
+
+    The file name is derived from its content, so repeated runs reuse the same file.
+
+    Args:
+        root: Directory the index server searches
+        base_config: Path of the agent's ``mcp-config`` whose servers are kept
+
+    Returns:
+        Path of the config file
+    """
+    servers = {}
+    if base_config:
+        with open(base_config) as f:
+            servers = dict(json.load(f).get("mcpServers", {}))
+    # The server must import this package even when it is not installed (e.g. run from a checkout)
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {key: value for key, value in os.environ.items() if key.startswith("TASK_AGENTS_INDEX_")}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_parent, os.environ.get("PYTHONPATH")]))
+    servers[SERVER_NAME] = {
+        "type": "stdio",
+        "command": sys.executable,
+        "args": ["-m", "task_agents_mcp.index_server", "--root", root],
+        "env": env,
+    }
+    content = json.dumps({"mcpServers": servers}, indent=2, sort_keys=True)
+    index_dir = default_index_dir()
+    path = os.path.join(index_dir, f"mcp-{hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]}.json")
+    if not os.path.exists(path):
+        os.makedirs(index_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    return path
+
+
+def create_server(root: str):
+    """The index MCP server for one directory; the index is synced in the background from the start."""
+    from fastmcp import FastMCP
+
+    index = RepoIndex(root)
+    # Queries wait for the initial sync (it holds the index lock), the handshake does not
+    threading.Thread(target=index.sync, name="repo-index-sync", daemon=True).start()
+    mcp = FastMCP(SERVER_NAME)
+
+    @mcp.tool()
+    def search_code(pattern: str, regex: bool = False, path_glob: Optional[str] = None,
+                    ignore_case: bool = False, max_results: int = 100) -> str:
+        """Search file contents of the working directory from a prebuilt index.
+
+        Returns matching lines as "path:line: text". Faster than Grep: only files
+        containing the pattern's literal parts are read.
+
+        Args:
+            pattern: Text to find, or a Python regex when regex is true
+            regex: Treat pattern as a regular expression
+            path_glob: Only search paths matching this glob (e.g. "src/*.py"; * also matches /)
+            ignore_case: Case-insensitive matching
+            max_results: Most lines returned
+        """
+        try:
+            hits, searched, more = index.search(pattern, regex=regex, path_glob=path_glob,
+                                                ignore_case=ignore_case, max_results=max_results)
+        except ValueError as e:
+            return f"Error: {e}"
+        if not hits:
+            return f"No matches ({searched} candidate files searched)"
+        lines = [f"{hit.path}:{hit.line}: {hit.text}" for hit in hits]
+        if more:
+            lines.append("... more matches not shown: narrow the pattern or set path_glob")
+        return "\n".join(lines)
+
+    @mcp.tool()
+    def find_files(pattern: str, max_results: int = 200) -> str:
+        """Find files of the working directory by glob (e.g. "*.test.ts", "docs/*") or name fragment.
+
+        Args:
+            pattern: Glob (* also matches /) or a substring of the path
+            max_results: Most paths returned
+        """
+        paths, total = index.find_files(pattern, max_results=max_results)
+        if not paths:
+            return "No files found"
+        more = f"\n... {total - len(paths)} more files" if total > len(paths) else ""
+        return "\n".join(paths) + more
+
+    @mcp.tool()
+    def find_symbol(name: str, kind: Optional[str] = None, max_results: int = 50) -> str:
+        """Find where a class, function, type or Markdown heading is defined.
+
+        Exact (case-insensitive) matches are returned if any, else names starting
+        with or containing ``name``.
+
+        Args:
+            name: Symbol name
+            kind: Only this kind (function, class, interface, type, struct, enum, heading, ...)
+            max_results: Most definitions returned
+        """
+        hits = index.find_symbol(name, kind=kind, max_results=max_results)
+        if not hits:
+            return f"No definitions of {name}"
+        return "\n".join(f"{hit.path}:{hit.line}: ({hit.kind}) {hit.text}" for hit in hits)
+
+    @mcp.tool()
+    def index_status() -> str:
+        """Files, symbols and freshness of the working directory's index."""
+        index.update()
+        return json.dumps(index.status(), indent=2)
+
+    return mcp
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Repository index MCP server (stdio)")
+    parser.add_argument("--root", default=os.getcwd(), help="Directory to index (default: current directory)")
+    args = parser.parse_args()
+    # stdout carries the protocol: log to stderr only
+    logging.basicConfig(level=os.environ.get('TASK_AGENTS_LOG_LEVEL', 'WARNING').upper(), stream=sys.stderr,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    create_server(os.path.abspath(args.root)).run(show_banner=False)
+
+
+if __name__ == "__main__":
+    main()
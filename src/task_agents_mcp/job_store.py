@@ -0,0 +1,222 @@
+"""
+Job Store for Task-Agents MCP Server
+
+Tracks background agent jobs submitted through the async job tools.
+Each job runs as an asyncio task on the server's event loop; its status,
+streamed output and final result are exposed as MCP resources.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+JOB_URI_PREFIX = "task-agent://jobs"
+
+
+def job_uri(job_id: str, part: str) -> str:
+    """Build the resource URI for one part (status, output, result) of a job."""
+    return f"{JOB_URI_PREFIX}/{job_id}/{part}"
+
+
+@dataclass
+class Job:
+    """A background agent task submitted through the async job API."""
+    job_id: str
+    agent_name: str  # Display name of the agent
+    prompt: str
+    session_reset: bool = False
+    allow_fork: bool = False  # Fork instead of queueing behind a busy session chain
+    priority: Optional[str] = None  # Priority class (None = the agent's default)
+    client: Optional[str] = None  # Identity of the submitting client
+    status: str = JOB_QUEUED
+    output: List[str] = field(default_factory=list)
+    output_base: int = 0  # Sequence number of output[0]: lines trimmed from the front so far
+    result: Optional[str] = None
+    error: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+    progress: Optional[Any] = field(default=None, repr=False)  # RunProgress of the job's run
+    changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def to_status_dict(self) -> Dict[str, Any]:
+        """Status summary served by the job status resource."""
+        status = {
+            "job_id": self.job_id,
+            "agent": self.agent_name,
+            "status": self.status,
+            "priority": self.priority,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "output_lines": len(self.output),
+            "has_result": self.result is not None,
+            "error": self.error,
+            "resources": {
+                "status": job_uri(self.job_id, "status"),
+                "output": job_uri(self.job_id, "output"),
+                "result": job_uri(self.job_id, "result"),
+            },
+        }
+        if self.progress is not None and not self.is_finished:
+            # Estimated from the agent's earlier runs (see progress_model.py)
+            snapshot = self.progress.snapshot()
+            status.update(snapshot)
+            if snapshot["eta_seconds"] is not None:
+                status["expected_finish_at"] = datetime.fromtimestamp(
+                    time.time() + snapshot["eta_seconds"]).isoformat(timespec="seconds")
+        return status
+
+
+class JobStore:
+    """Bounded in-memory store of async jobs with resource-update notifications."""
+
+    def __init__(self, max_jobs: int = 100, max_output_lines: int = 1000,
+                 output_notify_interval: float = 0.5):
+        """Initialize the job store.
+
+        Args:
+            max_jobs: Maximum number of jobs retained. Oldest finished jobs are
+                      evicted first; running jobs are never evicted.
+            max_output_lines: Maximum output lines kept per job (oldest dropped)
+            output_notify_interval: Minimum seconds between output notifications
+                                    for a single job
+        """
+        self.max_jobs = max_jobs
+        self.max_output_lines = max_output_lines
+        self.output_notify_interval = output_notify_interval
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.subscribers: Dict[str, Set[Any]] = {}
+        self._last_output_notify: Dict[str, float] = {}
+
+    def create(self, agent_name: str, prompt: str, session_reset: bool = False,
+               allow_fork: bool = False, priority: Optional[str] = None,
+               client: Optional[str] = None, job_id: Optional[str] = None) -> Job:
+        """Create and register a new queued job (under ``job_id`` when given, else a new id)."""
+        job = Job(
+            job_id=job_id or uuid.uuid4().hex[:12],
+            agent_name=agent_name,
+            prompt=prompt,
+            session_reset=session_reset,
+            allow_fork=allow_fork,
+            priority=priority,
+            client=client
+        )
+        self.jobs[job.job_id] = job
+        self._evict()
+        logger.info(f"Created job {job.job_id} for {agent_name}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Status summaries of all retained jobs, newest first."""
+        return [job.to_status_dict() for job in reversed(self.jobs.values())]
+
+    async def mark_running(self, job: Job):
+        job.status = JOB_RUNNING
+        job.started_at = datetime.now().isoformat()
+        await self._changed(job, "status")
+
+    async def append_output(self, job: Job, message: str):
+        """Append a progress message to the job's streamed output.
+
+        Partial text deltas (prefixed with ``partial:``) are merged into a
+        single running text line instead of one line per delta.
+        """
+        if message.startswith("partial:"):
+            text = message[8:]
+            if job.output and job.output[-1].startswith("partial:"):
+                job.output[-1] += text
+            else:
+                job.output.append(f"partial:{text}")
+        else:
+            job.output.append(message)
+
+        if len(job.output) > self.max_output_lines:
+            trimmed = len(job.output) - self.max_output_lines
+            del job.output[:trimmed]
+            job.output_base += trimmed
+
+        # Throttle output notifications - deltas can arrive many times per second
+        now = time.monotonic()
+        if now - self._last_output_notify.get(job.job_id, 0.0) >= self.output_notify_interval:
+            self._last_output_notify[job.job_id] = now
+            await self._changed(job, "output")
+        else:
+            job.changed.set()
+
+    async def finish(self, job: Job, status: str, result: Optional[str] = None,
+                     error: Optional[str] = None):
+        """Record the final state of a job."""
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = datetime.now().isoformat()
+        self._last_output_notify.pop(job.job_id, None)
+        logger.info(f"Job {job.job_id} finished with status: {status}")
+        await self._changed(job, "status", "output", "result")
+        self._evict()
+
+    def cancel(self, job: Job) -> bool:
+        """Cancel a running or queued job. Returns False if already finished."""
+        if job.is_finished or not job.task:
+            return False
+        job.task.cancel()
+        return True
+
+    def subscribe(self, uri: str, session: Any):
+        self.subscribers.setdefault(uri, set()).add(session)
+
+    def unsubscribe(self, uri: str, session: Any):
+        sessions = self.subscribers.get(uri)
+        if sessions:
+            sessions.discard(session)
+            if not sessions:
+                del self.subscribers[uri]
+
+    async def _changed(self, job: Job, *parts: str):
+        """Wake local waiters and notify subscribed sessions of updated parts."""
+        job.changed.set()
+        for part in parts:
+            uri = job_uri(job.job_id, part)
+            for session in list(self.subscribers.get(uri, ())):
+                try:
+                    await session.send_resource_updated(uri)
+                except Exception as e:
+                    # Session is gone - stop notifying it
+                    logger.debug(f"Dropping subscriber for {uri}: {e}")
+                    self.unsubscribe(uri, session)
+
+    def _evict(self):
+        """Drop the oldest finished jobs once the store exceeds max_jobs."""
+        excess = len(self.jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for job_id in [jid for jid, j in self.jobs.items() if j.is_finished][:excess]:
+            del self.jobs[job_id]
+            for part in ("status", "output", "result"):
+                self.subscribers.pop(job_uri(job_id, part), None)
+            logger.debug(f"Evicted job {job_id} from job store")
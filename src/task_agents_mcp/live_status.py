@@ -0,0 +1,242 @@
+"""
+Live Status for Task-Agents MCP Server
+
+What the server is doing right now: the requests it is serving and where
+each one is (queued, waiting for its session chain or a host slot, running,
+retrying), and every CLI process it follows, with its pid, model, elapsed
+time, last event, tool calls and tokens so far.
+
+The state is kept up to date as things happen instead of being computed
+when asked: ``execute_task`` registers a request when it arrives and removes
+it when it returns, the stages it passes through set its state, and the
+stream parser registers each CLI run and stamps it with every event. The
+current request is carried in a context variable, so runs started for it
+(including hedges) are linked to it without passing it through every call;
+so is the request's progress tracker, which the stream parser feeds.
+Reading the status only walks the active requests and runs.
+
+Served as JSON at ``task-agent://status`` and as a compact text view at
+``task-agent://status/text``.
+"""
+
+import contextvars
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .progress_model import RunProgress, format_seconds
+
+# Request states
+QUEUED = "queued"  # Waiting for the scheduler
+WAITING_FOR_CHAIN = "waiting for session chain"  # Behind a running exchange on its session chain
+WAITING_FOR_SLOT = "waiting for host slot"  # Admitted, waiting for a host-wide CLI slot
+STARTING = "starting"
+RUNNING = "running"
+RETRYING = "retrying"
+
+_current_request: contextvars.ContextVar[Optional["ActiveRequest"]] = contextvars.ContextVar(
+    "task_agents_current_request", default=None)
+
+
+@dataclass(eq=False)
+class ActiveRun:
+    """A CLI process being followed."""
+    run_id: int
+    agent: str
+    run: Any  # The CliRunResult the stream parser fills in
+    pid: Optional[int]
+    where: str  # "local" or the worker address
+    started_at: float  # time.monotonic()
+    request_id: Optional[int] = None  # None for background runs (compaction)
+    last_event_at: Optional[float] = None
+    last_event: Optional[str] = None  # Type of the last stream-json event
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        run = self.run
+        return {
+            "run_id": self.run_id,
+            "request_id": self.request_id,
+            "agent": self.agent,
+            "model": run.model,
+            "role": run.hedge_role,
+            "pid": self.pid,
+            "where": self.where,
+            "session_id": run.session_id,
+            "elapsed_seconds": round(now - self.started_at, 1),
+            "last_event": self.last_event,
+            "last_event_seconds_ago": round(now - self.last_event_at, 1) if self.last_event_at else None,
+            "tool_calls": len(run.tools_used),
+            "last_tool": run.tools_used[-1] if run.tools_used else None,
+            "tokens_so_far": run.tokens_so_far(),
+        }
+
+
+@dataclass(eq=False)
+class ActiveRequest:
+    """A task being served by execute_task."""
+    request_id: int
+    agent: str
+    client: str
+    priority: str
+    received_at: float  # time.monotonic()
+    state: str = STARTING
+    state_since: float = 0.0
+    job_id: Optional[str] = None
+    chain_id: Optional[str] = None  # Session chain the request is an exchange of
+    detail: Optional[str] = None  # E.g. the queue position
+    runs: List[ActiveRun] = field(default_factory=list)
+    progress: Optional[RunProgress] = field(default=None, repr=False)  # Fed by the stream parser
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "agent": self.agent,
+            "client": self.client,
+            "priority": self.priority,
+            "job_id": self.job_id,
+            "chain_id": self.chain_id,
+            "state": self.state,
+            "detail": self.detail,
+            "seconds_in_state": round(now - self.state_since, 1),
+            "age_seconds": round(now - self.received_at, 1),
+            "runs": [run.run_id for run in self.runs],
+        }
+
+
+class LiveStatus:
+    """Incrementally maintained registry of active requests and CLI runs."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.requests: Dict[int, ActiveRequest] = {}
+        self.runs: Dict[int, ActiveRun] = {}
+        self.requests_served = 0
+        self.runs_finished = 0
+        self._ids = itertools.count(1)
+
+    # ----- Requests (execute_task) -----
+    def request_started(self, agent: str, client: str, priority: str, job_id: Optional[str] = None,
+                        chain_id: Optional[str] = None, progress: Optional[RunProgress] = None) -> ActiveRequest:
+        """Register a request and make it the current request of the calling task."""
+        now = time.monotonic()
+        request = ActiveRequest(next(self._ids), agent, client, priority, now, state_since=now,
+                                job_id=job_id, chain_id=chain_id, progress=progress)
+        self.requests[request.request_id] = request
+        _current_request.set(request)
+        return request
+
+    def request_finished(self, request: ActiveRequest):
+        self.requests.pop(request.request_id, None)
+        self.requests_served += 1
+        if _current_request.get() is request:
+            _current_request.set(None)
+
+    def set_state(self, state: str, detail: Optional[str] = None):
+        """Move the current request (if any) to a new state."""
+        request = _current_request.get()
+        if request is not None:
+            request.state = state
+            request.state_since = time.monotonic()
+            request.detail = detail
+
+    @staticmethod
+    def progress() -> Optional[RunProgress]:
+        """Progress tracker of the current request, if its caller passed one."""
+        request = _current_request.get()
+        return request.progress if request is not None else None
+
+    @staticmethod
+    def detach_background():
+        """Unlink the calling task from its request (for background work that outlives it)."""
+        _current_request.set(None)
+
+    # ----- CLI runs (stream parser) -----
+    def run_started(self, agent: str, run: Any, execution: Any) -> ActiveRun:
+        request = _current_request.get()
+        active = ActiveRun(next(self._ids), agent, run, getattr(execution, "pid", None), execution.where,
+                           time.monotonic(), request_id=request.request_id if request else None)
+        self.runs[active.run_id] = active
+        if request is not None:
+            request.runs.append(active)
+            self.set_state(RUNNING)
+        return active
+
+    @staticmethod
+    def event(active: ActiveRun, event_type: Optional[str]):
+        active.last_event_at = time.monotonic()
+        active.last_event = event_type
+
+    def run_finished(self, active: ActiveRun):
+        self.runs.pop(active.run_id, None)
+        self.runs_finished += 1
+        request = self.requests.get(active.request_id)
+        if request is not None and active in request.runs:
+            request.runs.remove(active)
+
+    # ----- Views -----
+    def snapshot(self, pools: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Active runs, queued and waiting requests, session chains in use, and pool states."""
+        now = time.monotonic()
+        requests = list(self.requests.values())  # In arrival order
+        chains: Dict[str, Dict[str, Any]] = {}
+        for request in requests:
+            if request.chain_id:
+                chain = chains.setdefault(request.chain_id, {"agent": request.agent, "running": 0, "waiting": 0})
+                chain["waiting" if request.state == WAITING_FOR_CHAIN else "running"] += 1
+        return {
+            "uptime_seconds": round(now - self.started_at, 1),
+            "requests_served": self.requests_served,
+            "runs_finished": self.runs_finished,
+            "counts": {
+                "requests": len(requests),
+                "runs": len(self.runs),
+                "queued": sum(1 for r in requests if r.state in (QUEUED, WAITING_FOR_CHAIN, WAITING_FOR_SLOT)),
+            },
+            "runs": [run.to_dict(now) for run in self.runs.values()],
+            "requests": [request.to_dict(now) for request in requests],
+            "chains": chains,
+            "pools": pools or {},
+        }
+
+    def text(self, pools: Optional[Dict[str, Any]] = None) -> str:
+        """Compact text view of the snapshot, one line per run and waiting request."""
+        status = self.snapshot(pools)
+        counts = status["counts"]
+        lines = [f"task-agent: {counts['runs']} runs, {counts['requests']} requests "
+                 f"({counts['queued']} waiting) - up {_duration(status['uptime_seconds'])}, "
+                 f"{status['requests_served']} requests served"]
+        for run in status["runs"]:
+            role = f" {run['role']}" if run["role"] else ""
+            last = (f"last {run['last_event']} {_duration(run['last_event_seconds_ago'])} ago"
+                    if run["last_event"] else "no events yet")
+            lines.append(f"  RUN  {run['agent']}{role} [{run['model']}] pid {run['pid'] or '-'}"
+                         f"{'' if run['where'] == 'local' else ' on ' + run['where']} "
+                         f"{_duration(run['elapsed_seconds'])}, {run['tool_calls']} tools, "
+                         f"{_tokens(run['tokens_so_far'])} tokens, {last}")
+        for request in status["requests"]:
+            if request["state"] == RUNNING:
+                continue
+            detail = f" ({request['detail']})" if request["detail"] else ""
+            lines.append(f"  WAIT {request['agent']} {request['priority']} from {request['client']}: "
+                         f"{request['state']}{detail} for {_duration(request['seconds_in_state'])}")
+        for chain_id, chain in status["chains"].items():
+            lines.append(f"  CHAIN {chain['agent']} {chain_id}: {chain['running']} running, "
+                         f"{chain['waiting']} waiting")
+        if pools:
+            lines.append("  POOLS " + "; ".join(f"{name} {_compact(value)}" for name, value in pools.items()))
+        return "\n".join(lines)
+
+
+def _duration(seconds: Optional[float]) -> str:
+    return "-" if seconds is None else format_seconds(seconds)
+
+
+def _tokens(tokens: int) -> str:
+    return f"{tokens / 1000:.1f}k" if tokens >= 1000 else str(tokens)
+
+
+def _compact(value: Any) -> str:
+    if isinstance(value, dict):
+        return " ".join(f"{key}={item}" for key, item in value.items())
+    return str(value)
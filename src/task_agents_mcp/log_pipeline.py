@@ -0,0 +1,246 @@
+"""
+Log Pipeline for Task-Agents MCP Server
+
+Logging calls only put the record on a queue; a background thread formats
+and writes it, so a slow disk never blocks the event loop. Each agents
+directory has its own log file, rotated by size and by time, holding one JSON
+object per line:
+
+    {"ts": "2026-01-01T12:00:00.123Z", "level": "INFO", "logger": "task_agents_mcp.agent_manager",
+     "msg": "Executing command: ...", "agent": "dev"}
+
+Records logged with ``extra={"sample": key}`` (per-event lines such as stream
+deltas) are rate-limited per key; the next record that passes reports how
+many were dropped. Prompts and task text never reach the log in full:
+``redact`` replaces them with a hash and length unless debug capture is on.
+
+Only one process rotates a log file: the one holding the ``flock`` on
+``<file>.lock``. Another server writing the same file (same project, or an
+explicit shared TASK_AGENTS_LOG_FILE) only appends, and reopens the file
+after the owner rotates it.
+
+Settings:
+    TASK_AGENTS_LOG_FILE        Log file (default /tmp/task_agents_server-<hash>.log, empty to disable)
+    TASK_AGENTS_LOG_LEVEL       Level for the server's loggers (default INFO)
+    TASK_AGENTS_LOG_FORMAT      json (default) or text, for the log file
+    TASK_AGENTS_LOG_MAX_BYTES   Rotate when the file reaches this size (default 10 MB)
+    TASK_AGENTS_LOG_ROTATE_WHEN Time-based rotation interval, as for TimedRotatingFileHandler
+                                (default midnight)
+    TASK_AGENTS_LOG_BACKUPS     Rotated files to keep (default 5)
+    TASK_AGENTS_LOG_SAMPLE_RATE Sampled records per second and key (default 5)
+    TASK_AGENTS_DEBUG_CAPTURE   1 to log prompts and task text in full
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+DEFAULT_LOG_FILE = "/tmp/task_agents_server.log"  # Without an agents directory
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Command-line flags whose value is a prompt
+PROMPT_FLAGS = frozenset({"-p", "--system-prompt", "--append-system-prompt"})
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "sample", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_log_lock_fd: Optional[int] = None  # Held for the life of the process by the log file's owner
+
+
+def debug_capture() -> bool:
+    """Whether prompts are logged in full (TASK_AGENTS_DEBUG_CAPTURE)."""
+    return os.environ.get('TASK_AGENTS_DEBUG_CAPTURE', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def redact(text: Optional[str]) -> str:
+    """A prompt as it may appear in the log: its hash and length, or itself with debug capture."""
+    if text is None:
+        return "<none>"
+    if debug_capture():
+        return text
+    digest = hashlib.sha256(text.encode("utf-8", "replace")).hexdigest()[:12]
+    return f"<redacted sha256:{digest} len={len(text)}>"
+
+
+def redact_command(cmd: List[str]) -> List[str]:
+    """A CLI argv with the values of prompt flags redacted."""
+    redacted = list(cmd)
+    for i in range(len(redacted) - 1):
+        if redacted[i] in PROMPT_FLAGS:
+            redacted[i + 1] = redact(redacted[i + 1])
+    return redacted
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including fields passed through ``extra``."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds")
+                  .replace("+00:00", "Z"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Lets at most ``rate`` records per second through for each ``sample`` key."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self._windows: Dict[str, List[float]] = {}  # key -> [window start, passed, dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample", None)
+        if key is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.setdefault(key, [now, 0, 0])
+            if now - window[0] >= 1.0:
+                window[0], window[1] = now, 0
+            if window[1] >= self.rate:
+                window[2] += 1
+                return False
+            window[1] += 1
+            if window[2]:
+                record.sampled_out = window[2]
+                window[2] = 0
+        return True
+
+
+class RotatingLogFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """Rotates at the configured time interval and whenever the file exceeds ``max_bytes``."""
+
+    def __init__(self, filename: str, max_bytes: int, when: str = "midnight", backup_count: int = 5):
+        super().__init__(filename, when=when, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes <= 0:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        return self.stream.tell() + len(self.format(record)) + 1 >= self.max_bytes
+
+    def rotation_filename(self, default_name: str) -> str:
+        # Size rollovers within one time interval would reuse the timestamped name
+        name, suffix = default_name, 1
+        while os.path.exists(name):
+            name, suffix = f"{default_name}.{suffix}", suffix + 1
+        return name
+
+
+def default_log_file(agents_dir: Optional[str] = None) -> str:
+    """Log file of an agents directory (same digest as its session and ledger files)."""
+    if not agents_dir:
+        return DEFAULT_LOG_FILE
+    digest = hashlib.sha1(str(Path(agents_dir).resolve()).encode('utf-8')).hexdigest()[:10]
+    return f"/tmp/task_agents_server-{digest}.log"
+
+
+def _claim_log_file(log_file: str) -> bool:
+    """Become the process that rotates ``log_file``, unless a live one already is."""
+    global _log_lock_fd
+    if fcntl is None:
+        return True
+    try:
+        fd = os.open(f"{log_file}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+    except OSError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    _log_lock_fd = fd  # The kernel drops the lock when this process exits
+    return True
+
+
+def configure_logging(log_file: Optional[str] = None, level: Optional[str] = None,
+                      agents_dir: Optional[str] = None):
+    """Route all logging through a queue to a background writer thread.
+
+    Args:
+        log_file: Log file path (default TASK_AGENTS_LOG_FILE, else one per agents directory)
+        level: Log level name (default TASK_AGENTS_LOG_LEVEL, INFO)
+        agents_dir: Agents directory the default log file is named after
+    """
+    global _listener
+    if _listener is not None:
+        return
+    if log_file is None:
+        log_file = os.environ.get('TASK_AGENTS_LOG_FILE', default_log_file(agents_dir))
+    level = (level or os.environ.get('TASK_AGENTS_LOG_LEVEL', 'INFO')).upper()
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handlers: List[logging.Handler] = [console]
+    shared = False
+    if log_file:
+        if _claim_log_file(log_file):
+            file_handler = RotatingLogFileHandler(
+                log_file,
+                max_bytes=int(os.environ.get('TASK_AGENTS_LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+                when=os.environ.get('TASK_AGENTS_LOG_ROTATE_WHEN', 'midnight'),
+                backup_count=int(os.environ.get('TASK_AGENTS_LOG_BACKUPS', '5')),
+            )
+        else:
+            # Two processes renaming one file lose records: append only, following the owner's rotations
+            shared = True
+            file_handler = logging.handlers.WatchedFileHandler(log_file, encoding="utf-8", delay=True)
+        json_format = os.environ.get('TASK_AGENTS_LOG_FORMAT', 'json').strip().lower() != 'text'
+        file_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+        handlers.append(file_handler)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Sampling runs on the caller's side so dropped records are never queued
+    queue_handler.addFilter(SamplingFilter(float(os.environ.get('TASK_AGENTS_LOG_SAMPLE_RATE', '5'))))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    if shared:
+        logging.getLogger(__name__).info(f"Log file {log_file} is rotated by another server process; "
+                                         f"appending without rotating")
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
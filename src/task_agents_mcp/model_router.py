@@ -0,0 +1,289 @@
+"""
+Model Router for Task-Agents MCP Server
+
+Picks a model per request for agents that declare a set of allowed models
+(``models: haiku, sonnet, opus``) and a routing policy. Policies look at the
+prompt length, recent per-model latency and error rates from the run ledger,
+and the number of runs currently in flight.
+
+The module can also replay ledgered traffic offline to compare policies:
+
+    python -m task_agents_mcp.model_router --ledger /tmp/task_agents_ledger-<hash>.jsonl \\
+        --models haiku,sonnet,opus --policy balanced
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import os
+import statistics
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .run_ledger import RunRecord, percentile
+
+logger = logging.getLogger(__name__)
+
+# Prompt length (characters) boundaries between model tiers
+SMALL_PROMPT_CHARS = 400
+LARGE_PROMPT_CHARS = 6000
+
+# Error rate above which a model is avoided when an alternative exists
+MAX_ERROR_RATE = 0.3
+
+# In-flight runs above which the balanced policy steps down one tier
+BUSY_QUEUE_DEPTH = 4
+
+
+@dataclass
+class ModelStats:
+    """Recent behaviour of one model for one agent."""
+    samples: int = 0
+    p50_latency: Optional[float] = None
+    p90_latency: Optional[float] = None
+    error_rate: float = 0.0
+
+
+@dataclass
+class RoutingContext:
+    """Inputs a policy uses to pick a model."""
+    prompt_chars: int
+    queue_depth: int = 0
+    stats: Dict[str, ModelStats] = field(default_factory=dict)
+
+
+@dataclass
+class RoutingDecision:
+    model: str
+    policy: str
+    reason: str
+
+
+def model_stats(records: List[RunRecord]) -> Dict[str, ModelStats]:
+    """Summarize records into per-model latency and error statistics."""
+    by_model: Dict[str, List[RunRecord]] = {}
+    for record in records:
+        by_model.setdefault(record.model, []).append(record)
+
+    stats = {}
+    for model, model_records in by_model.items():
+        latencies = [
+            r.time_to_result if r.time_to_result is not None else r.duration
+            for r in model_records if r.outcome == "success"
+        ]
+        errors = sum(1 for r in model_records if r.outcome != "success")
+        stats[model] = ModelStats(
+            samples=len(model_records),
+            p50_latency=percentile(latencies, 0.5),
+            p90_latency=percentile(latencies, 0.9),
+            error_rate=errors / len(model_records)
+        )
+    return stats
+
+
+def _size_tier(models: List[str], prompt_chars: int) -> int:
+    """Index into ``models`` (ordered cheapest to strongest) for a prompt size."""
+    if len(models) == 1 or prompt_chars < SMALL_PROMPT_CHARS:
+        return 0
+    if prompt_chars >= LARGE_PROMPT_CHARS:
+        return len(models) - 1
+    return len(models) // 2 if len(models) > 2 else 1
+
+
+def _healthy(models: List[str], context: RoutingContext) -> List[str]:
+    """Models whose recent error rate is acceptable (all of them if none are)."""
+    healthy = [
+        m for m in models
+        if m not in context.stats or context.stats[m].error_rate <= MAX_ERROR_RATE
+    ]
+    return healthy or models
+
+
+def size_policy(models: List[str], context: RoutingContext) -> Tuple[str, str]:
+    """Route by prompt length alone: short prompts to the cheapest model, huge ones to the strongest."""
+    model = models[_size_tier(models, context.prompt_chars)]
+    return model, f"{context.prompt_chars} char prompt"
+
+
+def latency_policy(models: List[str], context: RoutingContext) -> Tuple[str, str]:
+    """Route to the healthy model with the lowest recent median latency.
+
+    Models without history are tried first so every model gets measured.
+    """
+    candidates = _healthy(models, context)
+    for model in candidates:
+        if model not in context.stats or context.stats[model].p50_latency is None:
+            return model, "no latency history yet"
+    model = min(candidates, key=lambda m: context.stats[m].p50_latency)
+    return model, f"lowest p50 latency ({context.stats[model].p50_latency:.1f}s)"
+
+
+def balanced_policy(models: List[str], context: RoutingContext) -> Tuple[str, str]:
+    """Start from the size tier, step down under load, and skip unhealthy models."""
+    tier = _size_tier(models, context.prompt_chars)
+    reasons = [f"{context.prompt_chars} char prompt"]
+
+    if context.queue_depth >= BUSY_QUEUE_DEPTH and tier > 0:
+        tier -= 1
+        reasons.append(f"{context.queue_depth} runs in flight")
+
+    healthy = _healthy(models, context)
+    model = models[tier]
+    if model not in healthy:
+        # Prefer the nearest healthy model, stronger first
+        ordered = sorted(healthy, key=lambda m: (abs(models.index(m) - tier), -models.index(m)))
+        reasons.append(f"{model} error rate {context.stats[model].error_rate:.0%}")
+        model = ordered[0]
+    return model, ", ".join(reasons)
+
+
+POLICIES: Dict[str, Callable[[List[str], RoutingContext], Tuple[str, str]]] = {
+    "size": size_policy,
+    "latency": latency_policy,
+    "balanced": balanced_policy,
+}
+
+DEFAULT_POLICY = "balanced"
+
+
+class ModelRouter:
+    """Chooses a model per request for agents with routing enabled."""
+
+    def __init__(self, ledger):
+        """
+        Initialize the router.
+
+        Args:
+            ledger: The RunLedger providing recent per-agent run history
+        """
+        self.ledger = ledger
+
+    def route(self, agent_config, prompt: str, queue_depth: int = 0) -> RoutingDecision:
+        """Pick a model for one request to a routing-enabled agent."""
+        models = agent_config.models
+        policy_name = agent_config.routing_policy or DEFAULT_POLICY
+        policy = POLICIES.get(policy_name, POLICIES[DEFAULT_POLICY])
+
+        context = RoutingContext(
+            prompt_chars=len(prompt),
+            queue_depth=queue_depth,
+            stats=model_stats(self.ledger.recent(agent_config.agent_name))
+        )
+        model, reason = policy(models, context)
+        logger.info(f"Routed {agent_config.agent_name} to {model} ({policy_name}: {reason})")
+        return RoutingDecision(model=model, policy=policy_name, reason=reason)
+
+
+# ============= OFFLINE SIMULATOR =============
+def _queue_depths(records: List[RunRecord]) -> List[int]:
+    """Number of runs already in flight when each record started (records sorted by start)."""
+    depths = []
+    running_until: List[float] = []  # Min-heap of end times of runs in flight
+    for record in records:
+        while running_until and running_until[0] <= record.started_at:
+            heapq.heappop(running_until)
+        depths.append(len(running_until))
+        heapq.heappush(running_until, record.started_at + record.duration)
+    return depths
+
+
+def simulate(records: List[RunRecord], models: List[str], policy_name: str,
+             window: int = 200) -> Dict[str, object]:
+    """Replay ledgered runs through a policy and estimate the outcome.
+
+    Each request's latency on the chosen model is estimated from the median
+    latency that model showed for prompts of a similar size across the whole
+    ledger (falling back to the model's overall median). The actual model and
+    latency of each record form the baseline.
+    """
+    policy = POLICIES[policy_name]
+    records = sorted(records, key=lambda r: r.started_at)
+    depths = _queue_depths(records)
+
+    def size_bucket(chars: int) -> int:
+        return 0 if chars < SMALL_PROMPT_CHARS else 2 if chars >= LARGE_PROMPT_CHARS else 1
+
+    latency_table: Dict[Tuple[str, int], List[float]] = {}
+    overall: Dict[str, List[float]] = {}
+    for r in records:
+        if r.outcome != "success":
+            continue
+        latency = r.time_to_result if r.time_to_result is not None else r.duration
+        latency_table.setdefault((r.model, size_bucket(r.prompt_chars)), []).append(latency)
+        overall.setdefault(r.model, []).append(latency)
+
+    def estimate(model: str, chars: int) -> Optional[float]:
+        samples = latency_table.get((model, size_bucket(chars))) or overall.get(model)
+        return statistics.median(samples) if samples else None
+
+    chosen_latencies, baseline_latencies = [], []
+    mix: Dict[str, int] = {}
+    unknown = 0
+    for i, record in enumerate(records):
+        history = [r for r in records[max(0, i - window):i] if r.agent == record.agent]
+        context = RoutingContext(
+            prompt_chars=record.prompt_chars,
+            queue_depth=depths[i],
+            stats=model_stats(history)
+        )
+        model, _ = policy(models, context)
+        mix[model] = mix.get(model, 0) + 1
+
+        baseline = record.time_to_result if record.time_to_result is not None else record.duration
+        estimated = estimate(model, record.prompt_chars)
+        if estimated is None:
+            unknown += 1
+            continue
+        chosen_latencies.append(estimated)
+        baseline_latencies.append(baseline)
+
+    def summary(values: List[float]) -> Dict[str, Optional[float]]:
+        return {
+            "mean": round(statistics.mean(values), 3) if values else None,
+            "p50": percentile(values, 0.5),
+            "p90": percentile(values, 0.9),
+        }
+
+    return {
+        "policy": policy_name,
+        "requests": len(records),
+        "estimated": len(chosen_latencies),
+        "no_estimate": unknown,
+        "model_mix": mix,
+        "policy_latency": summary(chosen_latencies),
+        "baseline_latency": summary(baseline_latencies),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command-line entry point for the offline routing simulator."""
+    parser = argparse.ArgumentParser(description="Replay ledgered agent runs through a model routing policy")
+    ledger = os.environ.get('TASK_AGENTS_LEDGER_PATH')
+    parser.add_argument("--ledger", default=ledger, required=ledger is None,
+                        help="Run ledger JSON-lines file (/tmp/task_agents_ledger-<hash>.jsonl, one per agents "
+                             "directory; default: TASK_AGENTS_LEDGER_PATH)")
+    parser.add_argument("--models", required=True, help="Comma-separated models, cheapest first")
+    parser.add_argument("--policy", default="all", choices=sorted(POLICIES) + ["all"])
+    parser.add_argument("--agent", help="Only replay runs of this agent")
+    args = parser.parse_args(argv)
+
+    records = []
+    with open(Path(args.ledger)) as f:
+        for line in f:
+            if line.strip():
+                record = RunRecord.from_dict(json.loads(line))
+                if not args.agent or record.agent == args.agent:
+                    records.append(record)
+
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    policies = sorted(POLICIES) if args.policy == "all" else [args.policy]
+    results = [simulate(records, models, name) for name in policies]
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
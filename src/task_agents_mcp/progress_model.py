@@ -0,0 +1,254 @@
+"""
+Progress Model for Task-Agents MCP Server
+
+Estimates how long an agent run takes and how far along a live run is, from
+the agent's recent runs in the run ledger: the distributions of run time,
+tool calls and output length. Runs whose prompt had a similar size weigh
+more (a Gaussian kernel on the log of the size ratio), since a one-line
+question and a full PRD brief to the same agent take very different times.
+
+A live run's progress combines three signals, each as done / (done + expected
+remaining):
+
+- time: the weighted median of the time left in past runs that lasted
+  longer than the current run has so far
+- tools: likewise for the number of tool calls
+- output: characters streamed against the expected output length, once the
+  agent starts writing
+
+Progress never goes backwards and stays below 100% until the run finishes.
+Agents with fewer than TASK_AGENTS_PROGRESS_MIN_RUNS runs get a bounded
+heuristic instead, and no ETA.
+
+Settings:
+    TASK_AGENTS_PROGRESS_MIN_RUNS   Successful runs needed for estimates (default 3)
+    TASK_AGENTS_PROGRESS_INTERVAL   Seconds between progress reports while a run is quiet (default 5)
+"""
+
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+FALLBACK_SECONDS = 60.0  # Time constant of the heuristic progress without history
+KERNEL_WIDTH = 1.0  # Standard deviation of the prompt-size kernel, in natural-log units
+MAX_PROGRESS = 0.95  # Highest progress reported before the run finishes
+PROGRESS_INTERVAL = float(os.environ.get('TASK_AGENTS_PROGRESS_INTERVAL', '5'))
+
+
+def weighted_quantile(values: Sequence[float], weights: Sequence[float], q: float) -> Optional[float]:
+    """Quantile (q in 0..1) of values with weights; None when the weights sum to zero."""
+    pairs = sorted((v, w) for v, w in zip(values, weights) if w > 0)
+    total = sum(w for _, w in pairs)
+    if not total:
+        return None
+    running = 0.0
+    for value, weight in pairs:
+        running += weight
+        if running >= q * total:
+            return value
+    return pairs[-1][0]
+
+
+@dataclass
+class RunEstimate:
+    """Expected size of one run of an agent, from similar past runs."""
+    agent: str
+    samples: int
+    durations: List[float]
+    tool_counts: List[int]
+    output_chars: List[int]
+    weights: List[float]
+    expected_seconds: float  # Weighted median
+    p90_seconds: float
+    expected_tools: float
+    expected_output_chars: float
+
+    def remaining(self, values: Sequence[float], done: float) -> Optional[float]:
+        """Median of what was left in past runs that had got further than ``done``, or None if none did."""
+        left = [(value - done, weight) for value, weight in zip(values, self.weights) if value > done]
+        if not left:
+            return None
+        return weighted_quantile([v for v, _ in left], [w for _, w in left], 0.5)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "expected_seconds": round(self.expected_seconds, 1),
+            "p90_seconds": round(self.p90_seconds, 1),
+            "expected_tools": round(self.expected_tools, 1),
+            "expected_output_chars": int(self.expected_output_chars),
+        }
+
+
+class RuntimeModel:
+    """Per-agent run time, tool-call and output-length distributions from the run ledger."""
+
+    def __init__(self, ledger, min_runs: Optional[int] = None):
+        """
+        Initialize the model.
+
+        Args:
+            ledger: RunLedger whose recent successful runs are the history
+            min_runs: Successful runs an agent needs before it gets estimates
+        """
+        self.ledger = ledger
+        self.min_runs = min_runs or int(os.environ.get('TASK_AGENTS_PROGRESS_MIN_RUNS', '3'))
+
+    def estimate(self, agent: str, prompt_chars: int) -> Optional[RunEstimate]:
+        """Expected run time, tool calls and output of a run with a prompt of ``prompt_chars``.
+
+        Returns:
+            The estimate, or None while the agent has too few successful runs
+        """
+        runs = [r for r in self.ledger.recent(agent, outcome="success") if not r.hedged]
+        if len(runs) < self.min_runs:
+            return None
+        size = math.log(max(prompt_chars, 1))
+        weights = [math.exp(-((size - math.log(max(r.prompt_chars, 1))) ** 2) / (2 * KERNEL_WIDTH ** 2)) + 1e-3
+                   for r in runs]
+        durations = [r.time_to_result if r.time_to_result is not None else r.duration for r in runs]
+        tool_counts = [r.tool_count for r in runs]
+        output_chars = [r.output_chars for r in runs]
+        return RunEstimate(
+            agent=agent,
+            samples=len(runs),
+            durations=durations,
+            tool_counts=tool_counts,
+            output_chars=output_chars,
+            weights=weights,
+            expected_seconds=weighted_quantile(durations, weights, 0.5),
+            p90_seconds=weighted_quantile(durations, weights, 0.9),
+            expected_tools=weighted_quantile(tool_counts, weights, 0.5),
+            expected_output_chars=weighted_quantile(output_chars, weights, 0.5),
+        )
+
+    def track(self, agent: str, prompt_chars: int) -> "RunProgress":
+        """Progress tracker for a new run."""
+        return RunProgress(self.estimate(agent, prompt_chars))
+
+    def summary(self, agent: str) -> Dict[str, Any]:
+        """The agent's model at a typical prompt size (for status resources)."""
+        runs = self.ledger.recent(agent, outcome="success")
+        if not runs:
+            return {"samples": 0}
+        typical = sorted(r.prompt_chars for r in runs)[len(runs) // 2]
+        estimate = self.estimate(agent, typical)
+        if estimate is None:
+            return {"samples": len(runs), "status": f"collecting ({len(runs)}/{self.min_runs} runs)"}
+        return {"typical_prompt_chars": typical, **estimate.to_dict()}
+
+
+class RunProgress:
+    """Live progress and ETA of one run, fed by AgentManager's stream parser as events arrive."""
+
+    def __init__(self, estimate: Optional[RunEstimate]):
+        self.estimate = estimate
+        self.created = time.monotonic()
+        self.started: Optional[float] = None  # When the CLI process was spawned (after any queueing)
+        self.finished: Optional[float] = None
+        self.tools = 0
+        self.output_chars = 0
+        self._reported = 0.0  # Highest fraction reported so far
+
+    def run_started(self):
+        """A CLI run started. A retry starts over, but reported progress does not go back."""
+        self.started = time.monotonic()
+        self.tools = 0
+        self.output_chars = 0
+
+    def tool_used(self, count: int):
+        """The run made its ``count``-th tool call."""
+        self.tools = count
+
+    def output_received(self, chars: int):
+        """The run streamed ``chars`` more characters of its answer."""
+        self.output_chars += chars
+
+    def finish(self):
+        self.finished = self.finished or time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the CLI started (0 while queued)."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def fraction(self) -> float:
+        """Progress of the run in 0..1 (monotonic; 1 only once finished)."""
+        if self.finished is not None:
+            self._reported = 1.0
+            return 1.0
+        if self.started is None:
+            return self._reported
+        signals = self._signals()
+        total_weight = sum(weight for _, weight in signals)
+        value = sum(fraction * weight for fraction, weight in signals) / total_weight
+        self._reported = max(self._reported, min(value, MAX_PROGRESS))
+        return self._reported
+
+    def eta(self) -> Optional[float]:
+        """Expected seconds until the run finishes, or None without history."""
+        if self.finished is not None:
+            return 0.0
+        if self.estimate is None:
+            return None
+        if self.started is None:
+            return self.estimate.expected_seconds
+        remaining = self.estimate.remaining(self.estimate.durations, self.elapsed)
+        # Longer than every similar run so far: assume it is a quarter of the way from done
+        return remaining if remaining is not None else max(5.0, self.elapsed * 0.25)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """State for status resources and progress messages."""
+        eta = self.eta()
+        snapshot = {
+            "progress": round(self.fraction(), 3),
+            "elapsed_seconds": round(self.elapsed, 1),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "tools_so_far": self.tools,
+        }
+        if self.estimate:
+            snapshot["estimate"] = self.estimate.to_dict()
+        return snapshot
+
+    def describe(self) -> str:
+        """Short progress text, e.g. "42% - about 1m 10s left"."""
+        eta = self.eta()
+        text = f"{self.fraction():.0%}"
+        if eta is not None and self.finished is None:
+            text += f" - about {format_seconds(eta)} left"
+        return text
+
+    def _signals(self) -> List[Tuple[float, float]]:
+        """(fraction, weight) of the time, tool and output signals available for this run."""
+        t = self.elapsed
+        if self.estimate is None:
+            # No history: approach the cap at a fixed pace, faster with every tool call
+            signals = [(1 - math.exp(-t / FALLBACK_SECONDS), 1.0)]
+            if self.tools:
+                signals.append((1 - 0.85 ** self.tools, 1.0))
+            return signals
+        estimate = self.estimate
+        signals = [(t / (t + self.eta()) if t else 0.0, 2.0)]
+        if estimate.expected_tools:
+            left = estimate.remaining(estimate.tool_counts, self.tools)
+            signals.append((self.tools / (self.tools + (left if left is not None else 1)), 1.0))
+        if self.output_chars and estimate.expected_output_chars:
+            signals.append((min(self.output_chars / max(estimate.expected_output_chars, self.output_chars * 1.1),
+                                1.0), 1.0))
+        return signals
+
+
+def format_seconds(seconds: float) -> str:
+    """Seconds as "45s", "3m 20s" or "1h 5m"."""
+    if seconds < 1:
+        return "<1s"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60}s"
+    return f"{seconds // 3600}h {(seconds % 3600) // 60}m"
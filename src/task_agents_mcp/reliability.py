@@ -0,0 +1,220 @@
+"""
+Reliability helpers for Task-Agents MCP Server
+
+Classifies Claude CLI failures, retries transient ones with jittered
+exponential backoff, and keeps a circuit breaker per model so an unhealthy
+model fails fast (or falls back) instead of being hammered with retries.
+"""
+
+import logging
+import os
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Error classes
+ERROR_RATE_LIMIT = "rate_limit"
+ERROR_OVERLOADED = "overloaded"
+ERROR_NETWORK = "network"
+ERROR_AUTH = "auth"
+ERROR_USER = "user_error"
+ERROR_UNKNOWN = "unknown"
+
+# Failures worth retrying - they usually clear up on their own
+TRANSIENT_ERRORS = (ERROR_RATE_LIMIT, ERROR_OVERLOADED, ERROR_NETWORK)
+
+# Ordered: the first matching pattern wins. Status codes and generic phrases only count
+# in the CLI's API error text ("API Error: 529 {...}"), since stderr and error results
+# also carry the agent's own output and tool errors.
+_ERROR_PATTERNS = [
+    (ERROR_AUTH, re.compile(
+        r'invalid api key|authentication_error|api error:?\s*(?:401|403)\b|'
+        r'permission_error|please run /login|not logged in|oauth token', re.I)),
+    (ERROR_RATE_LIMIT, re.compile(
+        r'rate_limit_error|api error:?\s*429\b|too many requests|usage limit', re.I)),
+    (ERROR_OVERLOADED, re.compile(
+        r'overloaded_error|"type":\s*"api_error"|'
+        r'api error:?\s*(?:5\d\d\b|overloaded|internal server error|service unavailable)', re.I)),
+    (ERROR_NETWORK, re.compile(
+        r'econnreset|econnrefused|etimedout|enotfound|eai_again|socket hang up|'
+        r'api error:?\s*(?:connection error|request timed out|fetch failed)|'
+        r'apiconnection(?:timeout)?error|worker connection error', re.I)),
+    (ERROR_USER, re.compile(
+        r'invalid_request_error|api error:?\s*400\b|prompt is too long|unknown option|'
+        r'invalid (?:model|argument)|no such file', re.I)),
+]
+
+
+def classify_error(stderr: str = "", result_event: Optional[Dict[str, Any]] = None) -> str:
+    """Classify a CLI failure from its stderr and final result event.
+
+    Args:
+        stderr: Captured stderr of the CLI process
+        result_event: The stream-json ``result`` event, if one was emitted
+
+    Returns:
+        One of the ERROR_* constants
+    """
+    text_parts = [stderr or ""]
+    if result_event:
+        for key in ("result", "subtype", "error"):
+            value = result_event.get(key)
+            if isinstance(value, str):
+                text_parts.append(value)
+    text = "\n".join(text_parts)
+
+    for error_kind, pattern in _ERROR_PATTERNS:
+        if pattern.search(text):
+            return error_kind
+    return ERROR_UNKNOWN
+
+
+@dataclass
+class RetryPolicy:
+    """Jittered exponential backoff for transient CLI failures."""
+    max_retries: int = 2
+    base_delay: float = 2.0  # Seconds
+    max_delay: float = 30.0  # Seconds
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        return cls(
+            max_retries=int(os.environ.get('TASK_AGENTS_MAX_RETRIES', '2')),
+            base_delay=float(os.environ.get('TASK_AGENTS_RETRY_BASE_DELAY', '2.0')),
+            max_delay=float(os.environ.get('TASK_AGENTS_RETRY_MAX_DELAY', '30.0'))
+        )
+
+    def delay(self, attempt: int) -> float:
+        """Full-jitter backoff delay before retry number ``attempt`` (0-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+# Circuit breaker states
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+@dataclass
+class CircuitBreaker:
+    """Per-model circuit breaker.
+
+    Opens after ``failure_threshold`` consecutive transient failures and fails
+    fast for ``cooldown`` seconds, then lets a single probe request through.
+    """
+    model: str
+    failure_threshold: int = 3
+    cooldown: float = 60.0
+    state: str = BREAKER_CLOSED
+    consecutive_failures: int = 0
+    opened_at: Optional[float] = None
+    probe_in_flight: bool = False
+    total_failures: int = 0
+    total_successes: int = 0
+    last_error: Optional[str] = None
+
+    def allow_request(self) -> bool:
+        """Whether a request to this model may proceed right now."""
+        if self.state == BREAKER_CLOSED:
+            return True
+        if self.state == BREAKER_OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.state = BREAKER_HALF_OPEN
+            self.probe_in_flight = False
+            logger.info(f"Circuit breaker for {self.model} half-open, allowing a probe request")
+        # Half-open: a single probe at a time
+        if self.probe_in_flight:
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker lets a probe through."""
+        if self.state != BREAKER_OPEN or self.opened_at is None:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def release_probe(self):
+        """Release a half-open probe slot without recording an outcome (e.g. cancelled run)."""
+        self.probe_in_flight = False
+
+    def record_success(self):
+        if self.state != BREAKER_CLOSED:
+            logger.info(f"Circuit breaker for {self.model} closed")
+        self.state = BREAKER_CLOSED
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        self.total_successes += 1
+
+    def record_failure(self, error_kind: str):
+        self.total_failures += 1
+        self.last_error = error_kind
+        self.probe_in_flight = False
+        if error_kind not in TRANSIENT_ERRORS:
+            # Auth and user errors say nothing about the model's health
+            return
+        self.consecutive_failures += 1
+        if self.state == BREAKER_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != BREAKER_OPEN:
+                logger.warning(f"Circuit breaker for {self.model} opened after "
+                               f"{self.consecutive_failures} consecutive failures ({error_kind})")
+            self.state = BREAKER_OPEN
+            self.opened_at = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after_seconds": round(self.retry_after(), 1),
+            "total_failures": self.total_failures,
+            "total_successes": self.total_successes,
+            "last_error": self.last_error
+        }
+
+
+@dataclass
+class ReliabilityTracker:
+    """Holds the per-model circuit breakers and retry statistics."""
+    retry_policy: RetryPolicy = field(default_factory=RetryPolicy.from_env)
+    failure_threshold: int = field(
+        default_factory=lambda: int(os.environ.get('TASK_AGENTS_BREAKER_THRESHOLD', '3')))
+    cooldown: float = field(
+        default_factory=lambda: float(os.environ.get('TASK_AGENTS_BREAKER_COOLDOWN', '60')))
+    breakers: Dict[str, CircuitBreaker] = field(default_factory=dict)
+    retries: int = 0
+    fallbacks: int = 0
+    fast_failures: int = 0
+    errors_by_kind: Dict[str, int] = field(default_factory=dict)
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self.breakers:
+            self.breakers[model] = CircuitBreaker(
+                model=model,
+                failure_threshold=self.failure_threshold,
+                cooldown=self.cooldown
+            )
+        return self.breakers[model]
+
+    def record_error(self, model: str, error_kind: str):
+        self.errors_by_kind[error_kind] = self.errors_by_kind.get(error_kind, 0) + 1
+        self.breaker(model).record_failure(error_kind)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Breaker states and retry counters for the status resource."""
+        return {
+            "breakers": {model: b.to_dict() for model, b in self.breakers.items()},
+            "retries": self.retries,
+            "fallbacks": self.fallbacks,
+            "fast_failures": self.fast_failures,
+            "errors_by_kind": dict(self.errors_by_kind),
+            "retry_policy": {
+                "max_retries": self.retry_policy.max_retries,
+                "base_delay": self.retry_policy.base_delay,
+                "max_delay": self.retry_policy.max_delay
+            }
+        }
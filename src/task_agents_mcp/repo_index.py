@@ -0,0 +1,656 @@
+"""
+Repository Index for Task-Agents MCP Server
+
+Agents search their working tree with Grep and Glob, and every CLI process
+scans it again from scratch. Agents with ``repo-index`` enabled also get the
+bundled index server (index_server.py) through ``--mcp-config``, which
+answers from an index of the working tree kept in SQLite:
+
+- the file list, with sizes and modification times (``git ls-files`` when the
+  directory is a git checkout, so ignored files stay out)
+- file contents in an FTS5 trigram table: substring and regex searches only
+  read the files that contain the pattern's literal parts
+- a symbol map (classes, functions, types, Markdown headings) from
+  per-language patterns
+
+There is one database per directory under TASK_AGENTS_INDEX_DIR, shared by
+every agent run on the host: a run only re-reads files whose size or
+modification time changed since the last sync. While a run is active,
+inotify reports changes (the agent's own edits included) and only those
+paths are indexed again; without inotify, the tree is rescanned by stat
+before queries at most every TASK_AGENTS_INDEX_SYNC_TTL seconds.
+
+Settings:
+    TASK_AGENTS_REPO_INDEX          1 to attach the index server to all agents (per agent: ``repo-index``)
+    TASK_AGENTS_INDEX_DIR           Index databases (default /tmp/task_agents_index-<uid>)
+    TASK_AGENTS_INDEX_SYNC_TTL      Seconds between stat rescans without inotify (default 2)
+    TASK_AGENTS_INDEX_MAX_FILE_KB   Larger files are listed but their content is not indexed (default 1024)
+    TASK_AGENTS_INDEX_MAX_FILES     Files indexed per directory (default 200000)
+"""
+
+import contextlib
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import struct
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from stat import S_ISREG
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .resource_manifest import SKIPPED_DIRS
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BINARY_SNIFF_BYTES = 8192
+LINE_CHARS = 240  # Longest line shown in search results
+MIN_TRIGRAM_LITERAL = 3  # FTS5 trigram queries need at least 3 characters
+
+# Symbol patterns per file extension: (regex with a ``name`` group, kind or None to use the ``kind`` group)
+_DECL = r"^[ \t]*(?:export[ \t]+)?(?:default[ \t]+)?(?:abstract[ \t]+)?"
+_JS_SYMBOLS = [
+    (_DECL + r"(?:async[ \t]+)?function\*?[ \t]+(?P<name>[\w$]+)", "function"),
+    (_DECL + r"(?P<kind>class|interface|enum)[ \t]+(?P<name>[\w$]+)", None),
+    (_DECL + r"type[ \t]+(?P<name>[\w$]+)[ \t]*(?:<[^>]*>)?[ \t]*=", "type"),
+    (_DECL + r"(?:const|let|var)[ \t]+(?P<name>[\w$]+)[ \t]*(?::[^=]+)?=[ \t]*(?:async[ \t]+)?"
+     r"(?:function|\([^)]*\)[ \t]*(?::[^=]+)?=>|[\w$]+[ \t]*=>)", "function"),
+]
+_JVM_SYMBOLS = [
+    (r"^[ \t]*(?:(?:public|private|protected|internal|static|final|abstract|sealed|open|data|partial)[ \t]+)*"
+     r"(?P<kind>class|interface|enum|record|object|struct)[ \t]+(?P<name>\w+)", None),
+]
+_SYMBOL_PATTERNS: Dict[str, List[Tuple[re.Pattern, Optional[str]]]] = {
+    ext: [(re.compile(pattern, re.MULTILINE), kind) for pattern, kind in patterns]
+    for exts, patterns in [
+        (("py", "pyi"), [
+            (r"^[ \t]*(?:async[ \t]+)?def[ \t]+(?P<name>\w+)", "function"),
+            (r"^[ \t]*class[ \t]+(?P<name>\w+)", "class"),
+        ]),
+        (("js", "jsx", "mjs", "cjs", "ts", "tsx", "mts", "cts"), _JS_SYMBOLS),
+        (("go",), [
+            (r"^func[ \t]+(?:\([^)]*\)[ \t]*)?(?P<name>\w+)", "function"),
+            (r"^(?:type[ \t]+|[ \t]+)(?P<name>\w+)[ \t]+(?P<kind>struct|interface)\b", None),
+        ]),
+        (("rs",), [
+            (r"^[ \t]*(?:pub(?:\([^)]*\))?[ \t]+)?(?:async[ \t]+)?(?:unsafe[ \t]+)?fn[ \t]+(?P<name>\w+)", "function"),
+            (r"^[ \t]*(?:pub(?:\([^)]*\))?[ \t]+)?(?P<kind>struct|enum|trait|type|mod)[ \t]+(?P<name>\w+)", None),
+        ]),
+        (("java", "kt", "kts", "cs", "scala", "swift"), _JVM_SYMBOLS + [
+            (r"^[ \t]*(?:(?:public|private|protected|internal|static|final|override|suspend)[ \t]+)*"
+             r"(?:fun|func|def)[ \t]+(?P<name>\w+)", "function"),
+        ]),
+        (("rb",), [
+            (r"^[ \t]*def[ \t]+(?:self\.)?(?P<name>\w+[?!=]?)", "function"),
+            (r"^[ \t]*(?P<kind>class|module)[ \t]+(?P<name>[\w:]+)", None),
+        ]),
+        (("md", "mdx"), [
+            (r"^#{1,6}[ \t]+(?P<name>.+?)[ \t]*#*[ \t]*$", "heading"),
+        ]),
+    ]
+    for ext in exts
+}
+
+# inotify(7) event bits
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+_EVENT = struct.Struct("iIII")
+
+
+def default_index_dir() -> str:
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.environ.get('TASK_AGENTS_INDEX_DIR', f'/tmp/task_agents_index-{uid}')
+
+
+def index_available() -> bool:
+    """Whether SQLite has the FTS5 trigram tokenizer (3.34+)."""
+    return sqlite3.sqlite_version_info >= (3, 34, 0)
+
+
+def required_literals(pattern: str) -> List[str]:
+    """Literal strings every match of a regex must contain, for the trigram prefilter.
+
+    Conservative: only top-level literal runs count, characters made optional
+    by ``?``, ``*`` or ``{`` are dropped, and alternations yield nothing.
+    """
+    if "|" in pattern:
+        return []
+    literals, run, depth, i = [], "", 0, 0
+
+    def close():
+        nonlocal run
+        if depth == 0 and run:
+            literals.append(run)
+        run = ""
+
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern):
+            escaped = pattern[i + 1]
+            i += 2
+            if escaped.isalnum():  # \w, \d, \b, \1 ...
+                close()
+            elif depth == 0:
+                run += escaped
+            continue
+        if char == "[":
+            close()
+            end = pattern.find("]", i + 2)
+            i = len(pattern) if end < 0 else end + 1
+            continue
+        if char in "?*{":
+            run = run[:-1]
+            close()
+            if char == "{":
+                end = pattern.find("}", i)
+                i = len(pattern) if end < 0 else end + 1
+                continue
+        elif char == "(":
+            close()
+            depth += 1
+        elif char == ")":
+            depth = max(0, depth - 1)
+        elif char in ".^$+":
+            close()
+        elif depth == 0:
+            run += char
+        i += 1
+    close()
+    return literals
+
+
+def _sql_glob(pattern: str) -> str:
+    """A path glob as an SQLite GLOB (where ``*`` also matches ``/``)."""
+    pattern = pattern[2:] if pattern.startswith("./") else pattern
+    return pattern.replace("**/", "*").replace("/**", "*")
+
+
+def _fts_query(literals: List[str]) -> str:
+    return " AND ".join('"' + literal.replace('"', '""') + '"' for literal in literals)
+
+
+@dataclass
+class SearchHit:
+    path: str
+    line: int
+    text: str
+
+
+@dataclass
+class SymbolHit:
+    name: str
+    kind: str
+    path: str
+    line: int
+    text: str
+
+
+class _Inotify:
+    """Non-blocking inotify watches on directories, drained on demand."""
+
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs: Dict[int, str] = {}  # Watch descriptor -> directory relative to the root
+
+    def add(self, abs_dir: str, rel_dir: str):
+        """Watch a directory.
+
+        Raises:
+            OSError: The watch limit is reached (ENOSPC) or the call failed otherwise
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(abs_dir), self.MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            if code in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return  # Gone or unreadable - nothing to watch
+            raise OSError(code, f"inotify_add_watch failed for {abs_dir}")
+        self.dirs[wd] = rel_dir
+
+    def drain(self) -> Tuple[Set[str], bool]:
+        """Paths reported since the last call, and whether events were lost."""
+        dirty: Set[str] = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + _EVENT.size <= len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif mask & IN_IGNORED:
+                    self.dirs.pop(wd, None)
+                elif name and wd in self.dirs:
+                    rel_dir = self.dirs[wd]
+                    name = os.fsdecode(name)
+                    dirty.add(f"{rel_dir}/{name}" if rel_dir else name)
+        return dirty, overflow
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class RepoIndex:
+    """Incrementally updated file, text and symbol index of one directory."""
+
+    def __init__(self, root: str, index_dir: Optional[str] = None, sync_ttl: Optional[float] = None,
+                 max_file_bytes: Optional[int] = None, max_files: Optional[int] = None, watch: bool = True):
+        """
+        Initialize the index and open (or create) its database.
+
+        Args:
+            root: Directory to index
+            index_dir: Where the databases are kept (default TASK_AGENTS_INDEX_DIR)
+            sync_ttl: Seconds between stat rescans when changes are not watched
+            max_file_bytes: Larger files are listed without their content
+            max_files: Files indexed at most
+            watch: Watch the directory with inotify while the index is open
+
+        Raises:
+            RuntimeError: SQLite lacks the FTS5 trigram tokenizer
+        """
+        env = os.environ.get
+        self.root = os.path.abspath(root)
+        self.sync_ttl = sync_ttl if sync_ttl is not None else float(env('TASK_AGENTS_INDEX_SYNC_TTL', '2'))
+        self.max_file_bytes = max_file_bytes or int(env('TASK_AGENTS_INDEX_MAX_FILE_KB', '1024')) * 1024
+        self.max_files = max_files or int(env('TASK_AGENTS_INDEX_MAX_FILES', '200000'))
+        self.watch = watch
+        index_dir = index_dir or default_index_dir()
+        os.makedirs(index_dir, exist_ok=True)
+        digest = hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:16]
+        self.db_path = os.path.join(index_dir, f"{digest}.sqlite")
+        if not index_available():
+            raise RuntimeError(f"SQLite {sqlite3.sqlite_version} has no trigram tokenizer (3.34+ needed)")
+        self._conn = sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL);
+                CREATE VIRTUAL TABLE IF NOT EXISTS content USING fts5(body, tokenize='trigram');
+                CREATE TABLE IF NOT EXISTS symbols (
+                    name TEXT NOT NULL, kind TEXT NOT NULL, file_id INTEGER NOT NULL, line INTEGER NOT NULL,
+                    text TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS symbols_name ON symbols(name COLLATE NOCASE);
+                CREATE INDEX IF NOT EXISTS symbols_file ON symbols(file_id);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                INSERT OR IGNORE INTO meta VALUES ('root', '{}');
+            """.format(self.root.replace("'", "''")))
+        self._lock = threading.RLock()  # One connection, used by the server and the initial sync thread
+        self._watcher: Optional[_Inotify] = None
+        self.mode = "poll"  # "inotify" once the watches are set up
+        self.last_sync: Dict[str, float] = {}
+
+    # ----- updates -----
+
+    def sync(self, force: bool = False) -> Dict[str, float]:
+        """Rescan the directory by stat and index new and modified files.
+
+        Skipped when any process on the host synced it within the TTL, unless ``force``.
+
+        Returns:
+            Counts of the sync (listed, read, removed files, seconds)
+        """
+        with self._lock, self._host_lock():
+            started = time.monotonic()
+            synced_at = float(self._meta("synced_at") or 0)
+            if not force and time.time() - synced_at < self.sync_ttl:
+                if self.watch and self._watcher is None:
+                    self._start_watcher(self._listed_dirs(self._known()))
+                return {"skipped": 1}
+            listed = self._list_files()
+            known = self._known()
+            changed = [path for path, stat in listed.items()
+                       if known.get(path, (0, -1, -1))[1:] != (stat.st_size, stat.st_mtime_ns)]
+            removed = [path for path in known if path not in listed]
+            with self._conn:
+                for path in removed:
+                    self._delete(known[path][0])
+                for path in changed:
+                    self._index(path, listed[path], known.get(path, (None,))[0])
+                self._set_meta("synced_at", str(time.time()))
+            if self.watch and self._watcher is None:
+                self._start_watcher(self._listed_dirs(listed))
+            self.last_sync = {"listed": len(listed), "read": len(changed), "removed": len(removed),
+                              "seconds": round(time.monotonic() - started, 3)}
+            if changed or removed:
+                logger.info(f"Index of {self.root}: {len(changed)} files read, {len(removed)} removed "
+                            f"({len(listed)} files, {self.last_sync['seconds']}s)")
+            return self.last_sync
+
+    def update(self):
+        """Bring the index up to date before a query: apply watched changes, or rescan after the TTL."""
+        with self._lock:
+            if self._watcher is None:
+                self.sync()
+                return
+            dirty, overflow = self._watcher.drain()
+            if overflow:
+                logger.info(f"Index of {self.root}: inotify queue overflowed, rescanning")
+                self.sync(force=True)
+            elif dirty:
+                self._apply(dirty)
+
+    def close(self):
+        with self._lock:
+            if self._watcher:
+                self._watcher.close()
+                self._watcher = None
+            self._conn.close()
+
+    # ----- queries -----
+
+    def search(self, pattern: str, regex: bool = False, path_glob: Optional[str] = None,
+               ignore_case: bool = False, max_results: int = 100) -> Tuple[List[SearchHit], int, bool]:
+        """Lines matching a literal string or regex.
+
+        Returns:
+            (hits, files searched, whether more matches were left out)
+
+        Raises:
+            ValueError: The regex is invalid
+        """
+        try:
+            compiled = re.compile(pattern if regex else re.escape(pattern),
+                                  re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+        except re.error as e:
+            raise ValueError(f"Invalid regex: {e}") from e
+        literals = required_literals(pattern) if regex else [pattern]
+        literals = [literal for literal in literals if len(literal) >= MIN_TRIGRAM_LITERAL]
+        where, params = [], []
+        if literals:
+            where.append("content MATCH ?")
+            params.append(_fts_query(literals))
+        if path_glob:
+            where.append("files.path GLOB ?")
+            params.append(_sql_glob(path_glob))
+        sql = ("SELECT files.path, content.body FROM content JOIN files ON files.id = content.rowid"
+               + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY files.path")
+        self.update()
+        hits: List[SearchHit] = []
+        searched = 0
+        with self._lock:
+            for path, body in self._conn.execute(sql, params):
+                searched += 1
+                line, position, last_line = 1, 0, 0
+                for match in compiled.finditer(body):
+                    line += body.count("\n", position, match.start())
+                    position = match.start()
+                    if line == last_line:
+                        continue
+                    if len(hits) >= max_results:
+                        return hits, searched, True
+                    last_line = line
+                    start = body.rfind("\n", 0, match.start()) + 1
+                    end = body.find("\n", match.start())
+                    hits.append(SearchHit(path, line, body[start:end if end >= 0 else len(body)][:LINE_CHARS]))
+        return hits, searched, False
+
+    def find_files(self, pattern: str, max_results: int = 200) -> Tuple[List[str], int]:
+        """Paths matching a glob (``*``, ``?``, ``[...]``) or containing a substring.
+
+        Returns:
+            (paths, total number of matches)
+        """
+        self.update()
+        with self._lock:
+            if any(char in pattern for char in "*?["):
+                rows = self._conn.execute("SELECT path FROM files WHERE path GLOB ? ORDER BY path",
+                                          (_sql_glob(pattern),)).fetchall()
+                paths = [path for path, in rows]
+            else:
+                like = "%" + pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                rows = self._conn.execute("SELECT path FROM files WHERE path LIKE ? ESCAPE '\\'",
+                                          (like,)).fetchall()
+                needle = pattern.lower()
+                # Matches in the file name first, then shorter paths
+                paths = sorted((path for path, in rows),
+                               key=lambda p: (needle not in p.rsplit("/", 1)[-1].lower(), len(p), p))
+        return paths[:max_results], len(paths)
+
+    def find_symbol(self, name: str, kind: Optional[str] = None, max_results: int = 50) -> List[SymbolHit]:
+        """Definitions named ``name`` (case-insensitive), or else starting with or containing it."""
+        self.update()
+        escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        kind_filter = " AND symbols.kind = ?" if kind else ""
+        with self._lock:
+            for condition, value in (("symbols.name = ? COLLATE NOCASE", name),
+                                     ("symbols.name LIKE ? ESCAPE '\\'", escaped + "%"),
+                                     ("symbols.name LIKE ? ESCAPE '\\'", "%" + escaped + "%")):
+                rows = self._conn.execute(
+                    "SELECT symbols.name, symbols.kind, files.path, symbols.line, symbols.text FROM symbols "
+                    f"JOIN files ON files.id = symbols.file_id WHERE {condition}{kind_filter} "
+                    "ORDER BY files.path, symbols.line LIMIT ?",
+                    [value] + ([kind] if kind else []) + [max_results]).fetchall()
+                if rows:
+                    return [SymbolHit(*row) for row in rows]
+        return []
+
+    def status(self) -> Dict[str, object]:
+        """Size and freshness of the index."""
+        with self._lock:
+            files = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+            indexed = self._conn.execute("SELECT COUNT(*) FROM content").fetchone()[0]
+            symbols = self._conn.execute("SELECT COUNT(*) FROM symbols").fetchone()[0]
+            synced_at = float(self._meta("synced_at") or 0)
+        try:
+            db_bytes = sum(os.path.getsize(self.db_path + suffix) for suffix in ("", "-wal")
+                           if os.path.exists(self.db_path + suffix))
+        except OSError:
+            db_bytes = 0
+        return {"root": self.root, "files": files[0], "bytes": files[1], "content_indexed": indexed,
+                "symbols": symbols, "mode": self.mode, "synced_at": synced_at, "database": self.db_path,
+                "database_bytes": db_bytes, "last_sync": self.last_sync}
+
+    # ----- internals -----
+
+    @contextlib.contextmanager
+    def _host_lock(self):
+        """Serialize syncs of the same directory across processes (lock file next to the database)."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.db_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def _known(self) -> Dict[str, Tuple[int, int, int]]:
+        return {path: (file_id, size, mtime_ns) for file_id, path, size, mtime_ns
+                in self._conn.execute("SELECT id, path, size, mtime_ns FROM files")}
+
+    def _list_files(self) -> Dict[str, os.stat_result]:
+        """Files to index with their stat, from git when possible."""
+        listed: Dict[str, os.stat_result] = {}
+        for path in self._git_files() or self._walk(""):
+            if len(listed) >= self.max_files:
+                logger.warning(f"Index of {self.root} is limited to {self.max_files} files")
+                break
+            if any(part in SKIPPED_DIRS for part in path.split("/")[:-1]):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, path))
+            except OSError:
+                continue
+            if S_ISREG(stat.st_mode):
+                listed[path] = stat
+        return listed
+
+    def _git_files(self) -> Optional[List[str]]:
+        """Tracked and untracked, non-ignored files, or None outside a git checkout."""
+        if not os.path.exists(os.path.join(self.root, ".git")):
+            return None
+        try:
+            output = subprocess.run(["git", "-C", self.root, "ls-files", "-co", "--exclude-standard", "-z"],
+                                    capture_output=True, timeout=60, check=True).stdout
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.debug(f"git ls-files failed in {self.root}: {e}")
+            return None
+        return [os.fsdecode(path) for path in output.split(b"\0") if path]
+
+    def _walk(self, rel_dir: str) -> Iterator[str]:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(self.root, rel_dir)):
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIPPED_DIRS)
+            rel = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            for filename in sorted(filenames):
+                yield filename if rel == "." else f"{rel}/{filename}"
+
+    @staticmethod
+    def _listed_dirs(paths) -> Set[str]:
+        dirs = {""}
+        for path in paths:
+            while "/" in path:
+                path = path.rsplit("/", 1)[0]
+                if path in dirs:
+                    break
+                dirs.add(path)
+        return dirs
+
+    def _start_watcher(self, dirs: Set[str]):
+        try:
+            watcher = _Inotify()
+        except (OSError, AttributeError) as e:  # No inotify (not Linux) or no libc
+            logger.info(f"Index of {self.root}: change watching unavailable ({e}), rescanning by stat")
+            self.watch = False
+            return
+        try:
+            for rel_dir in sorted(dirs):
+                watcher.add(os.path.join(self.root, rel_dir), rel_dir)
+        except OSError as e:
+            watcher.close()
+            logger.info(f"Index of {self.root}: cannot watch {len(dirs)} directories ({e}), rescanning by stat")
+            self.watch = False
+            return
+        self._watcher = watcher
+        self.mode = "inotify"
+
+    def _apply(self, dirty: Set[str]):
+        """Index the paths reported by inotify: changed files, new directories and removals.
+
+        Holds the host lock and reads the known rows under it, as ``sync`` does: another
+        server indexing the same directory may have added the same new file meanwhile.
+        """
+        with self._lock, self._host_lock():
+            read, removed = self._apply_locked(dirty)
+        if read or removed:
+            logger.debug(f"Index of {self.root}: {read} files read, {removed} removed from change events")
+
+    def _apply_locked(self, dirty: Set[str]) -> Tuple[int, int]:
+        known = self._known()
+        read = removed = 0
+        with self._conn:
+            for path in sorted(dirty):
+                if any(part in SKIPPED_DIRS for part in path.split("/")):
+                    continue
+                full = os.path.join(self.root, path)
+                if os.path.isdir(full):
+                    new_files = list(self._walk(path))
+                    for rel_dir in sorted(self._listed_dirs(new_files) | {path}):
+                        if rel_dir and rel_dir not in self._watcher.dirs.values():
+                            with contextlib.suppress(OSError):
+                                self._watcher.add(os.path.join(self.root, rel_dir), rel_dir)
+                    candidates = new_files
+                else:
+                    candidates = [path]
+                for candidate in candidates:
+                    try:
+                        stat = os.stat(os.path.join(self.root, candidate))
+                    except OSError:
+                        stat = None
+                    row = known.get(candidate)
+                    if stat is None or not os.path.isfile(os.path.join(self.root, candidate)):
+                        # Deleted, or a directory moved away: drop it and everything below it
+                        prefix = candidate + "/"
+                        for known_path in [p for p in known if p == candidate or p.startswith(prefix)]:
+                            self._delete(known.pop(known_path)[0])
+                            removed += 1
+                    elif row is None or row[1:] != (stat.st_size, stat.st_mtime_ns):
+                        self._index(candidate, stat, row[0] if row else None)
+                        read += 1
+        return read, removed
+
+    def _delete(self, file_id: int):
+        self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        self._conn.execute("DELETE FROM content WHERE rowid = ?", (file_id,))
+        self._conn.execute("DELETE FROM symbols WHERE file_id = ?", (file_id,))
+
+    def _index(self, path: str, stat: os.stat_result, file_id: Optional[int]):
+        """(Re)index one file's content and symbols."""
+        text = None
+        if stat.st_size <= self.max_file_bytes:
+            try:
+                with open(os.path.join(self.root, path), "rb") as f:
+                    data = f.read()
+                if b"\0" not in data[:BINARY_SNIFF_BYTES]:
+                    text = data.decode("utf-8", errors="replace")
+            except OSError as e:
+                logger.debug(f"Cannot read {path} for the index: {e}")
+        if file_id is None:
+            file_id = self._conn.execute("INSERT INTO files (path, size, mtime_ns) VALUES (?, ?, ?)",
+                                         (path, stat.st_size, stat.st_mtime_ns)).lastrowid
+        else:
+            self._conn.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE id = ?",
+                               (stat.st_size, stat.st_mtime_ns, file_id))
+            self._conn.execute("DELETE FROM content WHERE rowid = ?", (file_id,))
+            self._conn.execute("DELETE FROM symbols WHERE file_id = ?", (file_id,))
+        if text is None:
+            return
+        self._conn.execute("INSERT INTO content (rowid, body) VALUES (?, ?)", (file_id, text))
+        patterns = _SYMBOL_PATTERNS.get(path.rsplit(".", 1)[-1].lower() if "." in path else "")
+        if patterns:
+            self._conn.executemany("INSERT INTO symbols VALUES (?, ?, ?, ?, ?)",
+                                   [(name, kind, file_id, line, line_text)
+                                    for name, kind, line, line_text in self._symbols(text, patterns)])
+
+    @staticmethod
+    def _symbols(text: str, patterns) -> Iterator[Tuple[str, str, int, str]]:
+        for pattern, default_kind in patterns:
+            line, position = 1, 0
+            for match in pattern.finditer(text):
+                line += text.count("\n", position, match.start())
+                position = match.start()
+                end = text.find("\n", match.start())
+                line_text = text[match.start():end if end >= 0 else len(text)].strip()[:LINE_CHARS]
+                yield match.group("name"), default_kind or match.group("kind"), line, line_text
@@ -0,0 +1,379 @@
+"""
+Resource Governor for Task-Agents MCP Server
+
+Applies per-agent resource profiles to Claude CLI subprocesses on Linux:
+CPU niceness, rlimits (open files, and data size as the memory limit of
+last resort) and, when a delegated cgroup v2 hierarchy is available, a
+per-run cgroup with ``cpu.weight`` and ``memory.max``. Also measures each run's peak memory and CPU time, from the
+run's cgroup when there is one and, if enabled, by sampling ``/proc`` otherwise.
+
+A profile is declared in the agent frontmatter:
+
+    optional:
+      resources:
+        priority: batch          # interactive | normal | batch
+        nice: 15
+        max-memory: 8G           # cgroup memory.max, else RLIMIT_DATA of each process
+        max-open-files: 4096     # RLIMIT_NOFILE
+        cpu-weight: 25           # cgroup cpu.weight (1-10000, default 100)
+        memory-max: 2G           # cgroup memory.max
+"""
+
+import asyncio
+import logging
+import os
+import re
+import shlex
+import shutil
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Defaults implied by a priority class: (nice, cgroup cpu.weight). A negative
+# nice needs CAP_SYS_NICE and is silently skipped without it.
+PRIORITY_PRESETS = {
+    "interactive": (-5, 400),
+    "normal": (0, 100),
+    "batch": (10, 25),
+}
+
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def parse_size(value: Any) -> Optional[int]:
+    """Parse a byte size like ``512M``, ``4G`` or ``1048576``."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if value > 0 else None
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*', str(value), re.I)
+    if not match:
+        raise ValueError(f"invalid size '{value}'")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+@dataclass
+class ResourceProfile:
+    """Resource limits for the CLI runs of one agent."""
+    priority: str = "normal"
+    nice: Optional[int] = None  # Niceness added to the CLI process
+    max_memory: Optional[int] = None  # Bytes: cgroup memory.max, RLIMIT_DATA without a cgroup
+    max_open_files: Optional[int] = None  # RLIMIT_NOFILE
+    cpu_weight: Optional[int] = None  # cgroup v2 cpu.weight
+    memory_max: Optional[int] = None  # cgroup v2 memory.max in bytes
+
+    @classmethod
+    def from_frontmatter(cls, data: Dict[str, Any]) -> "ResourceProfile":
+        """Build a profile from the ``resources`` block, filling in priority defaults.
+
+        Raises:
+            ValueError: If a value is malformed
+        """
+        def get(key):
+            return data.get(key, data.get(key.replace('-', '_')))
+
+        priority = str(get('priority') or 'normal').strip().lower()
+        if priority not in PRIORITY_PRESETS:
+            raise ValueError(f"unknown priority '{priority}' (expected {', '.join(PRIORITY_PRESETS)})")
+        default_nice, default_weight = PRIORITY_PRESETS[priority]
+
+        nice = get('nice')
+        cpu_weight = get('cpu-weight')
+        max_open_files = get('max-open-files')
+        profile = cls(
+            priority=priority,
+            nice=int(nice) if nice is not None else default_nice,
+            max_memory=parse_size(get('max-memory')),
+            max_open_files=int(max_open_files) if max_open_files is not None else None,
+            cpu_weight=int(cpu_weight) if cpu_weight is not None else default_weight,
+            memory_max=parse_size(get('memory-max')),
+        )
+        if not 1 <= profile.cpu_weight <= 10000:
+            raise ValueError(f"cpu-weight must be between 1 and 10000, got {profile.cpu_weight}")
+        return profile
+
+    @property
+    def wants_cgroup(self) -> bool:
+        """Whether the profile asks for anything beyond the cgroup defaults."""
+        return self.memory_max is not None or self.max_memory is not None or self.cpu_weight != 100
+
+    @property
+    def cgroup_memory_max(self) -> Optional[int]:
+        """memory.max for the run's cgroup: the lower of ``memory-max`` and ``max-memory``."""
+        limits = [limit for limit in (self.memory_max, self.max_memory) if limit is not None]
+        return min(limits) if limits else None
+
+
+@dataclass
+class ResourceUsage:
+    """Measured resource use of one CLI run (including its child processes)."""
+    peak_rss_bytes: Optional[int] = None
+    cpu_seconds: Optional[float] = None
+    source: str = "none"  # "cgroup", "proc" or "none"
+
+
+def limit_command(cmd: List[str], profile: Optional[ResourceProfile], cgroup_path: Optional[Path]) -> List[str]:
+    """Wrap ``cmd`` in a small shell that applies the profile and then execs the CLI.
+
+    The shell joins the run's cgroup, lowers its rlimits and execs the CLI
+    under ``nice``, so every descendant is limited and accounted from the
+    start. Nothing runs in the forked child before exec (the server is
+    multi-threaded), and a limit that cannot be applied is skipped instead of
+    stopping the agent from running.
+
+    ``max-memory`` is left to the cgroup's ``memory.max`` when there is one.
+    Without it, RLIMIT_DATA is the fallback: it counts memory a process has
+    made writable, whereas RLIMIT_AS would count the address space V8 only
+    reserves and make the CLI abort at startup.
+    """
+    steps = []
+    if cgroup_path:
+        steps.append(f"{{ echo $$ > {shlex.quote(str(cgroup_path / 'cgroup.procs'))}; }} 2>/dev/null")
+    if profile is not None and resource is not None:
+        data_limit = profile.max_memory
+        if cgroup_path and (cgroup_path / "memory.max").exists():
+            data_limit = None
+        # ulimit takes KiB for -d; values above the hard limit are clamped to it, as setrlimit would refuse them
+        for flag, limit, value, unit in (("-d", resource.RLIMIT_DATA, data_limit, 1024),
+                                         ("-n", resource.RLIMIT_NOFILE, profile.max_open_files, 1)):
+            if value:
+                _, hard = resource.getrlimit(limit)
+                if hard != resource.RLIM_INFINITY:
+                    value = min(value, hard)
+                steps.append(f"ulimit -S {flag} {max(1, value // unit)} 2>/dev/null")
+    nice = _permitted_nice(profile.nice) if profile is not None and profile.nice else 0
+    if not steps and not nice:
+        return cmd
+    steps.append(f"exec nice -n {nice} \"$@\"" if nice else 'exec "$@"')
+    return ["/bin/sh", "-c", "; ".join(steps), "sh", *cmd]
+
+
+def _permitted_nice(adjustment: int) -> int:
+    """The niceness adjustment this process may apply (0 if a needed privilege is missing)."""
+    if adjustment >= 0:
+        return adjustment if shutil.which("nice") else 0
+    # Raising priority needs CAP_SYS_NICE or a high enough RLIMIT_NICE
+    current = os.getpriority(os.PRIO_PROCESS, 0)
+    target = max(-20, current + adjustment)
+    allowed = os.geteuid() == 0
+    if not allowed and resource is not None and hasattr(resource, "RLIMIT_NICE"):
+        allowed = target >= 20 - resource.getrlimit(resource.RLIMIT_NICE)[0]
+    return target - current if allowed and shutil.which("nice") else 0
+
+
+class CgroupManager:
+    """Creates per-run cgroups under a delegated cgroup v2 subtree.
+
+    The subtree is ``TASK_AGENTS_CGROUP_ROOT`` if set. The server's own
+    cgroup (e.g. under ``systemd-run --user -p Delegate=yes``) is only used
+    with ``TASK_AGENTS_CGROUP_MOVE_SERVER=1``: cgroup v2 only allows
+    controllers to be enabled for children of a cgroup without processes of
+    its own, so the server has to move itself into a ``server`` leaf first,
+    which changes where the client's process tree sits in the hierarchy.
+    """
+
+    def __init__(self, root: Optional[str] = None, move_server: Optional[bool] = None):
+        self.root_setting = root if root is not None else os.environ.get('TASK_AGENTS_CGROUP_ROOT')
+        self.move_server = move_server if move_server is not None else (
+            os.environ.get('TASK_AGENTS_CGROUP_MOVE_SERVER', '').strip().lower() in ('1', 'true', 'yes', 'on'))
+        self.root: Optional[Path] = None
+        self.checked = False
+        self.unavailable_reason: Optional[str] = None
+
+    def available(self) -> bool:
+        if not self.checked:
+            self.checked = True
+            try:
+                self._setup()
+            except OSError as e:
+                self.unavailable_reason = str(e)
+                self.root = None
+            if self.root is None:
+                logger.info(f"cgroup v2 limits unavailable: {self.unavailable_reason}")
+            else:
+                logger.info(f"Using cgroup v2 subtree {self.root} for agent runs")
+        return self.root is not None
+
+    def _setup(self):
+        mount = Path("/sys/fs/cgroup")
+        if not (mount / "cgroup.controllers").exists():
+            self.unavailable_reason = "no cgroup v2 hierarchy at /sys/fs/cgroup"
+            return
+
+        if self.root_setting:
+            root = Path(self.root_setting)
+            if not root.is_absolute():
+                root = mount / root
+            root.mkdir(exist_ok=True)
+        else:
+            own = Path("/proc/self/cgroup").read_text().strip().split("::", 1)[-1]
+            root = mount / own.lstrip("/")
+            if not os.access(root / "cgroup.subtree_control", os.W_OK):
+                self.unavailable_reason = f"own cgroup {root} is not delegated (set TASK_AGENTS_CGROUP_ROOT)"
+                return
+            if not self.move_server:
+                self.unavailable_reason = (f"no TASK_AGENTS_CGROUP_ROOT, and using the own cgroup {root} needs "
+                                           f"TASK_AGENTS_CGROUP_MOVE_SERVER=1")
+                return
+            # Leave the cgroup so controllers can be enabled for its children
+            leaf = root / "server"
+            logger.warning(f"Moving the server (pid {os.getpid()}) from cgroup {root} into {leaf} "
+                           f"(TASK_AGENTS_CGROUP_MOVE_SERVER)")
+            leaf.mkdir(exist_ok=True)
+            (leaf / "cgroup.procs").write_text(str(os.getpid()))
+
+        available = set((root / "cgroup.controllers").read_text().split())
+        wanted = [c for c in ("cpu", "memory") if c in available]
+        if not wanted:
+            self.unavailable_reason = f"cpu and memory controllers not available in {root}"
+            return
+        (root / "cgroup.subtree_control").write_text(" ".join(f"+{c}" for c in wanted))
+        self.root = root
+
+    def create(self, agent_name: str, profile: ResourceProfile) -> Optional[Path]:
+        """Create a cgroup for one run, or None if cgroups are unavailable."""
+        if not self.available():
+            return None
+        slug = re.sub(r'[^a-z0-9]+', '-', agent_name.lower()).strip('-')
+        path = self.root / f"run-{slug}-{uuid.uuid4().hex[:8]}"
+        try:
+            path.mkdir()
+            if profile.cpu_weight is not None and (path / "cpu.weight").exists():
+                (path / "cpu.weight").write_text(str(profile.cpu_weight))
+            if profile.cgroup_memory_max is not None and (path / "memory.max").exists():
+                (path / "memory.max").write_text(str(profile.cgroup_memory_max))
+        except OSError as e:
+            logger.warning(f"Could not create cgroup for {agent_name}: {e}")
+            self.remove(path)
+            return None
+        return path
+
+    @staticmethod
+    def usage(path: Path) -> ResourceUsage:
+        """Peak memory and CPU time of everything that ran in a cgroup."""
+        usage = ResourceUsage(source="cgroup")
+        try:
+            for line in (path / "cpu.stat").read_text().splitlines():
+                key, _, value = line.partition(" ")
+                if key == "usage_usec":
+                    usage.cpu_seconds = int(value) / 1_000_000
+        except OSError:
+            pass
+        try:
+            usage.peak_rss_bytes = int((path / "memory.peak").read_text())  # Linux 5.19+
+        except (OSError, ValueError):
+            pass
+        return usage
+
+    @staticmethod
+    def remove(path: Path):
+        """Kill anything left in a run cgroup and remove it."""
+        try:
+            if (path / "cgroup.kill").exists():
+                (path / "cgroup.kill").write_text("1")
+            for _ in range(20):
+                try:
+                    path.rmdir()
+                    return
+                except OSError:
+                    time.sleep(0.05)
+            logger.debug(f"cgroup {path} still busy, leaving it")
+        except OSError as e:
+            logger.debug(f"Could not remove cgroup {path}: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        self.available()
+        return {"root": str(self.root) if self.root else None, "unavailable_reason": self.unavailable_reason}
+
+
+class ProcessSampler:
+    """Samples memory and CPU time of a CLI's process tree from /proc while it runs.
+
+    Used when no cgroup is available, with TASK_AGENTS_SAMPLE_INTERVAL set.
+    Only the tree under the CLI is read (via /proc/<pid>/task/<tid>/children),
+    in a worker thread. Peak memory is the largest summed RSS seen across the
+    tree; CPU time includes reaped children (cutime/cstime) and is as of the
+    last sample.
+    """
+
+    def __init__(self, pgid: int, interval: float = 1.0):
+        self.pgid = pgid  # The CLI's process group leader: the root of the tree
+        self.interval = interval
+        self.peak_rss = 0
+        self.cpu_seconds = 0.0
+        self.samples = 0
+        self.task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def supported() -> bool:
+        return os.path.exists(f"/proc/self/task/{os.getpid()}/children")
+
+    def start(self):
+        self.task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> ResourceUsage:
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        if not self.samples:
+            return ResourceUsage()
+        return ResourceUsage(peak_rss_bytes=self.peak_rss, cpu_seconds=round(self.cpu_seconds, 3), source="proc")
+
+    async def _loop(self):
+        while True:
+            await asyncio.to_thread(self.sample)
+            await asyncio.sleep(self.interval)
+
+    def _tree(self) -> List[int]:
+        """Pids of the group leader and its descendants."""
+        pids, pending = [], [self.pgid]
+        while pending:
+            pid = pending.pop()
+            pids.append(pid)
+            try:
+                threads = os.listdir(f"/proc/{pid}/task")
+            except OSError:
+                continue
+            for tid in threads:
+                try:
+                    with open(f"/proc/{pid}/task/{tid}/children", "rb") as f:
+                        pending.extend(int(child) for child in f.read().split())
+                except (OSError, ValueError):
+                    continue
+        return pids
+
+    def sample(self):
+        rss_pages = 0
+        cpu_ticks = 0
+        found = False
+        for pid in self._tree():
+            try:
+                with open(f"/proc/{pid}/stat", "rb") as f:
+                    stat = f.read().decode(errors='replace')
+            except OSError:
+                continue
+            # Fields after the parenthesised command name (which may contain spaces)
+            fields = stat[stat.rfind(")") + 2:].split()
+            if len(fields) < 22:
+                continue
+            found = True
+            cpu_ticks += sum(int(v) for v in fields[11:15])  # utime, stime, cutime, cstime
+            rss_pages += int(fields[21])
+        if found:
+            self.samples += 1
+            self.peak_rss = max(self.peak_rss, rss_pages * _PAGE_SIZE)
+            self.cpu_seconds = max(self.cpu_seconds, cpu_ticks / _CLOCK_TICKS)
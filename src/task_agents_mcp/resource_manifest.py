@@ -0,0 +1,270 @@
+"""
+Resource Directory Manifests for Task-Agents MCP Server
+
+Agents with ``resource_dirs`` used to start every run by listing and
+opening files just to learn what their resource directories hold. The
+server now keeps a manifest per directory (path, size and first heading or
+summary line of every file) and adds a compact listing to the agent's
+appended system prompt:
+
+    RESOURCE MANIFEST /work/.bmad-core (3 files):
+    tasks/create-doc.md - Create Document from Template
+    templates/prd-tmpl.yaml - Product Requirements Document
+    ...
+
+Manifests are refreshed at most every TASK_AGENTS_MANIFEST_TTL seconds with
+a stat walk; only the start of files whose size or mtime changed is read
+again. The listing is part of the prompt prefix, so it leaves out sizes:
+editing a file changes it only if its summary line changes. Adding or
+removing files does change it, and with it the cached prefix of the agent's
+next run; keep directories the agents write to out of ``resource_dirs`` (or
+set ``manifest-tokens: 0``). The listing is cut to a token budget: files that
+don't fit are summarized as counts per directory. SHA-1 hashes are only
+computed for the ``task-agent://manifests`` resource, when it is read.
+
+Settings:
+    TASK_AGENTS_MANIFEST_TOKENS   Token budget of the listing for all of an agent's directories
+                                  (default 1500, 0 = off; per agent: ``manifest-tokens``)
+    TASK_AGENTS_MANIFEST_TTL      Seconds between directory rescans (default 2)
+    TASK_AGENTS_MANIFEST_MAX_FILES   Files indexed per directory (default 5000)
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+SKIPPED_DIRS = frozenset({".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".mypy_cache"})
+SUMMARY_BYTES = 4096  # Bytes read from the start of a file to find its summary line
+SUMMARY_CHARS = 80
+
+_HEADING = re.compile(r"^\s*#{1,6}\s+(.+?)\s*#*\s*$")
+_YAML_TITLE = re.compile(r"^\s*(?:title|name|description)\s*:\s*['\"]?(.+?)['\"]?\s*$", re.IGNORECASE)
+
+
+def _summary_line(head: bytes) -> str:
+    """First Markdown heading, YAML title/name, or first line of text ("" for binary files)."""
+    if b"\0" in head:
+        return ""
+    text = head.decode("utf-8", errors="ignore")
+    first = ""
+    in_frontmatter = False
+    for number, line in enumerate(text.splitlines()):
+        stripped = line.strip()
+        if number == 0 and stripped == "---":
+            in_frontmatter = True
+            continue
+        if in_frontmatter and stripped == "---":
+            in_frontmatter = False
+            continue
+        match = _HEADING.match(line) if not in_frontmatter else None
+        if match:
+            return match.group(1)[:SUMMARY_CHARS]
+        match = _YAML_TITLE.match(line)
+        if match:
+            return match.group(1)[:SUMMARY_CHARS]
+        if not first and stripped and not in_frontmatter and not stripped.startswith(("<!--", "```")):
+            first = stripped.lstrip("/#*-> ").strip()
+    return first[:SUMMARY_CHARS]
+
+
+@dataclass
+class ManifestEntry:
+    """One file of a resource directory."""
+    path: str  # Relative to the directory, with forward slashes
+    size: int
+    mtime_ns: int
+    summary: str
+    sha1: Optional[str] = None  # Computed when the full manifest is read
+
+
+class DirectoryManifest:
+    """Incrementally refreshed manifest of one directory."""
+
+    def __init__(self, root: str, max_files: int):
+        self.root = root
+        self.max_files = max_files
+        self.entries: Dict[str, ManifestEntry] = {}
+        self.truncated = False  # The directory has more than max_files files
+        self.scanned_at = 0.0
+        self.version = 0  # Bumped when any entry changes
+        self._rendered: Dict[int, str] = {}  # Budget -> listing at the current version
+
+    def refresh(self) -> bool:
+        """Rescan the directory, re-reading only new and modified files.
+
+        Returns:
+            Whether anything changed
+        """
+        seen = set()
+        changed = 0
+        self.truncated = False
+        for rel_path, stat in self._walk():
+            if len(seen) >= self.max_files:
+                self.truncated = True
+                break
+            seen.add(rel_path)
+            entry = self.entries.get(rel_path)
+            if entry and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+                continue
+            try:
+                self.entries[rel_path] = self._read(rel_path, stat)
+                changed += 1
+            except OSError as e:
+                logger.debug(f"Skipping {rel_path} in manifest of {self.root}: {e}")
+        removed = [path for path in self.entries if path not in seen]
+        for path in removed:
+            del self.entries[path]
+        self.scanned_at = time.monotonic()
+        if changed or removed:
+            self.version += 1
+            self._rendered.clear()
+            logger.info(f"Manifest of {self.root}: {changed} files read, {len(removed)} removed "
+                        f"({len(self.entries)} files)")
+        return bool(changed or removed)
+
+    def render(self, budget_tokens: int) -> str:
+        """Compact listing of the directory within ``budget_tokens`` (cached per version)."""
+        if budget_tokens in self._rendered:
+            return self._rendered[budget_tokens]
+        budget = budget_tokens * CHARS_PER_TOKEN
+        header = f"RESOURCE MANIFEST {self.root} ({len(self.entries)} files):"
+        lines = [header]
+        used = len(header) + 1
+        paths = sorted(self.entries)
+        for index, path in enumerate(paths):
+            entry = self.entries[path]
+            line = path + (f" - {entry.summary}" if entry.summary else "")
+            # Keep room for the line that summarizes the files left out
+            if used + len(line) + 1 > budget - 120:
+                lines.append(self._omitted(paths[index:]))
+                break
+            lines.append(line)
+            used += len(line) + 1
+        else:
+            if self.truncated:
+                lines.append(f"... more files not indexed (over {self.max_files})")
+        listing = "\n".join(lines)
+        self._rendered[budget_tokens] = listing
+        return listing
+
+    def to_dict(self) -> Dict[str, object]:
+        """The full manifest (for resources), hashing files not hashed since they changed."""
+        entries = sorted(list(self.entries.values()), key=lambda e: e.path)
+        return {
+            "root": self.root,
+            "files": len(entries),
+            "bytes": sum(entry.size for entry in entries),
+            "truncated": self.truncated,
+            "entries": [
+                {"path": e.path, "size": e.size, "sha1": self._sha1(e), "summary": e.summary}
+                for e in entries
+            ],
+        }
+
+    @staticmethod
+    def _omitted(paths: List[str]) -> str:
+        folders = Counter(path.rsplit("/", 1)[0] + "/" if "/" in path else "./" for path in paths)
+        parts = [f"{folder} ({count})" for folder, count in folders.most_common(8)]
+        more = f", {len(folders) - 8} more folders" if len(folders) > 8 else ""
+        return f"... {len(paths)} more files in {', '.join(parts)}{more}"
+
+    def _walk(self):
+        """``(relative path, stat)`` of every file, in a stable order."""
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                with os.scandir(os.path.join(self.root, rel_dir)) as it:
+                    items = sorted(it, key=lambda item: item.name)
+            except OSError:
+                continue
+            subdirs = []
+            for item in items:
+                rel_path = f"{rel_dir}/{item.name}" if rel_dir else item.name
+                try:
+                    if item.is_dir(follow_symlinks=False):
+                        if item.name not in SKIPPED_DIRS:
+                            subdirs.append(rel_path)
+                    elif item.is_file():
+                        yield rel_path, item.stat()
+                except OSError:
+                    continue
+            stack.extend(reversed(subdirs))
+
+    def _read(self, rel_path: str, stat: os.stat_result) -> ManifestEntry:
+        with open(os.path.join(self.root, rel_path), "rb") as f:
+            head = f.read(SUMMARY_BYTES)
+        return ManifestEntry(path=rel_path, size=stat.st_size, mtime_ns=stat.st_mtime_ns,
+                             summary=_summary_line(head))
+
+    def _sha1(self, entry: ManifestEntry) -> Optional[str]:
+        """The entry's hash, computed on first use (None if the file is gone)."""
+        if entry.sha1 is None:
+            digest = hashlib.sha1()
+            try:
+                with open(os.path.join(self.root, entry.path), "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(chunk)
+            except OSError as e:
+                logger.debug(f"Cannot hash {entry.path} in manifest of {self.root}: {e}")
+                return None
+            entry.sha1 = digest.hexdigest()[:12]
+        return entry.sha1
+
+
+class ManifestCache:
+    """Manifests of all resource directories in use, shared by the agents."""
+
+    def __init__(self, ttl: Optional[float] = None, max_files: Optional[int] = None,
+                 default_budget: Optional[int] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl: Seconds between rescans of a directory
+            max_files: Files indexed per directory
+            default_budget: Token budget of an agent's listing when its config sets none
+        """
+        self.ttl = ttl if ttl is not None else float(os.environ.get('TASK_AGENTS_MANIFEST_TTL', '2'))
+        self.max_files = max_files or int(os.environ.get('TASK_AGENTS_MANIFEST_MAX_FILES', '5000'))
+        self.default_budget = (default_budget if default_budget is not None
+                               else int(os.environ.get('TASK_AGENTS_MANIFEST_TOKENS', '1500')))
+        self.manifests: Dict[str, DirectoryManifest] = {}
+        self._lock = threading.Lock()  # Refreshes run in worker threads
+
+    def get(self, root: str) -> DirectoryManifest:
+        """The manifest of a directory, rescanned if it is older than the TTL."""
+        with self._lock:
+            manifest = self.manifests.get(root)
+            if manifest is None:
+                manifest = self.manifests[root] = DirectoryManifest(root, self.max_files)
+            if time.monotonic() - manifest.scanned_at >= self.ttl or not manifest.scanned_at:
+                manifest.refresh()
+            return manifest
+
+    def context(self, roots: List[str], budget_tokens: Optional[int] = None) -> Optional[str]:
+        """Listing of several directories for a system prompt, sharing one token budget.
+
+        Args:
+            roots: Absolute paths of existing directories
+            budget_tokens: Token budget (default: the cache's default budget; 0 = no listing)
+
+        Returns:
+            The listing, or None if there is nothing to add
+        """
+        budget = self.default_budget if budget_tokens is None else budget_tokens
+        if budget <= 0 or not roots:
+            return None
+        share = max(1, budget // len(roots))
+        listings = [self.get(root).render(share) for root in roots]
+        return "\n\n".join(listings) + ("\nThese files are listed here already: read the ones you need "
+                                        "directly instead of listing the directories.")
@@ -0,0 +1,291 @@
+"""
+Result Store for Task-Agents MCP Server
+
+Agents that write long documents (PRDs, architecture docs) would otherwise
+return them whole as the tool result, and the client model would have to
+read all of it. Results larger than TASK_AGENTS_SPILL_THRESHOLD bytes are
+written to this store instead; the tool result holds the beginning of the
+text, its size and the URIs to read the rest:
+
+    task-agent://results/{result_id}                      Size, page count and URIs
+    task-agent://results/{result_id}/page/{page}          One page (1-based, split at line breaks)
+    task-agent://results/{result_id}/range/{start}/{end}  Bytes start..end (UTF-8 offsets)
+
+Each result is a text file plus a JSON metadata file with the page offsets,
+so reads seek straight to the requested bytes. Results expire after
+TASK_AGENTS_RESULT_TTL seconds, and the oldest are deleted once the store
+exceeds TASK_AGENTS_RESULT_QUOTA_MB.
+
+Settings:
+    TASK_AGENTS_SPILL_THRESHOLD    Result size in bytes above which results are stored (default 32768, 0 = never)
+    TASK_AGENTS_SPILL_HEAD         Characters of the result kept in the tool response (default 2000)
+    TASK_AGENTS_RESULT_DIR         Store directory (default /tmp/task_agents_results-<agents dir digest>)
+    TASK_AGENTS_RESULT_PAGE_SIZE   Target page size in bytes (default 16384)
+    TASK_AGENTS_RESULT_TTL         Seconds a result is kept (default 86400)
+    TASK_AGENTS_RESULT_QUOTA_MB    Disk quota of the store (default 256)
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RESULT_URI_PREFIX = "task-agent://results"
+BYTES_PER_TOKEN = 4  # Rough estimate for English text and code
+
+_RESULT_ID = re.compile(r"^[0-9a-f]{16}$")
+
+
+def result_uri(result_id: str, part: str = "") -> str:
+    """Build the resource URI of a stored result, or of one part (page/N, range/S/E) of it."""
+    return f"{RESULT_URI_PREFIX}/{result_id}" + (f"/{part}" if part else "")
+
+
+def page_offsets(data: bytes, page_size: int) -> List[int]:
+    """Start offsets of the pages of ``data``, breaking at the last newline of each page when there is one."""
+    offsets = [0]
+    start = 0
+    while len(data) - start > page_size:
+        end = data.rfind(b"\n", start, start + page_size) + 1
+        if end <= start:
+            end = _char_boundary(data, start + page_size)
+        offsets.append(end)
+        start = end
+    return offsets
+
+
+def _char_boundary(data: bytes, offset: int) -> int:
+    """The nearest offset at or before ``offset`` that doesn't split a UTF-8 character."""
+    offset = max(0, min(offset, len(data)))
+    while 0 < offset < len(data) and (data[offset] & 0xC0) == 0x80:
+        offset -= 1
+    return offset
+
+
+@dataclass
+class StoredResult:
+    """Metadata of one stored result."""
+    result_id: str
+    agent: str
+    created_at: float
+    expires_at: float
+    size: int  # Bytes (UTF-8)
+    chars: int
+    lines: int
+    pages: List[int] = field(default_factory=list)  # Byte offset where each page starts
+
+    @property
+    def tokens(self) -> int:
+        return self.size // BYTES_PER_TOKEN
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "result_id": self.result_id,
+            "agent": self.agent,
+            "created_at": self.created_at,
+            "expires_at": self.expires_at,
+            "bytes": self.size,
+            "estimated_tokens": self.tokens,
+            "lines": self.lines,
+            "pages": len(self.pages),
+            "page_uri": result_uri(self.result_id, "page/{page}"),
+            "range_uri": result_uri(self.result_id, "range/{start}/{end}"),
+        }
+
+
+class ResultStore:
+    """On-disk store of large agent results with paged and ranged reads."""
+
+    def __init__(self, directory: Path, threshold: Optional[int] = None, head_chars: Optional[int] = None,
+                 page_size: Optional[int] = None, ttl: Optional[float] = None, quota: Optional[int] = None):
+        """
+        Initialize the store.
+
+        Args:
+            directory: Where results are written
+            threshold: Result size in bytes above which results are stored (0 = never)
+            head_chars: Characters of a stored result kept in the tool response
+            page_size: Target page size in bytes
+            ttl: Seconds a result is kept
+            quota: Total bytes the store may use
+        """
+        env = os.environ.get
+        self.directory = Path(directory)
+        self.threshold = threshold if threshold is not None else int(env('TASK_AGENTS_SPILL_THRESHOLD', '32768'))
+        self.head_chars = head_chars if head_chars is not None else int(env('TASK_AGENTS_SPILL_HEAD', '2000'))
+        self.page_size = page_size or int(env('TASK_AGENTS_RESULT_PAGE_SIZE', '16384'))
+        self.ttl = ttl if ttl is not None else float(env('TASK_AGENTS_RESULT_TTL', '86400'))
+        self.quota = quota if quota is not None else int(float(env('TASK_AGENTS_RESULT_QUOTA_MB', '256')) * 1024 * 1024)
+        self.stored = 0  # Results stored since startup
+        self._lock = threading.Lock()  # Writes run in worker threads
+
+    def should_spill(self, text: str) -> bool:
+        """Whether a result is large enough to be stored instead of returned."""
+        # Characters are at most 4 bytes, so only encode when the length is ambiguous
+        if self.threshold <= 0 or len(text) * 4 <= self.threshold:
+            return False
+        return len(text) > self.threshold or len(text.encode("utf-8")) > self.threshold
+
+    def put(self, text: str, agent: str) -> StoredResult:
+        """Store a result and enforce expiry and the quota.
+
+        Args:
+            text: The full result text
+            agent: Display name of the agent that produced it
+
+        Returns:
+            The stored result's metadata
+        """
+        data = text.encode("utf-8")
+        now = time.time()
+        stored = StoredResult(
+            result_id=uuid.uuid4().hex[:16],
+            agent=agent,
+            created_at=now,
+            expires_at=now + self.ttl,
+            size=len(data),
+            chars=len(text),
+            lines=text.count("\n") + 1,
+            pages=page_offsets(data, self.page_size),
+        )
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            text_path, meta_path = self._paths(stored.result_id)
+            with open(text_path, "wb") as f:
+                f.write(data)
+            # Metadata last: a result without it is incomplete and never served
+            tmp_path = meta_path.with_name(f"{meta_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(asdict(stored), f)
+            os.replace(tmp_path, meta_path)
+            self.stored += 1
+            self._prune()
+        logger.info(f"Stored {stored.size:,} byte result of {agent} as {stored.result_id} "
+                    f"({len(stored.pages)} pages)")
+        return stored
+
+    def get(self, result_id: str) -> Optional[StoredResult]:
+        """Metadata of a result, or None if it is unknown or expired."""
+        if not _RESULT_ID.match(result_id):
+            return None
+        _, meta_path = self._paths(result_id)
+        try:
+            with open(meta_path) as f:
+                stored = StoredResult(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+        return stored if stored.expires_at > time.time() else None
+
+    def read_page(self, result_id: str, page: int) -> Tuple[StoredResult, str]:
+        """One page of a result (1-based).
+
+        Raises:
+            KeyError: The result is unknown or expired
+            IndexError: The page is out of range
+        """
+        stored = self._require(result_id)
+        if not 1 <= page <= len(stored.pages):
+            raise IndexError(f"Page {page} out of range (1-{len(stored.pages)})")
+        start = stored.pages[page - 1]
+        end = stored.pages[page] if page < len(stored.pages) else stored.size
+        return stored, self._read(stored, start, end)
+
+    def read_range(self, result_id: str, start: int, end: int) -> Tuple[StoredResult, str]:
+        """Bytes ``start``..``end`` of a result, widened to whole UTF-8 characters.
+
+        Raises:
+            KeyError: The result is unknown or expired
+            IndexError: The range is empty or starts past the end
+        """
+        stored = self._require(result_id)
+        if start < 0 or end <= start or start >= stored.size:
+            raise IndexError(f"Invalid range {start}-{end} (result has {stored.size} bytes)")
+        return stored, self._read(stored, start, min(end, stored.size))
+
+    def head(self, text: str) -> str:
+        """The beginning of a result for the tool response, cut at a line break when possible."""
+        if len(text) <= self.head_chars:
+            return text
+        cut = text.rfind("\n", 0, self.head_chars)
+        return text[:cut if cut > self.head_chars // 2 else self.head_chars].rstrip()
+
+    def summary(self) -> Dict[str, Any]:
+        """Usage of the store (for status resources)."""
+        results, size = 0, 0
+        for path in self._meta_files():
+            results += 1
+            size += self._size_of(path)
+        return {"directory": str(self.directory), "results": results, "bytes": size,
+                "quota_bytes": self.quota, "threshold_bytes": self.threshold, "stored_since_start": self.stored}
+
+    def _require(self, result_id: str) -> StoredResult:
+        stored = self.get(result_id)
+        if stored is None:
+            raise KeyError(result_id)
+        return stored
+
+    def _read(self, stored: StoredResult, start: int, end: int) -> str:
+        text_path, _ = self._paths(stored.result_id)
+        # Read up to 3 bytes more on each side to complete characters split by the range
+        begin = max(0, start - 3)
+        with open(text_path, "rb") as f:
+            f.seek(begin)
+            chunk = f.read(end - begin + 3)
+        first = _char_boundary(chunk, start - begin)
+        last = end - begin
+        while last < len(chunk) and (chunk[last] & 0xC0) == 0x80:
+            last += 1
+        return chunk[first:last].decode("utf-8", errors="replace")
+
+    def _paths(self, result_id: str) -> Tuple[Path, Path]:
+        return self.directory / f"{result_id}.txt", self.directory / f"{result_id}.json"
+
+    def _meta_files(self) -> List[Path]:
+        try:
+            return list(self.directory.glob("*.json"))
+        except OSError:
+            return []
+
+    def _size_of(self, meta_path: Path) -> int:
+        try:
+            return meta_path.stat().st_size + meta_path.with_suffix(".txt").stat().st_size
+        except OSError:
+            return 0
+
+    def _prune(self):
+        """Delete expired results, then the oldest ones while over the quota."""
+        now = time.time()
+        entries = []
+        for meta_path in self._meta_files():
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                expires_at, created_at = meta["expires_at"], meta["created_at"]
+            except (OSError, ValueError, KeyError):
+                continue
+            if expires_at <= now:
+                self._delete(meta_path)
+            else:
+                entries.append((created_at, meta_path, self._size_of(meta_path)))
+        total = sum(size for _, _, size in entries)
+        for _, meta_path, size in sorted(entries):
+            if total <= self.quota:
+                break
+            self._delete(meta_path)
+            total -= size
+
+    def _delete(self, meta_path: Path):
+        for path in (meta_path, meta_path.with_suffix(".txt")):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        logger.info(f"Deleted stored result {meta_path.stem}")
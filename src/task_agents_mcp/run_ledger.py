@@ -0,0 +1,201 @@
+"""
+Run Ledger for Task-Agents MCP Server
+
+Record of completed agent runs (timings, token usage, tools, outcome).
+Recent records are kept in memory per agent so latency percentiles can be
+computed cheaply, and are persisted as JSON lines (one file per agents
+directory, since agents are keyed by display name) for offline analysis.
+
+Appends are written by a background thread. The file is bounded: once it
+holds twice the in-memory window, it is rewritten with just the window.
+"""
+
+import json
+import logging
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict, fields
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RunRecord:
+    """One finished Claude CLI run."""
+    agent: str  # Display name of the agent
+    model: str
+    outcome: str  # "success" or an error class from reliability.classify_error
+    started_at: float = field(default_factory=time.time)  # Epoch seconds
+    duration: float = 0.0  # Seconds from spawn to process exit
+    time_to_result: Optional[float] = None  # Seconds from spawn to the result event
+    time_to_first_token: Optional[float] = None  # Seconds from spawn to the first text delta
+    prompt_chars: int = 0
+    output_chars: int = 0
+    tool_count: int = 0
+    tools_used: List[str] = field(default_factory=list)
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_creation_tokens: int = 0
+    cost_usd: Optional[float] = None
+    session_id: Optional[str] = None
+    hedged: bool = False  # A hedge run was started for this request
+    hedge_winner: Optional[str] = None  # "primary" or "hedge"
+    hedge_threshold: Optional[float] = None  # Seconds waited before hedging
+    hedge_extra_tokens: int = 0  # Tokens spent by the losing run
+    routing_policy: Optional[str] = None  # Set when the model was picked by adaptive routing
+    primed: bool = False  # Forked from a primed base session
+    peak_rss_bytes: Optional[int] = None  # Peak memory of the CLI and its children
+    cpu_seconds: Optional[float] = None  # CPU time of the CLI and its children
+    slot_wait: float = 0.0  # Seconds spent waiting for a host concurrency slot
+    worker: str = "local"  # "local" or the address of the remote worker that ran the CLI
+    priority: Optional[str] = None  # Priority class of the request
+    client: Optional[str] = None  # Client that made the request
+    queue_wait: float = 0.0  # Seconds the request waited in the scheduler before running
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RunRecord":
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in known})
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of ``values`` (q in 0..1)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q * len(ordered)))
+    return ordered[rank - 1]
+
+
+class RunLedger:
+    """Persistent run history with an in-memory window per agent."""
+
+    def __init__(self, storage_path: Optional[Path] = None, window: int = 200):
+        """Initialize the ledger.
+
+        Args:
+            storage_path: JSON-lines file to append records to. If None,
+                          records are kept in memory only.
+            window: Number of recent records kept in memory per agent
+        """
+        self.storage_path = storage_path
+        self.window = window
+        self.records: Dict[str, Deque[RunRecord]] = {}
+        self.file_records = 0  # Lines in the storage file, appended or pending
+        # One writer thread, so appends and compactions stay in order
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="run-ledger")
+
+        if self.storage_path and self.storage_path.exists():
+            self._load_records()
+
+    def record(self, run_record: RunRecord):
+        """Add a finished run to the ledger (the file is written in the background)."""
+        self._remember(run_record)
+        if not self.storage_path:
+            return
+        self.file_records += 1
+        if self.file_records > 2 * self.window * len(self.records):
+            # Keep only what is in memory: the last ``window`` records of each agent
+            kept = sorted((r for records in self.records.values() for r in records), key=lambda r: r.started_at)
+            self.file_records = len(kept)
+            self.writer.submit(self._rewrite, kept)
+        else:
+            self.writer.submit(self._append, run_record)
+
+    def flush(self):
+        """Wait until the records added so far are written."""
+        self.writer.submit(lambda: None).result()
+
+    def _append(self, run_record: RunRecord):
+        try:
+            self.storage_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.storage_path, 'a') as f:
+                f.write(json.dumps(asdict(run_record)) + '\n')
+        except Exception as e:
+            logger.error(f"Failed to append run record: {e}")
+
+    def _rewrite(self, records: List[RunRecord]):
+        try:
+            self.storage_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.storage_path.with_name(f"{self.storage_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'w') as f:
+                f.writelines(json.dumps(asdict(r)) + '\n' for r in records)
+            os.replace(tmp_path, self.storage_path)
+            logger.debug(f"Compacted the run ledger to {len(records)} records")
+        except Exception as e:
+            logger.error(f"Failed to compact the run ledger: {e}")
+
+    def recent(self, agent: str, model: Optional[str] = None,
+               outcome: Optional[str] = None) -> List[RunRecord]:
+        """Recent records for an agent, optionally filtered by model and outcome."""
+        return [
+            r for r in self.records.get(agent, ())
+            if (model is None or r.model == model) and (outcome is None or r.outcome == outcome)
+        ]
+
+    def latency_percentile(self, agent: str, q: float, model: Optional[str] = None,
+                           min_samples: int = 10) -> Optional[float]:
+        """Percentile of time-to-result over recent successful runs.
+
+        Returns None until at least ``min_samples`` runs have been recorded.
+        """
+        values = [
+            r.time_to_result if r.time_to_result is not None else r.duration
+            for r in self.recent(agent, model=model, outcome="success")
+            if not r.hedged
+        ]
+        if len(values) < min_samples:
+            return None
+        return percentile(values, q)
+
+    def cache_summary(self, agent: str) -> Dict[str, Dict[str, Any]]:
+        """Compare primed and cold successful runs: cache-read ratio and time to first token."""
+        summary = {}
+        for label, primed in (("primed", True), ("cold", False)):
+            runs = [r for r in self.recent(agent, outcome="success") if r.primed == primed]
+            ratios = [
+                r.cache_read_tokens / total
+                for r in runs
+                if (total := r.input_tokens + r.cache_read_tokens + r.cache_creation_tokens)
+            ]
+            ttfts = [r.time_to_first_token for r in runs if r.time_to_first_token is not None]
+            summary[label] = {
+                "runs": len(runs),
+                "mean_cache_read_ratio": round(sum(ratios) / len(ratios), 3) if ratios else None,
+                "p50_time_to_first_token": percentile(ttfts, 0.5),
+            }
+        return summary
+
+    def _remember(self, run_record: RunRecord):
+        if run_record.agent not in self.records:
+            self.records[run_record.agent] = deque(maxlen=self.window)
+        self.records[run_record.agent].append(run_record)
+
+    def _load_records(self):
+        """Load the most recent records from storage into memory."""
+        try:
+            with open(self.storage_path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    self.file_records += 1
+                    try:
+                        self._remember(RunRecord.from_dict(json.loads(line)))
+                    except (json.JSONDecodeError, TypeError):
+                        continue
+            total = sum(len(d) for d in self.records.values())
+            logger.info(f"Loaded {total} run records from {self.storage_path}")
+        except Exception as e:
+            logger.error(f"Failed to load run ledger: {e}")
+
+
+def default_ledger_path(configs_digest: str) -> Path:
+    """Ledger file of one agents directory (TASK_AGENTS_LEDGER_PATH overrides it)."""
+    return Path(os.environ.get('TASK_AGENTS_LEDGER_PATH') or f'/tmp/task_agents_ledger-{configs_digest}.jsonl')
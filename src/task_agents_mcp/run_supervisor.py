@@ -0,0 +1,207 @@
+"""
+Run Supervisor for Task-Agents MCP Server
+
+Lets agent runs survive a server restart. With TASK_AGENTS_DETACHED_RUNS=1,
+each agent run's CLI is started detached from the server (see
+``executors.SpooledExecution``), its stream-json output goes to a spool file,
+and a checkpoint records what the server needs to finish the run: the agent,
+prompt, session-chain bookkeeping and the job id. The spool directory holds,
+per run:
+
+- ``<run>.json``: the checkpoint, ``flock``-ed by the server that owns the run
+- ``<run>.out`` / ``<run>.err``: the CLI's stdout and stderr
+- ``<run>.exit``: the CLI's exit code, written when it exits
+
+When a server exits (upgrade, config change, crash) its locks are dropped.
+Another server on the same agents directory, started before or after, finds
+checkpoints nobody holds, adopts them, re-reads the spool from the start,
+waits for the CLI to finish and completes the run: session store, run ledger
+and transcript archive. It serves the response as an async job, under the
+original job id if the run was a job (see ``task-agent://jobs``).
+
+Drain mode (SIGUSR1) stops the server accepting new agent calls and exits
+it once its in-flight runs have finished, or after TASK_AGENTS_DRAIN_TIMEOUT
+seconds, when detached runs are left to the next server. Runs that are not
+detached (remote workers, hedged requests, isolated workspaces, priming and
+compaction) are not handed over.
+
+Settings:
+    TASK_AGENTS_DETACHED_RUNS    1 to run agents detached so runs survive restarts
+    TASK_AGENTS_SPOOL_DIR        Spool directory (default /tmp/task_agents_spool-<agents dir digest>)
+    TASK_AGENTS_ADOPT_INTERVAL   Seconds between checks for runs left by exited servers (default 5)
+    TASK_AGENTS_DRAIN_TIMEOUT    Seconds a drain waits for in-flight runs before exiting (default 600)
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SPOOL_SUFFIXES = (".json", ".out", ".err", ".exit", ".exit.tmp")  # Checkpoint first: it marks the run live
+
+
+@dataclass
+class RunCheckpoint:
+    """What a server needs to finish a detached run it did not start."""
+    agent: str  # Display name of the agent
+    prompt: str
+    working_dir: str
+    model: Optional[str] = None
+    run_id: Optional[str] = None
+    pid: Optional[int] = None  # The CLI's wrapper process (its process group leader)
+    started_at: float = 0.0  # Epoch seconds
+    job_id: Optional[str] = None  # Async job the run belongs to
+    on_chain: bool = False  # An exchange of the agent's session chain
+    was_resume: bool = False
+    seeded_from_summary: bool = False
+    resumed_from: Optional[str] = None  # Session the run resumed or forked
+    cgroup_path: Optional[str] = None
+    server_pid: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RunCheckpoint":
+        names = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+
+
+class RunSupervisor:
+    """Checkpoints of detached runs, their adoption after a restart, and drain mode."""
+
+    def __init__(self, spool_dir: Path, enabled: Optional[bool] = None):
+        """
+        Initialize the supervisor.
+
+        Args:
+            spool_dir: Directory for spool files and checkpoints
+            enabled: Start agent runs detached (default: TASK_AGENTS_DETACHED_RUNS)
+        """
+        self.spool_dir = Path(spool_dir)
+        if enabled is None:
+            enabled = os.environ.get('TASK_AGENTS_DETACHED_RUNS', '').strip().lower() in ('1', 'true', 'yes', 'on')
+        if enabled and fcntl is None:
+            logger.info("flock not available, agent runs are not detached")
+            enabled = False
+        self.enabled = enabled
+        self.adopt_interval = float(os.environ.get('TASK_AGENTS_ADOPT_INTERVAL', '5'))
+        self.drain_timeout = float(os.environ.get('TASK_AGENTS_DRAIN_TIMEOUT', '600'))
+        self.draining = False
+        self.drain_started: Optional[float] = None
+        self.owned: Dict[str, int] = {}  # Run id -> descriptor holding the checkpoint's lock
+        self.adopted = 0
+        if self.enabled:
+            self.spool_dir.mkdir(parents=True, exist_ok=True, mode=0o700)
+
+    def new_run_id(self) -> str:
+        return f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+
+    def prefix(self, run_id: str) -> Path:
+        """Path prefix of a run's spool files."""
+        return self.spool_dir / run_id
+
+    def register(self, checkpoint: RunCheckpoint):
+        """Write a started run's checkpoint and hold its lock for as long as this server owns the run."""
+        checkpoint.server_pid = os.getpid()
+        fd = os.open(f"{self.prefix(checkpoint.run_id)}.json", os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            os.write(fd, json.dumps(asdict(checkpoint)).encode('utf-8'))
+        except OSError:
+            os.close(fd)
+            raise
+        self.owned[checkpoint.run_id] = fd
+
+    def release(self, run_id: Optional[str]):
+        """Remove a finished run's spool files and checkpoint (safe to call twice)."""
+        if not run_id:
+            return
+        for suffix in SPOOL_SUFFIXES:
+            try:
+                os.unlink(f"{self.prefix(run_id)}{suffix}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove spool file of run {run_id}: {e}")
+        fd = self.owned.pop(run_id, None)
+        if fd is not None:
+            os.close(fd)  # Closing the descriptor drops the flock
+
+    def disown(self, run_id: Optional[str]):
+        """Remove a recorded run's checkpoint but keep its spool files while the CLI is still exiting."""
+        if not run_id:
+            return
+        try:
+            os.unlink(f"{self.prefix(run_id)}.json")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove the checkpoint of run {run_id}: {e}")
+        fd = self.owned.pop(run_id, None)
+        if fd is not None:
+            os.close(fd)
+
+    def adopt_orphans(self) -> List[RunCheckpoint]:
+        """Take over the runs of servers that have exited (checkpoints nobody holds a lock on)."""
+        if fcntl is None or not self.spool_dir.is_dir():
+            return []
+        adopted = []
+        for path in sorted(self.spool_dir.glob("*.json")):
+            run_id = path.stem
+            if run_id in self.owned:
+                continue
+            try:
+                fd = os.open(path, os.O_RDWR)
+            except OSError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (BlockingIOError, PermissionError):
+                os.close(fd)  # Its server is still running
+                continue
+            if os.fstat(fd).st_nlink == 0:
+                os.close(fd)  # Released by its server while we were looking
+                continue
+            try:
+                checkpoint = RunCheckpoint.from_dict(json.loads(os.pread(fd, 1 << 20, 0)))
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f"Discarding unreadable run checkpoint {path}: {e}")
+                self.owned[run_id] = fd
+                self.release(run_id)
+                continue
+            self.owned[run_id] = fd
+            self.adopted += 1
+            adopted.append(checkpoint)
+            logger.info(f"Adopted run {run_id} of {checkpoint.agent} (pid {checkpoint.pid}) "
+                        f"from server {checkpoint.server_pid}")
+        return adopted
+
+    def start_drain(self) -> bool:
+        """Stop accepting new work. Returns False if already draining."""
+        if self.draining:
+            return False
+        self.draining = True
+        self.drain_started = time.monotonic()
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Supervisor state for the status resource."""
+        return {
+            "detached_runs": self.enabled,
+            "spool_dir": str(self.spool_dir),
+            "owned_runs": sorted(self.owned),
+            "adopted_since_start": self.adopted,
+            "draining": self.draining,
+            "draining_for_seconds": (round(time.monotonic() - self.drain_started, 1)
+                                     if self.drain_started is not None else None),
+            "drain_timeout": self.drain_timeout,
+        }
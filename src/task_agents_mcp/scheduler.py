@@ -0,0 +1,219 @@
+"""
+Request Scheduler for Task-Agents MCP Server
+
+Orders agent requests when more arrive than can run at once. Every request
+carries a priority class (``interactive``, ``normal`` or ``batch``) and a
+client identity; each (class, client) pair is a flow, and flows share the
+capacity by weighted fair queuing:
+
+- A request is charged its expected run time (the agent's median from the
+  run ledger) divided by its class weight, so a client flooding long batch
+  runs accumulates virtual time quickly and cannot crowd out others.
+- The queued request with the smallest virtual finish time runs next.
+- Starvation protection: a request that has waited longer than
+  ``max_wait`` seconds is served before any fair-queued one, oldest first.
+
+Class weights default to interactive=8, normal=4, batch=1 and can be set
+with ``TASK_AGENTS_CLASS_WEIGHTS="interactive=8,normal=4,batch=1"``.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from .run_ledger import percentile
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CLASSES = ("interactive", "normal", "batch")
+DEFAULT_WEIGHTS = {"interactive": 8.0, "normal": 4.0, "batch": 1.0}
+DEFAULT_PRIORITY = "normal"
+
+
+def parse_weights(value: Optional[str]) -> Dict[str, float]:
+    """Parse ``interactive=8,normal=4,batch=1`` into class weights (missing classes keep defaults)."""
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in (value or "").split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in weights:
+            raise ValueError(f"unknown priority class '{name}'")
+        weights[name] = float(weight)
+        if weights[name] <= 0:
+            raise ValueError(f"weight of '{name}' must be positive")
+    return weights
+
+
+def normalize_priority(priority: Optional[str]) -> Optional[str]:
+    """Validate a priority class name (None passes through).
+
+    Raises:
+        ValueError: If the class is unknown
+    """
+    if priority is None or priority == "":
+        return None
+    priority = str(priority).strip().lower()
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"unknown priority '{priority}' (expected {', '.join(PRIORITY_CLASSES)})")
+    return priority
+
+
+@dataclass
+class Admission:
+    """A request's place in the scheduler, from arrival until it finishes."""
+    priority: str
+    client: str
+    label: str = ""  # Agent name, for the status resource
+    cost: float = 1.0  # Expected run time in seconds
+    finish_tag: float = 0.0
+    enqueued: float = field(default_factory=time.monotonic)
+    queue_wait: float = 0.0  # Seconds spent waiting to be admitted
+    granted: Optional[asyncio.Future] = field(default=None, repr=False)
+
+    @property
+    def flow(self) -> Tuple[str, str]:
+        return (self.priority, self.client)
+
+
+class FairScheduler:
+    """Weighted fair queuing of agent requests across clients and priority classes."""
+
+    def __init__(self, capacity: Union[int, Callable[[], int]] = 4,
+                 weights: Optional[Dict[str, float]] = None,
+                 max_wait: Optional[float] = None, history: int = 500):
+        """
+        Initialize the scheduler.
+
+        Args:
+            capacity: Requests allowed to run at once, or a callable returning it
+                      (re-evaluated on every admission, e.g. as workers come and go)
+            weights: Class weights (default from TASK_AGENTS_CLASS_WEIGHTS)
+            max_wait: Seconds after which a queued request is served first
+                      (TASK_AGENTS_MAX_QUEUE_WAIT, default 120)
+            history: Queue waits kept per class for the percentiles in ``snapshot``
+        """
+        self.capacity = capacity if callable(capacity) else (lambda: capacity)
+        self.weights = weights or parse_weights(os.environ.get('TASK_AGENTS_CLASS_WEIGHTS'))
+        self.max_wait = max_wait if max_wait is not None else float(
+            os.environ.get('TASK_AGENTS_MAX_QUEUE_WAIT', '120'))
+        self.queue: List[Admission] = []
+        self.running: List[Admission] = []
+        self.virtual_time = 0.0
+        self.flow_finish: Dict[Tuple[str, str], float] = {}
+        self.waits: Dict[str, Deque[float]] = {p: deque(maxlen=history) for p in PRIORITY_CLASSES}
+        self.admitted: Dict[str, int] = {p: 0 for p in PRIORITY_CLASSES}
+        self.promoted = 0  # Requests served early by starvation protection
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: str, client: str, label: str = "", cost: float = 1.0,
+                   on_wait: Optional[Callable[[Admission, int], Awaitable[None]]] = None):
+        """Wait for this request's turn and hold a slot while the body runs.
+
+        Args:
+            priority: Priority class
+            client: Client identity (fairness is per client within a class)
+            label: Agent name, for the status resource
+            cost: Expected run time in seconds
+            on_wait: Optional async callback ``(admission, position)`` invoked once if the request queues
+        """
+        admission = self._enqueue(priority, client, label, cost)
+        try:
+            if not admission.granted.done():
+                if on_wait:
+                    await on_wait(admission, self.position(admission))
+                await admission.granted
+        except BaseException:
+            if admission in self.queue:
+                self.queue.remove(admission)
+            elif admission.granted.done() and not admission.granted.cancelled():
+                # Granted while we were being cancelled - give the slot back
+                self._release(admission)
+            raise
+        try:
+            yield admission
+        finally:
+            self._release(admission)
+
+    def _enqueue(self, priority: str, client: str, label: str, cost: float) -> Admission:
+        admission = Admission(priority=priority, client=client, label=label, cost=max(cost, 0.001))
+        admission.granted = asyncio.get_running_loop().create_future()
+        start = max(self.virtual_time, self.flow_finish.get(admission.flow, 0.0))
+        admission.finish_tag = start + admission.cost / self.weights[priority]
+        self.flow_finish[admission.flow] = admission.finish_tag
+        self.queue.append(admission)
+        self._dispatch()
+        return admission
+
+    def _release(self, admission: Admission):
+        if admission in self.running:
+            self.running.remove(admission)
+        if not self.running and not self.queue:
+            # Idle: nobody has a backlog to be fair about
+            self.flow_finish.clear()
+        self._dispatch()
+
+    def _next(self) -> Admission:
+        now = time.monotonic()
+        starving = [a for a in self.queue if now - a.enqueued >= self.max_wait]
+        if starving:
+            self.promoted += 1
+            return min(starving, key=lambda a: a.enqueued)
+        return min(self.queue, key=lambda a: (a.finish_tag, a.enqueued))
+
+    def _dispatch(self):
+        while self.queue and len(self.running) < max(1, self.capacity()):
+            admission = self._next()
+            self.queue.remove(admission)
+            admission.queue_wait = time.monotonic() - admission.enqueued
+            # Virtual time advances to the start tag of the request entering service
+            start_tag = admission.finish_tag - admission.cost / self.weights[admission.priority]
+            self.virtual_time = max(self.virtual_time, start_tag)
+            self.running.append(admission)
+            self.waits[admission.priority].append(admission.queue_wait)
+            self.admitted[admission.priority] += 1
+            if admission.queue_wait > 0.001:
+                logger.info(f"Admitted {admission.label} ({admission.priority}, {admission.client}) "
+                            f"after {admission.queue_wait:.1f}s in queue")
+            admission.granted.set_result(True)
+
+    def position(self, admission: Admission) -> int:
+        """1-based position of a queued request in the current service order."""
+        ordered = sorted(self.queue, key=lambda a: (a.finish_tag, a.enqueued))
+        return ordered.index(admission) + 1 if admission in ordered else 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Queue state and per-class queue-wait percentiles for the status resource."""
+        now = time.monotonic()
+        classes = {}
+        for priority in PRIORITY_CLASSES:
+            waits = list(self.waits[priority])
+            classes[priority] = {
+                "weight": self.weights[priority],
+                "queued": sum(1 for a in self.queue if a.priority == priority),
+                "running": sum(1 for a in self.running if a.priority == priority),
+                "admitted": self.admitted[priority],
+                "wait_p50": round(percentile(waits, 0.5), 3) if waits else None,
+                "wait_p95": round(percentile(waits, 0.95), 3) if waits else None,
+                "wait_max": round(max(waits), 3) if waits else None,
+            }
+        return {
+            "capacity": self.capacity(),
+            "max_wait": self.max_wait,
+            "starvation_promotions": self.promoted,
+            "classes": classes,
+            "queue": [
+                {"agent": a.label, "priority": a.priority, "client": a.client,
+                 "waiting": round(now - a.enqueued, 1)}
+                for a in sorted(self.queue, key=lambda a: (a.finish_tag, a.enqueued))
+            ],
+            "running": [
+                {"agent": a.label, "priority": a.priority, "client": a.client} for a in self.running
+            ],
+        }
@@ -8,24 +8,37 @@ providing direct access to Claude Code CLI with custom configurations.
 This is the multi-tool version where each agent is a separate MCP tool.
 """
 import os
+import asyncio
 import logging
+import signal
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 from fastmcp import FastMCP, Context
-import re
+from fastmcp.exceptions import ResourceError
 
 from .agent_manager import AgentManager
+from .transcript_archive import condense, parse_since
+from .log_pipeline import configure_logging, redact, shutdown_logging
+from .tool_profiler import tool_tokens
+from .progress_model import PROGRESS_INTERVAL, format_seconds
+from .scheduler import normalize_priority
+from .catalog import AgentCatalog, resolve_tool_mode
 from .resource_manager import AgentResourceManager
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('/tmp/task_agents_server.log')
-    ]
+from .job_store import (
+    JobStore, job_uri, JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED
 )
+
+# Look for task-agents directory
+# 1. First check environment variable (for Claude Desktop and other MCP clients)
+# 2. Fall back to current working directory (for Claude Code CLI)
+config_dir = os.environ.get('TASK_AGENTS_PATH')
+if not config_dir:
+    # Default to task-agents subdirectory in current working directory
+    config_dir = os.path.join(os.getcwd(), "task-agents")
+
+# Configure logging (queued, written by a background thread; one log file per agents directory)
+configure_logging(agents_dir=config_dir)
 logger = logging.getLogger(__name__)
 
 # Log startup information
@@ -34,16 +47,26 @@ logger.info(f"Current working directory: {os.getcwd()}")
 logger.info(f"TASK_AGENTS_PATH env: {os.environ.get('TASK_AGENTS_PATH', 'NOT SET')}")
 logger.info(f"CLAUDE_EXECUTABLE_PATH env: {os.environ.get('CLAUDE_EXECUTABLE_PATH', 'NOT SET (will auto-detect)')}")
 
-# Initialize FastMCP server with duplicate resource handling
-mcp = FastMCP("task-agent", on_duplicate_resources="replace")
+# Background tasks started with the server (see server_lifespan)
+adopter_task: Optional[asyncio.Task] = None
+drain_task: Optional[asyncio.Task] = None
 
-# Look for task-agents directory
-# 1. First check environment variable (for Claude Desktop and other MCP clients)
-# 2. Fall back to current working directory (for Claude Code CLI)
-config_dir = os.environ.get('TASK_AGENTS_PATH')
-if not config_dir:
-    # Default to task-agents subdirectory in current working directory
-    config_dir = os.path.join(os.getcwd(), "task-agents")
+
+@asynccontextmanager
+async def server_lifespan(server):
+    """Background work while the server runs: adopting runs of exited servers, and drain on SIGUSR1."""
+    global adopter_task
+    if adopter_task is None or adopter_task.done():
+        adopter_task = asyncio.create_task(adopt_orphaned_runs())
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, start_drain)
+        except (NotImplementedError, RuntimeError, ValueError) as e:
+            logger.debug(f"No SIGUSR1 drain handler: {e}")
+    yield {}
+
+
+# Initialize FastMCP server with duplicate resource handling
+mcp = FastMCP("task-agent", on_duplicate_resources="replace", lifespan=server_lifespan)
 
 # Check if config directory exists
 if not os.path.exists(config_dir):
@@ -82,9 +105,19 @@ agents_info = agent_manager.get_agents_info()
 for name, info in agents_info.items():
     logger.info(f"  - {name}: {info['description']}")
 
+# Large fleets are exposed through a catalog instead of one tool per agent
+catalog = AgentCatalog(agent_manager)
+tool_mode = resolve_tool_mode(len(agent_manager.agents))
+if tool_mode == "catalog":
+    pinned_agents = [name for name, config in agent_manager.agents.items() if catalog.is_pinned(config)]
+    logger.info(f"Catalog mode: {len(pinned_agents)} pinned agent tools, "
+                f"{len(agent_manager.agents) - len(pinned_agents)} agents behind run_agent")
+else:
+    pinned_agents = None
+
 # Initialize resource manager and register resources
 resource_manager = AgentResourceManager(mcp, agent_manager)
-resource_manager.register_all_resources()
+resource_manager.register_all_resources(only=pinned_agents)
 
 
 # ============= HELPER FUNCTIONS =============
@@ -98,61 +131,95 @@ def sanitize_tool_name(agent_name: str) -> str:
     return agent_name.lower().replace(' ', '_').replace('-', '_')
 
 
+def client_identity(ctx: Context) -> str:
+    """Identity of the calling client for fair queuing.
+
+    The ``client_id`` from the request metadata if the client sends one,
+    otherwise the client's name and MCP session.
+    """
+    try:
+        if ctx.client_id:
+            return str(ctx.client_id)
+        params = ctx.session.client_params
+        name = params.clientInfo.name if params and params.clientInfo else "client"
+        return f"{name}:{ctx.session_id[:8]}"
+    except Exception:
+        return "default"
+
+
+class ProgressBridge:
+    """Bridge between an agent run's progress messages and the MCP context.
+
+    Progress and ETA come from the agent's earlier runs (see progress_model.py);
+    the tracker is passed to execute_task, which feeds it the run's events.
+    Progress is reported with every status message and every PROGRESS_INTERVAL
+    seconds while the run is quiet, so long tool calls don't look stalled. Use
+    as an async context manager around the run and pass it as the progress
+    callback.
+    """
+
+    def __init__(self, ctx: Context, agent_config, prompt: str):
+        self.ctx = ctx
+        self.tracker = agent_manager.runtimes.track(agent_config.agent_name, len(prompt))
+        self._ticker: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "ProgressBridge":
+        if PROGRESS_INTERVAL > 0:
+            self._ticker = asyncio.create_task(self._tick())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._ticker:
+            self._ticker.cancel()
+
+    async def __call__(self, message: str):
+        try:
+            # Log if we have a progress token (for debugging)
+            if hasattr(self.ctx, '_progress_token') and self.ctx._progress_token:
+                logger.debug(f"Progress token present: {self.ctx._progress_token}", extra={"sample": "progress"})
+
+            if message.startswith("partial:"):
+                # Streaming text delta from --include-partial-messages
+                await self.ctx.info(message[8:])
+                return
+            await self._report()
+            if "⚠️" in message:
+                # Warning but still complete
+                await self.ctx.warning(message)
+            else:
+                await self.ctx.info(message)
+        except Exception as e:
+            logger.debug(f"Progress bridge error (non-critical): {e}")
+
+    async def _report(self):
+        await self.ctx.report_progress(round(self.tracker.fraction() * 100, 1), 100, self.tracker.describe())
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            if self.tracker.started is not None and self.tracker.finished is None:
+                try:
+                    await self._report()
+                except Exception as e:
+                    logger.debug(f"Progress report error (non-critical): {e}")
+
+
 def create_agent_tool_function(agent_name: str, agent_config):
     """Create a tool function for a specific agent."""
     
     # Check if agent supports session resumption
     if agent_config.resume_session:
         # Create function with session_reset parameter
-        async def agent_tool_impl(prompt: str, ctx: Context, session_reset: bool = False) -> str:
+        async def agent_tool_impl(prompt: str, ctx: Context, session_reset: bool = False,
+                                  allow_fork: bool = False, priority: Optional[str] = None) -> str:
             """Execute agent task with optional session reset."""
             try:
                 logger.info(f"=== {agent_name} Tool Called ===")
                 logger.info(f"Current process working directory: {os.getcwd()}")
-                logger.info(f"Task: {prompt[:100]}...")
+                logger.info(f"Task: {redact(prompt)}")
                 if session_reset:
                     logger.info(f"Session reset requested for {agent_name}")
                 
-                # Create progress bridge function
-                async def progress_bridge(message: str):
-                    """Bridge between agent progress messages and MCP context."""
-                    try:
-                        # Log if we have a progress token (for debugging)
-                        if hasattr(ctx, '_progress_token') and ctx._progress_token:
-                            logger.debug(f"Progress token present: {ctx._progress_token}")
-                        
-                        # Parse different types of progress messages
-                        if "🚀 Starting" in message or "Starting" in message:
-                            await ctx.report_progress(0, 100)
-                            await ctx.info(message)
-                        elif "🔧 Using tool" in message or "Using tool" in message:
-                            # Extract tool number from message like "🔧 Using tool: Read (#1)"
-                            match = re.search(r'#(\d+)', message)
-                            if match:
-                                tool_num = int(match.group(1))
-                                # Progress: 10% base + 15% per tool, max 90%
-                                progress = min(10 + (tool_num * 15), 90)
-                                await ctx.report_progress(progress, 100)
-                            await ctx.info(message)
-                        elif "🔄 Session reset" in message:
-                            await ctx.report_progress(5, 100)
-                            await ctx.info(message)
-                        elif message.startswith("partial:"):
-                            # Streaming text delta from --include-partial-messages
-                            await ctx.info(message[8:])
-                        elif "✅ Task completed" in message or "completed" in message.lower():
-                            await ctx.report_progress(100, 100)
-                            await ctx.info(message)
-                        elif "⚠️" in message:
-                            # Warning but still complete
-                            await ctx.report_progress(100, 100)
-                            await ctx.warning(message)
-                        else:
-                            # Just log other messages
-                            await ctx.info(message)
-                    except Exception as e:
-                        logger.debug(f"Progress bridge error (non-critical): {e}")
-
                 # Create the selected agent dict format expected by execute_task
                 selected_agent = {
                     'name': agent_config.name,  # Internal name for logging
@@ -160,12 +227,17 @@ def create_agent_tool_function(agent_name: str, agent_config):
                 }
 
                 # Execute the task using the selected agent with session_reset and progress callback
-                result = await agent_manager.execute_task(
-                    selected_agent, 
-                    prompt, 
-                    session_reset=session_reset,
-                    progress_callback=progress_bridge
-                )
+                async with ProgressBridge(ctx, agent_config, prompt) as progress_bridge:
+                    result = await agent_manager.execute_task(
+                        selected_agent,
+                        prompt,
+                        session_reset=session_reset,
+                        progress_callback=progress_bridge,
+                        progress=progress_bridge.tracker,
+                        allow_fork=allow_fork,
+                        priority=normalize_priority(priority),
+                        client=client_identity(ctx)
+                    )
                 
                 return result
                 
@@ -185,56 +257,23 @@ Session support: Enabled (max {agent_config.resume_session if isinstance(agent_c
 Parameters:
     prompt: The specific task, question, or request for the agent to perform
     session_reset: Optional. Reset the session context before executing (default: False)
+    allow_fork: Optional. If another call is already running on this agent's session, run in a
+        fork of the session instead of waiting for it; the fork is not remembered (default: False)
+    priority: Optional. 'interactive', 'normal' or 'batch'; decides the order when calls have to
+        queue (default: the agent's configured priority, else 'normal')
 
 Returns:
     Text response from the {agent_name} agent after task completion
 """
     else:
         # Create function without session_reset parameter (original version)
-        async def agent_tool_impl(prompt: str, ctx: Context) -> str:
+        async def agent_tool_impl(prompt: str, ctx: Context, priority: Optional[str] = None) -> str:
             """Execute agent task."""
             try:
                 logger.info(f"=== {agent_name} Tool Called ===")
                 logger.info(f"Current process working directory: {os.getcwd()}")
-                logger.info(f"Task: {prompt[:100]}...")
+                logger.info(f"Task: {redact(prompt)}")
                 
-                # Create progress bridge function (same as above)
-                async def progress_bridge(message: str):
-                    """Bridge between agent progress messages and MCP context."""
-                    try:
-                        # Log if we have a progress token (for debugging)
-                        if hasattr(ctx, '_progress_token') and ctx._progress_token:
-                            logger.debug(f"Progress token present: {ctx._progress_token}")
-                        
-                        # Parse different types of progress messages
-                        if "🚀 Starting" in message or "Starting" in message:
-                            await ctx.report_progress(0, 100)
-                            await ctx.info(message)
-                        elif "🔧 Using tool" in message or "Using tool" in message:
-                            # Extract tool number from message like "🔧 Using tool: Read (#1)"
-                            match = re.search(r'#(\d+)', message)
-                            if match:
-                                tool_num = int(match.group(1))
-                                # Progress: 10% base + 15% per tool, max 90%
-                                progress = min(10 + (tool_num * 15), 90)
-                                await ctx.report_progress(progress, 100)
-                            await ctx.info(message)
-                        elif message.startswith("partial:"):
-                            # Streaming text delta from --include-partial-messages
-                            await ctx.info(message[8:])
-                        elif "✅ Task completed" in message or "completed" in message.lower():
-                            await ctx.report_progress(100, 100)
-                            await ctx.info(message)
-                        elif "⚠️" in message:
-                            # Warning but still complete
-                            await ctx.report_progress(100, 100)
-                            await ctx.warning(message)
-                        else:
-                            # Just log other messages
-                            await ctx.info(message)
-                    except Exception as e:
-                        logger.debug(f"Progress bridge error (non-critical): {e}")
-
                 # Create the selected agent dict format expected by execute_task
                 selected_agent = {
                     'name': agent_config.name,  # Internal name for logging
@@ -242,11 +281,15 @@ Returns:
                 }
 
                 # Execute the task using the selected agent with progress callback
-                result = await agent_manager.execute_task(
-                    selected_agent, 
-                    prompt,
-                    progress_callback=progress_bridge
-                )
+                async with ProgressBridge(ctx, agent_config, prompt) as progress_bridge:
+                    result = await agent_manager.execute_task(
+                        selected_agent,
+                        prompt,
+                        progress_callback=progress_bridge,
+                        progress=progress_bridge.tracker,
+                        priority=normalize_priority(priority),
+                        client=client_identity(ctx)
+                    )
                 
                 return result
                 
@@ -264,6 +307,8 @@ Working directory: {agent_config.cwd}
 
 Parameters:
     prompt: The specific task, question, or request for the agent to perform
+    priority: Optional. 'interactive', 'normal' or 'batch'; decides the order when calls have to
+        queue (default: the agent's configured priority, else 'normal')
 
 Returns:
     Text response from the {agent_name} agent after task completion
@@ -273,25 +318,733 @@ Returns:
 
 
 # ============= DYNAMIC TOOL REGISTRATION =============
-# Register each agent as its own tool
+# Register each agent as its own tool (only pinned agents in catalog mode)
 logger.info("\n=== Registering Individual Agent Tools ===")
 registered_tools = []
+agent_tools = {}  # Registered tool name by internal agent name
+agent_tool_functions = {}  # Tool implementations by internal name, also called by run_agent and route
+
+
+def has_own_tool(agent_config) -> bool:
+    """Whether an agent is registered as an individual tool."""
+    return tool_mode != "catalog" or catalog.is_pinned(agent_config)
+
+
+def agent_tool_function(internal_name: str, agent_config):
+    """Tool implementation of an agent, created on first use for agents added by a reload."""
+    tool_func = agent_tool_functions.get(internal_name)
+    if tool_func is None:
+        tool_func = create_agent_tool_function(agent_config.agent_name, agent_config)
+        agent_tool_functions[internal_name] = tool_func
+    return tool_func
+
+
+def register_agent_tool(internal_name: str, agent_config) -> Optional[str]:
+    """Register an agent's individual tool if it gets one, returning the tool name."""
+    tool_func = agent_tool_function(internal_name, agent_config)
+    if not has_own_tool(agent_config):
+        return None
+    tool_name = sanitize_tool_name(agent_config.agent_name)
+    mcp.tool(name=tool_name)(tool_func)
+    agent_tools[internal_name] = tool_name
+    return tool_name
+
+
+async def call_agent(internal_name: str, agent_config, prompt: str, ctx: Context,
+                     session_reset: bool = False, allow_fork: bool = False,
+                     priority: Optional[str] = None) -> str:
+    """Run an agent through its tool implementation (for run_agent and route)."""
+    tool_func = agent_tool_function(internal_name, agent_config)
+    if agent_config.resume_session:
+        return await tool_func(prompt, ctx, session_reset=session_reset, allow_fork=allow_fork,
+                               priority=priority)
+    return await tool_func(prompt, ctx, priority=priority)
+
 
 for agent_name, agent_config in agent_manager.agents.items():
     try:
-        # Create the tool function for this agent
-        tool_func = create_agent_tool_function(agent_config.agent_name, agent_config)
-        
-        # Register it as an MCP tool
-        tool_name = sanitize_tool_name(agent_config.agent_name)
-        mcp.tool(name=tool_name)(tool_func)
-        
-        registered_tools.append(tool_name)
-        logger.info(f"Registered tool: {tool_name} for agent: {agent_config.agent_name}")
+        # Create the tool function for this agent and register it as an MCP tool
+        tool_name = register_agent_tool(agent_name, agent_config)
+        if tool_name:
+            registered_tools.append(tool_name)
+            logger.info(f"Registered tool: {tool_name} for agent: {agent_config.agent_name}")
         
     except Exception as e:
         logger.error(f"Failed to register tool for {agent_name}: {str(e)}")
 
+# ============= AGENT CATALOG =============
+# In catalog mode the agents without their own tool are called through run_agent
+# and discovered through the task-agent://catalog resources.
+if tool_mode == "catalog":
+    @mcp.tool(name="run_agent")
+    async def run_agent(agent: str, prompt: str, ctx: Context, session_reset: bool = False,
+                        allow_fork: bool = False, priority: Optional[str] = None) -> str:
+        """Run any agent from the agent catalog.
+
+Browse task-agent://catalog (or task-agent://catalog/search/{query}) to find the agent,
+and task-agent://catalog/agents/{agent} for its details.
+
+Parameters:
+    agent: Agent name from the catalog (e.g. 'code_reviewer')
+    prompt: The specific task, question, or request for the agent to perform
+    session_reset: Optional. For session agents, reset the session before executing (default: False)
+    allow_fork: Optional. For session agents, fork the session instead of queueing behind a
+        running call on it (default: False)
+    priority: Optional. 'interactive', 'normal' or 'batch' (default: the agent's configured priority)
+
+Returns:
+    Text response from the agent after task completion
+"""
+        internal_name, agent_config = catalog.find(agent)
+        if not agent_config:
+            suggestions = ', '.join(catalog.suggest(agent))
+            hint = f" Did you mean: {suggestions}?" if suggestions else ""
+            return f"Error: Unknown agent '{agent}'.{hint} See task-agent://catalog for all agents."
+
+        return await call_agent(internal_name, agent_config, prompt, ctx, session_reset=session_reset,
+                                allow_fork=allow_fork, priority=priority)
+
+    registered_tools.append("run_agent")
+
+registered_tools.extend(["route", "reload_agents", "tool_profile"])
+
+
+# ============= ROUTING =============
+@mcp.tool(name="route")
+async def route(task: str, ctx: Context, top_k: int = 3, run: bool = False,
+                priority: Optional[str] = None) -> str:
+    """Find the best agents for a task, and optionally run the best match.
+
+Ranks all agents by how well their name, description, tools and instructions match
+the task (BM25 over an in-memory index), without reading agent listings.
+
+Parameters:
+    task: Description of the task to route
+    top_k: Optional. Number of agents to return (default: 3, max 20)
+    run: Optional. Run the best-matching agent on the task and return its response (default: False)
+    priority: Optional. Priority when running: 'interactive', 'normal' or 'batch'
+
+Returns:
+    The matching agents with scores, or the response of the best match when run is set
+"""
+    matches = agent_manager.route(task, max(1, min(top_k, 20)))
+    if not matches:
+        return "No agent matches this task. See task-agent://catalog for all agents."
+
+    if run:
+        internal_name, score = matches[0]
+        agent_config = agent_manager.agents[internal_name]
+        logger.info(f"Routing to {agent_config.agent_name} (score {score:.2f})")
+        result = await call_agent(internal_name, agent_config, task, ctx, priority=priority)
+        return f"Routed to {sanitize_tool_name(agent_config.agent_name)} (score {score:.2f})\n\n{result}"
+
+    lines = []
+    for rank, (internal_name, score) in enumerate(matches, 1):
+        agent_config = agent_manager.agents[internal_name]
+        tool_name = sanitize_tool_name(agent_config.agent_name)
+        call = tool_name if has_own_tool(agent_config) else f"run_agent(agent='{tool_name}')"
+        matched = ', '.join(agent_manager.index.explain(internal_name, task))
+        lines.append(f"{rank}. {tool_name} (score {score:.2f}) - call: {call}\n"
+                     f"   {agent_config.description.strip().splitlines()[0]}\n"
+                     f"   matched: {matched}")
+    return "\n".join(lines)
+
+
+def apply_agent_changes(changes: Dict[str, List[str]]):
+    """Re-register the tools and resources of reloaded agents (called by AgentManager.reload_agents)."""
+    for internal_name in changes["changed"] + changes["removed"]:
+        agent_tool_functions.pop(internal_name, None)
+        resource_manager.unregister_agent_resource(internal_name)
+        tool_name = agent_tools.pop(internal_name, None)
+        if tool_name:
+            mcp.remove_tool(tool_name)
+    for internal_name in changes["added"] + changes["changed"]:
+        agent_config = agent_manager.agents[internal_name]
+        register_agent_tool(internal_name, agent_config)
+        if has_own_tool(agent_config):
+            resource_manager._register_agent_resource(internal_name, agent_config)
+    catalog.refresh()
+
+
+agent_manager.reload_listeners.append(apply_agent_changes)
+
+
+@mcp.tool(name="reload_agents")
+async def reload_agents() -> str:
+    """Re-read the agents directory and update the agent tools without restarting the server.
+
+Only new and modified agent files are parsed.
+
+Returns:
+    The agents that were added, changed and removed
+"""
+    changes = agent_manager.reload_agents()
+    if not any(changes.values()):
+        return "No agent changes found."
+    return "\n".join(f"{kind.title()}: {', '.join(sorted(names))}" for kind, names in changes.items() if names)
+
+
+@mcp.tool(name="tool_profile")
+async def tool_profile(agent: Optional[str] = None, apply: bool = False) -> str:
+    """Show which of an agent's tools its runs actually use, and tighten its tool set.
+
+Every declared tool adds its schema to each request. Lists declared tools that were never
+used with their estimated token cost, and suggests a smaller 'tools' list once the agent
+has enough recorded runs.
+
+Parameters:
+    agent: Optional. Agent name; all agents with suggestions when omitted
+    apply: Optional. Write the suggested tool set as the agent's override
+           (.overrides/<name>.yaml in the agents directory) and reload it (default: False)
+
+Returns:
+    The usage report, and the override files written when apply is set
+"""
+    if agent:
+        internal_name, agent_config = catalog.find(agent)
+        if not agent_config:
+            return f"Error: Unknown agent '{agent}'. See task-agent://catalog for all agents."
+        names = [internal_name]
+    else:
+        names = [name for name in agent_manager.agents
+                 if agent_manager.tool_profiler.report(agent_manager.agents[name])["suggestion"]]
+        if not names:
+            return "No agent has a tighter tool set to suggest yet. See task-agent://status/tools for usage."
+
+    lines = []
+    for internal_name in names:
+        report = agent_manager.tool_report(internal_name)
+        used = ", ".join(f"{t['tool']} {t['runs_using']}/{report['runs']}" for t in report["tools"]
+                         if t["runs_using"]) or "none"
+        lines.append(f"{report['agent']}: {report['status']}\n   used in runs: {used}")
+        if report["unused"]:
+            unused = ", ".join(f"{tool} (~{tool_tokens(tool)})" for tool in report["unused"])
+            lines.append(f"   never used: {unused} = ~{report['unused_tokens_per_request']} tokens per request")
+        suggestion = report["suggestion"]
+        if suggestion and apply:
+            path = agent_manager.apply_tool_suggestion(internal_name)
+            lines.append(f"   applied: tools: {suggestion['tools']} ({path})" if path
+                         else "   not applied: plugin agents take their tools from the plugin")
+        elif suggestion:
+            lines.append(f"   suggested: tools: {suggestion['tools']}")
+        elif report["override"]:
+            lines.append(f"   override: {report['override']}")
+    return "\n".join(lines)
+
+
+@mcp.resource("task-agent://catalog")
+async def catalog_resource() -> Dict[str, Any]:
+    """First page of the agent catalog: one compact entry per agent."""
+    return catalog.page(1)
+
+
+@mcp.resource("task-agent://catalog/page/{page}")
+async def catalog_page_resource(page: str) -> Dict[str, Any]:
+    """One page of the agent catalog."""
+    if not page.isdigit():
+        raise ResourceError(f"Invalid page: {page}")
+    return catalog.page(int(page))
+
+
+@mcp.resource("task-agent://catalog/search/{query}")
+async def catalog_search_resource(query: str) -> Dict[str, Any]:
+    """Catalog entries matching the words of a query, best matches first."""
+    return catalog.search(query)
+
+
+@mcp.resource("task-agent://catalog/agents/{name}", mime_type="application/json")
+async def catalog_agent_resource(name: str) -> str:
+    """Full details of one agent: capabilities, when to use it and how to call it."""
+    internal_name, agent_config = catalog.find(name)
+    if not agent_config:
+        raise ResourceError(f"Unknown agent: {name}")
+    via_dispatcher = tool_mode == "catalog" and not catalog.is_pinned(agent_config)
+    return resource_manager.agent_document(internal_name, agent_config, via_dispatcher=via_dispatcher)
+
+
+# ============= ASYNC JOB TOOLS =============
+# Long-running agent tasks can be submitted in the background. The job's status,
+# streamed output and final result are exposed as task-agent://jobs/... resources.
+job_store = JobStore(max_jobs=int(os.environ.get('TASK_AGENTS_MAX_JOBS', '100')))
+
+
+def resolve_agent_config(agent: str):
+    """Find an agent config by tool name, display name or internal name."""
+    for name, config in agent_manager.agents.items():
+        if agent in (name, config.agent_name, sanitize_tool_name(config.agent_name)):
+            return config
+    return None
+
+
+async def run_job(job, execute):
+    """Run a job to completion, recording output and result in the job store.
+
+    ``execute`` is called with the job's progress callback and returns the response.
+    """
+    await job_store.mark_running(job)
+
+    async def job_progress(message: str):
+        await job_store.append_output(job, message)
+
+    try:
+        result = await execute(job_progress)
+    except asyncio.CancelledError:
+        await job_store.finish(job, JOB_CANCELLED, error="Cancelled by client")
+        return
+    except Exception as e:
+        logger.error(f"Job {job.job_id} failed: {str(e)}")
+        await job_store.finish(job, JOB_FAILED, error=str(e))
+        return
+
+    status = JOB_FAILED if result.startswith("Error") else JOB_COMPLETED
+    await job_store.finish(job, status, result=result)
+
+
+@mcp.tool(name="submit_task")
+async def submit_task(agent: str, prompt: str, ctx: Context, session_reset: bool = False,
+                      allow_fork: bool = False, priority: Optional[str] = None) -> str:
+    """Submit a task to an agent in the background and return a job id immediately.
+
+Use this instead of calling the agent tool directly for long-running work. The task
+keeps running on the server; poll or subscribe to its resources, or call attach_job
+to wait for it.
+
+Parameters:
+    agent: Agent tool name (e.g. 'code_reviewer') or display name
+    prompt: The specific task, question, or request for the agent to perform
+    session_reset: Optional. Reset the session context before executing (default: False)
+    allow_fork: Optional. For session agents, fork the session instead of queueing behind a
+        running call on it (default: False)
+    priority: Optional. 'interactive', 'normal' or 'batch' (default: the agent's configured
+        priority, else 'normal'); background work is usually 'batch'
+
+Returns:
+    The job id and the resource URIs for its status, output and result
+"""
+    agent_config = resolve_agent_config(agent)
+    if not agent_config:
+        available = ', '.join(sorted(sanitize_tool_name(c.agent_name) for c in agent_manager.agents.values()))
+        return f"Error: Unknown agent '{agent}'. Available agents: {available}"
+    try:
+        priority = normalize_priority(priority)
+    except ValueError as e:
+        return f"Error: {e}"
+    if agent_manager.supervisor.draining:
+        return "Error: The server is draining for a restart and does not accept new tasks. Try again shortly."
+
+    job = job_store.create(agent_config.agent_name, prompt, session_reset=session_reset,
+                           allow_fork=allow_fork, priority=priority, client=client_identity(ctx))
+    job.progress = agent_manager.runtimes.track(agent_config.agent_name, len(prompt))
+    job.task = asyncio.create_task(run_job(job, lambda callback: agent_manager.execute_task(
+        {'name': agent_config.name, 'config': agent_config},
+        job.prompt,
+        session_reset=job.session_reset,
+        progress_callback=callback,
+        allow_fork=job.allow_fork,
+        priority=job.priority,
+        client=job.client,
+        job_id=job.job_id,
+        progress=job.progress
+    )))
+
+    # The submitting client is notified of status changes without an explicit subscribe
+    try:
+        job_store.subscribe(job_uri(job.job_id, "status"), ctx.session)
+    except Exception as e:
+        logger.debug(f"Could not auto-subscribe client to job {job.job_id}: {e}")
+
+    estimate = job.progress.estimate
+    expected = (f"Expected run time: ~{format_seconds(estimate.expected_seconds)} "
+                f"(90% within {format_seconds(estimate.p90_seconds)}, from {estimate.samples} earlier runs)\n"
+                if estimate else "")
+    return (
+        f"Job submitted: {job.job_id}\n"
+        f"Agent: {agent_config.agent_name}\n"
+        f"{expected}"
+        f"Status: {job_uri(job.job_id, 'status')}\n"
+        f"Output: {job_uri(job.job_id, 'output')}\n"
+        f"Result: {job_uri(job.job_id, 'result')}\n"
+        f"Use attach_job to wait for completion or cancel_job to stop it."
+    )
+
+
+async def adopt_orphaned_runs():
+    """Take over the detached runs of servers that have exited, serving each one as a job."""
+    supervisor = agent_manager.supervisor
+    while not supervisor.draining:
+        try:
+            for checkpoint in await asyncio.to_thread(supervisor.adopt_orphans):
+                # Under the original job id when the run was a job, so clients can attach to it again
+                job = job_store.create(checkpoint.agent, checkpoint.prompt, client="adopted",
+                                       job_id=checkpoint.job_id or checkpoint.run_id)
+                job.progress = agent_manager.runtimes.track(checkpoint.agent, len(checkpoint.prompt))
+                job.task = asyncio.create_task(run_job(
+                    job, lambda callback, checkpoint=checkpoint, job=job: agent_manager.finish_adopted_run(
+                        checkpoint, callback, job.progress)))
+                logger.info(f"Run {checkpoint.run_id} of {checkpoint.agent} continues as job {job.job_id}")
+        except Exception as e:
+            logger.warning(f"Could not adopt runs of exited servers: {e}")
+        await asyncio.sleep(supervisor.adopt_interval)
+
+
+def start_drain():
+    """Stop accepting new tasks and exit once the in-flight runs have finished (SIGUSR1)."""
+    global drain_task
+    if agent_manager.supervisor.start_drain():
+        logger.info(f"Draining for a restart: {agent_manager.in_flight} runs in flight, no new tasks accepted")
+        drain_task = asyncio.get_running_loop().create_task(drain_and_exit())
+
+
+async def drain_and_exit():
+    """Wait for in-flight runs (up to the drain timeout), then exit the server."""
+    supervisor = agent_manager.supervisor
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + supervisor.drain_timeout
+    while agent_manager.in_flight and loop.time() < deadline:
+        await asyncio.sleep(0.5)
+    if agent_manager.in_flight:
+        handed_over = len(supervisor.owned)
+        logger.warning(f"Drain timed out with {agent_manager.in_flight} runs in flight; exiting and leaving "
+                       f"{handed_over} detached runs to the next server")
+    else:
+        logger.info("Drained, exiting")
+    # CLIs that already returned their result: let them exit so their runs are recorded
+    await asyncio.gather(*agent_manager.teardown_tasks, return_exceptions=True)
+    agent_manager.session_store.flush()
+    await asyncio.to_thread(agent_manager.ledger.flush)
+    await asyncio.gather(*agent_manager.archive_tasks, *agent_manager.override_tasks.values(),
+                         return_exceptions=True)
+    shutdown_logging()
+    # Without running cleanup: detached runs keep going, and their checkpoint locks drop with the process
+    os._exit(0)
+
+
+@mcp.tool(name="attach_job")
+async def attach_job(job_id: str, ctx: Context, timeout: float = 600) -> str:
+    """Attach to a submitted job, streaming its progress until it finishes or the timeout expires.
+
+Detaching (timeout or client cancel) does not stop the job.
+
+Parameters:
+    job_id: The id returned by submit_task
+    timeout: Optional. Maximum seconds to wait (default: 600)
+
+Returns:
+    The job result if it finished, otherwise its current status
+"""
+    job = job_store.get(job_id)
+    if not job:
+        return f"Error: Unknown job '{job_id}'"
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    forwarded = 0  # Sequence number of the next output line to forward (see Job.output_base)
+    while True:
+        # Forward completed output lines; partial text lines are still growing. The oldest
+        # lines may be trimmed while we forward, so index by sequence number each time.
+        while True:
+            forwarded = max(forwarded, job.output_base)  # Skip lines trimmed before they were forwarded
+            index = forwarded - job.output_base
+            if index >= len(job.output) or job.output[index].startswith("partial:"):
+                break
+            try:
+                await ctx.info(job.output[index])
+            except Exception as e:
+                logger.debug(f"Attach progress error (non-critical): {e}")
+            forwarded += 1
+        if forwarded - job.output_base < len(job.output) - 1:
+            forwarded += 1  # Skip a finished partial-text line (its text is in the result)
+
+        if job.is_finished:
+            break
+        if job.progress and job.progress.started is not None:
+            try:
+                await ctx.report_progress(round(job.progress.fraction() * 100, 1), 100, job.progress.describe())
+            except Exception as e:
+                logger.debug(f"Attach progress error (non-critical): {e}")
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return f"Job {job_id} is still {job.status}. Attach again or read {job_uri(job_id, 'status')}."
+        job.changed.clear()
+        try:
+            await asyncio.wait_for(job.changed.wait(), timeout=min(remaining, 5.0))
+        except asyncio.TimeoutError:
+            pass
+
+    if job.status == JOB_COMPLETED or job.result is not None:
+        return job.result or ""
+    return f"Job {job_id} {job.status}: {job.error or 'no result'}"
+
+
+@mcp.tool(name="cancel_job")
+async def cancel_job(job_id: str) -> str:
+    """Cancel a submitted job and kill its agent process.
+
+Parameters:
+    job_id: The id returned by submit_task
+
+Returns:
+    Confirmation of the cancellation or the job's final status
+"""
+    job = job_store.get(job_id)
+    if not job:
+        return f"Error: Unknown job '{job_id}'"
+    if not job_store.cancel(job):
+        return f"Job {job_id} already {job.status}"
+    try:
+        await asyncio.wait_for(asyncio.shield(job.task), timeout=10)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        pass
+    return f"Job {job_id} {job.status}"
+
+
+@mcp.resource("task-agent://jobs")
+async def jobs_resource() -> Dict[str, Any]:
+    """List all retained async jobs, newest first."""
+    return {"jobs": job_store.list_jobs()}
+
+
+@mcp.resource("task-agent://jobs/{job_id}/status")
+async def job_status_resource(job_id: str) -> Dict[str, Any]:
+    """Status of an async job."""
+    job = job_store.get(job_id)
+    if not job:
+        raise ResourceError(f"Unknown job: {job_id}")
+    return job.to_status_dict()
+
+
+@mcp.resource("task-agent://jobs/{job_id}/output")
+async def job_output_resource(job_id: str) -> str:
+    """Progress output streamed by an async job so far."""
+    job = job_store.get(job_id)
+    if not job:
+        raise ResourceError(f"Unknown job: {job_id}")
+    return '\n'.join(line[8:] if line.startswith("partial:") else line for line in job.output)
+
+
+@mcp.resource("task-agent://jobs/{job_id}/result")
+async def job_result_resource(job_id: str) -> str:
+    """Final result of an async job."""
+    job = job_store.get(job_id)
+    if not job:
+        raise ResourceError(f"Unknown job: {job_id}")
+    if job.result is None:
+        return f"Job {job_id} is {job.status}; no result yet."
+    return job.result
+
+
+# ============= STORED RESULT RESOURCES =============
+# Results above TASK_AGENTS_SPILL_THRESHOLD are returned as their beginning plus
+# these URIs, so clients read only the pages or byte ranges they need.
+def stored_result(result_id: str):
+    """Metadata of a stored result, or a ResourceError if it is unknown or expired."""
+    stored = agent_manager.results.get(result_id)
+    if not stored:
+        raise ResourceError(f"Unknown or expired result: {result_id}")
+    return stored
+
+
+@mcp.resource("task-agent://results/{result_id}")
+async def result_resource(result_id: str) -> Dict[str, Any]:
+    """Size, page count and read URIs of a stored result."""
+    return stored_result(result_id).to_dict()
+
+
+@mcp.resource("task-agent://results/{result_id}/page/{page}")
+async def result_page_resource(result_id: str, page: str) -> str:
+    """One page of a stored result (1-based)."""
+    stored = stored_result(result_id)
+    if not page.isdigit() or not 1 <= int(page) <= len(stored.pages):
+        raise ResourceError(f"Invalid page: {page} (result has {len(stored.pages)} pages)")
+    return agent_manager.results.read_page(result_id, int(page))[1]
+
+
+@mcp.resource("task-agent://results/{result_id}/range/{start}/{end}")
+async def result_range_resource(result_id: str, start: str, end: str) -> str:
+    """Bytes start..end (end exclusive) of a stored result."""
+    stored = stored_result(result_id)
+    if not (start.isdigit() and end.isdigit()) or int(end) <= int(start) or int(start) >= stored.size:
+        raise ResourceError(f"Invalid range: {start}-{end} (result has {stored.size} bytes)")
+    return agent_manager.results.read_range(result_id, int(start), int(end))[1]
+
+
+# ============= TRANSCRIPT RESOURCES =============
+# Archived events of earlier runs, indexed by agent, session chain, session id and time.
+def agent_display_name(agent: str) -> str:
+    """Display name of an agent given by tool, display or internal name (as archived)."""
+    _, agent_config = catalog.find(agent)
+    return agent_config.agent_name if agent_config else agent
+
+
+@mcp.resource("task-agent://transcripts")
+async def transcripts_resource() -> Dict[str, Any]:
+    """Transcript archive usage and the latest archived runs."""
+    archive = agent_manager.archive
+    return {**archive.summary(), "latest": await asyncio.to_thread(archive.runs, limit=20)}
+
+
+@mcp.resource("task-agent://transcripts/agents/{agent}")
+async def agent_transcripts_resource(agent: str) -> Dict[str, Any]:
+    """Archived runs of an agent, newest first."""
+    name = agent_display_name(agent)
+    return {"agent": name, "runs": await asyncio.to_thread(agent_manager.archive.runs, agent=name)}
+
+
+@mcp.resource("task-agent://transcripts/agents/{agent}/since/{since}")
+async def agent_transcripts_since_resource(agent: str, since: str) -> Dict[str, Any]:
+    """Archived runs of an agent since a time (ISO date/time or epoch seconds), newest first."""
+    try:
+        start = parse_since(since)
+    except ValueError:
+        raise ResourceError(f"Invalid time: {since} (use an ISO date/time or epoch seconds)")
+    name = agent_display_name(agent)
+    return {"agent": name, "since": start,
+            "runs": await asyncio.to_thread(agent_manager.archive.runs, agent=name, since=start, limit=500)}
+
+
+@mcp.resource("task-agent://transcripts/chains/{chain_id}")
+async def chain_transcripts_resource(chain_id: str) -> Dict[str, Any]:
+    """Archived runs of a session chain, oldest first."""
+    runs = await asyncio.to_thread(agent_manager.archive.runs, chain_id=chain_id, limit=500, oldest_first=True)
+    if not runs:
+        raise ResourceError(f"No archived runs for chain: {chain_id}")
+    return {"chain_id": chain_id, "runs": runs}
+
+
+@mcp.resource("task-agent://transcripts/sessions/{session_id}")
+async def session_transcript_resource(session_id: str) -> Dict[str, Any]:
+    """One archived run: assistant messages, tool calls and results, and the final result."""
+    entry = await asyncio.to_thread(agent_manager.archive.session, session_id)
+    if not entry:
+        raise ResourceError(f"No archived run for session: {session_id}")
+    events = entry.pop("events")
+    return {**entry, **condense(events), "events": f"task-agent://transcripts/sessions/{session_id}/events"}
+
+
+@mcp.resource("task-agent://transcripts/sessions/{session_id}/events")
+async def session_events_resource(session_id: str) -> Dict[str, Any]:
+    """The raw stream-json events of one archived run."""
+    entry = await asyncio.to_thread(agent_manager.archive.session, session_id)
+    if not entry:
+        raise ResourceError(f"No archived run for session: {session_id}")
+    return entry
+
+
+@mcp.resource("task-agent://manifests/{agent}")
+async def agent_manifests_resource(agent: str) -> Dict[str, Any]:
+    """Full manifests (paths, sizes, hashes, summaries) of an agent's resource directories."""
+    _, agent_config = catalog.find(agent)
+    if not agent_config:
+        raise ResourceError(f"Unknown agent: {agent}")
+    working_dir = agent_manager._resolve_working_dir(agent_config)
+    roots = [agent_manager._resolve_resource_dir(d, working_dir) for d in agent_config.resource_dirs or []]
+    manifests = [await asyncio.to_thread(agent_manager.manifests.get, root) for root in roots if os.path.isdir(root)]
+    # Hashes the files changed since the last read
+    return {"agent": agent_config.agent_name, "manifests": [await asyncio.to_thread(m.to_dict) for m in manifests]}
+
+
+# ============= STATUS RESOURCES =============
+@mcp.resource("task-agent://status")
+async def live_status_resource() -> Dict[str, Any]:
+    """Active runs (agent, model, pid, elapsed, last event, tools, tokens), waiting requests,
+    session chains in use and pool states."""
+    return agent_manager.live.snapshot(agent_manager.live_pools())
+
+
+@mcp.resource("task-agent://status/text", mime_type="text/plain")
+async def live_status_text_resource() -> str:
+    """The live status as a few lines of text, one per run and waiting request."""
+    return agent_manager.live.text(agent_manager.live_pools())
+
+
+@mcp.resource("task-agent://status/reliability")
+async def reliability_status_resource() -> Dict[str, Any]:
+    """Per-model circuit breaker states, retry counts and error classes seen so far."""
+    return agent_manager.reliability.snapshot()
+
+
+@mcp.resource("task-agent://status/priming")
+async def priming_status_resource() -> Dict[str, Any]:
+    """Primed base sessions, and cache-read ratio / time-to-first-token of primed vs cold runs."""
+    status = agent_manager.primer.snapshot()
+    status["ledger"] = {
+        config.agent_name: agent_manager.ledger.cache_summary(config.agent_name)
+        for config in agent_manager.agents.values()
+        if config.prime_session
+    }
+    return status
+
+
+@mcp.resource("task-agent://status/workspaces")
+async def workspaces_status_resource() -> Dict[str, Any]:
+    """Pooled worktrees and isolated workspaces currently in use."""
+    return agent_manager.workspaces.snapshot()
+
+
+@mcp.resource("task-agent://status/broker")
+async def broker_status_resource() -> Dict[str, Any]:
+    """Host-wide concurrency slots shared with other server instances, and local queueing."""
+    return await asyncio.to_thread(agent_manager.broker.snapshot)
+
+
+@mcp.resource("task-agent://status/workers")
+async def workers_status_resource() -> Dict[str, Any]:
+    """Endpoints agent runs are dispatched to (local and remote workers), with health and load."""
+    return agent_manager.workers.snapshot()
+
+
+@mcp.resource("task-agent://status/results")
+async def results_status_resource() -> Dict[str, Any]:
+    """Disk usage and settings of the stored result store."""
+    return agent_manager.results.summary()
+
+
+@mcp.resource("task-agent://status/tools")
+async def tools_status_resource() -> Dict[str, Any]:
+    """Tool usage of every agent, unused tools with their token cost, and suggested tool sets."""
+    reports = [agent_manager.tool_report(name) for name in agent_manager.agents]
+    return {"min_runs": agent_manager.tool_profiler.min_runs, "auto_apply": agent_manager.tool_profiler.auto_apply,
+            "agents": reports}
+
+
+@mcp.resource("task-agent://status/runtimes")
+async def runtimes_status_resource() -> Dict[str, Any]:
+    """Expected run time, tool calls and output per agent, and the progress and ETA of running jobs."""
+    return {
+        "min_runs": agent_manager.runtimes.min_runs,
+        "agents": {config.agent_name: agent_manager.runtimes.summary(config.agent_name)
+                   for config in agent_manager.agents.values()},
+        "jobs": [job.to_status_dict() for job in job_store.jobs.values() if not job.is_finished],
+    }
+
+
+@mcp.resource("task-agent://status/supervisor")
+async def supervisor_status_resource() -> Dict[str, Any]:
+    """Detached runs owned by this server, runs adopted from exited servers, and drain state."""
+    status = agent_manager.supervisor.snapshot()
+    status["in_flight"] = agent_manager.in_flight
+    return status
+
+
+@mcp.resource("task-agent://status/scheduler")
+async def scheduler_status_resource() -> Dict[str, Any]:
+    """Queued and running requests by priority class and client, with queue-wait percentiles."""
+    return agent_manager.scheduler.snapshot()
+
+
+# Resource subscriptions - clients subscribe to job URIs to receive update notifications
+@mcp._mcp_server.subscribe_resource()
+async def handle_subscribe(uri) -> None:
+    job_store.subscribe(str(uri), mcp._mcp_server.request_context.session)
+
+
+@mcp._mcp_server.unsubscribe_resource()
+async def handle_unsubscribe(uri) -> None:
+    job_store.unsubscribe(str(uri), mcp._mcp_server.request_context.session)
+
+registered_tools.extend(["submit_task", "attach_job", "cancel_job"])
+
+
 # Log summary of what's available
 logger.info("\n=== MCP Server Configuration ===")
 logger.info(f"Resources: {len(resource_manager.registered_resources)} registered")
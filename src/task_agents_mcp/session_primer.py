@@ -0,0 +1,145 @@
+"""
+Session Primer for Task-Agents MCP Server
+
+Keeps a "primed" base session per agent and model: a session in which the
+agent's system prompt, tool definitions and a standard context preamble have
+already been processed. Fresh requests fork from the base session
+(``-r <base> --fork-session``) so they start from the cached prompt prefix
+instead of paying full input-token processing for the system prompt.
+
+Base sessions are re-primed in the background when the agent's configuration
+changes or when the prompt cache has likely expired.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sent as the prompt of the priming run. The exchange becomes part of every
+# forked session, so it is kept short and neutral.
+PRIMING_PROMPT = (
+    "SESSION PRIMING: This session is a base that later tasks will continue from. "
+    "Do not use any tools. Reply only with the word: ready"
+)
+
+
+@dataclass
+class PrimedSession:
+    """A base session that requests fork from."""
+    session_id: str
+    config_version: str
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    forks: int = 0
+
+
+class SessionPrimer:
+    """Tracks primed base sessions and refreshes them in the background."""
+
+    def __init__(self, cache_ttl: Optional[float] = None):
+        """
+        Initialize the primer.
+
+        Args:
+            cache_ttl: Seconds after the last use of a base session when its cached
+                       prefix is assumed expired and a refresh is started. Defaults to
+                       TASK_AGENTS_PRIME_TTL or 270s (just under the 5 minute prompt cache).
+        """
+        self.cache_ttl = cache_ttl if cache_ttl is not None else float(
+            os.environ.get('TASK_AGENTS_PRIME_TTL', '270'))
+        self.sessions: Dict[Tuple[str, str], PrimedSession] = {}
+        self.refreshing: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.primes = 0
+        self.prime_failures = 0
+
+    def get_base_session(self, agent_name: str, model: str, config_version: str,
+                         prime: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """Return the base session to fork from, starting a background refresh if needed.
+
+        Args:
+            agent_name: Display name of the agent
+            model: Model the request will run on (cached prefixes are per model)
+            config_version: Current version of the agent's configuration
+            prime: Coroutine factory that runs a priming exchange and returns its session ID
+
+        Returns:
+            Session ID to fork from, or None if no usable base session exists yet
+        """
+        key = (agent_name, model)
+        primed = self.sessions.get(key)
+
+        if primed and primed.config_version != config_version:
+            # The system prompt or tools changed - the old prefix no longer matches
+            logger.info(f"Configuration of {agent_name} changed, discarding primed session {primed.session_id}")
+            del self.sessions[key]
+            primed = None
+
+        if primed is None:
+            self._start_refresh(key, config_version, prime)
+            return None
+
+        now = time.monotonic()
+        if now - primed.last_used > self.cache_ttl:
+            # Forking still works, but the cached prefix has probably expired -
+            # prime a fresh base for the following requests
+            logger.info(f"Primed session for {agent_name} ({model}) idle for {now - primed.last_used:.0f}s, refreshing")
+            self._start_refresh(key, config_version, prime)
+
+        primed.last_used = now
+        primed.forks += 1
+        return primed.session_id
+
+    def invalidate(self, agent_name: str, model: Optional[str] = None):
+        """Forget primed sessions of an agent (e.g. when a fork from it failed)."""
+        for key in [k for k in self.sessions if k[0] == agent_name and (model is None or k[1] == model)]:
+            del self.sessions[key]
+
+    def _start_refresh(self, key: Tuple[str, str], config_version: str,
+                       prime: Callable[[], Awaitable[Optional[str]]]):
+        if key in self.refreshing and not self.refreshing[key].done():
+            return
+        self.refreshing[key] = asyncio.create_task(self._refresh(key, config_version, prime))
+
+    async def _refresh(self, key: Tuple[str, str], config_version: str,
+                       prime: Callable[[], Awaitable[Optional[str]]]):
+        agent_name, model = key
+        try:
+            session_id = await prime()
+        except Exception as e:
+            session_id = None
+            logger.warning(f"Priming run for {agent_name} ({model}) failed: {e}")
+        finally:
+            self.refreshing.pop(key, None)
+
+        if not session_id:
+            self.prime_failures += 1
+            return
+        self.primes += 1
+        self.sessions[key] = PrimedSession(session_id=session_id, config_version=config_version)
+        logger.info(f"Primed base session for {agent_name} ({model}): {session_id}")
+
+    def snapshot(self) -> Dict[str, object]:
+        """Primed sessions and counters for the status resource."""
+        now = time.monotonic()
+        return {
+            "cache_ttl_seconds": self.cache_ttl,
+            "primes": self.primes,
+            "prime_failures": self.prime_failures,
+            "sessions": [
+                {
+                    "agent": agent_name,
+                    "model": model,
+                    "session_id": primed.session_id,
+                    "age_seconds": round(now - primed.created_at, 1),
+                    "idle_seconds": round(now - primed.last_used, 1),
+                    "forks": primed.forks,
+                }
+                for (agent_name, model), primed in self.sessions.items()
+            ],
+            "refreshing": [f"{agent_name} ({model})" for agent_name, model in self.refreshing],
+        }
@@ -7,13 +7,23 @@ Each resume creates a new session ID that must be tracked.
 
 import json
 import logging
+import os
+import uuid
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Any
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Sent (in a forked copy of the chain's session) to produce the compacted summary
+COMPACTION_PROMPT = (
+    "CONTEXT COMPACTION: This conversation will continue in a fresh session that only sees "
+    "your summary. Summarize it: the user's goals, decisions made, important facts and file "
+    "paths, work completed, and open questions or next steps. Do not use any tools. "
+    "Reply only with the summary."
+)
+
 
 @dataclass
 class SessionChain:
@@ -23,6 +33,12 @@ class SessionChain:
     previous_sessions: List[str] = field(default_factory=list)
     created_at: str = field(default_factory=lambda: datetime.now().isoformat())
     last_updated: str = field(default_factory=lambda: datetime.now().isoformat())
+    chain_id: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
+    context_tokens: int = 0  # Input context size of the latest exchange
+    summary: Optional[str] = None  # Compacted summary waiting to seed the next segment
+    summary_of: Optional[str] = None  # Session ID the pending summary was generated from
+    segment_seed: Optional[str] = None  # Summary the current segment was seeded with
+    lineage: List[Dict[str, Any]] = field(default_factory=list)  # One entry per compacted segment
 
 
 class SessionChainStore:
@@ -37,17 +53,22 @@ class SessionChainStore:
         """
         self.storage_path = storage_path
         self.chains: Dict[str, SessionChain] = {}
+        self.unsaved = False  # Changes waiting for flush()
         
         # Load existing chains if storage path exists
         if self.storage_path and self.storage_path.exists():
             self._load_chains()
     
-    def get_resume_session(self, agent_name: str, max_exchanges: int) -> Optional[str]:
+    def get_resume_session(self, agent_name: str, max_exchanges: int,
+                           compaction: bool = False) -> Optional[str]:
         """Get the session ID to resume for an agent.
         
         Args:
             agent_name: Name of the agent
             max_exchanges: Maximum exchanges before starting fresh
+            compaction: Whether the agent compacts its chain instead of resetting it.
+                        The chain then keeps being resumed past max_exchanges while
+                        its summary is generated, up to twice the limit.
             
         Returns:
             Session ID to resume with -r flag, or None to start fresh
@@ -57,10 +78,11 @@ class SessionChainStore:
             return None
             
         chain = self.chains[agent_name]
+        limit = max_exchanges * 2 if compaction else max_exchanges
         
         # Check if we've exceeded max exchanges
-        if chain.exchange_count >= max_exchanges:
-            logger.info(f"Session chain for {agent_name} exceeded max exchanges ({chain.exchange_count} >= {max_exchanges})")
+        if chain.exchange_count >= limit:
+            logger.info(f"Session chain for {agent_name} exceeded max exchanges ({chain.exchange_count} >= {limit})")
             # Archive the old chain
             chain.previous_sessions.append(chain.current_session_id)
             del self.chains[agent_name]
@@ -71,15 +93,40 @@ class SessionChainStore:
         logger.info(f"Resuming session for {agent_name}: {chain.current_session_id} (exchange {chain.exchange_count + 1}/{max_exchanges})")
         return chain.current_session_id
     
-    def update_chain(self, agent_name: str, new_session_id: str, was_resume: bool = False):
+    def update_chain(self, agent_name: str, new_session_id: str, was_resume: bool = False,
+                     context_tokens: int = 0, seeded_from_summary: bool = False, save: bool = True):
         """Update the session chain with a new session ID.
         
         Args:
             agent_name: Name of the agent
             new_session_id: The NEW session ID from this execution
             was_resume: Whether this was a resumed session
+            context_tokens: Input context size of this exchange
+            seeded_from_summary: Whether this exchange started a new segment seeded
+                                 with the chain's compacted summary
+            save: Write the store now; otherwise the caller calls ``flush`` later
         """
-        if was_resume and agent_name in self.chains:
+        if seeded_from_summary and agent_name in self.chains:
+            # Start a new segment of the same chain, recording what was compacted
+            chain = self.chains[agent_name]
+            segment_start = sum(entry["exchanges"] for entry in chain.lineage)
+            chain.lineage.append({
+                "sessions": chain.previous_sessions[segment_start:] + [chain.current_session_id],
+                "exchanges": chain.exchange_count,
+                "summary_chars": len(chain.summary or ""),
+                "compacted_at": datetime.now().isoformat()
+            })
+            chain.previous_sessions.append(chain.current_session_id)
+            chain.current_session_id = new_session_id
+            chain.exchange_count = 1
+            chain.segment_seed = chain.summary
+            chain.summary = None
+            chain.summary_of = None
+            chain.context_tokens = context_tokens
+            chain.last_updated = datetime.now().isoformat()
+            logger.info(f"Started compacted segment {len(chain.lineage) + 1} of chain {chain.chain_id} "
+                        f"for {agent_name}: {new_session_id}")
+        elif was_resume and agent_name in self.chains:
             # This was a resume, update the chain
             chain = self.chains[agent_name]
             # Move current to previous
@@ -87,18 +134,65 @@ class SessionChainStore:
             # Update to new session
             chain.current_session_id = new_session_id
             chain.exchange_count += 1
+            chain.context_tokens = context_tokens
             chain.last_updated = datetime.now().isoformat()
             logger.info(f"Updated session chain for {agent_name}: {new_session_id} (exchange {chain.exchange_count})")
         else:
             # New chain or fresh start
             self.chains[agent_name] = SessionChain(
                 current_session_id=new_session_id,
-                exchange_count=1
+                exchange_count=1,
+                context_tokens=context_tokens
             )
             logger.info(f"Created new session chain for {agent_name}: {new_session_id}")
         
         # Persist changes
+        if save:
+            self._save_chains()
+        else:
+            self.unsaved = True
+
+    def flush(self):
+        """Write changes made with ``update_chain(save=False)``, if any."""
+        if self.unsaved:
+            self._save_chains()
+
+    def needs_compaction(self, agent_name: str, max_exchanges: int, max_context_tokens: int) -> bool:
+        """Whether an agent's chain has crossed its compaction threshold and has no summary yet."""
+        chain = self.chains.get(agent_name)
+        if not chain or chain.summary is not None:
+            return False
+        return chain.exchange_count >= max_exchanges or chain.context_tokens >= max_context_tokens
+
+    def set_summary(self, agent_name: str, session_id: str, summary: str) -> bool:
+        """Attach a compacted summary to a chain.
+
+        The summary is only kept if ``session_id`` is still the chain's current
+        session, i.e. no exchange happened while it was being generated.
+        """
+        chain = self.chains.get(agent_name)
+        if not chain or chain.current_session_id != session_id:
+            logger.info(f"Discarding summary for {agent_name}: chain moved on from {session_id}")
+            return False
+        chain.summary = summary
+        chain.summary_of = session_id
         self._save_chains()
+        logger.info(f"Stored compacted summary for {agent_name} ({len(summary)} chars)")
+        return True
+
+    def get_summary(self, agent_name: str) -> Optional[str]:
+        """The pending compacted summary for an agent's chain, if any."""
+        chain = self.chains.get(agent_name)
+        return chain.summary if chain else None
+
+    def get_segment_seed(self, agent_name: str) -> Optional[str]:
+        """The summary the chain's current segment was seeded with, if it is a compacted segment.
+
+        The system prompt is not part of a stored session, so the seed has to be
+        passed again on every exchange that resumes the segment.
+        """
+        chain = self.chains.get(agent_name)
+        return chain.segment_seed if chain else None
     
     def clear_chain(self, agent_name: str):
         """Clear the session chain for an agent."""
@@ -118,7 +212,11 @@ class SessionChainStore:
             "exchange_count": chain.exchange_count,
             "previous_sessions": len(chain.previous_sessions),
             "created_at": chain.created_at,
-            "last_updated": chain.last_updated
+            "last_updated": chain.last_updated,
+            "chain_id": chain.chain_id,
+            "context_tokens": chain.context_tokens,
+            "compacted_segments": len(chain.lineage),
+            "summary_pending": chain.summary is not None
         }
     
     def _load_chains(self):
@@ -134,6 +232,7 @@ class SessionChainStore:
     
     def _save_chains(self):
         """Save session chains to storage."""
+        self.unsaved = False
         if not self.storage_path:
             return
             
@@ -147,9 +246,11 @@ class SessionChainStore:
                 for agent_name, chain in self.chains.items()
             }
             
-            # Write to file
-            with open(self.storage_path, 'w') as f:
+            # Write to a temporary file and rename, so readers never see a partial file
+            tmp_path = self.storage_path.with_name(f"{self.storage_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'w') as f:
                 json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.storage_path)
                 
             logger.debug(f"Saved {len(self.chains)} session chains to {self.storage_path}")
         except Exception as e:
@@ -0,0 +1,238 @@
+"""
+Tool Usage Profiler for Task-Agents MCP Server
+
+Every tool an agent declares adds its description and schema to every
+request, but many agents declare the full set and use two tools. The
+profiler counts, per agent and across all runs, how many runs used each tool
+and how often, and persists the counts. Its report lists the declared tools
+that were never used, with an estimate of the tokens each adds per request
+(package data ``data/tool_tokens.json``), and suggests a tighter ``tools``
+list once an agent has TASK_AGENTS_TOOL_MIN_RUNS runs.
+
+A suggestion is applied by writing it as a frontmatter override next to the
+agent files, ``.overrides/<name>.yaml``, which the agent manager merges into
+the agent's frontmatter:
+
+    # Written by the tool-usage profiler: 42 runs used Read, Grep
+    tools: Read, Grep
+
+Delete the file to restore the agent's own tools. Overrides are written when
+asked for (the ``tool_profile`` tool) or, with TASK_AGENTS_TOOL_AUTO_APPLY,
+as soon as an agent has enough runs.
+
+Settings:
+    TASK_AGENTS_TOOL_STATS_PATH   Statistics file (default /tmp/task_agents_tool_stats-<agents dir digest>.json)
+    TASK_AGENTS_TOOL_MIN_RUNS     Runs of an agent before unused tools are suggested for removal (default 20)
+    TASK_AGENTS_TOOL_AUTO_APPLY   1 to write suggestions as overrides automatically
+"""
+
+import functools
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+OVERRIDES_DIR = ".overrides"
+TOOL_TOKENS_PATH = Path(__file__).parent / "data" / "tool_tokens.json"
+
+
+@functools.lru_cache(maxsize=None)
+def load_tool_tokens() -> Dict[str, int]:
+    """Estimated per-request tokens of the built-in tools, read from the package data once."""
+    with open(TOOL_TOKENS_PATH, encoding="utf-8") as f:
+        return {name: tokens for name, tokens in json.load(f).items() if not name.startswith("_comment")}
+
+
+def tool_tokens(tool: str) -> int:
+    """Estimated tokens a tool's definition adds to each request."""
+    tokens = load_tool_tokens()
+    return tokens.get(tool, tokens["_default"])
+
+
+def base_tool_name(tool: str) -> str:
+    """A declared tool without its permission pattern (``Bash(git:*)`` -> ``Bash``)."""
+    return tool.split("(", 1)[0].strip()
+
+
+def override_path(configs_dir: Path, name: str) -> Path:
+    """The override file of an agent (by internal name)."""
+    return Path(configs_dir) / OVERRIDES_DIR / f"{name}.yaml"
+
+
+def load_override(configs_dir: Path, name: str) -> Optional[Dict[str, Any]]:
+    """An agent's frontmatter override, or None if it has none or it is invalid."""
+    path = override_path(configs_dir, name)
+    if not path.exists():
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            override = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError) as e:
+        logger.warning(f"Ignoring override {path}: {e}")
+        return None
+    if not isinstance(override, dict):
+        logger.warning(f"Ignoring override {path}: not a mapping")
+        return None
+    return override
+
+
+def apply_override(frontmatter: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """Frontmatter with an override's keys replacing its own (``optional`` is merged key by key)."""
+    merged = dict(frontmatter)
+    for key, value in override.items():
+        if key == "optional" and isinstance(value, dict) and isinstance(merged.get("optional"), dict):
+            merged["optional"] = {**merged["optional"], **value}
+        else:
+            merged[key] = value
+    return merged
+
+
+@dataclass
+class ToolStats:
+    """Tool usage of one agent across all recorded runs."""
+    runs: int = 0
+    calls: Dict[str, int] = field(default_factory=dict)  # Tool -> calls
+    runs_using: Dict[str, int] = field(default_factory=dict)  # Tool -> runs that called it
+    last_used: Dict[str, float] = field(default_factory=dict)  # Tool -> epoch seconds
+    first_run: Optional[float] = None
+    last_run: Optional[float] = None
+
+    def add(self, tools_used: Iterable[str], at: Optional[float] = None):
+        at = at or time.time()
+        self.runs += 1
+        self.first_run = self.first_run or at
+        self.last_run = at
+        tools_used = list(tools_used)
+        for tool in tools_used:
+            self.calls[tool] = self.calls.get(tool, 0) + 1
+        for tool in set(tools_used):
+            self.runs_using[tool] = self.runs_using.get(tool, 0) + 1
+            self.last_used[tool] = at
+
+
+class ToolProfiler:
+    """Persistent per-agent tool usage statistics and tool-set suggestions."""
+
+    def __init__(self, storage_path: Optional[Path] = None, min_runs: Optional[int] = None,
+                 auto_apply: Optional[bool] = None):
+        """
+        Initialize the profiler and load saved statistics.
+
+        Args:
+            storage_path: JSON file for the statistics (None = memory only)
+            min_runs: Runs of an agent before unused tools are suggested for removal
+            auto_apply: Write suggestions as overrides as soon as they are available
+        """
+        self.storage_path = storage_path
+        self.min_runs = min_runs or int(os.environ.get('TASK_AGENTS_TOOL_MIN_RUNS', '20'))
+        self.auto_apply = auto_apply if auto_apply is not None else (
+            os.environ.get('TASK_AGENTS_TOOL_AUTO_APPLY', '').strip().lower() in ('1', 'true', 'yes', 'on'))
+        self.stats: Dict[str, ToolStats] = {}
+        self.loaded = False  # Statistics were read from storage
+        if storage_path and storage_path.exists():
+            self._load()
+
+    def record(self, agent: str, tools_used: Iterable[str], at: Optional[float] = None) -> ToolStats:
+        """Count the tools of one finished run and save the statistics."""
+        stats = self.stats.setdefault(agent, ToolStats())
+        stats.add(tools_used, at)
+        self._save()
+        return stats
+
+    def bootstrap(self, runs: Iterable[Any]):
+        """Seed empty statistics from earlier runs (records with ``agent``, ``tools_used`` and ``started_at``)."""
+        count = 0
+        for run in runs:
+            self.stats.setdefault(run.agent, ToolStats()).add(run.tools_used, run.started_at)
+            count += 1
+        if count:
+            logger.info(f"Tool usage statistics seeded from {count} recorded runs")
+            self._save()
+
+    def report(self, agent_config) -> Dict[str, Any]:
+        """Usage of an agent's tools, the unused ones and their cost, and the suggested tool set."""
+        stats = self.stats.get(agent_config.agent_name, ToolStats())
+        declared = [base_tool_name(tool) for tool in agent_config.tools if base_tool_name(tool)]
+        used = [tool for tool in declared if stats.runs_using.get(tool)]
+        unused = [tool for tool in declared if not stats.runs_using.get(tool)]
+        tools = [
+            {
+                "tool": tool,
+                "declared": tool in declared,
+                "calls": stats.calls.get(tool, 0),
+                "runs_using": stats.runs_using.get(tool, 0),
+                "share_of_runs": round(stats.runs_using.get(tool, 0) / stats.runs, 3) if stats.runs else 0.0,
+                "estimated_tokens_per_request": tool_tokens(tool) if tool in declared else None,
+                "last_used": stats.last_used.get(tool),
+            }
+            for tool in declared + sorted(set(stats.calls) - set(declared))
+        ]
+        report = {
+            "agent": agent_config.agent_name,
+            "runs": stats.runs,
+            "declared": declared,
+            "tools": tools,
+            "unused": unused,
+            "unused_tokens_per_request": sum(tool_tokens(tool) for tool in unused),
+            "undeclared_used": sorted(set(stats.calls) - set(declared)),  # MCP tools and the like
+            "suggestion": None,
+        }
+        if stats.runs < self.min_runs:
+            report["status"] = f"collecting ({stats.runs}/{self.min_runs} runs)"
+        elif not unused:
+            report["status"] = "all declared tools are used"
+        else:
+            report["status"] = "tighter tool set available"
+            report["suggestion"] = {
+                "tools": ", ".join(used),
+                "remove": unused,
+                "tokens_saved_per_request": report["unused_tokens_per_request"],
+            }
+        return report
+
+    def write_override(self, configs_dir: Path, agent_config, suggestion: Dict[str, Any]) -> Path:
+        """Write a suggestion as the agent's frontmatter override, keeping other override keys."""
+        path = override_path(configs_dir, agent_config.name)
+        override = load_override(configs_dir, agent_config.name) or {}
+        override["tools"] = suggestion["tools"]
+        stats = self.stats.get(agent_config.agent_name, ToolStats())
+        header = (f"# Written by the tool-usage profiler on {datetime.now().strftime('%Y-%m-%d %H:%M')}: "
+                  f"{stats.runs} runs never used {', '.join(suggestion['remove'])}\n"
+                  f"# (~{suggestion['tokens_saved_per_request']} tokens per request). "
+                  f"Delete this file to restore the agent's tools.\n")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(header + yaml.safe_dump(override, sort_keys=False))
+        os.replace(tmp_path, path)
+        logger.info(f"Tool override for {agent_config.agent_name} written to {path}: tools {suggestion['tools']}")
+        return path
+
+    def _load(self):
+        try:
+            with open(self.storage_path) as f:
+                data = json.load(f)
+            self.stats = {agent: ToolStats(**values) for agent, values in data.get("agents", {}).items()}
+            self.loaded = True
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Failed to load tool usage statistics: {e}")
+
+    def _save(self):
+        if not self.storage_path:
+            return
+        try:
+            self.storage_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.storage_path.with_name(f"{self.storage_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({"agents": {agent: asdict(stats) for agent, stats in self.stats.items()}}, f)
+            os.replace(tmp_path, self.storage_path)
+        except OSError as e:
+            logger.error(f"Failed to save tool usage statistics: {e}")
@@ -0,0 +1,304 @@
+"""
+Transcript Archive for Task-Agents MCP Server
+
+Keeps the stream-json events of every agent run so earlier exchanges can be
+inspected without resuming a session or digging through the CLI's own
+session files.
+
+Each run's events are compressed as one gzip member and appended to the
+current segment file (segment-000001.gz, ...); a new segment starts once the
+current one reaches TASK_AGENTS_ARCHIVE_SEGMENT_MB. A SQLite index records,
+per run, the agent, session chain, session id, time and the segment offset
+and length of its events, so a session is read with one seek and one
+decompression. When the archive exceeds TASK_AGENTS_ARCHIVE_MAX_MB, whole
+segments are deleted oldest first together with their index rows.
+
+Partial-message deltas are not archived (the assistant messages that follow
+them hold the same text), and neither are the prompts sent to the CLI.
+
+Resources:
+    task-agent://transcripts                         Archive usage and the latest runs
+    task-agent://transcripts/agents/{agent}          Runs of an agent, newest first
+    task-agent://transcripts/agents/{agent}/since/{since}   Runs since a time (ISO date or epoch seconds)
+    task-agent://transcripts/chains/{chain_id}       Runs of a session chain, in order
+    task-agent://transcripts/sessions/{session_id}   One run: messages, tool calls and result
+    task-agent://transcripts/sessions/{session_id}/events   One run's raw stream-json events
+
+Settings:
+    TASK_AGENTS_ARCHIVE              off to disable archiving (default on)
+    TASK_AGENTS_ARCHIVE_DIR          Archive directory (default /tmp/task_agents_archive-<agents dir digest>)
+    TASK_AGENTS_ARCHIVE_SEGMENT_MB   Segment size (default 8)
+    TASK_AGENTS_ARCHIVE_MAX_MB       Total size of the archive (default 256)
+    TASK_AGENTS_ARCHIVE_MAX_EVENTS   Events kept per run (default 5000)
+"""
+
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends from several instances are not serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    agent TEXT NOT NULL,
+    chain_id TEXT,
+    session_id TEXT,
+    resumed_from TEXT,
+    started_at REAL NOT NULL,
+    duration REAL,
+    model TEXT,
+    outcome TEXT,
+    event_count INTEGER,
+    truncated INTEGER DEFAULT 0,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_agent ON runs (agent, started_at);
+CREATE INDEX IF NOT EXISTS runs_chain ON runs (chain_id, started_at);
+CREATE INDEX IF NOT EXISTS runs_session ON runs (session_id);
+CREATE INDEX IF NOT EXISTS runs_segment ON runs (segment);
+"""
+
+_COLUMNS = ("id", "agent", "chain_id", "session_id", "resumed_from", "started_at", "duration", "model",
+            "outcome", "event_count", "truncated")
+
+
+@dataclass
+class ArchivedRun:
+    """What the index records about one run (besides where its events are)."""
+    agent: str
+    session_id: Optional[str]
+    started_at: float
+    duration: float
+    model: Optional[str]
+    outcome: str
+    chain_id: Optional[str] = None
+    resumed_from: Optional[str] = None  # Session the run resumed or forked
+
+
+def parse_since(value: str) -> float:
+    """Epoch seconds from an ISO date/time or a number of epoch seconds.
+
+    Raises:
+        ValueError: The value is neither
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def condense(events: List[Dict[str, Any]], max_chars: int = 2000) -> Dict[str, Any]:
+    """A readable view of a run's events: assistant text, tool calls and the result."""
+    steps: List[Dict[str, Any]] = []
+    result: Dict[str, Any] = {}
+    for event in events:
+        event_type = event.get('type')
+        if event_type == 'assistant':
+            for item in event.get('message', {}).get('content') or []:
+                if item.get('type') == 'text' and item.get('text'):
+                    steps.append({"text": item['text']})
+                elif item.get('type') == 'tool_use':
+                    tool_input = json.dumps(item.get('input', {}), ensure_ascii=False)
+                    steps.append({"tool": item.get('name'), "input": tool_input[:max_chars]})
+        elif event_type == 'user':
+            for item in event.get('message', {}).get('content') or []:
+                if isinstance(item, dict) and item.get('type') == 'tool_result':
+                    content = item.get('content')
+                    text = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+                    steps.append({"tool_result": text[:max_chars], "is_error": bool(item.get('is_error'))})
+        elif event_type == 'result':
+            result = {key: event.get(key) for key in ('subtype', 'is_error', 'result', 'usage', 'total_cost_usd')
+                      if key in event}
+    return {"steps": steps, "result": result}
+
+
+class TranscriptArchive:
+    """Segmented, compressed, append-only store of run events with a SQLite index."""
+
+    def __init__(self, directory: Path, segment_bytes: Optional[int] = None, max_bytes: Optional[int] = None,
+                 max_events: Optional[int] = None):
+        """
+        Initialize the archive (nothing is created until the first run is archived).
+
+        Args:
+            directory: Where segments and the index are kept
+            segment_bytes: Size at which a new segment starts
+            max_bytes: Total size above which the oldest segments are deleted
+            max_events: Events kept per run
+        """
+        env = os.environ.get
+        self.enabled = env('TASK_AGENTS_ARCHIVE', 'on').strip().lower() not in ('off', '0', 'false', 'no')
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes or int(float(env('TASK_AGENTS_ARCHIVE_SEGMENT_MB', '8')) * 1024 * 1024)
+        self.max_bytes = max_bytes or int(float(env('TASK_AGENTS_ARCHIVE_MAX_MB', '256')) * 1024 * 1024)
+        self.max_events = max_events or int(env('TASK_AGENTS_ARCHIVE_MAX_EVENTS', '5000'))
+        self.archived = 0  # Runs archived since startup
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()  # Appends run in worker threads
+
+    def keep(self, event: Dict[str, Any]) -> bool:
+        """Whether an event of a run goes into the archive."""
+        return self.enabled and event.get('type') != 'stream_event'
+
+    def append(self, run: ArchivedRun, events: List[Dict[str, Any]], truncated: bool = False) -> int:
+        """Archive a run's events.
+
+        Args:
+            run: Index fields of the run
+            events: Its stream-json events
+            truncated: Events were dropped because the run exceeded max_events
+
+        Returns:
+            The run's archive id
+        """
+        blob = gzip.compress("\n".join(json.dumps(e, ensure_ascii=False) for e in events).encode("utf-8"),
+                            compresslevel=6)
+        with self._lock:
+            db = self._connect()
+            segment = self._current_segment(db)
+            with open(self._segment_path(segment), "ab") as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)  # Other instances may append too
+                offset = f.seek(0, os.SEEK_END)
+                f.write(blob)
+            cursor = db.execute(
+                "INSERT INTO runs (agent, chain_id, session_id, resumed_from, started_at, duration, model, "
+                "outcome, event_count, truncated, segment, offset, length) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                (run.agent, run.chain_id, run.session_id, run.resumed_from, run.started_at, run.duration,
+                 run.model, run.outcome, len(events), int(truncated), segment, offset, len(blob)))
+            db.commit()
+            self.archived += 1
+            self._enforce_retention(db)
+            return cursor.lastrowid
+
+    def runs(self, agent: Optional[str] = None, chain_id: Optional[str] = None,
+             since: Optional[float] = None, limit: int = 50, oldest_first: bool = False) -> List[Dict[str, Any]]:
+        """Index entries of archived runs, filtered by agent, chain and start time."""
+        clauses, params = [], []
+        for column, value in (("agent", agent), ("chain_id", chain_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("started_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "ASC" if oldest_first else "DESC"
+        with self._lock:
+            db = self._connect(create=False)
+            if db is None:
+                return []
+            rows = db.execute(f"SELECT {', '.join(_COLUMNS)} FROM runs {where} "
+                              f"ORDER BY started_at {order} LIMIT ?", (*params, limit)).fetchall()
+        return [self._row_dict(row) for row in rows]
+
+    def session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Index entry and events of the latest run with a session id, or None."""
+        with self._lock:
+            db = self._connect(create=False)
+            if db is None:
+                return None
+            row = db.execute(f"SELECT {', '.join(_COLUMNS)}, segment, offset, length FROM runs "
+                             f"WHERE session_id = ? ORDER BY started_at DESC LIMIT 1", (session_id,)).fetchone()
+        if row is None:
+            return None
+        segment, offset, length = row[-3:]
+        try:
+            with open(self._segment_path(segment), "rb") as f:
+                f.seek(offset)
+                data = gzip.decompress(f.read(length))
+        except (OSError, EOFError, gzip.BadGzipFile) as e:
+            logger.warning(f"Archived events of session {session_id} are unreadable: {e}")
+            return None
+        entry = self._row_dict(row[:len(_COLUMNS)])
+        entry["events"] = [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+        return entry
+
+    def summary(self) -> Dict[str, Any]:
+        """Archive usage (for resources)."""
+        segments = self._segments()
+        with self._lock:
+            db = self._connect(create=False)
+            runs = db.execute("SELECT COUNT(*) FROM runs").fetchone()[0] if db else 0
+        return {
+            "enabled": self.enabled,
+            "directory": str(self.directory),
+            "runs": runs,
+            "segments": len(segments),
+            "bytes": sum(size for _, size in segments),
+            "max_bytes": self.max_bytes,
+            "archived_since_start": self.archived,
+        }
+
+    def _connect(self, create: bool = True) -> Optional[sqlite3.Connection]:
+        if self._db is None:
+            index_path = self.directory / "index.sqlite"
+            if not create and not index_path.exists():
+                return None
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(index_path), check_same_thread=False, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f"segment-{segment:06d}.gz"
+
+    def _segments(self) -> List[tuple]:
+        """``(number, size)`` of the segment files, oldest first."""
+        segments = []
+        try:
+            for path in self.directory.glob("segment-*.gz"):
+                try:
+                    segments.append((int(path.stem.split("-")[1]), path.stat().st_size))
+                except (ValueError, OSError):
+                    continue
+        except OSError:
+            pass
+        return sorted(segments)
+
+    def _current_segment(self, db: sqlite3.Connection) -> int:
+        segments = self._segments()
+        if not segments:
+            latest = db.execute("SELECT MAX(segment) FROM runs").fetchone()[0]
+            return (latest or 0) + 1
+        number, size = segments[-1]
+        return number + 1 if size >= self.segment_bytes else number
+
+    def _enforce_retention(self, db: sqlite3.Connection):
+        """Delete the oldest segments (never the current one) while the archive is over its size."""
+        segments = self._segments()
+        total = sum(size for _, size in segments)
+        for number, size in segments[:-1]:
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM runs WHERE segment = ?", (number,))
+            db.commit()
+            try:
+                self._segment_path(number).unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            logger.info(f"Deleted transcript segment {number} ({size:,} bytes) to stay under the archive size")
+
+    @staticmethod
+    def _row_dict(row) -> Dict[str, Any]:
+        entry = dict(zip(_COLUMNS, row))
+        entry["truncated"] = bool(entry["truncated"])
+        entry["started"] = datetime.fromtimestamp(entry["started_at"]).isoformat(timespec="seconds")
+        return entry
@@ -0,0 +1,466 @@
+"""
+Remote Workers for Task-Agents MCP Server
+
+A worker runs Claude CLI processes on behalf of task-agent servers, so agent
+runs can be spread over several machines:
+
+    task-agent worker --listen 0.0.0.0:7460 --capacity 8      # on each worker host
+    TASK_AGENTS_WORKERS=host-a:7460,host-b:7460 task-agent    # on the server
+
+Protocol: newline-delimited JSON over TCP or a Unix socket (``unix:/path``),
+one connection per request. The server sends
+
+    {"type": "run", "token": ..., "args": [...], "cwd": ..., "resources": {...}, "label": ...}
+
+where ``args`` is the CLI argv without the executable (the worker uses its
+own ``claude``), and receives ``started``, one ``event`` message per
+stream-json event, and a final ``exit`` message with the exit code, stderr
+and resource usage. Sending ``{"type": "cancel"}`` (or closing the
+connection) kills the run. ``{"type": "health"}`` returns the worker's load.
+
+Working directories are used as-is, so workers need the same paths as the
+server (a shared or mirrored filesystem). Requests must carry the token from
+``TASK_AGENTS_WORKER_TOKEN``. A worker refuses to listen on TCP without one;
+its Unix socket is created owner-only (0600), so without a token only the
+worker's own user can connect.
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from . import __version__
+from .executors import Execution, LocalExecution, find_claude_executable
+from .resource_governor import CgroupManager, ResourceProfile, ResourceUsage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 7460
+LOCAL = "local"
+
+# stream-json lines carry whole tool results
+STREAM_LIMIT = 16 * 1024 * 1024
+
+
+class WorkerError(Exception):
+    """A worker refused or failed a request."""
+
+
+async def _open(address: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if address.startswith("unix:"):
+        return await asyncio.open_unix_connection(address[5:], limit=STREAM_LIMIT)
+    host, _, port = address.rpartition(":")
+    return await asyncio.open_connection(host or "127.0.0.1", int(port or DEFAULT_PORT), limit=STREAM_LIMIT)
+
+
+async def _send(writer: asyncio.StreamWriter, message: Dict[str, Any]):
+    writer.write(json.dumps(message).encode('utf-8') + b"\n")
+    await writer.drain()
+
+
+async def _receive(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+# ============= SERVER SIDE =============
+class RemoteExecution(Execution):
+    """A CLI run on a remote worker."""
+
+    def __init__(self, address: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        super().__init__()
+        self.where = address
+        self.reader = reader
+        self.writer = writer
+        self.pid: Optional[int] = None
+        self.exited = asyncio.Event()
+        self.lost = False  # The connection dropped before the worker reported an exit
+
+    @classmethod
+    async def start(cls, address: str, cmd: List[str], working_dir: str,
+                    profile: Optional[ResourceProfile] = None, label: str = "",
+                    token: Optional[str] = None, connect_timeout: float = 5.0) -> "RemoteExecution":
+        """Send a run request to a worker and wait until it has started the CLI.
+
+        Args:
+            address: Worker address (``host:port`` or ``unix:/path``)
+            cmd: Full CLI argv (the worker replaces the executable with its own)
+            working_dir: Directory to run the CLI in, on the worker
+            profile: Optional resource profile applied by the worker
+            label: Name used for the run's cgroup on the worker (the agent name)
+            token: Shared secret (TASK_AGENTS_WORKER_TOKEN)
+            connect_timeout: Seconds allowed for connecting
+
+        Raises:
+            OSError, asyncio.TimeoutError: The worker could not be reached
+            WorkerError: The worker refused the request
+        """
+        reader, writer = await asyncio.wait_for(_open(address), timeout=connect_timeout)
+        execution = cls(address, reader, writer)
+        try:
+            await _send(writer, {
+                "type": "run",
+                "token": token,
+                "args": cmd[1:],
+                "cwd": working_dir,
+                "resources": asdict(profile) if profile else None,
+                "label": label,
+            })
+            # No timeout here: a busy worker queues the run until it has a free slot
+            message = await _receive(reader)
+        except BaseException:
+            writer.close()
+            raise
+        if not message or message.get("type") != "started":
+            writer.close()
+            raise WorkerError((message or {}).get("message", "worker closed the connection"))
+        execution.pid = message.get("pid")
+        return execution
+
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        while True:
+            try:
+                message = await _receive(self.reader)
+            except (OSError, ValueError) as e:
+                message = None
+                self.stderr = f"Worker connection error: {e}"
+            if message is None:
+                if not self.exited.is_set():
+                    self.lost = True
+                    self.stderr = self.stderr or f"Worker connection error: {self.where} closed the connection"
+                    self.returncode = -1
+                    self.exited.set()
+                return
+            if message.get("type") == "event":
+                yield message["event"]
+            elif message.get("type") == "exit":
+                self.returncode = message.get("returncode")
+                self.stderr = message.get("stderr", "")
+                usage = message.get("usage")
+                if usage:
+                    self.usage = ResourceUsage(**usage)
+                self.exited.set()
+                return
+
+    async def wait(self) -> int:
+        await self.exited.wait()
+        return self.returncode
+
+    async def terminate(self):
+        try:
+            await _send(self.writer, {"type": "cancel"})
+        except OSError:
+            pass
+        self.writer.close()
+
+    async def finish(self):
+        self.writer.close()
+
+
+@dataclass
+class WorkerEndpoint:
+    """A place agent runs can execute: this server ("local") or a remote worker."""
+    address: str
+    capacity: int = 1
+    active: int = 0  # Runs in progress (as of the last health check, plus our dispatches since)
+    queued: int = 0
+    healthy: bool = True
+    last_check: Optional[float] = None
+    last_error: Optional[str] = None
+    dispatched: int = 0
+    version: Optional[str] = None
+
+    @property
+    def load(self) -> float:
+        return (self.active + self.queued) / max(1, self.capacity)
+
+
+class WorkerPool:
+    """Least-loaded dispatch over the local runner and the workers in TASK_AGENTS_WORKERS."""
+
+    def __init__(self, addresses: Optional[List[str]] = None, local_capacity: int = 4,
+                 token: Optional[str] = None, health_interval: Optional[float] = None):
+        """
+        Initialize the pool.
+
+        Args:
+            addresses: Worker addresses (``host:port`` or ``unix:/path``); defaults to
+                       the comma-separated TASK_AGENTS_WORKERS
+            local_capacity: Concurrent runs the local runner is counted as handling
+            token: Shared secret sent with requests (TASK_AGENTS_WORKER_TOKEN)
+            health_interval: Seconds between worker health checks (TASK_AGENTS_WORKER_HEALTH_INTERVAL, default 10)
+        """
+        if addresses is None:
+            addresses = [a.strip() for a in os.environ.get('TASK_AGENTS_WORKERS', '').split(',') if a.strip()]
+        self.token = token if token is not None else os.environ.get('TASK_AGENTS_WORKER_TOKEN')
+        self.health_interval = health_interval if health_interval is not None else float(
+            os.environ.get('TASK_AGENTS_WORKER_HEALTH_INTERVAL', '10'))
+        self.endpoints: Dict[str, WorkerEndpoint] = {}
+        if os.environ.get('TASK_AGENTS_LOCAL_WORKER', 'on').lower() not in ('off', '0', 'false') or not addresses:
+            self.endpoints[LOCAL] = WorkerEndpoint(address=LOCAL, capacity=local_capacity)
+        for address in addresses:
+            self.endpoints[address] = WorkerEndpoint(address=address, capacity=1, healthy=False)
+        self.first_check: Optional[asyncio.Future] = None
+        self.health_task: Optional[asyncio.Task] = None
+
+    @property
+    def has_remote(self) -> bool:
+        return any(address != LOCAL for address in self.endpoints)
+
+    async def select(self) -> WorkerEndpoint:
+        """Reserve the healthy endpoint with the lowest load (local wins ties).
+
+        The caller must call ``finished`` when the run ends.
+
+        Raises:
+            WorkerError: No endpoint is healthy (only possible with the local runner disabled)
+        """
+        if self.has_remote:
+            if self.first_check is None:
+                self.first_check = asyncio.ensure_future(self.check_all())
+                self.health_task = asyncio.create_task(self._health_loop())
+            await asyncio.shield(self.first_check)
+        candidates = [e for e in self.endpoints.values() if e.healthy]
+        if not candidates:
+            # Workers may have recovered since the last health check
+            await self.check_all()
+            candidates = [e for e in self.endpoints.values() if e.healthy]
+        if not candidates:
+            # Never fall back to running here: TASK_AGENTS_LOCAL_WORKER=off means this host must not run the CLI
+            raise WorkerError(f"no healthy workers among {', '.join(self.endpoints)}")
+        endpoint = min(candidates, key=lambda e: (e.load, e.address != LOCAL))
+        endpoint.active += 1
+        endpoint.dispatched += 1
+        return endpoint
+
+    def finished(self, endpoint: WorkerEndpoint):
+        endpoint.active = max(0, endpoint.active - 1)
+
+    def mark_failed(self, endpoint: WorkerEndpoint, error: Exception):
+        logger.warning(f"Worker {endpoint.address} failed: {error}")
+        endpoint.healthy = False
+        endpoint.last_error = str(error)
+
+    async def check(self, endpoint: WorkerEndpoint):
+        """Ask a worker for its load and mark it healthy or not."""
+        try:
+            reader, writer = await asyncio.wait_for(_open(endpoint.address), timeout=3.0)
+            try:
+                await _send(writer, {"type": "health", "token": self.token})
+                reply = await asyncio.wait_for(_receive(reader), timeout=3.0)
+            finally:
+                writer.close()
+            if not reply or reply.get("type") != "health":
+                raise WorkerError((reply or {}).get("message", "no health reply"))
+            if not endpoint.healthy:
+                logger.info(f"Worker {endpoint.address} is healthy")
+            endpoint.healthy = True
+            endpoint.capacity = reply.get("capacity", 1)
+            endpoint.active = reply.get("active", 0)
+            endpoint.queued = reply.get("queued", 0)
+            endpoint.version = reply.get("version")
+            endpoint.last_error = None
+        except (OSError, asyncio.TimeoutError, ValueError, WorkerError) as e:
+            if endpoint.healthy:
+                logger.warning(f"Worker {endpoint.address} failed its health check: {e}")
+            endpoint.healthy = False
+            endpoint.last_error = str(e) or type(e).__name__
+        endpoint.last_check = time.time()
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(e) for e in self.endpoints.values() if e.address != LOCAL))
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.check_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Endpoints and their load for the status resource."""
+        return {
+            "endpoints": [
+                {
+                    "address": e.address,
+                    "healthy": e.healthy,
+                    "capacity": e.capacity,
+                    "active": e.active,
+                    "queued": e.queued,
+                    "dispatched": e.dispatched,
+                    "version": e.version,
+                    "last_error": e.last_error,
+                }
+                for e in self.endpoints.values()
+            ],
+        }
+
+
+# ============= WORKER SIDE =============
+class Worker:
+    """Accepts run requests and executes them with the local Claude CLI."""
+
+    def __init__(self, capacity: int = 4, token: Optional[str] = None, sample_interval: float = 0.0):
+        self.capacity = capacity
+        self.token = token
+        self.sample_interval = sample_interval
+        self.slots = asyncio.Semaphore(capacity)
+        self.cgroups = CgroupManager()
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+
+    def _authorized(self, request: Dict[str, Any], writer: asyncio.StreamWriter) -> bool:
+        if not self.token:
+            # Only the owner-only Unix socket may go without a token (a path, not a TCP address)
+            return isinstance(writer.get_extra_info("sockname"), str)
+        return hmac.compare_digest(str(request.get("token") or ""), self.token)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await _receive(reader)
+            if not request:
+                return
+            if not self._authorized(request, writer):
+                await _send(writer, {"type": "error", "message": "invalid worker token"})
+                return
+            if request.get("type") == "health":
+                await _send(writer, {"type": "health", "active": self.active, "queued": self.queued,
+                                     "capacity": self.capacity, "version": __version__})
+            elif request.get("type") == "run":
+                await self._run(request, reader, writer)
+            else:
+                await _send(writer, {"type": "error", "message": f"unknown request {request.get('type')!r}"})
+        except (OSError, ValueError) as e:
+            logger.debug(f"Connection error: {e}")
+        finally:
+            writer.close()
+
+    async def _run(self, request: Dict[str, Any], reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        claude_path = find_claude_executable()
+        cwd = request.get("cwd") or "."
+        if not claude_path:
+            await _send(writer, {"type": "error", "message": "Claude CLI not found on worker"})
+            return
+        if not os.path.isdir(cwd):
+            await _send(writer, {"type": "error", "message": f"Working directory does not exist on worker: {cwd}"})
+            return
+        profile = ResourceProfile(**request["resources"]) if request.get("resources") else None
+
+        self.queued += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+        execution = None
+        exited = False
+        try:
+            execution = await LocalExecution.start(
+                [claude_path, *request.get("args", [])], cwd, profile, self.cgroups,
+                request.get("label", ""), self.sample_interval
+            )
+            await _send(writer, {"type": "started", "pid": execution.pid})
+
+            async def watch_client():
+                # Cancel request or a dropped connection kills the run
+                while True:
+                    message = await _receive(reader)
+                    if message is None or message.get("type") == "cancel":
+                        return
+
+            watcher = asyncio.create_task(watch_client())
+            relay = asyncio.create_task(self._relay(execution, writer))
+            done, _ = await asyncio.wait({watcher, relay}, return_when=asyncio.FIRST_COMPLETED)
+            if watcher in done:
+                logger.info(f"Run {execution.pid} cancelled by the server")
+                relay.cancel()
+                await execution.terminate()
+                return
+            watcher.cancel()
+            await execution.wait()
+            exited = True
+        except (OSError, ValueError) as e:
+            logger.warning(f"Run failed: {e}")
+            if execution:
+                await execution.terminate()
+            else:
+                try:
+                    await _send(writer, {"type": "error", "message": str(e)})
+                except OSError:
+                    pass
+        finally:
+            try:
+                if execution:
+                    # Collects stderr and usage, so the exit message goes out after it
+                    await execution.finish()
+                if exited:
+                    await _send(writer, {
+                        "type": "exit",
+                        "returncode": execution.returncode,
+                        "stderr": execution.stderr,
+                        "usage": asdict(execution.usage) if execution.usage else None,
+                    })
+            except OSError as e:
+                logger.debug(f"Could not report exit: {e}")
+            finally:
+                self.active -= 1
+                self.completed += 1
+                self.slots.release()
+
+    @staticmethod
+    async def _relay(execution: LocalExecution, writer: asyncio.StreamWriter):
+        async for event in execution.events():
+            await _send(writer, {"type": "event", "event": event})
+
+
+async def serve(listen: str, worker: Worker):
+    """Accept connections on ``listen`` (``host:port`` or ``unix:/path``) until cancelled."""
+    if listen.startswith("unix:"):
+        # Create the socket owner-only: the file mode is what guards a token-less worker
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(worker.handle, path=listen[5:], limit=STREAM_LIMIT)
+        finally:
+            os.umask(umask)
+    else:
+        host, _, port = listen.rpartition(":")
+        server = await asyncio.start_server(worker.handle, host or "127.0.0.1", int(port or DEFAULT_PORT),
+                                            limit=STREAM_LIMIT)
+    logger.info(f"task-agent worker listening on {listen} (capacity {worker.capacity})")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command-line entry point: ``task-agent worker``."""
+    parser = argparse.ArgumentParser(prog="task-agent worker",
+                                     description="Run Claude CLI agent executions for task-agent servers")
+    parser.add_argument("--listen", default=f"127.0.0.1:{DEFAULT_PORT}",
+                        help="host:port or unix:/path/to/socket (default: %(default)s)")
+    parser.add_argument("--capacity", type=int, default=int(os.environ.get('TASK_AGENTS_WORKER_CAPACITY', '4')),
+                        help="Concurrent CLI runs (default: %(default)s)")
+    parser.add_argument("--token", default=os.environ.get('TASK_AGENTS_WORKER_TOKEN'),
+                        help="Shared secret required from servers (default: TASK_AGENTS_WORKER_TOKEN)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if not args.listen.startswith("unix:") and not args.token:
+        parser.error("a --token (or TASK_AGENTS_WORKER_TOKEN) is required to listen on TCP")
+
+    worker = Worker(capacity=args.capacity, token=args.token,
+                    sample_interval=float(os.environ.get('TASK_AGENTS_SAMPLE_INTERVAL', '0')))
+    try:
+        asyncio.run(serve(args.listen, worker))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
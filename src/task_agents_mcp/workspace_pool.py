@@ -0,0 +1,367 @@
+"""
+Workspace Pool for Task-Agents MCP Server
+
+Gives each invocation of an ``isolation: worktree`` agent its own checkout so
+several write-capable agents can work on one repository in parallel.
+
+For git repositories each run gets a git worktree taken from a per-repository
+pool of pre-created worktrees (reset to the current HEAD on checkout). Changes
+the agent leaves behind are committed to a ``task-agents/...`` branch, which is
+reported back and kept for merging. For directories outside git, each run gets
+a copy of the tree (reflinked where the filesystem supports copy-on-write) and
+the changed files are reported.
+
+Disk use is bounded by the pool size, the number of result branches kept and
+the number of overlay copies kept.
+"""
+
+import asyncio
+import filecmp
+import hashlib
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BRANCH_PREFIX = "task-agents/"
+
+# Commits on result branches are made with a fixed identity and without hooks
+_COMMIT_IDENTITY = ["-c", "user.name=Task Agents", "-c", "user.email=task-agents@localhost"]
+
+
+@dataclass
+class Workspace:
+    """An isolated checkout handed to one agent run."""
+    kind: str  # "worktree" or "overlay"
+    root: str  # Root of the isolated checkout
+    path: str  # Working directory inside it (mirrors the agent's cwd)
+    source: str  # Repository top level, or the copied directory
+    agent_name: str
+    base_sha: Optional[str] = None  # Commit the worktree was reset to
+    acquired_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class WorkspaceResult:
+    """What an isolated run produced."""
+    kind: str
+    changed: bool
+    branch: Optional[str] = None
+    base_sha: Optional[str] = None
+    diff_stat: str = ""
+    overlay_path: Optional[str] = None
+    changed_files: List[str] = field(default_factory=list)
+
+    def format(self) -> str:
+        """Short report appended to the agent's response."""
+        if self.kind == "worktree":
+            if not self.changed:
+                return "Workspace: isolated worktree, no changes"
+            return (f"Workspace: branch {self.branch} (from {self.base_sha[:8]})\n"
+                    f"{self.diff_stat}\n"
+                    f"Merge with: git merge {self.branch}")
+        if not self.changed:
+            return "Workspace: isolated copy, no changes"
+        shown = ', '.join(self.changed_files[:20])
+        more = f" and {len(self.changed_files) - 20} more" if len(self.changed_files) > 20 else ""
+        return f"Workspace: {self.overlay_path}\nChanged files: {shown}{more}"
+
+
+async def _run(args: List[str], cwd: Optional[str] = None) -> Tuple[int, str, str]:
+    """Run a command and return (returncode, stdout, stderr)."""
+    process = await asyncio.create_subprocess_exec(
+        *args, cwd=cwd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    return process.returncode, stdout.decode(errors='replace').strip(), stderr.decode(errors='replace').strip()
+
+
+async def _git(cwd: str, *args: str) -> str:
+    """Run a git command, raising RuntimeError on failure."""
+    returncode, stdout, stderr = await _run(["git", *args], cwd=cwd)
+    if returncode != 0:
+        raise RuntimeError(f"git {' '.join(args)} failed: {stderr or stdout}")
+    return stdout
+
+
+def _changed_files(left: str, right: str, prefix: str = "") -> List[str]:
+    """Files that differ, were added or were removed between two directory trees."""
+    comparison = filecmp.dircmp(left, right)
+    changed = [prefix + name for name in comparison.left_only + comparison.right_only + comparison.diff_files]
+    changed += [prefix + name for name in comparison.funny_files]
+    for sub in comparison.common_dirs:
+        changed += _changed_files(os.path.join(left, sub), os.path.join(right, sub), f"{prefix}{sub}/")
+    return sorted(changed)
+
+
+class WorkspacePool:
+    """Pools git worktrees per repository and creates overlay copies for other trees."""
+
+    def __init__(self, base_dir: Optional[Path] = None, pool_size: Optional[int] = None,
+                 keep_branches: Optional[int] = None, keep_overlays: Optional[int] = None):
+        """
+        Initialize the pool.
+
+        Args:
+            base_dir: Directory holding worktrees and overlays
+                      (TASK_AGENTS_WORKTREE_DIR, default /tmp/task_agents_worktrees)
+            pool_size: Idle worktrees kept ready per repository (TASK_AGENTS_WORKTREE_POOL, default 2)
+            keep_branches: Result branches kept per repository (TASK_AGENTS_KEEP_BRANCHES, default 20)
+            keep_overlays: Overlay copies kept (TASK_AGENTS_KEEP_OVERLAYS, default 5)
+        """
+        self.base_dir = base_dir or Path(os.environ.get('TASK_AGENTS_WORKTREE_DIR', '/tmp/task_agents_worktrees'))
+        self.pool_size = pool_size if pool_size is not None else int(
+            os.environ.get('TASK_AGENTS_WORKTREE_POOL', '2'))
+        self.keep_branches = keep_branches if keep_branches is not None else int(
+            os.environ.get('TASK_AGENTS_KEEP_BRANCHES', '20'))
+        self.keep_overlays = keep_overlays if keep_overlays is not None else int(
+            os.environ.get('TASK_AGENTS_KEEP_OVERLAYS', '5'))
+        self.idle: Dict[str, List[str]] = {}  # Repository top level -> idle worktree paths
+        self.busy: Dict[str, Workspace] = {}  # Workspace root -> workspace in use
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.fill_tasks: Dict[str, asyncio.Task] = {}
+        self.discovered: set = set()
+        self.created = 0
+        self.reused = 0
+
+    async def acquire(self, agent_name: str, working_dir: str, isolation: str = "worktree") -> Workspace:
+        """Get an isolated workspace mirroring ``working_dir``.
+
+        Args:
+            agent_name: Display name of the agent (used in branch and directory names)
+            working_dir: The agent's resolved working directory
+            isolation: "worktree" (git worktree when possible) or "overlay" (always copy)
+
+        Returns:
+            The workspace; run the agent in ``workspace.path``
+        """
+        top_level = None
+        if isolation == "worktree":
+            returncode, stdout, _ = await _run(["git", "rev-parse", "--show-toplevel"], cwd=working_dir)
+            top_level = stdout if returncode == 0 and stdout else None
+            if top_level is None:
+                logger.info(f"{working_dir} is not in a git repository, using an overlay copy")
+
+        if top_level:
+            workspace = await self._acquire_worktree(agent_name, working_dir, top_level)
+        else:
+            workspace = await self._create_overlay(agent_name, working_dir)
+        self.busy[workspace.root] = workspace
+        return workspace
+
+    async def release(self, workspace: Workspace, task_description: str) -> WorkspaceResult:
+        """Collect the result of a run and return the workspace to the pool."""
+        self.busy.pop(workspace.root, None)
+        if workspace.kind == "overlay":
+            return await asyncio.to_thread(self._finish_overlay, workspace)
+
+        try:
+            result = await self._commit_worktree(workspace, task_description)
+        except Exception as e:
+            logger.error(f"Could not collect changes from worktree {workspace.root}: {e}")
+            result = WorkspaceResult(kind="worktree", changed=False, base_sha=workspace.base_sha)
+
+        async with self._lock(workspace.source):
+            try:
+                # Detach so the result branch is free to be checked out or merged elsewhere
+                await _git(workspace.root, "checkout", "-q", "--detach")
+                idle = self.idle.setdefault(workspace.source, [])
+                if len(idle) < self.pool_size:
+                    idle.append(workspace.root)
+                else:
+                    await self._remove_worktree(workspace.source, workspace.root)
+            except Exception as e:
+                logger.warning(f"Dropping worktree {workspace.root}: {e}")
+                await self._remove_worktree(workspace.source, workspace.root)
+            await self._prune_branches(workspace.source)
+        return result
+
+    # ============= GIT WORKTREES =============
+    def _lock(self, top_level: str) -> asyncio.Lock:
+        return self.locks.setdefault(top_level, asyncio.Lock())
+
+    def _pool_dir(self, top_level: str) -> Path:
+        digest = hashlib.sha1(top_level.encode('utf-8')).hexdigest()[:10]
+        return self.base_dir / f"{Path(top_level).name}-{digest}"
+
+    async def _acquire_worktree(self, agent_name: str, working_dir: str, top_level: str) -> Workspace:
+        async with self._lock(top_level):
+            if top_level not in self.discovered:
+                await self._discover(top_level)
+            head = await _git(top_level, "rev-parse", "HEAD")
+            idle = self.idle.setdefault(top_level, [])
+            root = None
+            while idle and root is None:
+                candidate = idle.pop()
+                try:
+                    # Bring the pooled worktree to the current HEAD and drop leftovers
+                    await _git(candidate, "checkout", "-q", "--detach", "-f", head)
+                    await _git(candidate, "clean", "-q", "-fd")
+                    root = candidate
+                    self.reused += 1
+                except Exception as e:
+                    logger.warning(f"Discarding broken pooled worktree {candidate}: {e}")
+                    await self._remove_worktree(top_level, candidate)
+            if root is None:
+                root = await self._create_worktree(top_level, head)
+
+        branch = f"{BRANCH_PREFIX}{re.sub(r'[^a-z0-9]+', '-', agent_name.lower()).strip('-')}-{uuid.uuid4().hex[:6]}"
+        await _git(root, "checkout", "-q", "-b", branch)
+        if not self.idle[top_level]:
+            self._start_fill(top_level)
+
+        relative = os.path.relpath(os.path.realpath(working_dir), os.path.realpath(top_level))
+        path = root if relative == "." else os.path.join(root, relative)
+        logger.info(f"Isolated worktree for {agent_name}: {root} on {branch}")
+        return Workspace(kind="worktree", root=root, path=path, source=top_level,
+                         agent_name=agent_name, base_sha=head)
+
+    async def _create_worktree(self, top_level: str, head: str) -> str:
+        pool_dir = self._pool_dir(top_level)
+        pool_dir.mkdir(parents=True, exist_ok=True)
+        root = str(pool_dir / f"wt-{uuid.uuid4().hex[:8]}")
+        await _git(top_level, "worktree", "add", "-q", "--detach", root, head)
+        self.created += 1
+        return root
+
+    async def _discover(self, top_level: str):
+        """Adopt worktrees left in the pool directory by an earlier server process."""
+        self.discovered.add(top_level)
+        pool_dir = str(self._pool_dir(top_level))
+        try:
+            await _git(top_level, "worktree", "prune")
+            listing = await _git(top_level, "worktree", "list", "--porcelain")
+        except Exception as e:
+            logger.debug(f"Could not list worktrees of {top_level}: {e}")
+            return
+        idle = self.idle.setdefault(top_level, [])
+        for line in listing.splitlines():
+            if line.startswith("worktree "):
+                path = line[len("worktree "):]
+                if path.startswith(pool_dir) and path not in idle and path not in self.busy:
+                    idle.append(path)
+        if idle:
+            logger.info(f"Reusing {len(idle)} pooled worktrees of {top_level}")
+
+    def _start_fill(self, top_level: str):
+        """Refill the drained idle pool in the background so the next runs don't pay for setup."""
+        task = self.fill_tasks.get(top_level)
+        if task and not task.done():
+            return
+        self.fill_tasks[top_level] = asyncio.create_task(self._fill(top_level))
+
+    async def _fill(self, top_level: str):
+        try:
+            async with self._lock(top_level):
+                head = await _git(top_level, "rev-parse", "HEAD")
+                idle = self.idle.setdefault(top_level, [])
+                while len(idle) < self.pool_size:
+                    idle.append(await self._create_worktree(top_level, head))
+        except Exception as e:
+            logger.warning(f"Could not pre-create worktrees for {top_level}: {e}")
+
+    async def _commit_worktree(self, workspace: Workspace, task_description: str) -> WorkspaceResult:
+        """Commit what the agent left uncommitted and describe the branch."""
+        root = workspace.root
+        branch = await _git(root, "rev-parse", "--abbrev-ref", "HEAD")
+        await _git(root, "add", "-A")
+        if await _git(root, "status", "--porcelain"):
+            title = task_description.strip().splitlines()[0][:72] if task_description.strip() else "task"
+            await _git(root, *_COMMIT_IDENTITY, "commit", "-q", "--no-verify",
+                       "-m", f"{workspace.agent_name}: {title}")
+
+        diff_stat = await _git(root, "diff", "--shortstat", workspace.base_sha, "HEAD")
+        head = await _git(root, "rev-parse", "HEAD")
+        if head == workspace.base_sha:
+            # Nothing produced - don't keep an empty branch around
+            await _git(root, "checkout", "-q", "--detach")
+            await _git(root, "branch", "-q", "-D", branch)
+            return WorkspaceResult(kind="worktree", changed=False, base_sha=workspace.base_sha)
+        return WorkspaceResult(kind="worktree", changed=True, branch=branch,
+                               base_sha=workspace.base_sha, diff_stat=diff_stat)
+
+    async def _remove_worktree(self, top_level: str, root: str):
+        returncode, _, stderr = await _run(["git", "worktree", "remove", "--force", root], cwd=top_level)
+        if returncode != 0:
+            logger.debug(f"git worktree remove {root} failed ({stderr}), deleting directory")
+            shutil.rmtree(root, ignore_errors=True)
+            await _run(["git", "worktree", "prune"], cwd=top_level)
+
+    async def _prune_branches(self, top_level: str):
+        """Delete the oldest result branches beyond the retention limit."""
+        try:
+            listing = await _git(top_level, "for-each-ref", "--sort=-committerdate",
+                                 "--format=%(refname:short)", f"refs/heads/{BRANCH_PREFIX}")
+        except Exception as e:
+            logger.debug(f"Could not list result branches of {top_level}: {e}")
+            return
+        for branch in listing.splitlines()[self.keep_branches:]:
+            returncode, _, stderr = await _run(["git", "branch", "-q", "-D", branch], cwd=top_level)
+            if returncode != 0:
+                logger.debug(f"Could not delete result branch {branch}: {stderr}")
+
+    # ============= OVERLAY COPIES =============
+    async def _create_overlay(self, agent_name: str, working_dir: str) -> Workspace:
+        overlay_dir = self.base_dir / "overlays"
+        overlay_dir.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r'[^a-z0-9]+', '-', agent_name.lower()).strip('-')
+        root = str(overlay_dir / f"{slug}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}")
+
+        # cp --reflink=auto shares blocks on copy-on-write filesystems and copies elsewhere
+        returncode, _, stderr = await _run(["cp", "-a", "--reflink=auto", working_dir, root])
+        if returncode != 0:
+            logger.debug(f"cp --reflink failed ({stderr}), copying with shutil")
+            shutil.rmtree(root, ignore_errors=True)
+            await asyncio.to_thread(shutil.copytree, working_dir, root, symlinks=True)
+        self.created += 1
+        logger.info(f"Isolated overlay copy for {agent_name}: {root}")
+        return Workspace(kind="overlay", root=root, path=root, source=working_dir, agent_name=agent_name)
+
+    def _finish_overlay(self, workspace: Workspace) -> WorkspaceResult:
+        changed = _changed_files(workspace.source, workspace.root)
+        if not changed:
+            shutil.rmtree(workspace.root, ignore_errors=True)
+            return WorkspaceResult(kind="overlay", changed=False)
+
+        # Keep the newest overlays with changes, oldest go first (cp -a preserves
+        # mtimes, so order by inode change time, which is set when the copy is made)
+        overlays = sorted(
+            (p for p in Path(workspace.root).parent.iterdir() if p.is_dir() and str(p) not in self.busy),
+            key=lambda p: p.stat().st_ctime, reverse=True
+        )
+        for stale in overlays[self.keep_overlays:]:
+            if str(stale) != workspace.root:
+                shutil.rmtree(stale, ignore_errors=True)
+        return WorkspaceResult(kind="overlay", changed=True, overlay_path=workspace.root,
+                               changed_files=changed)
+
+    def snapshot(self) -> Dict[str, object]:
+        """Pool state for the status resource."""
+        now = time.monotonic()
+        return {
+            "base_dir": str(self.base_dir),
+            "pool_size": self.pool_size,
+            "keep_branches": self.keep_branches,
+            "keep_overlays": self.keep_overlays,
+            "created": self.created,
+            "reused": self.reused,
+            "idle": {repo: len(paths) for repo, paths in self.idle.items()},
+            "busy": [
+                {
+                    "agent": ws.agent_name,
+                    "kind": ws.kind,
+                    "root": ws.root,
+                    "seconds": round(now - ws.acquired_at, 1),
+                }
+                for ws in self.busy.values()
+            ],
+        }
@@ -0,0 +1,138 @@
+"""
+Host-wide concurrency slots shared by server instances.
+
+Instances are separate processes (tickets are grouped by pid), so the
+fairness test runs its waiters in child processes on one broker directory.
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from task_agents_mcp import host_broker
+from task_agents_mcp.host_broker import HostBroker
+
+SRC = str(Path(__file__).resolve().parent.parent / "src")
+
+# An instance: queues one acquire per label, logs each grant, holds the slot briefly
+INSTANCE = """\
+import asyncio, sys
+from pathlib import Path
+from task_agents_mcp.host_broker import HostBroker
+
+async def main(broker_dir, log, labels):
+    broker = HostBroker(Path(broker_dir), host_slots=1, poll_interval=0.02)
+    async def run(label):
+        lease = await broker.acquire(label)
+        with open(log, "a") as f:
+            f.write(label + "\\n")
+        await asyncio.sleep(0.05)
+        broker.release(lease)
+    tasks = []
+    for label in labels:
+        tasks.append(asyncio.create_task(run(label)))
+        await asyncio.sleep(0.02)  # Tickets in label order
+    await asyncio.gather(*tasks)
+
+asyncio.run(main(sys.argv[1], sys.argv[2], sys.argv[3:]))
+"""
+
+
+@pytest.fixture(autouse=True)
+def broker_on(monkeypatch):
+    monkeypatch.delenv("TASK_AGENTS_BROKER", raising=False)
+
+
+def tickets(broker_dir: Path) -> int:
+    return len(os.listdir(broker_dir / "queue"))
+
+
+def wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not reached")
+        time.sleep(0.02)
+
+
+def test_instances_are_served_round_robin(tmp_path):
+    broker = HostBroker(tmp_path, host_slots=1)
+    log = tmp_path / "grants.log"
+
+    async def hold():
+        return await broker.acquire("holder")
+
+    lease = asyncio.run(hold())
+    env = dict(os.environ, PYTHONPATH=SRC)
+
+    def instance(*labels):
+        return subprocess.Popen([sys.executable, "-c", INSTANCE, str(tmp_path), str(log), *labels], env=env)
+
+    # A queues a backlog of three, then B queues one behind it
+    a = instance("a1", "a2", "a3")
+    wait_for(lambda: tickets(tmp_path) == 3)
+    b = instance("b1")
+    wait_for(lambda: tickets(tmp_path) == 4)
+    broker.release(lease)
+    assert a.wait(timeout=30) == 0 and b.wait(timeout=30) == 0
+
+    # B's only ticket is served right after A's oldest one, not after A's backlog
+    assert log.read_text().split() == ["a1", "b1", "a2", "a3"]
+
+
+def test_snapshot_never_locks_or_truncates_slots(tmp_path, monkeypatch):
+    broker = HostBroker(tmp_path, host_slots=3)
+    lease = asyncio.run(broker.acquire("busy"))
+    # A crashed holder's line on a free slot, and a free slot that was never used
+    dead = subprocess.Popen(["true"])
+    dead.wait()
+    stale = f"{dead.pid} crashed\n"
+    (tmp_path / f"slot-{(lease.slot + 1) % 3}.lock").write_text(stale)
+
+    def no_locking(fd):
+        raise AssertionError("snapshot took a slot lock")
+
+    monkeypatch.setattr(host_broker, "_try_lock", no_locking)
+    monkeypatch.setattr(host_broker.fcntl, "flock", no_locking)
+    status = broker.snapshot()
+
+    assert [holder["slot"] for holder in status["busy_slots"]] == [lease.slot]
+    assert status["busy_slots"][0]["holder"] == f"{os.getpid()} busy"
+    assert (tmp_path / f"slot-{(lease.slot + 1) % 3}.lock").read_text() == stale
+    assert status["queued_on_host"] == 0
+    monkeypatch.undo()
+    broker.release(lease)
+
+
+def test_cancelled_waiters_leave_no_slot_or_ticket(tmp_path):
+    broker = HostBroker(tmp_path, host_slots=1, poll_interval=0.01)
+
+    async def scenario():
+        lease = await broker.acquire("holder")
+        waiters = [asyncio.create_task(broker.acquire(f"w{i}")) for i in range(4)]
+        await asyncio.sleep(0.2)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        broker.release(lease)
+        return await asyncio.wait_for(broker.acquire("after"), timeout=2)
+
+    lease = asyncio.run(scenario())
+    assert tickets(tmp_path) == 0
+    assert broker.waiting == 0
+    broker.release(lease)
+
+
+def test_tickets_of_dead_instances_are_removed(tmp_path):
+    broker = HostBroker(tmp_path, host_slots=1)
+    # Nobody holds this ticket's lock, as after its instance crashed
+    (tmp_path / "queue" / f"{time.time_ns()}-999999-abcdef").touch()
+
+    lease = asyncio.run(asyncio.wait_for(broker.acquire("next"), timeout=2))
+    assert tickets(tmp_path) == 0
+    broker.release(lease)
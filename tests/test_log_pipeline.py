@@ -0,0 +1,59 @@
+"""
+Log files shared by several server processes.
+
+Logging is configured once per process, so each writer runs in a child process.
+"""
+
+import glob
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from task_agents_mcp.log_pipeline import default_log_file
+
+SRC = str(Path(__file__).resolve().parent.parent / "src")
+
+WRITER = """\
+import logging, sys, time
+from task_agents_mcp.log_pipeline import configure_logging, shutdown_logging
+configure_logging(log_file=sys.argv[1])
+print("ready", flush=True)
+log = logging.getLogger("writer")
+for i in range(int(sys.argv[3])):
+    log.info(f"{sys.argv[2]} {i}")
+    time.sleep(0.0005)
+shutdown_logging()
+"""
+
+
+def test_default_log_file_is_per_agents_directory(tmp_path):
+    assert default_log_file(str(tmp_path / "one")) != default_log_file(str(tmp_path / "two"))
+    assert default_log_file(str(tmp_path / "one")) == default_log_file(str(tmp_path / "one" / "."))
+
+
+def test_only_one_process_rotates_a_shared_file(tmp_path):
+    log_file = tmp_path / "server.log"
+    env = dict(os.environ, PYTHONPATH=SRC, TASK_AGENTS_LOG_MAX_BYTES="20000", TASK_AGENTS_LOG_BACKUPS="1000",
+               TASK_AGENTS_LOG_LEVEL="INFO")
+
+    def writer(name, count):
+        process = subprocess.Popen([sys.executable, "-c", WRITER, str(log_file), name, str(count)], env=env,
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        assert process.stdout.readline().strip() == "ready"
+        return process
+
+    owner = writer("owner", 1500)  # Holds the lock before the second writer starts
+    other = writer("other", 1000)
+    assert other.wait(timeout=60) == 0 and owner.wait(timeout=60) == 0
+
+    files = [path for path in glob.glob(f"{log_file}*") if not path.endswith(".lock")]
+    assert len(files) > 2  # Rotated by size
+    messages = []
+    for path in files:
+        with open(path) as f:
+            messages.extend(json.loads(line)["msg"] for line in f if line.strip())
+    for name, count in (("owner", 1500), ("other", 1000)):
+        assert sorted(int(m.split()[1]) for m in messages if m.startswith(f"{name} ")) == list(range(count))
+    assert any("appending without rotating" in m for m in messages)
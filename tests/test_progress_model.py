@@ -0,0 +1,95 @@
+"""
+Progress tracking of a live run.
+
+Runs AgentManager.execute_task against a stand-in ``claude`` script that
+streams text deltas, makes tool calls and reports its result, and checks that
+the request's tracker is fed from those events.
+"""
+
+import asyncio
+import json
+import stat
+import sys
+
+import pytest
+
+from task_agents_mcp.agent_manager import AgentManager
+
+FAKE_CLI = """\
+#!{python}
+import json, time, uuid
+session_id = str(uuid.uuid4())
+def emit(event):
+    print(json.dumps(event), flush=True)
+    time.sleep(0.05)
+emit({{"type": "system", "subtype": "init", "session_id": session_id}})
+for i, name in enumerate(["Read", "Grep"]):
+    emit({{"type": "assistant", "message": {{"id": f"m{{i}}", "content": [
+        {{"type": "tool_use", "name": name, "input": {{}}}}]}}}})
+for text in ["Found ", "it"]:
+    emit({{"type": "stream_event", "event": {{"type": "content_block_delta",
+                                              "delta": {{"type": "text_delta", "text": text}}}}}})
+emit({{"type": "result", "subtype": "success", "is_error": False, "result": "Found it",
+       "session_id": session_id, "usage": {{"input_tokens": 10, "output_tokens": 5}}}})
+"""
+
+AGENT = """\
+---
+agent-name: Tracked
+description: Test agent with progress
+tools: Read, Grep
+model: sonnet
+cwd: {cwd}
+---
+
+System-prompt:
+You are a test agent.
+"""
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    cli = tmp_path / "claude"
+    cli.write_text(FAKE_CLI.format(python=sys.executable))
+    cli.chmod(cli.stat().st_mode | stat.S_IEXEC)
+    agents = tmp_path / "agents"
+    agents.mkdir()
+    (agents / "tracked.md").write_text(AGENT.format(cwd=tmp_path))
+    for key, value in {
+        "CLAUDE_EXECUTABLE_PATH": str(cli),
+        "TASK_AGENTS_LEDGER_PATH": str(tmp_path / "ledger.jsonl"),
+        "TASK_AGENTS_ARCHIVE_DIR": str(tmp_path / "archive"),
+        "TASK_AGENTS_RESULT_DIR": str(tmp_path / "results"),
+        "TASK_AGENTS_TOOL_STATS_PATH": str(tmp_path / "tool_stats.json"),
+        "TASK_AGENTS_SPOOL_DIR": str(tmp_path / "spool"),
+        "TASK_AGENTS_BROKER": "off",
+        "TASK_AGENTS_SAMPLE_INTERVAL": "0",
+    }.items():
+        monkeypatch.setenv(key, value)
+    manager = AgentManager(str(agents))
+    manager.load_agents()
+    return manager
+
+
+def test_tracker_follows_the_run_events(manager):
+    config = next(iter(manager.agents.values()))
+    tracker = manager.runtimes.track(config.agent_name, 100)
+    seen = []
+
+    async def on_progress(message: str):
+        if not message.startswith("partial:"):
+            seen.append((message, tracker.tools, tracker.finished is not None))
+
+    async def scenario():
+        response = await manager.execute_task({'name': config.name, 'config': config}, "find it",
+                                              progress_callback=on_progress, progress=tracker)
+        await asyncio.gather(*manager.teardown_tasks)
+        return response
+
+    assert "Found it" in asyncio.run(scenario())
+    # Each status message is sent after the tracker has seen its event
+    assert [(tools, done) for message, tools, done in seen if "tool" in message or "completed" in message] == [
+        (1, False), (2, False), (2, True)]
+    assert tracker.output_chars == len("Found it")
+    assert tracker.fraction() == 1.0 and tracker.eta() == 0.0
+
@@ -0,0 +1,104 @@
+"""
+Repository index: regex prefilter literals, incremental updates, and two
+servers indexing the same directory into one database.
+"""
+
+import threading
+import time
+
+import pytest
+
+from task_agents_mcp import repo_index
+from task_agents_mcp.repo_index import RepoIndex, index_available, required_literals
+
+pytestmark = pytest.mark.skipif(not index_available(), reason="SQLite has no trigram tokenizer")
+
+
+@pytest.mark.parametrize("pattern, literals", [
+    ("def handle_request", ["def handle_request"]),
+    (r"def \w+_request\(", ["def ", "_request("]),
+    ("colou?r", ["colo", "r"]),
+    ("ab*c", ["a", "c"]),
+    ("x{2,3}yz", ["yz"]),
+    ("foo|bar", []),
+    ("(optional)?name", ["name"]),
+    ("[A-Z]+Error", ["Error"]),
+    (r"a\.b.c", ["a.b", "c"]),
+    ("^import os$", ["import os"]),
+])
+def test_required_literals(pattern, literals):
+    assert required_literals(pattern) == literals
+
+
+@pytest.fixture
+def repo(tmp_path):
+    root = tmp_path / "repo"
+    (root / "pkg").mkdir(parents=True)
+    (root / "pkg" / "core.py").write_text("def handle_request(req):\n    return req\n")
+    (root / "README.md").write_text("# Project\n")
+    return root
+
+
+def open_index(repo, tmp_path, **kwargs) -> RepoIndex:
+    kwargs.setdefault("watch", False)
+    return RepoIndex(str(repo), index_dir=str(tmp_path / "index"), sync_ttl=0, **kwargs)
+
+
+def paths(hits):
+    return [hit.path for hit in hits]
+
+
+@pytest.mark.parametrize("watch", [False, True])
+def test_incremental_update(repo, tmp_path, watch):
+    index = open_index(repo, tmp_path, watch=watch)
+    try:
+        assert index.sync(force=True)["read"] == 2
+        assert paths(index.search("handle_request")[0]) == ["pkg/core.py"]
+
+        (repo / "pkg" / "core.py").write_text("def serve_request(req):\n    return req\n")
+        (repo / "pkg" / "extra.py").write_text("class RequestQueue:\n    pass\n")
+        (repo / "README.md").unlink()
+        time.sleep(0.01)  # Let the change events arrive
+        if not watch:  # Only the changed files are read again
+            assert index.sync(force=True) == dict(index.last_sync, listed=2, read=2, removed=1)
+
+        assert index.search("handle_request")[0] == []
+        assert paths(index.search(r"def \w+_request", regex=True)[0]) == ["pkg/core.py"]
+        assert [hit.path for hit in index.find_symbol("RequestQueue")] == ["pkg/extra.py"]
+        assert index.find_files("*.md") == ([], 0)
+        assert index.find_files("pkg/*")[0] == ["pkg/core.py", "pkg/extra.py"]
+    finally:
+        index.close()
+
+
+def test_two_servers_apply_the_same_new_file(repo, tmp_path, monkeypatch):
+    first, second = open_index(repo, tmp_path), open_index(repo, tmp_path)
+    first.sync(force=True)
+    (repo / "pkg" / "new.py").write_text("def added():\n    pass\n")
+    index_file = RepoIndex._index
+
+    def slow_index(self, *args):
+        if self is first:
+            time.sleep(0.3)  # Both servers have seen the file as new before either writes it
+        index_file(self, *args)
+
+    monkeypatch.setattr(repo_index.RepoIndex, "_index", slow_index)
+    errors = []
+
+    def apply_first():
+        try:
+            first._apply({"pkg/new.py"})
+        except Exception as e:  # noqa: BLE001 - reported by the assertion below
+            errors.append(e)
+
+    thread = threading.Thread(target=apply_first)
+    thread.start()
+    time.sleep(0.1)
+    second._apply({"pkg/new.py"})
+    thread.join()
+
+    assert errors == []
+    assert first.find_files("new.py")[0] == ["pkg/new.py"]
+    assert [hit.path for hit in second.find_symbol("added")] == ["pkg/new.py"]
+    first.close()
+    second.close()
@@ -0,0 +1,45 @@
+"""
+Resource limits applied by the exec wrapper around the CLI.
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from task_agents_mcp.resource_governor import ResourceProfile, limit_command
+
+resource = pytest.importorskip("resource")
+
+REPORT = ("import json, resource; print(json.dumps({'data': resource.getrlimit(resource.RLIMIT_DATA)[0], "
+          "'as': resource.getrlimit(resource.RLIMIT_AS)[0], 'nofile': resource.getrlimit(resource.RLIMIT_NOFILE)[0]}))")
+
+
+def limits_of(cmd):
+    return json.loads(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout)
+
+
+def test_max_memory_is_a_data_limit_without_a_cgroup():
+    profile = ResourceProfile.from_frontmatter({"max-memory": "8G", "max-open-files": 256})
+    limits = limits_of(limit_command([sys.executable, "-c", REPORT], profile, None))
+
+    assert limits["data"] == 8 * 1024 ** 3
+    assert limits["as"] == resource.getrlimit(resource.RLIMIT_AS)[0]  # Address space is left alone
+    assert limits["nofile"] == 256
+
+
+def test_max_memory_is_left_to_the_cgroup(tmp_path):
+    (tmp_path / "memory.max").write_text("max")
+    (tmp_path / "cgroup.procs").write_text("")
+    profile = ResourceProfile.from_frontmatter({"max-memory": "8G", "memory-max": "2G"})
+    cmd = limit_command([sys.executable, "-c", REPORT], profile, tmp_path)
+
+    assert limits_of(cmd)["data"] == resource.getrlimit(resource.RLIMIT_DATA)[0]
+    assert profile.cgroup_memory_max == 2 * 1024 ** 3
+    assert profile.wants_cgroup
+
+
+def test_no_limits_runs_the_command_as_is():
+    cmd = [sys.executable, "-c", REPORT]
+    assert limit_command(cmd, ResourceProfile(), None) == cmd
@@ -0,0 +1,54 @@
+"""
+Resource directory manifests: the prompt listing stays the same while files
+are edited, and files are hashed only for the full manifest.
+"""
+
+import hashlib
+
+from task_agents_mcp import resource_manifest
+from task_agents_mcp.resource_manifest import ManifestCache
+
+
+def test_editing_a_file_keeps_the_listing(tmp_path):
+    (tmp_path / "tasks").mkdir()
+    (tmp_path / "tasks" / "create-doc.md").write_text("# Create Document\n\nSteps.\n")
+    (tmp_path / "notes.txt").write_text("Scratch notes\n")
+    cache = ManifestCache(ttl=0, default_budget=500)
+
+    listing = cache.context([str(tmp_path)])
+    assert listing.startswith(f"RESOURCE MANIFEST {tmp_path} (2 files):\n"
+                              "notes.txt - Scratch notes\n"
+                              "tasks/create-doc.md - Create Document\n")
+
+    # An agent appends to a file: the prompt prefix is unchanged
+    (tmp_path / "notes.txt").write_text("Scratch notes\n" + "more output\n" * 200)
+    assert cache.context([str(tmp_path)]) == listing
+
+    (tmp_path / "tasks" / "review.md").write_text("# Review\n")
+    assert "tasks/review.md - Review" in cache.context([str(tmp_path)])
+
+
+def test_files_are_hashed_only_for_the_full_manifest(tmp_path, monkeypatch):
+    (tmp_path / "data.md").write_text("# Data\n" + "x" * 100_000)
+    cache = ManifestCache(ttl=0)
+    hashed = []
+    sha1 = hashlib.sha1
+
+    def counting_sha1(*args):
+        hashed.append(args)
+        return sha1(*args)
+
+    monkeypatch.setattr(resource_manifest.hashlib, "sha1", counting_sha1)
+    cache.context([str(tmp_path)])
+    cache.context([str(tmp_path)])
+    assert hashed == []
+
+    manifest = cache.get(str(tmp_path)).to_dict()
+    expected = sha1((tmp_path / "data.md").read_bytes()).hexdigest()[:12]
+    assert manifest["entries"] == [{"path": "data.md", "size": 100_007, "sha1": expected, "summary": "Data"}]
+    cache.get(str(tmp_path)).to_dict()
+    assert len(hashed) == 1  # Kept until the file changes
+
+    (tmp_path / "data.md").write_text("# Data\nchanged\n")
+    changed = cache.get(str(tmp_path)).to_dict()["entries"][0]["sha1"]
+    assert changed == sha1(b"# Data\nchanged\n").hexdigest()[:12] and len(hashed) == 2
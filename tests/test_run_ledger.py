@@ -0,0 +1,50 @@
+"""
+Run ledger persistence: per-project files, background writes and compaction.
+"""
+
+import json
+
+from task_agents_mcp.agent_manager import AgentManager
+from task_agents_mcp.run_ledger import RunLedger, RunRecord
+
+
+def lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_each_agents_directory_has_its_own_ledger(tmp_path, monkeypatch):
+    monkeypatch.delenv("TASK_AGENTS_LEDGER_PATH", raising=False)
+    for name in ("one", "two"):
+        (tmp_path / name).mkdir()
+    one, two = AgentManager(str(tmp_path / "one")), AgentManager(str(tmp_path / "two"))
+    assert one.ledger.storage_path != two.ledger.storage_path
+    assert AgentManager(str(tmp_path / "one")).ledger.storage_path == one.ledger.storage_path
+
+    monkeypatch.setenv("TASK_AGENTS_LEDGER_PATH", str(tmp_path / "ledger.jsonl"))
+    assert AgentManager(str(tmp_path / "two")).ledger.storage_path == tmp_path / "ledger.jsonl"
+
+
+def test_records_are_written_in_order_in_the_background(tmp_path):
+    ledger = RunLedger(tmp_path / "ledger.jsonl", window=100)
+    for i in range(50):
+        ledger.record(RunRecord(agent="dev", model="sonnet", outcome="success", started_at=i))
+    ledger.flush()
+
+    assert [r["started_at"] for r in lines(tmp_path / "ledger.jsonl")] == list(range(50))
+
+
+def test_file_is_compacted_to_the_window(tmp_path):
+    path = tmp_path / "ledger.jsonl"
+    ledger = RunLedger(path, window=5)
+    for i in range(100):
+        ledger.record(RunRecord(agent=f"agent-{i % 2}", model="sonnet", outcome="success", started_at=i))
+        ledger.flush()
+        assert len(lines(path)) <= 2 * 5 * 2
+
+    reloaded = RunLedger(path, window=5)
+    for agent, last in (("agent-0", 98), ("agent-1", 99)):
+        expected = list(range(last - 8, last + 1, 2))
+        assert [r.started_at for r in reloaded.recent(agent)] == expected
+        assert [r.started_at for r in ledger.recent(agent)] == expected
+    assert reloaded.file_records == len(lines(path))
@@ -0,0 +1,170 @@
+"""
+Detached runs handed over between servers.
+
+A first server process starts a detached run of a stand-in ``claude`` script
+and drains, exiting while the CLI is still running and dropping its
+checkpoint lock. A
+second server on the same spool directory adopts the run through
+``adopt_orphaned_runs``, re-reads the spool and serves the response as a job
+under the original job id.
+"""
+
+import json
+import os
+import stat
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from task_agents_mcp.run_supervisor import RunCheckpoint, RunSupervisor
+
+SRC = str(Path(__file__).resolve().parent.parent / "src")
+
+# Starts a session, then waits for the test to let it finish
+FAKE_CLI = """\
+#!{python}
+import json, os, time, uuid
+session_id = str(uuid.uuid4())
+print(json.dumps({{"type": "system", "subtype": "init", "session_id": session_id}}), flush=True)
+while not os.path.exists(os.environ["FAKE_CLAUDE_GO"]):
+    time.sleep(0.02)
+print(json.dumps({{"type": "result", "subtype": "success", "is_error": False, "result": "ok " + session_id,
+                  "session_id": session_id, "usage": {{"input_tokens": 10, "output_tokens": 5}}}}), flush=True)
+"""
+
+AGENT = """\
+---
+agent-name: Detached
+description: Test agent run detached
+tools: Read
+model: sonnet
+cwd: {cwd}
+optional:
+  resume-session: true
+---
+
+System-prompt:
+You are a test agent.
+"""
+
+# The owning server: starts the run as job-1, then drains (SIGUSR1) and exits with the run in flight
+OWNER = """\
+import asyncio
+from task_agents_mcp import server
+
+async def main():
+    manager = server.agent_manager
+    config = next(iter(manager.agents.values()))
+    asyncio.create_task(manager.execute_task({'name': config.name, 'config': config}, "recover me",
+                                             job_id="job-1"))
+    while not manager.supervisor.owned:
+        await asyncio.sleep(0.02)
+    server.start_drain()
+    await asyncio.sleep(60)  # drain_and_exit ends the process
+
+asyncio.run(main())
+"""
+
+# The next server: adopts the run, lets the CLI finish and reports the job and the session chain
+ADOPTER = """\
+import asyncio, json, sys
+from pathlib import Path
+from task_agents_mcp import server
+
+async def main(go):
+    adopter = asyncio.create_task(server.adopt_orphaned_runs())
+    while server.job_store.get("job-1") is None:
+        await asyncio.sleep(0.02)
+    Path(go).touch()
+    job = server.job_store.get("job-1")
+    await job.task
+    await asyncio.gather(*server.agent_manager.teardown_tasks)
+    server.agent_manager.session_store.flush()
+    server.agent_manager.ledger.flush()
+    server.agent_manager.supervisor.draining = True
+    adopter.cancel()
+    print(json.dumps({"status": job.status, "client": job.client, "result": job.result,
+                      "chain": server.agent_manager.session_store.get_chain_info("Detached"),
+                      "sessions": str(server.agent_manager.session_store.storage_path)}))
+
+asyncio.run(main(sys.argv[1]))
+"""
+
+
+@pytest.fixture
+def env(tmp_path):
+    cli = tmp_path / "claude"
+    cli.write_text(FAKE_CLI.format(python=sys.executable))
+    cli.chmod(cli.stat().st_mode | stat.S_IEXEC)
+    agents = tmp_path / "agents"
+    agents.mkdir()
+    (agents / "detached.md").write_text(AGENT.format(cwd=tmp_path))
+    return dict(
+        os.environ,
+        PYTHONPATH=SRC,
+        CLAUDE_EXECUTABLE_PATH=str(cli),
+        FAKE_CLAUDE_GO=str(tmp_path / "go"),
+        TASK_AGENTS_PATH=str(agents),
+        TASK_AGENTS_DETACHED_RUNS="1",
+        TASK_AGENTS_ADOPT_INTERVAL="0.1",
+        TASK_AGENTS_SPOOL_DIR=str(tmp_path / "spool"),
+        TASK_AGENTS_LEDGER_PATH=str(tmp_path / "ledger.jsonl"),
+        TASK_AGENTS_ARCHIVE_DIR=str(tmp_path / "archive"),
+        TASK_AGENTS_RESULT_DIR=str(tmp_path / "results"),
+        TASK_AGENTS_TOOL_STATS_PATH=str(tmp_path / "tool_stats.json"),
+        TASK_AGENTS_LOG_FILE=str(tmp_path / "server.log"),
+        TASK_AGENTS_BROKER="off",
+        TASK_AGENTS_SAMPLE_INTERVAL="0",
+        PLUGIN_REGISTRY_PATH=str(tmp_path / "registry.json"),
+    )
+
+
+def test_checkpoint_is_adopted_only_once_its_owner_lets_go(tmp_path):
+    owner, other, third = (RunSupervisor(tmp_path, enabled=True) for _ in range(3))
+    owner.register(RunCheckpoint(agent="Detached", prompt="p", working_dir=str(tmp_path), run_id="run-1",
+                                 job_id="job-1"))
+    assert other.adopt_orphans() == []
+
+    os.close(owner.owned.pop("run-1"))  # The owning server exits
+    adopted = other.adopt_orphans()
+    assert [(c.run_id, c.job_id, c.server_pid) for c in adopted] == [("run-1", "job-1", os.getpid())]
+    assert other.adopt_orphans() == [] and third.adopt_orphans() == []
+
+    other.release("run-1")
+    assert list(tmp_path.glob("run-1*")) == []
+    assert third.adopt_orphans() == []
+
+
+def test_next_server_adopts_a_detached_run(tmp_path, env):
+    owner = subprocess.run([sys.executable, "-c", OWNER], env=dict(env, TASK_AGENTS_DRAIN_TIMEOUT="0.2"),
+                           timeout=30)
+    assert owner.returncode == 0
+    assert "leaving 1 detached runs to the next server" in (tmp_path / "server.log").read_text()
+    spool = tmp_path / "spool"
+    (checkpoint_path,) = spool.glob("*.json")
+    checkpoint = json.loads(checkpoint_path.read_text())
+    assert checkpoint["job_id"] == "job-1" and checkpoint["on_chain"]
+    assert not Path(f"{spool / checkpoint['run_id']}.exit").exists()  # The CLI outlived its server
+
+    adopter = subprocess.run([sys.executable, "-c", ADOPTER, env["FAKE_CLAUDE_GO"]], env=env,
+                             capture_output=True, text=True, timeout=60)
+    assert adopter.returncode == 0, adopter.stderr
+    report = json.loads(adopter.stdout.strip().splitlines()[-1])
+    Path(report["sessions"]).unlink(missing_ok=True)
+
+    assert report["status"] == "completed" and report["client"] == "adopted"
+    assert "Recovered: started" in report["result"]
+    session_id = report["result"].split("Session: ", 1)[1].split("\n", 1)[0]
+    assert f"ok {session_id}" in report["result"]
+    # The session chain continues from the adopted run, and the run is recorded once
+    assert report["chain"]["current_session"] == session_id
+    assert report["chain"]["exchange_count"] == 1
+    ledger = [json.loads(line) for line in (tmp_path / "ledger.jsonl").read_text().splitlines()]
+    assert [record["agent"] for record in ledger] == ["Detached"]
+    deadline = time.monotonic() + 10
+    while list(spool.iterdir()) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert list(spool.iterdir()) == []
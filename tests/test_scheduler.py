@@ -0,0 +1,116 @@
+"""
+Fair scheduler: class weights, starvation protection and cancelled waiters.
+
+Requests hold their slot until the test releases them, so service order is
+observed directly instead of through timings.
+"""
+
+import asyncio
+
+from task_agents_mcp.scheduler import FairScheduler
+
+
+class Requests:
+    """Requests that take a slot, record their admission and hold it until released."""
+
+    def __init__(self, scheduler: FairScheduler):
+        self.scheduler = scheduler
+        self.admitted = []
+        self.releases = {}
+        self.tasks = {}
+
+    def submit(self, name: str, priority: str, client: str, cost: float = 1.0) -> asyncio.Task:
+        release = self.releases[name] = asyncio.Event()
+
+        async def request():
+            async with self.scheduler.slot(priority, client, label=name, cost=cost):
+                self.admitted.append(name)
+                await release.wait()
+
+        task = self.tasks[name] = asyncio.create_task(request())
+        return task
+
+    async def finish(self, name: str):
+        self.releases[name].set()
+        await self.tasks[name]
+        await asyncio.sleep(0)  # Let the next admitted request record itself
+
+
+def test_batch_flood_delays_interactive_by_at_most_one_slot():
+    async def scenario():
+        requests = Requests(FairScheduler(capacity=1, max_wait=60))
+        requests.submit("running", "batch", "automation", cost=30)
+        await asyncio.sleep(0)
+        # Long batch runs from one client and from many, then a short interactive call
+        for i in range(10):
+            requests.submit(f"flood{i}", "batch", "automation", cost=30)
+            requests.submit(f"other{i}", "batch", f"client{i}", cost=30)
+        await asyncio.sleep(0)
+        requests.submit("interactive", "interactive", "developer", cost=5)
+        await asyncio.sleep(0)
+        assert requests.admitted == ["running"]
+        await requests.finish("running")
+        assert requests.admitted == ["running", "interactive"]
+        for name in list(requests.tasks):
+            requests.releases[name].set()
+        await asyncio.gather(*requests.tasks.values())
+        return requests.scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.promoted == 0
+    assert scheduler.running == [] and scheduler.queue == []
+
+
+def test_request_past_max_wait_is_served_first():
+    async def scenario():
+        requests = Requests(FairScheduler(capacity=1, max_wait=0.2))
+        requests.submit("running", "interactive", "developer")
+        await asyncio.sleep(0)
+        requests.submit("starved", "batch", "automation", cost=30)
+        await asyncio.sleep(0.3)  # Past max_wait
+        requests.submit("interactive", "interactive", "developer")
+        await asyncio.sleep(0)
+        await requests.finish("running")
+        assert requests.admitted == ["running", "starved"]
+        await requests.finish("starved")
+        assert requests.admitted == ["running", "starved", "interactive"]
+        await requests.finish("interactive")
+        return requests.scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.promoted == 1
+    assert scheduler.waits["batch"][0] >= 0.2
+
+
+def test_cancelled_waiters_do_not_leak_slots():
+    async def scenario():
+        scheduler = FairScheduler(capacity=1, max_wait=60)
+        requests = Requests(scheduler)
+        requests.submit("running", "normal", "a")
+        await asyncio.sleep(0)
+        # Cancelled while queued
+        queued = requests.submit("queued", "normal", "b")
+        await asyncio.sleep(0)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        assert scheduler.queue == []
+        # Granted the slot, then cancelled before it could run: the slot is given back
+        granted = requests.submit("granted", "normal", "c")
+        await asyncio.sleep(0)
+        requests.releases["running"].set()
+        while scheduler.running[0].label != "granted":
+            await asyncio.sleep(0)
+        granted.cancel()
+        await asyncio.gather(granted, return_exceptions=True)
+        assert "granted" not in requests.admitted
+        assert scheduler.running == [] and scheduler.queue == []
+        # The capacity is intact
+        async with asyncio.timeout(1):
+            requests.submit("after", "normal", "d")
+            await asyncio.sleep(0)
+            assert requests.admitted == ["running", "after"]
+            await requests.finish("after")
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.running == [] and scheduler.queue == []
@@ -0,0 +1,161 @@
+"""
+Session chains under concurrency.
+
+Runs AgentManager.execute_task end to end against a stand-in ``claude``
+script that starts a new session id on every run and logs what it was asked
+to resume, so the tests can check the chain the server built.
+"""
+
+import asyncio
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+from task_agents_mcp.agent_manager import AgentManager
+
+FAKE_CLI = """\
+#!{python}
+import json, os, sys, time, uuid
+args = sys.argv[1:]
+def arg(flag):
+    return args[args.index(flag) + 1] if flag in args else None
+session_id = str(uuid.uuid4())
+started = time.time()
+print(json.dumps({{"type": "system", "subtype": "init", "session_id": session_id}}), flush=True)
+time.sleep(float(os.environ.get("FAKE_CLAUDE_SLEEP", "0.2")))
+print(json.dumps({{"type": "result", "subtype": "success", "is_error": False, "result": "ok " + session_id,
+                  "session_id": session_id, "usage": {{"input_tokens": 10, "output_tokens": 5}}}}), flush=True)
+with open(os.environ["FAKE_CLAUDE_LOG"], "a") as log:
+    log.write(json.dumps({{"session": session_id, "resume": arg("-r"), "fork": "--fork-session" in args,
+                          "prompt": arg("-p"), "start": started, "end": time.time()}}) + "\\n")
+"""
+
+AGENT = """\
+---
+agent-name: {name}
+description: Test agent {name}
+tools: Read
+model: sonnet
+cwd: {cwd}
+{optional}---
+
+System-prompt:
+You are a test agent.
+"""
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    cli = tmp_path / "claude"
+    cli.write_text(FAKE_CLI.format(python=sys.executable))
+    cli.chmod(cli.stat().st_mode | stat.S_IEXEC)
+    agents = tmp_path / "agents"
+    agents.mkdir()
+    chained = "optional:\n  resume-session: true 20\n"
+    for name, optional in (("Chain", chained), ("Other", chained), ("Plain", "")):
+        (agents / f"{name.lower()}.md").write_text(AGENT.format(name=name, cwd=tmp_path, optional=optional))
+    for key, value in {
+        "CLAUDE_EXECUTABLE_PATH": str(cli),
+        "FAKE_CLAUDE_LOG": str(tmp_path / "runs.jsonl"),
+        "TASK_AGENTS_LEDGER_PATH": str(tmp_path / "ledger.jsonl"),
+        "TASK_AGENTS_ARCHIVE_DIR": str(tmp_path / "archive"),
+        "TASK_AGENTS_RESULT_DIR": str(tmp_path / "results"),
+        "TASK_AGENTS_TOOL_STATS_PATH": str(tmp_path / "tool_stats.json"),
+        "TASK_AGENTS_SPOOL_DIR": str(tmp_path / "spool"),
+        "TASK_AGENTS_BROKER": "off",
+        "TASK_AGENTS_MAX_CONCURRENCY": "8",
+        "TASK_AGENTS_SAMPLE_INTERVAL": "0",
+        "TASK_AGENTS_DETACHED_RUNS": "0",
+    }.items():
+        monkeypatch.setenv(key, value)
+    manager = AgentManager(str(agents))
+    manager.load_agents()
+    yield manager
+    if manager.session_store.storage_path:
+        manager.session_store.storage_path.unlink(missing_ok=True)
+
+
+def runs(manager):
+    with open(os.environ["FAKE_CLAUDE_LOG"]) as f:
+        return [json.loads(line) for line in f]
+
+
+def call(manager, agent_name, prompt, **kwargs):
+    config = next(c for c in manager.agents.values() if c.agent_name == agent_name)
+    return manager.execute_task({'name': config.name, 'config': config}, prompt, **kwargs)
+
+
+async def settle(manager):
+    """Let background teardowns finish, so every run has been logged."""
+    await asyncio.gather(*manager.teardown_tasks)
+
+
+def test_concurrent_calls_form_one_linear_chain(manager):
+    n = 6
+
+    async def scenario():
+        responses = await asyncio.gather(*(call(manager, "Chain", f"exchange {i}") for i in range(n)))
+        await settle(manager)
+        return responses
+
+    responses = asyncio.run(scenario())
+    assert all("ok " in response for response in responses)
+
+    log = sorted(runs(manager), key=lambda run: run["start"])
+    assert len(log) == n
+    # Each exchange resumes the session of the one before it, and none overlap
+    assert log[0]["resume"] is None
+    for previous, current in zip(log, log[1:]):
+        assert current["resume"] == previous["session"]
+        assert not current["fork"]
+        assert current["start"] >= previous["end"]
+
+    chain = manager.session_store.get_chain_info("Chain")
+    assert chain["exchange_count"] == n
+    assert chain["current_session"] == log[-1]["session"]
+
+
+def test_allow_fork_forks_instead_of_queueing(manager, monkeypatch):
+    async def scenario():
+        await call(manager, "Chain", "first")
+        monkeypatch.setenv("FAKE_CLAUDE_SLEEP", "1.0")
+        exchange = asyncio.create_task(call(manager, "Chain", "second"))
+        await asyncio.sleep(0.3)  # The second exchange holds the chain
+        monkeypatch.setenv("FAKE_CLAUDE_SLEEP", "0.2")
+        forked = await call(manager, "Chain", "side question", allow_fork=True)
+        assert not exchange.done()  # Answered while the exchange was still running
+        await exchange
+        await settle(manager)
+        return forked
+
+    forked = asyncio.run(scenario())
+    assert "forked from chain" in forked
+
+    by_prompt = {run["prompt"]: run for run in runs(manager)}
+    first, second, side = by_prompt["first"], by_prompt["second"], by_prompt["side question"]
+    assert second["resume"] == first["session"] and not second["fork"]
+    assert side["resume"] == first["session"] and side["fork"]
+    assert side["start"] < second["end"]
+
+    # The fork is not recorded on the chain
+    chain = manager.session_store.get_chain_info("Chain")
+    assert chain["exchange_count"] == 2
+    assert chain["current_session"] == second["session"]
+
+
+def test_other_agents_run_in_parallel(manager, monkeypatch):
+    monkeypatch.setenv("FAKE_CLAUDE_SLEEP", "0.8")
+
+    async def scenario():
+        await asyncio.gather(call(manager, "Chain", "chain"), call(manager, "Other", "other"),
+                             call(manager, "Plain", "plain one"), call(manager, "Plain", "plain two"))
+        await settle(manager)
+
+    asyncio.run(scenario())
+    log = runs(manager)
+    assert len(log) == 4
+    # All four were running at the same moment
+    assert max(run["start"] for run in log) < min(run["end"] for run in log)
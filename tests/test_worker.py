@@ -0,0 +1,210 @@
+"""
+Remote workers on localhost.
+
+Starts ``task-agent worker`` processes on free localhost ports, each with a
+stand-in ``claude`` script that logs which worker ran it, and dispatches
+agent runs to them through AgentManager and WorkerPool.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import stat
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from task_agents_mcp.agent_manager import AgentManager
+from task_agents_mcp.worker import RemoteExecution, WorkerError, WorkerPool
+
+SRC = str(Path(__file__).resolve().parent.parent / "src")
+TOKEN = "test-secret"
+
+FAKE_CLI = """\
+#!{python}
+import json, os, sys, time, uuid
+session_id = str(uuid.uuid4())
+print(json.dumps({{"type": "system", "subtype": "init", "session_id": session_id}}), flush=True)
+time.sleep(float(os.environ.get("FAKE_CLAUDE_SLEEP", "0.3")))
+print(json.dumps({{"type": "result", "subtype": "success", "is_error": False, "result": "ok",
+                  "session_id": session_id, "usage": {{"input_tokens": 10, "output_tokens": 5}}}}), flush=True)
+with open(os.environ["FAKE_CLAUDE_LOG"], "a") as log:
+    log.write(json.dumps({{"worker": os.environ.get("FAKE_WORKER", "local")}}) + "\\n")
+"""
+
+AGENT = """\
+---
+agent-name: Remote
+description: Test agent run on workers
+tools: Read
+model: sonnet
+cwd: {cwd}
+---
+
+System-prompt:
+You are a test agent.
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_listening(port: int, process: subprocess.Popen, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"worker exited with {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"worker on port {port} did not start")
+
+
+@pytest.fixture
+def cli(tmp_path):
+    path = tmp_path / "claude"
+    path.write_text(FAKE_CLI.format(python=sys.executable))
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return path
+
+
+@pytest.fixture
+def start_worker(tmp_path, cli):
+    """Start ``task-agent worker`` processes; returns their addresses."""
+    processes = []
+
+    def start(name: str, capacity: int = 2) -> str:
+        port = free_port()
+        env = dict(os.environ, PYTHONPATH=SRC, CLAUDE_EXECUTABLE_PATH=str(cli), FAKE_WORKER=name,
+                   FAKE_CLAUDE_LOG=str(tmp_path / "runs.jsonl"), TASK_AGENTS_WORKER_TOKEN=TOKEN)
+        process = subprocess.Popen(
+            [sys.executable, "-m", "task_agents_mcp.cli", "worker", "--listen", f"127.0.0.1:{port}",
+             "--capacity", str(capacity)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        processes.append(process)
+        wait_listening(port, process)
+        return f"127.0.0.1:{port}"
+
+    start.processes = processes
+    yield start
+    for process in processes:
+        process.kill()
+        process.wait()
+
+
+@pytest.fixture
+def manager_for(tmp_path, cli, monkeypatch):
+    """Build an AgentManager that dispatches only to the given workers."""
+    agents = tmp_path / "agents"
+    agents.mkdir()
+    (agents / "remote.md").write_text(AGENT.format(cwd=tmp_path))
+    for key, value in {
+        "CLAUDE_EXECUTABLE_PATH": str(cli),
+        "FAKE_CLAUDE_LOG": str(tmp_path / "runs.jsonl"),
+        "TASK_AGENTS_LEDGER_PATH": str(tmp_path / "ledger.jsonl"),
+        "TASK_AGENTS_ARCHIVE_DIR": str(tmp_path / "archive"),
+        "TASK_AGENTS_RESULT_DIR": str(tmp_path / "results"),
+        "TASK_AGENTS_TOOL_STATS_PATH": str(tmp_path / "tool_stats.json"),
+        "TASK_AGENTS_SPOOL_DIR": str(tmp_path / "spool"),
+        "TASK_AGENTS_BROKER": "off",
+        "TASK_AGENTS_LOCAL_WORKER": "off",
+        "TASK_AGENTS_WORKER_TOKEN": TOKEN,
+        "TASK_AGENTS_RETRY_BASE_DELAY": "0.05",
+    }.items():
+        monkeypatch.setenv(key, value)
+
+    def build(*addresses: str) -> AgentManager:
+        monkeypatch.setenv("TASK_AGENTS_WORKERS", ",".join(addresses))
+        manager = AgentManager(str(agents))
+        manager.load_agents()
+        return manager
+
+    return build
+
+
+def worker_runs(tmp_path):
+    with open(tmp_path / "runs.jsonl") as f:
+        return [json.loads(line)["worker"] for line in f]
+
+
+async def run_all(manager: AgentManager, n: int):
+    config = next(iter(manager.agents.values()))
+    responses = await asyncio.gather(*(
+        manager.execute_task({'name': config.name, 'config': config}, f"request {i}") for i in range(n)))
+    await asyncio.gather(*manager.teardown_tasks)
+    if manager.workers.health_task:
+        manager.workers.health_task.cancel()
+    return responses
+
+
+def test_runs_are_spread_across_workers(tmp_path, start_worker, manager_for):
+    manager = manager_for(start_worker("a"), start_worker("b"))
+    responses = asyncio.run(run_all(manager, 4))
+
+    assert all("ok" in response for response in responses)
+    runs = worker_runs(tmp_path)
+    assert sorted(runs) == ["a", "a", "b", "b"]
+
+
+def test_unhealthy_worker_is_skipped(tmp_path, start_worker, manager_for):
+    dead = f"127.0.0.1:{free_port()}"  # Nothing listens here
+    live = start_worker("a")
+    manager = manager_for(live, dead)
+    responses = asyncio.run(run_all(manager, 3))
+
+    assert all("ok" in response for response in responses)
+    assert worker_runs(tmp_path) == ["a", "a", "a"]
+    assert not manager.workers.endpoints[dead].healthy
+    assert manager.workers.endpoints[dead].dispatched == 0
+
+
+def test_worker_that_dies_is_skipped_after_failing(tmp_path, start_worker, manager_for):
+    a, b = start_worker("a"), start_worker("b")
+    manager = manager_for(a, b)
+
+    async def scenario():
+        await manager.workers.check_all()
+        start_worker.processes[1].kill()  # b passed its health check, then went away
+        start_worker.processes[1].wait()
+        return await run_all(manager, 2)
+
+    responses = asyncio.run(scenario())
+    assert all("ok" in response for response in responses)
+    assert worker_runs(tmp_path) == ["a", "a"]
+    assert not manager.workers.endpoints[b].healthy
+
+
+def test_no_healthy_worker_never_runs_locally(tmp_path, manager_for):
+    manager = manager_for(f"127.0.0.1:{free_port()}")
+    responses = asyncio.run(run_all(manager, 1))
+
+    assert "no healthy workers" in responses[0]
+    assert not (tmp_path / "runs.jsonl").exists()
+    with pytest.raises(WorkerError, match="no healthy workers"):
+        asyncio.run(WorkerPool([f"127.0.0.1:{free_port()}"], token=TOKEN).select())
+
+
+@pytest.mark.parametrize("token", [None, "wrong"])
+def test_request_without_the_token_is_refused(tmp_path, start_worker, token):
+    address = start_worker("a")
+
+    async def scenario():
+        with pytest.raises(WorkerError, match="invalid worker token"):
+            await RemoteExecution.start(address, ["claude", "-p", "hi"], str(tmp_path), token=token)
+        pool = WorkerPool([address], token=token)
+        await pool.check_all()
+        return pool.endpoints[address]
+
+    endpoint = asyncio.run(scenario())
+    assert not endpoint.healthy
+    assert "invalid worker token" in endpoint.last_error
+    assert not (tmp_path / "runs.jsonl").exists()